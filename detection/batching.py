@@ -0,0 +1,155 @@
+# detection/batching.py
+"""
+Service d'inférence par micro-lots.
+
+``model.predict`` a un coût fixe élevé par appel : scorer les recensements un
+par un revient à payer ce coût à chaque requête HTTP. Ce service regroupe les
+demandes concurrentes dans une file, les traite par lots (``max_batch_size``
+lignes, ou ce qui est arrivé en ``max_wait`` secondes) en une seule passe
+vectorisée, puis rend à chaque appelant sa propre ligne de résultat.
+
+    service = get_inference_service()
+    proba = service.predict({'age': 34, 'revenu': 25000})   # un appelant
+    probas = service.predict_many(rows)                      # appel en masse
+
+Le regroupement n'apporte un gain que si plusieurs requêtes arrivent en même
+temps, c'est-à-dire avec des workers threadés (gthread) ou ASGI.
+
+La ligne est transformée une seule fois, par l'appelant : c'est le vecteur
+(avec le modèle qui l'a produit) qui passe dans la file, après consultation du
+cache des prédictions.
+"""
+import os
+import queue
+import threading
+import time
+import logging
+from concurrent.futures import Future
+
+import numpy as np
+from django.conf import settings
+
+from detection.prediction_cache import get_prediction_cache, predict_cached
+from detection.registry import get_registry
+
+logger = logging.getLogger(__name__)
+
+
+class InferenceService:
+    """File d'attente + thread de traitement qui score les lignes par lots."""
+
+    def __init__(self, registry=None, max_batch_size=32, max_wait=0.005, cache=None):
+        self.registry = registry or get_registry()
+        self.cache = cache
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+
+        self._lock = threading.Lock()
+        self._queue = None
+        self._thread = None
+        self._pid = None
+
+    # ------------------------------------------------------------------
+    # API publique
+    # ------------------------------------------------------------------
+    def submit(self, row):
+        """Ajoute une ligne (dict de features) à la file ; retourne un Future."""
+        bundle = self.registry.get()
+        return self._submit(bundle, bundle.transform([row])[0])
+
+    def predict(self, row, timeout=None):
+        """Probabilités des classes pour une ligne, via le micro-lot courant."""
+        bundle = self.registry.get()
+        vector = bundle.transform([row])[0]
+        if self.cache is not None:
+            # Ligne déjà scorée : réponse immédiate, sans attendre le lot
+            _, found = self.cache.get_many(bundle.fingerprint, vector[np.newaxis])
+            if found[0] is not None:
+                return found[0]
+        return self._submit(bundle, vector).result(timeout=timeout)
+
+    def predict_many(self, rows, _count=True):
+        """Score directement une liste de lignes en une passe (sans la file)."""
+        rows = list(rows)
+        if not rows:
+            return np.empty((0, 0), dtype=np.float32)
+        bundle = self.registry.get()
+        return predict_cached(bundle, bundle.transform(rows), self.cache, count=_count)
+
+    # ------------------------------------------------------------------
+    # Thread de traitement
+    # ------------------------------------------------------------------
+    def _submit(self, bundle, vector):
+        future = Future()
+        self._ensure_started()
+        self._queue.put((bundle, vector, future))
+        return future
+
+    def _ensure_started(self):
+        # Après un fork (gunicorn), le thread du parent n'existe plus : on repart de zéro.
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._queue = queue.Queue()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='detection-inference', daemon=True)
+            self._thread.start()
+
+    def _collect_batch(self):
+        # Bloque jusqu'à la première ligne, puis attend au plus max_wait les suivantes
+        batch = [self._queue.get()]
+        end = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = end - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            self._process(batch)
+
+    def _process(self, batch):
+        # Un lot par modèle (plusieurs seulement si la version a changé entre deux lignes)
+        groups = {}
+        for bundle, vector, future in batch:
+            vectors, futures = groups.setdefault(bundle, ([], []))
+            vectors.append(vector)
+            futures.append(future)
+
+        for bundle, (vectors, futures) in groups.items():
+            try:
+                # Lignes déjà cherchées dans le cache par predict() : pas de double comptage
+                probas = predict_cached(bundle, np.stack(vectors), self.cache, count=False)
+            except Exception as e:
+                logger.exception("Erreur lors de l'inférence d'un lot de %d ligne(s)", len(vectors))
+                for future in futures:
+                    future.set_exception(e)
+                continue
+            for future, proba in zip(futures, probas):
+                future.set_result(proba)
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_inference_service():
+    """Service d'inférence unique du processus."""
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                _service = InferenceService(
+                    max_batch_size=getattr(settings, 'DETECTION_BATCH_MAX_SIZE', 32),
+                    max_wait=getattr(settings, 'DETECTION_BATCH_MAX_WAIT_MS', 5) / 1000.0,
+                    cache=get_prediction_cache(),
+                )
+    return _service
@@ -0,0 +1,281 @@
+# detection/benchmarks.py
+"""
+Benchmarks d'inférence et d'empreinte mémoire des modèles de vulnérabilité.
+
+Pour chaque candidat (modèle Keras, export NumPy, RandomForest et XGBoost de
+``create_model``, ou tout fichier passé en argument), on mesure dans un
+processus neuf (``spawn``), pour que les chiffres ne se contaminent pas :
+
+- le temps d'import du framework et le temps de chargement à froid ;
+- la latence p50 / p99 d'un appel ``predict`` pour des lots de 1, 32 et 1024
+  lignes, et le débit correspondant (lignes/s) ;
+- la mémoire résidente avant chargement, après chargement et le pic (VmHWM) ;
+- la taille du fichier.
+
+Les lignes sont synthétiques, tirées du schéma d'entraînement (cf. synthetic.py),
+et transformées une fois pour toutes : on mesure le modèle, pas le pré-traitement.
+
+    python manage.py benchmark_detection --output bench.json
+"""
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+
+BATCH_SIZES = (1, 32, 1024)
+
+
+def _rss_mb():
+    """Mémoire résidente actuelle (Mo), depuis /proc quand il existe."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except (OSError, ValueError):
+        return None
+
+
+def _peak_rss_mb():
+    # VmHWM repart de zéro à l'exec ; ru_maxrss garde le pic du parent au moment du fork
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Ko sous Linux, octets sous macOS
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 1024
+
+
+def _load(kind, path):
+    """Importe le framework nécessaire et charge le modèle ; renvoie (modèle, t_import, t_load)."""
+    start = time.perf_counter()
+    if kind == 'keras':
+        import tensorflow as tf
+        t_import = time.perf_counter() - start
+        start = time.perf_counter()
+        model = tf.keras.models.load_model(path, compile=False)
+    elif kind == 'numpy':
+        from detection.numpy_runtime import load_numpy_model
+        t_import = time.perf_counter() - start
+        start = time.perf_counter()
+        model = load_numpy_model(path)
+    else:
+        import joblib
+        if kind == 'xgboost':
+            import xgboost  # noqa: F401  (import mesuré à part du chargement)
+        else:
+            import sklearn.ensemble  # noqa: F401
+        t_import = time.perf_counter() - start
+        start = time.perf_counter()
+        model = joblib.load(path)
+    return model, t_import, time.perf_counter() - start
+
+
+def _predict(model, X):
+    if hasattr(model, 'predict_proba'):
+        return model.predict_proba(X)
+    return model.predict(X, verbose=0)
+
+
+def _run_candidate(kind, path, inputs_path, repeats, batch_sizes, queue):
+    """Exécuté dans un processus neuf : toutes les mesures d'un candidat."""
+    try:
+        X = np.load(inputs_path)
+        rss_start = _rss_mb()
+        model, t_import, t_load = _load(kind, path)
+        rss_loaded = _rss_mb()
+
+        start = time.perf_counter()
+        _predict(model, X[:1])
+        first_call = time.perf_counter() - start
+
+        batches = {}
+        for size in batch_sizes:
+            batch = X[:size]
+            n = max(5, repeats // max(1, size // 32)) if size > 32 else repeats
+            timings = np.empty(n)
+            for i in range(n):
+                start = time.perf_counter()
+                _predict(model, batch)
+                timings[i] = time.perf_counter() - start
+            batches[str(size)] = {
+                'calls': n,
+                'p50_ms': float(np.percentile(timings, 50) * 1000),
+                'p99_ms': float(np.percentile(timings, 99) * 1000),
+                'rows_per_s': float(size / np.median(timings)),
+            }
+
+        queue.put({
+            'name': kind,
+            'path': path,
+            'size_bytes': os.path.getsize(path),
+            'import_s': t_import,
+            'cold_load_s': t_load,
+            'first_call_ms': first_call * 1000,
+            'rss_start_mb': rss_start,
+            'rss_loaded_mb': rss_loaded,
+            'peak_rss_mb': _peak_rss_mb(),
+            'batches': batches,
+        })
+    except Exception as e:  # rapporté dans le JSON plutôt que d'interrompre la suite
+        queue.put({'name': kind, 'path': path, 'error': f'{type(e).__name__}: {e}'})
+
+
+def run_candidate(kind, path, inputs_path, repeats=200, batch_sizes=BATCH_SIZES, timeout=600):
+    """Mesure un candidat dans un processus séparé."""
+    ctx = multiprocessing.get_context('spawn')
+    queue = ctx.Queue()
+    process = ctx.Process(target=_run_candidate, args=(kind, path, inputs_path, repeats, batch_sizes, queue))
+    process.start()
+    try:
+        result = queue.get(timeout=timeout)
+    except Exception:
+        result = {'name': kind, 'path': path, 'error': f'pas de résultat après {timeout}s'}
+    process.join(5)
+    if process.is_alive():
+        process.terminate()
+    return result
+
+
+# ----------------------------------------------------------------------
+# Préparation des candidats
+# ----------------------------------------------------------------------
+def train_tree_candidates(workdir, seed=42):
+    """RandomForest et XGBoost avec les hyperparamètres de l'ancien ``create_model.main``."""
+    import joblib
+    from sklearn.ensemble import RandomForestClassifier
+    from xgboost import XGBClassifier
+
+    from detection.model_selection import build_preprocessor
+    from detection.prepare_data import FEATURES, TARGET, load_and_concatenate, preprocess
+
+    X_train, _, y_train, _ = preprocess(load_and_concatenate(columns=FEATURES + [TARGET]))
+    preprocessor = build_preprocessor(list(X_train.columns))
+    Xt = preprocessor.fit_transform(X_train).astype(np.float32)
+
+    paths = {}
+    models = {
+        'random_forest': RandomForestClassifier(n_estimators=200, random_state=seed),
+        'xgboost': XGBClassifier(n_estimators=300, max_depth=6, learning_rate=0.001, eval_metric='mlogloss'),
+    }
+    for name, model in models.items():
+        model.fit(Xt, y_train)
+        paths[name] = os.path.join(workdir, f'{name}.joblib')
+        joblib.dump(model, paths[name])
+    return paths
+
+
+def _guess_kind(path):
+    if path.endswith('.npz'):
+        return 'numpy'
+    if path.endswith(('.h5', '.keras')):
+        return 'keras'
+    return 'joblib'
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+            cwd=os.path.dirname(__file__), timeout=10,
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run_benchmarks(candidates=None, extra_models=(), n_rows=1024, repeats=200, seed=0,
+                   batch_sizes=BATCH_SIZES, train_trees=True, log=print):
+    """
+    Lance la suite et renvoie le dictionnaire sérialisable en JSON.
+
+    ``candidates`` : sous-ensemble de ('keras', 'numpy', 'random_forest', 'xgboost') ;
+    ``extra_models`` : chemins supplémentaires (.npz, .h5/.keras, .joblib).
+    """
+    import joblib
+    from detection.synthetic import synthetic_rows
+
+    base = os.path.dirname(__file__)
+    preprocessor = joblib.load(os.path.join(base, 'data', 'preprocessor.pkl'))
+    candidates = list(candidates or ('keras', 'numpy', 'random_forest', 'xgboost'))
+
+    with tempfile.TemporaryDirectory(prefix='detection_bench_') as workdir:
+        import pandas as pd
+        from detection.registry import FEATURES
+
+        rows = synthetic_rows(preprocessor, max(n_rows, max(batch_sizes)), seed=seed)
+        X = preprocessor.transform(pd.DataFrame(rows, columns=FEATURES)).astype(np.float32)
+        inputs_path = os.path.join(workdir, 'inputs.npy')
+        np.save(inputs_path, X)
+
+        # (nom affiché, type de chargement, chemin)
+        targets = []
+        if 'keras' in candidates:
+            targets.append(('keras', 'keras', os.path.join(base, 'modele_vulnerabilite.h5')))
+        if 'numpy' in candidates:
+            targets.append(('numpy', 'numpy', os.path.join(base, 'modele_vulnerabilite.npz')))
+        wanted_trees = [c for c in ('random_forest', 'xgboost') if c in candidates]
+        if wanted_trees and train_trees:
+            log("Entraînement des variantes RandomForest / XGBoost…")
+            tree_paths = train_tree_candidates(workdir)
+            targets += [(name, name, tree_paths[name]) for name in wanted_trees]
+        targets += [(os.path.basename(path), _guess_kind(path), path) for path in extra_models]
+
+        results = []
+        for name, kind, path in targets:
+            log(f"Benchmark {name}…")
+            result = run_candidate(kind, path, inputs_path, repeats=repeats, batch_sizes=batch_sizes)
+            result['name'] = name
+            results.append(result)
+
+    return {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'git_commit': _git_commit(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'rows': int(X.shape[0]),
+            'features': int(X.shape[1]),
+            'repeats': repeats,
+            'batch_sizes': list(batch_sizes),
+        },
+        'results': results,
+    }
+
+
+def format_results(report):
+    """Résumé texte d'un rapport."""
+    lines = []
+    sizes = report['meta']['batch_sizes']
+    header = f"{'modèle':<16}{'charg. (s)':>11}{'import (s)':>11}{'pic RSS (Mo)':>13}" + ''.join(
+        f"{f'p50@{s} (ms)':>14}{f'lignes/s@{s}':>14}" for s in sizes
+    )
+    lines.append(header)
+    lines.append('-' * len(header))
+    for r in report['results']:
+        if 'error' in r:
+            lines.append(f"{r['name']:<16}ERREUR : {r['error']}")
+            continue
+        line = f"{r['name']:<16}{r['cold_load_s']:>11.3f}{r['import_s']:>11.2f}{r['peak_rss_mb']:>13.0f}"
+        for s in sizes:
+            b = r['batches'][str(s)]
+            line += f"{b['p50_ms']:>14.3f}{b['rows_per_s']:>14.0f}"
+        lines.append(line)
+    return '\n'.join(lines)
+
+
+def write_report(report, path):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
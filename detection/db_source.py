@@ -0,0 +1,124 @@
+# detection/db_source.py
+"""
+Source de données d'entraînement issue de la base (``users.PersonneVulnerable``).
+
+Les classeurs Excel de ``prepare_data`` sont figés, alors que la population
+recensée grandit tous les jours. Ce module lit les personnes étiquetées par
+paquets (``values_list(...).iterator(chunk_size)``, curseur côté serveur sous
+PostgreSQL) et écrit leurs features directement dans une matrice préallouée
+— en mémoire ou mappée sur disque (``np.memmap``) — avec le transformateur
+compilé du pré-processeur actif : la table n'est jamais chargée en entier.
+
+Une ligne est étiquetée quand son ``categorie_predite`` est l'un des 4 libellés
+du modèle (cf. ``prepare_data.TARGET_MAPPING``) et qu'elle a été saisie par un
+humain (``categorie_source``). Les catégories écrites par le modèle lui-même
+(``rescore_population``) ne sont jamais reprises : l'entraîner sur ses propres
+sorties ne lui apprendrait rien, et la validation d'une fiche par un
+administrateur ne dit rien de la provenance de sa catégorie. Celles du LLM ne
+le sont que sur demande (``sources``). Par défaut seules les fiches validées
+par un administrateur sont lues.
+
+L'état (dernier id vu) est conservé dans ``<DETECTION_ARTIFACTS_DIR>/db_training.json`` :
+un ré-entraînement incrémental ne lit que les lignes ajoutées depuis.
+"""
+import json
+import os
+
+import numpy as np
+
+from detection.features import PERSONNE_FIELDS, personne_features
+from detection.prepare_data import TARGET_MAPPING, normalize_label
+
+STATE_FILENAME = 'db_training.json'
+
+
+def labeled_queryset(since_id=0, validated_only=True, sources=None):
+    """
+    Personnes dont la catégorie est exploitable comme étiquette, par id croissant.
+
+    ``sources`` : provenances acceptées (défaut : saisie humaine seulement) ;
+    une catégorie écrite par le modèle est toujours exclue.
+    """
+    from users.models import PersonneVulnerable
+
+    sources = set(sources or [PersonneVulnerable.CATEGORIE_HUMAIN]) - {PersonneVulnerable.CATEGORIE_MODELE}
+    queryset = PersonneVulnerable.objects.filter(
+        pk__gt=since_id, categorie_predite__isnull=False, categorie_source__in=sorted(sources),
+    )
+    if validated_only:
+        queryset = queryset.filter(validated_by_admin=True)
+    return queryset.order_by('pk')
+
+
+def iter_labeled_rows(queryset, chunk_size=2000):
+    """Génère des paquets ``(ids, lignes de features, étiquettes)`` ; ignore les libellés inconnus."""
+    fields = ('pk', 'categorie_predite') + PERSONNE_FIELDS
+    ids, rows, labels = [], [], []
+    for values in queryset.values_list(*fields).iterator(chunk_size=chunk_size):
+        record = dict(zip(fields, values))
+        label = TARGET_MAPPING.get(normalize_label(record['categorie_predite']))
+        if label is None:
+            continue
+        ids.append(record['pk'])
+        rows.append(personne_features(record))
+        labels.append(label)
+        if len(rows) == chunk_size:
+            yield ids, rows, labels
+            ids, rows, labels = [], [], []
+    if rows:
+        yield ids, rows, labels
+
+
+def extract_matrix(queryset, transformer, chunk_size=2000, path=None):
+    """
+    Remplit ``(X, y)`` paquet par paquet et renvoie ``(X, y, last_id)``.
+
+    ``X`` est préalloué d'après ``queryset.count()`` (borne haute : les libellés
+    inconnus sont sautés), en mémoire ou dans un ``np.memmap`` si ``path`` est donné.
+    """
+    capacity = queryset.count()
+    shape = (capacity, transformer.n_features_out)
+    if path:
+        X = np.lib.format.open_memmap(path, mode='w+', dtype=np.float32, shape=shape)
+    else:
+        X = np.empty(shape, dtype=np.float32)
+    y = np.empty(capacity, dtype=np.int8)
+
+    n, last_id = 0, None
+    for ids, rows, labels in iter_labeled_rows(queryset, chunk_size):
+        transformer.transform_many(rows, out=X[n:n + len(rows)])
+        y[n:n + len(rows)] = labels
+        n += len(rows)
+        last_id = ids[-1]
+    return X[:n], y[:n], last_id
+
+
+def spreadsheet_matrix(transformer):
+    """Lignes étiquetées des classeurs historiques, avec le même transformateur."""
+    from detection.prepare_data import FEATURES, TARGET, encode_target, load_and_concatenate
+
+    df = load_and_concatenate(columns=FEATURES + [TARGET])
+    y = encode_target(df[TARGET])
+    keep = y.notna().to_numpy()
+    records = df.loc[keep, FEATURES].to_dict('records')
+    return transformer.transform_many(records), y[keep].to_numpy().astype(np.int8)
+
+
+# ----------------------------------------------------------------------
+# État de l'entraînement incrémental
+# ----------------------------------------------------------------------
+def read_state(artifacts_dir):
+    try:
+        with open(os.path.join(artifacts_dir, STATE_FILENAME), encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def write_state(artifacts_dir, state):
+    os.makedirs(artifacts_dir, exist_ok=True)
+    path = os.path.join(artifacts_dir, STATE_FILENAME)
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, path)
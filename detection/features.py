@@ -0,0 +1,187 @@
+# detection/features.py
+"""
+Transformation « compilée » des features pour le scoring à la volée.
+
+Le ColumnTransformer de ``data/preprocessor.pkl`` impose, pour chaque ligne,
+la construction d'un DataFrame pandas et toute la validation de sklearn
+(SimpleImputer, StandardScaler, OneHotEncoder). On en extrait ici une fois
+pour toutes les médianes, moyennes et écarts-types, ainsi qu'une table
+catégorie → colonne de sortie : transformer une ligne ne coûte plus que
+quelques accès dictionnaire et une division.
+
+    compiled = CompiledTransformer.from_preprocessor(preprocessor)
+    x = compiled.transform_one(personne)          # PersonneVulnerable ou dict
+    X = compiled.transform_many(rows, out=buffer) # remplit un tableau 2-D
+
+La sortie est identique à ``preprocessor.transform`` (convertie en float32).
+Un dict est lu tel quel (colonnes du modèle) ; une PersonneVulnerable passe
+d'abord par ``personne_features`` (libellés du sexe, montant reçu, handicap).
+"""
+import math
+
+import numpy as np
+
+
+def _as_features(row):
+    """Ligne de features : un dict tel quel, une PersonneVulnerable via ``personne_features``."""
+    return row if isinstance(row, dict) else personne_features(row)
+
+
+def _to_number(value):
+    """Valeur numérique ou NaN (valeur manquante, imputée ensuite)."""
+    if value is None or value == '':
+        return math.nan
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+class CompiledTransformer:
+    """Équivalent précompilé d'un ColumnTransformer num (imputer + scaler) / cat (one-hot)."""
+
+    def __init__(self, num_features, fill_values, means, scales, num_slice,
+                 cat_features, lookups, n_features_out):
+        self.num_features = list(num_features)
+        self.fill_values = np.asarray(fill_values, dtype=np.float64)
+        self.means = np.asarray(means, dtype=np.float64)
+        self.scales = np.asarray(scales, dtype=np.float64)
+        self.num_slice = num_slice
+        self.cat_features = list(cat_features)
+        # Pour chaque colonne catégorielle : {catégorie: index de la colonne de sortie}
+        self.lookups = lookups
+        self.n_features_out = n_features_out
+
+    @classmethod
+    def from_preprocessor(cls, preprocessor):
+        """
+        Construit le transformateur à partir d'un ColumnTransformer ajusté.
+
+        Lève ValueError si sa structure n'est pas celle de create_model.main :
+        l'appelant garde alors le pré-processeur sklearn.
+        """
+        if getattr(preprocessor, 'sparse_output_', False):
+            raise ValueError("Sortie creuse non supportée")
+
+        transformers = {name: (transformer, cols) for name, transformer, cols in preprocessor.transformers_}
+        if set(transformers) - {'num', 'cat', 'remainder'}:
+            raise ValueError(f"Transformateurs non supportés : {sorted(transformers)}")
+        remainder = transformers.get('remainder')
+        if remainder is not None and remainder[0] != 'drop' and len(remainder[1]):
+            raise ValueError("Colonnes « remainder » non supportées")
+
+        num_pipeline, num_features = transformers['num']
+        imputer = num_pipeline.named_steps['imputer']
+        scaler = num_pipeline.named_steps['scaler']
+        if len(num_pipeline.steps) != 2 or imputer.add_indicator or not _is_nan(imputer.missing_values):
+            raise ValueError("Pipeline numérique non supporté")
+
+        n = len(num_features)
+        means = scaler.mean_ if scaler.with_mean else np.zeros(n)
+        scales = scaler.scale_ if scaler.with_std else np.ones(n)
+
+        encoder, cat_features = transformers['cat']
+        if encoder.drop is not None or getattr(encoder, 'infrequent_categories_', None) is not None \
+                or encoder.handle_unknown != 'ignore':
+            raise ValueError("OneHotEncoder non supporté (drop / infrequent / handle_unknown)")
+
+        num_slice = preprocessor.output_indices_['num']
+        offset = preprocessor.output_indices_['cat'].start
+        lookups = []
+        for categories in encoder.categories_:
+            lookups.append({_python_value(c): offset + j for j, c in enumerate(categories)})
+            offset += len(categories)
+
+        n_features_out = max(s.stop for s in preprocessor.output_indices_.values())
+        return cls(list(num_features), imputer.statistics_, means, scales, num_slice,
+                   list(cat_features), lookups, n_features_out)
+
+    # ------------------------------------------------------------------
+    # Transformation
+    # ------------------------------------------------------------------
+    def transform_one(self, row, out=None):
+        """Transforme une ligne (dict ou PersonneVulnerable) en vecteur float32."""
+        if out is None:
+            out = np.zeros(self.n_features_out, dtype=np.float32)
+        else:
+            out.fill(0)
+
+        row = _as_features(row)
+        values = np.fromiter(
+            (_to_number(row.get(name)) for name in self.num_features),
+            dtype=np.float64, count=len(self.num_features),
+        )
+        missing = np.isnan(values)
+        values[missing] = self.fill_values[missing]
+        out[self.num_slice] = (values - self.means) / self.scales
+
+        for name, lookup in zip(self.cat_features, self.lookups):
+            index = _lookup(lookup, row.get(name))
+            if index is not None:
+                out[index] = 1.0
+        return out
+
+    def transform_many(self, rows, out=None):
+        """Transforme une liste de lignes dans un tableau (n, n_features_out) float32."""
+        rows = list(rows)
+        if out is None:
+            out = np.zeros((len(rows), self.n_features_out), dtype=np.float32)
+        else:
+            out = out[:len(rows)]
+            out.fill(0)
+
+        values = np.empty((len(rows), len(self.num_features)), dtype=np.float64)
+        for i, row in enumerate(rows):
+            row = _as_features(row)
+            for j, name in enumerate(self.num_features):
+                values[i, j] = _to_number(row.get(name))
+            for name, lookup in zip(self.cat_features, self.lookups):
+                index = _lookup(lookup, row.get(name))
+                if index is not None:
+                    out[i, index] = 1.0
+
+        missing = np.isnan(values)
+        values[missing] = np.broadcast_to(self.fill_values, values.shape)[missing]
+        out[:, self.num_slice] = (values - self.means) / self.scales
+        return out
+
+    __call__ = transform_many
+
+
+def _is_nan(value):
+    return isinstance(value, float) and math.isnan(value)
+
+
+def _python_value(value):
+    """np.str_ / np.bool_ → types Python, pour des clés de dictionnaire stables."""
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def _lookup(lookup, value):
+    # Catégorie inconnue ou manquante : ligne de zéros (handle_unknown='ignore')
+    try:
+        return lookup.get(value)
+    except TypeError:
+        return None
+
+
+# ----------------------------------------------------------------------
+# PersonneVulnerable → colonnes du modèle
+# ----------------------------------------------------------------------
+# Champs du modèle Django utiles au scoring ; les autres colonnes (logement,
+# emploi…) ne sont pas saisies au recensement et sont imputées / ignorées.
+PERSONNE_FIELDS = ('age', 'revenu', 'sexe', 'montant_recu', 'entite')
+SEXE_MAPPING = {'Homme': 'Masculin', 'Femme': 'Féminin'}
+
+
+def personne_features(personne):
+    """Ligne de features (dict) d'une PersonneVulnerable ou d'un dict de PERSONNE_FIELDS."""
+    value = (lambda name: personne.get(name)) if isinstance(personne, dict) \
+        else (lambda name: getattr(personne, name, None))
+    return {
+        'age': value('age'),
+        'revenu': value('revenu'),
+        'sexe': SEXE_MAPPING.get(value('sexe')),
+        'montant_total_recu': value('montant_recu'),
+        'handicap': True if value('entite') == 'handicape' else None,
+    }
@@ -0,0 +1,42 @@
+# detection/management/commands/benchmark_detection.py
+import os
+from datetime import datetime
+
+from django.core.management.base import BaseCommand
+
+from detection.benchmarks import BATCH_SIZES, format_results, run_benchmarks, write_report
+
+CANDIDATES = ('keras', 'numpy', 'random_forest', 'xgboost')
+
+
+class Command(BaseCommand):
+    help = ("Mesure chargement à froid, latences p50/p99, débit (1/32/1024 lignes) et pic de mémoire "
+            "des modèles de vulnérabilité ; écrit un rapport JSON comparable d'un commit à l'autre.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--candidates', nargs='+', choices=CANDIDATES, default=list(CANDIDATES))
+        parser.add_argument('--model', action='append', default=[], dest='models',
+                            help="Modèle supplémentaire (.npz, .h5/.keras, .joblib) ; répétable")
+        parser.add_argument('--repeats', type=int, default=200, help="Appels mesurés par taille de lot")
+        parser.add_argument('--batch-sizes', nargs='+', type=int, default=list(BATCH_SIZES))
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', default=None,
+                            help="Fichier JSON (défaut : detection/outputs/benchmark-<date>.json)")
+
+    def handle(self, *args, **options):
+        report = run_benchmarks(
+            candidates=options['candidates'],
+            extra_models=options['models'],
+            n_rows=max(options['batch_sizes']),
+            repeats=options['repeats'],
+            seed=options['seed'],
+            batch_sizes=options['batch_sizes'],
+            log=self.stdout.write,
+        )
+        output = options['output'] or os.path.join(
+            os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
+            'outputs', f"benchmark-{datetime.now():%Y%m%d-%H%M%S}.json",
+        )
+        write_report(report, output)
+        self.stdout.write(format_results(report))
+        self.stdout.write(self.style.SUCCESS(f"Rapport écrit dans {output}"))
@@ -0,0 +1,79 @@
+# detection/management/commands/export_numpy_model.py
+import os
+import time
+
+import numpy as np
+import pandas as pd
+from django.core.management.base import BaseCommand, CommandError
+
+from detection.numpy_runtime import SUPPORTED_DTYPES, export_numpy_model, load_numpy_model
+from detection.registry import FEATURES
+from detection.synthetic import synthetic_rows
+
+# Tolérances de parité avec Keras selon la précision des poids
+TOLERANCES = {'float32': 1e-4, 'float16': 5e-3, 'int8': 1e-1}
+
+
+def _latency(predict, X, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        predict(X)
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+class Command(BaseCommand):
+    help = "Exporte un modèle Keras (Dense/BatchNorm/Dropout) vers le moteur d'inférence NumPy."
+
+    def add_arguments(self, parser):
+        parser.add_argument('source', help="Modèle Keras (.h5 / .keras)")
+        parser.add_argument('--output', default=None, help="Fichier .npz (par défaut : à côté de la source)")
+        parser.add_argument('--dtype', default='float32', choices=SUPPORTED_DTYPES)
+        parser.add_argument('--preprocessor', default=None, help="Pré-processeur servant à générer les lignes de contrôle")
+        parser.add_argument('--samples', type=int, default=2048, help="Lignes synthétiques pour le contrôle de parité")
+
+    def handle(self, *args, **options):
+        import joblib
+        import tensorflow as tf
+
+        source = options['source']
+        output = options['output'] or os.path.splitext(source)[0] + '.npz'
+        preprocessor_path = options['preprocessor'] or os.path.join(
+            os.path.dirname(os.path.abspath(__file__)), '..', '..', 'data', 'preprocessor.pkl'
+        )
+
+        model = tf.keras.models.load_model(source, compile=False)
+        try:
+            meta = export_numpy_model(model, output, dtype=options['dtype'], metadata={'source': os.path.basename(source)})
+        except ValueError as e:
+            raise CommandError(str(e))
+        runtime = load_numpy_model(output)
+
+        # Contrôle de parité sur des lignes synthétiques du schéma d'entraînement
+        preprocessor = joblib.load(preprocessor_path)
+        rows = synthetic_rows(preprocessor, options['samples'], seed=42)
+        X = preprocessor.transform(pd.DataFrame(rows, columns=FEATURES)).astype(np.float32)
+        expected = model.predict(X, verbose=0)
+        obtained = runtime.predict(X)
+        max_diff = float(np.abs(expected - obtained).max())
+        agreement = float((expected.argmax(axis=1) == obtained.argmax(axis=1)).mean())
+
+        self.stdout.write(f"Export {meta['dtype']} : {output} ({os.path.getsize(output) / 1024:.1f} Ko)")
+        self.stdout.write(f"Écart max des probabilités : {max_diff:.2e} — classes identiques : {agreement:.2%}")
+
+        # Comparaison latence / taille des poids
+        row = X[:1]
+        X = np.resize(X, (max(len(X), 1024), X.shape[1]))
+        keras_bytes = sum(w.nbytes for w in model.get_weights())
+        self.stdout.write(
+            f"1 ligne    : Keras {_latency(lambda x: model.predict(x, verbose=0), row, 20):.2f} ms"
+            f" / NumPy {_latency(runtime.predict, row, 200):.3f} ms"
+        )
+        self.stdout.write(
+            f"1024 lignes: Keras {_latency(lambda x: model.predict(x, verbose=0), X[:1024], 5):.2f} ms"
+            f" / NumPy {_latency(runtime.predict, X[:1024], 50):.3f} ms"
+        )
+        self.stdout.write(f"Poids      : Keras {keras_bytes / 1024:.1f} Ko / NumPy {runtime.nbytes / 1024:.1f} Ko")
+
+        if max_diff > TOLERANCES[meta['dtype']]:
+            raise CommandError(f"Parité insuffisante ({max_diff:.2e} > {TOLERANCES[meta['dtype']]:.0e})")
+        self.stdout.write(self.style.SUCCESS("Parité vérifiée."))
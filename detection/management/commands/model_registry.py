@@ -0,0 +1,48 @@
+# detection/management/commands/model_registry.py
+from django.core.management.base import BaseCommand, CommandError
+
+from detection.registry import get_registry
+
+
+class Command(BaseCommand):
+    help = "Gère les versions du modèle de vulnérabilité (liste, publication, activation)."
+
+    def add_arguments(self, parser):
+        sub = parser.add_subparsers(dest='action', required=True)
+
+        sub.add_parser('list', help="Lister les versions disponibles")
+
+        publish = sub.add_parser('publish', help="Publier un modèle et son pré-processeur")
+        publish.add_argument('model_path')
+        publish.add_argument('preprocessor_path')
+        publish.add_argument('--version', default=None)
+        publish.add_argument('--no-activate', action='store_true', help="Publier sans activer")
+
+        activate = sub.add_parser('activate', help="Activer une version (bascule à chaud des workers)")
+        activate.add_argument('version')
+
+    def handle(self, *args, **options):
+        registry = get_registry()
+        action = options['action']
+
+        if action == 'list':
+            active = registry.active_version()
+            for version in ['legacy'] + registry.available_versions():
+                marker = '*' if version == active else ' '
+                self.stdout.write(f"{marker} {version}")
+            return
+
+        try:
+            if action == 'publish':
+                version = registry.publish(
+                    options['model_path'],
+                    options['preprocessor_path'],
+                    version=options['version'],
+                    activate=not options['no_activate'],
+                )
+                self.stdout.write(self.style.SUCCESS(f"Version {version} publiée."))
+            elif action == 'activate':
+                registry.activate(options['version'])
+                self.stdout.write(self.style.SUCCESS(f"Version {options['version']} activée."))
+        except (FileNotFoundError, ValueError) as e:
+            raise CommandError(str(e))
@@ -0,0 +1,215 @@
+# detection/management/commands/rescore_population.py
+"""
+Recalcule ``categorie_predite`` et ``est_vulnerable`` pour toutes les
+PersonneVulnerable avec le modèle actif (typiquement après un ré-entraînement).
+
+    python manage.py rescore_population --dry-run
+    python manage.py rescore_population --chunk-size 5000 --workers 4
+    python manage.py rescore_population --resume     # reprend après une interruption
+
+Les lignes sont lues par paquets (``values_list(...).iterator``), chaque paquet
+est transformé en matrice et scoré en une seule passe, puis seules les lignes
+dont le résultat change sont réécrites (un UPDATE groupé par catégorie).
+Après chaque paquet, le dernier id traité est enregistré dans un fichier de reprise.
+
+Les catégories écrites sont marquées ``categorie_source = 'modele'`` (jamais
+reprises comme étiquettes d'entraînement, cf. detection/db_source.py) ; les
+fiches dont la catégorie a été saisie par un humain ne sont pas modifiées.
+Une personne dont le montant reçu atteint l'objectif de financement
+(``DONS_OBJECTIF_FINANCEMENT``, cf. donations/distribution.py) garde son
+``est_vulnerable`` : seule sa catégorie est réécrite.
+L'instantané des statistiques donateur suit les changements d'``est_vulnerable``
+(cf. donations/statistiques.py).
+"""
+import json
+import os
+import time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from detection.features import PERSONNE_FIELDS, personne_features
+from donations import statistiques
+from donations.distribution import objectif_financement
+from detection.registry import LABELS, VULNERABLE_FROM_CLASS, get_model, get_registry
+from users.models import PersonneVulnerable
+
+CHECKPOINT_FILENAME = 'rescore_population.json'
+# Nombre d'ids par requête UPDATE (limite de paramètres SQLite)
+UPDATE_BATCH_SIZE = 900
+
+
+def _init_worker():
+    # Selon la méthode de démarrage (fork / spawn), Django n'est pas forcément initialisé
+    import django
+    from django.apps import apps
+    if not apps.ready:
+        django.setup()
+    get_model()
+
+
+def _score_chunk(rows):
+    """Classe prédite (indice dans LABELS) de chaque ligne du paquet."""
+    bundle = get_model()
+    probas = bundle.predict_proba(bundle.transform([personne_features(row) for row in rows]))
+    return probas.argmax(axis=1).astype(np.int8)
+
+
+class Command(BaseCommand):
+    help = "Re-score toute la table PersonneVulnerable avec le modèle de vulnérabilité actif."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=2000, help="Lignes par paquet (défaut : 2000)")
+        parser.add_argument('--workers', type=int, default=0,
+                            help="Processus de scoring en parallèle (0 : dans le processus courant)")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Ne rien écrire, afficher les changements de catégorie")
+        parser.add_argument('--resume', action='store_true', help="Reprendre après le dernier id enregistré")
+        parser.add_argument('--checkpoint', default=None,
+                            help="Fichier de reprise (défaut : <DETECTION_ARTIFACTS_DIR>/rescore_population.json)")
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        if chunk_size <= 0:
+            raise CommandError("--chunk-size doit être positif.")
+        self.dry_run = options['dry_run']
+        self.objectif = objectif_financement()
+        self.checkpoint_path = options['checkpoint'] or os.path.join(
+            get_registry().artifacts_dir, CHECKPOINT_FILENAME
+        )
+
+        version = get_model().version
+        start_id = 0
+        if options['resume']:
+            checkpoint = self._read_checkpoint()
+            start_id = checkpoint.get('last_id', 0)
+            if checkpoint.get('version') not in (None, version):
+                self.stderr.write(self.style.WARNING(
+                    f"Reprise commencée avec la version {checkpoint['version']}, modèle actif : {version}."
+                ))
+            self.stdout.write(f"Reprise après l'id {start_id}.")
+
+        queryset = (PersonneVulnerable.objects.filter(pk__gt=start_id)
+                    .exclude(categorie_source=PersonneVulnerable.CATEGORIE_HUMAIN).order_by('pk'))
+        self.total = queryset.count()
+        self.stdout.write(f"{self.total} personne(s) à scorer avec le modèle {version}"
+                          f"{' (simulation)' if self.dry_run else ''}.")
+
+        fields = ('pk', 'categorie_predite', 'est_vulnerable') + PERSONNE_FIELDS
+        rows = (dict(zip(fields, values)) for values in
+                queryset.values_list(*fields).iterator(chunk_size=chunk_size))
+
+        self.version = version
+        self.processed = self.changed = 0
+        self.transitions = Counter()
+        self.started = time.perf_counter()
+
+        if options['workers'] > 0:
+            self._run_parallel(self._chunks(rows, chunk_size), options['workers'])
+        else:
+            for chunk in self._chunks(rows, chunk_size):
+                self._apply(chunk, _score_chunk(chunk))
+
+        self._report()
+
+    # ------------------------------------------------------------------
+    # Lecture / scoring
+    # ------------------------------------------------------------------
+    @staticmethod
+    def _chunks(rows, size):
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) == size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def _run_parallel(self, chunks, workers):
+        # Au plus 2 paquets en attente par worker ; les résultats sont appliqués
+        # dans l'ordre des ids, pour que le point de reprise reste exact.
+        pending = deque()
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            for chunk in chunks:
+                pending.append((chunk, pool.submit(_score_chunk, chunk)))
+                if len(pending) >= workers * 2:
+                    chunk, future = pending.popleft()
+                    self._apply(chunk, future.result())
+            while pending:
+                chunk, future = pending.popleft()
+                self._apply(chunk, future.result())
+
+    # ------------------------------------------------------------------
+    # Écriture
+    # ------------------------------------------------------------------
+    def _apply(self, chunk, classes):
+        updates = {}
+        for row, cls in zip(chunk, classes):
+            label = LABELS[cls]
+            vulnerable = bool(cls >= VULNERABLE_FROM_CLASS)
+            if row['montant_recu'] is not None and row['montant_recu'] >= self.objectif:
+                # Financée : sortie de la vulnérabilité par la répartition des dons
+                vulnerable = row['est_vulnerable']
+            if row['categorie_predite'] == label and row['est_vulnerable'] == vulnerable:
+                continue
+            self.transitions[(row['categorie_predite'] or '—', label)] += 1
+            updates.setdefault((label, vulnerable), []).append(row['pk'])
+
+        if updates and not self.dry_run:
+            # Seulement 4 résultats possibles : un UPDATE ... WHERE id IN (...) par
+            # catégorie, bien plus rapide que le CASE WHEN ligne à ligne de bulk_update.
+            # update() n'émet pas de signal : l'instantané des statistiques est
+            # corrigé par suivre(), sur la plage d'ids du paquet.
+            paquet = PersonneVulnerable.objects.filter(pk__gte=chunk[0]['pk'], pk__lte=chunk[-1]['pk'])
+            with transaction.atomic(), statistiques.suivre(paquet):
+                for (label, vulnerable), ids in updates.items():
+                    for i in range(0, len(ids), UPDATE_BATCH_SIZE):
+                        PersonneVulnerable.objects.filter(pk__in=ids[i:i + UPDATE_BATCH_SIZE]).update(
+                            categorie_predite=label, est_vulnerable=vulnerable,
+                            categorie_source=PersonneVulnerable.CATEGORIE_MODELE,
+                        )
+
+        self.processed += len(chunk)
+        self.changed += sum(len(ids) for ids in updates.values())
+        if not self.dry_run:
+            self._write_checkpoint(chunk[-1]['pk'])
+        self._progress()
+
+    def _read_checkpoint(self):
+        try:
+            with open(self.checkpoint_path, encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise CommandError(f"Aucun fichier de reprise : {self.checkpoint_path}")
+
+    def _write_checkpoint(self, last_id):
+        os.makedirs(os.path.dirname(self.checkpoint_path) or '.', exist_ok=True)
+        tmp_path = f'{self.checkpoint_path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'last_id': last_id, 'version': self.version}, f)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    # ------------------------------------------------------------------
+    # Affichage
+    # ------------------------------------------------------------------
+    def _progress(self):
+        elapsed = time.perf_counter() - self.started
+        rate = self.processed / elapsed if elapsed else 0
+        remaining = (self.total - self.processed) / rate if rate else 0
+        self.stdout.write(
+            f"  {self.processed}/{self.total} ({rate:.0f} lignes/s, "
+            f"{self.changed} changement(s), reste ~{remaining:.0f}s)"
+        )
+
+    def _report(self):
+        elapsed = time.perf_counter() - self.started
+        verb = "seraient mises à jour" if self.dry_run else "mises à jour"
+        self.stdout.write(self.style.SUCCESS(
+            f"{self.processed} personne(s) scorée(s) en {elapsed:.1f}s, {self.changed} {verb}."
+        ))
+        for (old, new), count in self.transitions.most_common():
+            self.stdout.write(f"  {old} → {new} : {count}")
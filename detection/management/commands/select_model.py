@@ -0,0 +1,60 @@
+# detection/management/commands/select_model.py
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from detection.model_selection import DEFAULT_GRIDS, format_leaderboard, run_selection
+
+
+class Command(BaseCommand):
+    help = ("Validation croisée parallèle des familles de modèles (RF, XGBoost, MLP), "
+            "classement et publication du gagnant dans le registre.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--families', nargs='+', choices=sorted(DEFAULT_GRIDS), default=None,
+                            help="Familles à évaluer (défaut : toutes)")
+        parser.add_argument('--grid', default=None,
+                            help="Fichier JSON {famille: {paramètre: [valeurs]}} remplaçant les grilles par défaut")
+        parser.add_argument('--folds', type=int, default=5)
+        parser.add_argument('--n-jobs', type=int, default=-1, help="Entraînements en parallèle (-1 : tous les cœurs)")
+        parser.add_argument('--threads', type=int, default=1, help="Threads par entraînement")
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--output-dir', default=None, help="Répertoire des modèles candidats et du leaderboard.json")
+        parser.add_argument('--no-publish', action='store_true', help="Ne pas publier le gagnant")
+        parser.add_argument('--activate', action='store_true', help="Activer le gagnant après publication")
+
+    def handle(self, *args, **options):
+        grids = None
+        if options['grid']:
+            try:
+                with open(options['grid'], encoding='utf-8') as f:
+                    grids = json.load(f)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Grille illisible : {e}")
+        if options['folds'] < 2:
+            raise CommandError("--folds doit valoir au moins 2.")
+
+        try:
+            result = run_selection(
+                families=options['families'],
+                grids=grids,
+                folds=options['folds'],
+                n_jobs=options['n_jobs'],
+                n_threads=options['threads'],
+                seed=options['seed'],
+                output_dir=options['output_dir'],
+                publish=not options['no_publish'],
+                activate=options['activate'],
+                verbose=5 if options['verbosity'] > 1 else 0,
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(format_leaderboard(result['leaderboard']))
+        winner = result['winner']
+        self.stdout.write(f"Modèles candidats : {winner['model_path'].rsplit('/', 2)[0]}")
+        if result['version']:
+            state = "publiée et activée" if options['activate'] else "publiée"
+            self.stdout.write(self.style.SUCCESS(f"Gagnant : {winner['family']} — version {result['version']} {state}."))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Gagnant : {winner['family']} (non publié)."))
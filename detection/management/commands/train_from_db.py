@@ -0,0 +1,155 @@
+# detection/management/commands/train_from_db.py
+"""
+Ré-entraîne le MLP de vulnérabilité à partir des personnes recensées en base.
+
+    python manage.py train_from_db                      # seulement les nouvelles fiches
+    python manage.py train_from_db --full --with-spreadsheets
+    python manage.py train_from_db --memmap /tmp/X.npy --chunk-size 10000
+
+Par défaut l'entraînement est incrémental : on reprend les poids du dernier
+modèle entraîné ainsi (ou de ``modele_vulnerabilite.h5``) et on ne lit que les
+fiches ajoutées depuis le dernier passage, plus un échantillon des classeurs
+historiques rejoué pour ne pas oublier ce qui a été appris. Le pré-processeur
+reste celui du modèle actif : l'espace d'entrée ne change pas, ce qui permet
+de repartir des poids existants.
+"""
+import os
+import tempfile
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from detection import db_source
+from detection.registry import get_registry
+from users.models import PersonneVulnerable
+
+SOURCE_MODEL_FILENAME = 'source.keras'
+
+
+class Command(BaseCommand):
+    help = "Entraîne (ou poursuit l'entraînement du) MLP de vulnérabilité avec les fiches de la base."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help="Relire toute la table, pas seulement le delta")
+        parser.add_argument('--include-unvalidated', action='store_true',
+                            help="Utiliser aussi les fiches non validées par un administrateur")
+        parser.add_argument('--include-llm', action='store_true',
+                            help="Utiliser aussi les catégories de l'analyse LLM (par défaut : saisies humaines seulement)")
+        parser.add_argument('--with-spreadsheets', action='store_true',
+                            help="Ajouter toutes les lignes des classeurs Excel (sinon un échantillon, cf. --replay)")
+        parser.add_argument('--replay', type=int, default=2000,
+                            help="Lignes des classeurs rejouées avec le delta (défaut : 2000)")
+        parser.add_argument('--chunk-size', type=int, default=2000)
+        parser.add_argument('--memmap', default=None, help="Fichier .npy où extraire la matrice (np.memmap)")
+        parser.add_argument('--base-model', default=None, help="Modèle Keras de départ (.keras / .h5)")
+        parser.add_argument('--epochs', type=int, default=20)
+        parser.add_argument('--learning-rate', type=float, default=1e-4)
+        parser.add_argument('--min-rows', type=int, default=50,
+                            help="Nombre minimal de nouvelles fiches pour lancer un entraînement")
+        parser.add_argument('--no-publish', action='store_true')
+        parser.add_argument('--activate', action='store_true')
+
+    def handle(self, *args, **options):
+        registry = get_registry()
+        bundle = registry.get()
+        if bundle.transformer is None:
+            raise CommandError(f"Le pré-processeur de la version {bundle.version} n'est pas compilable.")
+        state = db_source.read_state(registry.artifacts_dir)
+        since_id = 0 if options['full'] else state.get('last_id', 0)
+
+        # 1) Extraction en flux des fiches étiquetées
+        start = time.perf_counter()
+        sources = [PersonneVulnerable.CATEGORIE_HUMAIN]
+        if options['include_llm']:
+            sources.append(PersonneVulnerable.CATEGORIE_LLM)
+        queryset = db_source.labeled_queryset(
+            since_id, validated_only=not options['include_unvalidated'], sources=sources,
+        )
+        X_db, y_db, last_id = db_source.extract_matrix(
+            queryset, bundle.transformer, chunk_size=options['chunk_size'], path=options['memmap'],
+        )
+        self.stdout.write(f"{len(y_db)} fiche(s) étiquetée(s) après l'id {since_id} "
+                          f"extraites en {time.perf_counter() - start:.1f}s.")
+        if not len(y_db) and since_id == 0:
+            inconnues = PersonneVulnerable.objects.filter(
+                categorie_predite__isnull=False, categorie_source__isnull=True,
+            ).count()
+            raise CommandError(
+                f"Aucune fiche étiquetée de provenance {', '.join(sources)} en base "
+                f"({inconnues} catégorie(s) sans provenance). Appliquer la migration "
+                "users 0038 ou saisir des catégories dans l'administration."
+            )
+        if len(y_db) < options['min_rows'] and not options['with_spreadsheets']:
+            self.stdout.write("Pas assez de nouvelles fiches : rien à entraîner.")
+            return
+
+        # 2) Données historiques : tout, ou un échantillon rejoué
+        X_sheet, y_sheet = db_source.spreadsheet_matrix(bundle.transformer)
+        if not options['with_spreadsheets'] and options['replay'] < len(y_sheet):
+            pick = np.random.default_rng(0).choice(len(y_sheet), size=options['replay'], replace=False)
+            X_sheet, y_sheet = X_sheet[pick], y_sheet[pick]
+        # Mélange avant validation_split (qui prend les dernières lignes)
+        order = np.random.default_rng(0).permutation(len(y_db) + len(y_sheet))
+        X = np.concatenate([X_db, X_sheet])[order]
+        y = np.concatenate([y_db, y_sheet])[order]
+        self.stdout.write(f"Entraînement sur {len(y)} lignes ({len(y_db)} de la base, {len(y_sheet)} des classeurs).")
+
+        # 3) Reprise des poids existants
+        base_model = options['base_model'] or state.get('source_model')
+        if not base_model or not os.path.exists(base_model):
+            base_model = os.path.splitext(registry.legacy_model_path)[0] + '.h5'
+        model, history = self._fit(base_model, X, y, options)
+        self.stdout.write(f"{len(history['loss'])} époque(s), val_accuracy finale "
+                          f"{history['val_accuracy'][-1]:.4f} (départ : {os.path.basename(base_model)}).")
+
+        if options['no_publish']:
+            return
+
+        # 4) Publication : export NumPy servi par le registre + .keras pour le prochain passage
+        from detection.numpy_runtime import export_numpy_model
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            keras_path = os.path.join(tmpdir, SOURCE_MODEL_FILENAME)
+            npz_path = os.path.join(tmpdir, 'model.npz')
+            model.save(keras_path)
+            export_numpy_model(model, npz_path, metadata={'trained_from': 'database', 'base_model': base_model})
+            _, preprocessor_path = registry.paths_for(bundle.version)
+            version = registry.publish(
+                npz_path, preprocessor_path, activate=options['activate'], extra_files=[keras_path],
+            )
+
+        db_source.write_state(registry.artifacts_dir, {
+            'last_id': last_id if last_id is not None else since_id,
+            'version': version,
+            'source_model': os.path.join(registry.artifacts_dir, version, SOURCE_MODEL_FILENAME),
+            'rows_trained': state.get('rows_trained', 0) + int(len(y_db)),
+        })
+        state_label = "publiée et activée" if options['activate'] else "publiée"
+        self.stdout.write(self.style.SUCCESS(f"Version {version} {state_label}."))
+
+    def _fit(self, base_model, X, y, options):
+        import tensorflow as tf
+        from sklearn.utils.class_weight import compute_class_weight
+
+        model = tf.keras.models.load_model(base_model, compile=False)
+        if model.input_shape[-1] != X.shape[1]:
+            raise CommandError(f"{base_model} attend {model.input_shape[-1]} features, "
+                               f"le pré-processeur actif en produit {X.shape[1]}.")
+        model.compile(
+            optimizer=tf.keras.optimizers.Adam(learning_rate=options['learning_rate']),
+            loss='sparse_categorical_crossentropy', metrics=['accuracy'],
+        )
+        classes = np.unique(y)
+        class_weights = dict(zip(classes.tolist(), compute_class_weight('balanced', classes=classes, y=y)))
+        history = model.fit(
+            X, y,
+            validation_split=0.1,
+            epochs=options['epochs'],
+            batch_size=64,
+            shuffle=True,
+            class_weight=class_weights,
+            callbacks=[tf.keras.callbacks.EarlyStopping(monitor='val_loss', patience=3, restore_best_weights=True)],
+            verbose=0,
+        )
+        return model, history.history
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.4 on 2026-10-18 16:05
+
+from django.core.management import call_command
+from django.db import migrations
+
+
+def creer_table_cache(apps, schema_editor):
+    """
+    Table du cache Django « predictions » (cf. CACHES dans settings.py), créée au
+    migrate plutôt que par un ``createcachetable`` manuel facile à oublier.
+    Sans effet si elle existe déjà ou si l'alias n'est plus un DatabaseCache.
+    """
+    call_command('createcachetable', database=schema_editor.connection.alias, verbosity=0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = []
+
+    operations = [
+        migrations.RunPython(creer_table_cache, migrations.RunPython.noop),
+    ]
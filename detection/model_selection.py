@@ -0,0 +1,378 @@
+# detection/model_selection.py
+"""
+Sélection de modèle pour la détection de vulnérabilité.
+
+Remplace l'entraînement séquentiel de ``create_model.main`` (RF, XGBoost puis
+MLP Keras, un seul découpage 80/20) par :
+
+1. une validation croisée stratifiée à k plis (les lignes identiques restant
+   dans le même pli) de chaque configuration de la grille de chaque famille,
+   toutes les combinaisons (famille, paramètres, pli) étant réparties sur les
+   cœurs avec joblib ;
+2. le ré-entraînement de la meilleure configuration de chaque famille sur tout
+   le jeu d'entraînement, avec un vrai early stopping (jeu de validation interne) ;
+3. un classement : accuracy et macro-F1 (CV et test), temps d'entraînement,
+   latence d'inférence et taille du modèle ;
+4. la publication du gagnant comme nouvelle version du registre (cf. registry.py).
+
+    python manage.py select_model --folds 5 --n-jobs -1
+    python manage.py select_model --families xgboost mlp --activate
+"""
+import io
+import itertools
+import json
+import os
+import tempfile
+import time
+import logging
+
+import joblib
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from sklearn.compose import ColumnTransformer
+from sklearn.impute import SimpleImputer
+from sklearn.metrics import accuracy_score, f1_score
+from sklearn.model_selection import StratifiedGroupKFold, train_test_split
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import OneHotEncoder, StandardScaler
+from sklearn.utils.class_weight import compute_class_weight
+
+logger = logging.getLogger(__name__)
+
+NUM_FEATURES = [
+    'age', 'revenu', 'enfants_non_scolarises',
+    'nombre_personnes_menage', 'montant_total_recu',
+]
+
+# Grilles par défaut ; remplaçables par un fichier JSON (--grid)
+DEFAULT_GRIDS = {
+    'random_forest': {
+        'n_estimators': [200, 400],
+        'max_depth': [None, 20],
+        'min_samples_leaf': [1, 3],
+    },
+    'xgboost': {
+        'max_depth': [4, 6],
+        'learning_rate': [0.05, 0.1],
+        'subsample': [0.8, 1.0],
+    },
+    'mlp': {
+        'learning_rate': [1e-3, 3e-4],
+        'dropout': [0.3],
+        'batch_size': [64],
+    },
+}
+
+# Early stopping : part du jeu d'entraînement gardée pour la validation interne
+VALIDATION_FRACTION = 0.1
+XGB_MAX_ESTIMATORS = 2000
+XGB_EARLY_STOPPING_ROUNDS = 30
+MLP_MAX_EPOCHS = 300
+MLP_PATIENCE = 15
+
+
+def build_preprocessor(columns):
+    """ColumnTransformer num (médiane + standardisation) / cat (one-hot)."""
+    num_feats = [c for c in NUM_FEATURES if c in columns]
+    cat_feats = [c for c in columns if c not in num_feats]
+    numeric_pipeline = Pipeline([
+        ('imputer', SimpleImputer(strategy='median')),
+        ('scaler', StandardScaler()),
+    ])
+    return ColumnTransformer([
+        ('num', numeric_pipeline, num_feats),
+        ('cat', OneHotEncoder(handle_unknown='ignore', sparse_output=False), cat_feats),
+    ], remainder='drop')
+
+
+def expand_grid(grid):
+    """{'a': [1, 2], 'b': [3]} -> [{'a': 1, 'b': 3}, {'a': 2, 'b': 3}]"""
+    keys = sorted(grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*(grid[k] for k in keys))]
+
+
+# ----------------------------------------------------------------------
+# Familles de modèles
+# ----------------------------------------------------------------------
+def _inner_split(X, y, seed):
+    return train_test_split(X, y, test_size=VALIDATION_FRACTION, random_state=seed, stratify=y)
+
+
+def _fit_random_forest(X, y, params, n_threads, seed):
+    from sklearn.ensemble import RandomForestClassifier
+
+    model = RandomForestClassifier(random_state=seed, n_jobs=n_threads, **params)
+    model.fit(X, y)
+    return model, {}
+
+
+def _fit_xgboost(X, y, params, n_threads, seed):
+    from xgboost import XGBClassifier
+
+    X_fit, X_val, y_fit, y_val = _inner_split(X, y, seed)
+    model = XGBClassifier(
+        n_estimators=XGB_MAX_ESTIMATORS,
+        early_stopping_rounds=XGB_EARLY_STOPPING_ROUNDS,
+        eval_metric='mlogloss',
+        n_jobs=n_threads,
+        random_state=seed,
+        **params,
+    )
+    model.fit(X_fit, y_fit, eval_set=[(X_val, y_val)], verbose=False)
+    return model, {'best_iteration': int(model.best_iteration)}
+
+
+def _fit_mlp(X, y, params, n_threads, seed):
+    import tensorflow as tf
+    from detection.create_model import build_model
+
+    tf.config.threading.set_intra_op_parallelism_threads(n_threads)
+    tf.keras.utils.set_random_seed(seed)
+
+    X_fit, X_val, y_fit, y_val = _inner_split(X, y, seed)
+    model = build_model(
+        input_dim=X.shape[1], n_classes=int(y.max()) + 1,
+        learning_rate=params['learning_rate'], dropout=params['dropout'],
+    )
+    classes = np.unique(y_fit)
+    class_weights = dict(zip(classes, compute_class_weight('balanced', classes=classes, y=y_fit)))
+    early_stopping = tf.keras.callbacks.EarlyStopping(
+        monitor='val_loss', patience=MLP_PATIENCE, restore_best_weights=True,
+    )
+    history = model.fit(
+        X_fit, y_fit,
+        validation_data=(X_val, y_val),
+        epochs=MLP_MAX_EPOCHS,
+        batch_size=params['batch_size'],
+        class_weight=class_weights,
+        callbacks=[early_stopping],
+        verbose=0,
+    )
+    return model, {'epochs': len(history.history['loss'])}
+
+
+FAMILIES = {
+    'random_forest': _fit_random_forest,
+    'xgboost': _fit_xgboost,
+    'mlp': _fit_mlp,
+}
+
+
+def _predict_classes(model, X):
+    if hasattr(model, 'predict_proba'):
+        return model.predict_proba(X).argmax(axis=1)
+    return np.asarray(model.predict(X, verbose=0)).argmax(axis=1)
+
+
+# ----------------------------------------------------------------------
+# Tâches exécutées dans les workers joblib
+# ----------------------------------------------------------------------
+def _cv_task(family, params, fold, X, y, train_idx, val_idx, n_threads, seed):
+    """Entraîne une configuration sur un pli ; ne renvoie que les métriques."""
+    X_train, X_val = X.iloc[train_idx], X.iloc[val_idx]
+    y_train, y_val = y[train_idx], y[val_idx]
+    # Pré-processeur ajusté sur le pli seulement : pas de fuite vers la validation
+    preprocessor = build_preprocessor(list(X.columns))
+    Xt_train = preprocessor.fit_transform(X_train).astype(np.float32)
+    Xt_val = preprocessor.transform(X_val).astype(np.float32)
+
+    start = time.perf_counter()
+    model, info = FAMILIES[family](Xt_train, y_train, params, n_threads, seed)
+    train_time = time.perf_counter() - start
+
+    y_pred = _predict_classes(model, Xt_val)
+    return {
+        'family': family,
+        'params': params,
+        'fold': fold,
+        'accuracy': accuracy_score(y_val, y_pred),
+        'f1_macro': f1_score(y_val, y_pred, average='macro'),
+        'train_time': train_time,
+        **info,
+    }
+
+
+def _refit_task(family, params, X_train, y_train, X_test, y_test, output_dir, n_threads, seed):
+    """Ré-entraîne la configuration retenue sur tout le jeu d'entraînement et l'exporte."""
+    preprocessor = build_preprocessor(list(X_train.columns))
+    Xt_train = preprocessor.fit_transform(X_train).astype(np.float32)
+    Xt_test = preprocessor.transform(X_test).astype(np.float32)
+
+    start = time.perf_counter()
+    model, info = FAMILIES[family](Xt_train, y_train, params, n_threads, seed)
+    train_time = time.perf_counter() - start
+
+    y_pred = _predict_classes(model, Xt_test)
+    family_dir = os.path.join(output_dir, family)
+    os.makedirs(family_dir, exist_ok=True)
+    if family == 'mlp':
+        # Le serveur web utilise le moteur NumPy : c'est cet export qu'on mesure et publie
+        from detection.numpy_runtime import export_numpy_model
+        model_path = os.path.join(family_dir, 'model.npz')
+        export_numpy_model(model, model_path, metadata={'params': params})
+    else:
+        model_path = os.path.join(family_dir, 'model.joblib')
+        joblib.dump(model, model_path)
+    preprocessor_path = os.path.join(family_dir, 'preprocessor.pkl')
+    joblib.dump(preprocessor, preprocessor_path)
+
+    return {
+        'family': family,
+        'params': params,
+        'test_accuracy': accuracy_score(y_test, y_pred),
+        'test_f1_macro': f1_score(y_test, y_pred, average='macro'),
+        'refit_time': train_time,
+        'model_path': model_path,
+        'preprocessor_path': preprocessor_path,
+        **info,
+    }
+
+
+# ----------------------------------------------------------------------
+# Mesures d'inférence (dans le processus principal, sans concurrence)
+# ----------------------------------------------------------------------
+def _load_exported(model_path):
+    if model_path.endswith('.npz'):
+        from detection.numpy_runtime import load_numpy_model
+        return load_numpy_model(model_path)
+    return joblib.load(model_path)
+
+
+def measure_inference(model_path, preprocessor_path, X_sample, repeats=50):
+    """Latence (ms) pour une ligne et pour un lot, taille du modèle sur disque."""
+    model = _load_exported(model_path)
+    preprocessor = joblib.load(preprocessor_path)
+    X = preprocessor.transform(X_sample).astype(np.float32)
+    one = X[:1]
+
+    _predict_classes(model, one)  # premier appel (allocations, caches)
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        _predict_classes(model, one)
+        timings.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    _predict_classes(model, X)
+    batch_time = time.perf_counter() - start
+
+    return {
+        'latency_ms_p50': float(np.percentile(timings, 50) * 1000),
+        'latency_ms_p99': float(np.percentile(timings, 99) * 1000),
+        'batch_ms_per_1k_rows': batch_time * 1000 * 1000 / len(X),
+        'size_bytes': os.path.getsize(model_path),
+    }
+
+
+# ----------------------------------------------------------------------
+# Orchestration
+# ----------------------------------------------------------------------
+def _summarize(results):
+    """Moyenne / écart-type par (famille, paramètres)."""
+    groups = {}
+    for r in results:
+        key = (r['family'], json.dumps(r['params'], sort_keys=True))
+        groups.setdefault(key, []).append(r)
+
+    summary = []
+    for (family, _), rows in groups.items():
+        f1 = np.array([r['f1_macro'] for r in rows])
+        summary.append({
+            'family': family,
+            'params': rows[0]['params'],
+            'cv_accuracy': float(np.mean([r['accuracy'] for r in rows])),
+            'cv_f1_macro': float(f1.mean()),
+            'cv_f1_std': float(f1.std()),
+            'cv_train_time': float(np.mean([r['train_time'] for r in rows])),
+        })
+    summary.sort(key=lambda s: (s['cv_f1_macro'], s['cv_accuracy']), reverse=True)
+    return summary
+
+
+def run_selection(families=None, grids=None, folds=5, n_jobs=-1, n_threads=1, seed=42,
+                  output_dir=None, publish=True, activate=False, registry=None, verbose=0):
+    """
+    Lance la sélection complète et renvoie ``{'leaderboard', 'cv', 'winner', 'version'}``.
+
+    ``n_jobs`` : tâches joblib en parallèle (-1 : tous les cœurs) ;
+    ``n_threads`` : threads par tâche (n_jobs des forêts / XGBoost, threads TF).
+    """
+    from detection.prepare_data import FEATURES, TARGET, load_and_concatenate, preprocess
+
+    families = families or list(DEFAULT_GRIDS)
+    grids = {**DEFAULT_GRIDS, **(grids or {})}
+    unknown = set(families) - set(FAMILIES)
+    if unknown:
+        raise ValueError(f"Familles inconnues : {sorted(unknown)}")
+
+    X_train, X_test, y_train, y_test = preprocess(load_and_concatenate(columns=FEATURES + [TARGET]))
+    X_train, X_test = X_train.reset_index(drop=True), X_test.reset_index(drop=True)
+    y_train, y_test = y_train.to_numpy(), y_test.to_numpy()
+
+    # Le second classeur reprend les lignes du premier : une même personne ne doit
+    # pas se retrouver des deux côtés d'un pli, ni dans le test si elle est déjà
+    # dans l'entraînement, sinon les scores mesurent de la mémorisation.
+    groups = pd.util.hash_pandas_object(X_train, index=False).to_numpy()
+    unseen = ~pd.util.hash_pandas_object(X_test, index=False).isin(groups).to_numpy()
+    X_test, y_test = X_test[unseen].reset_index(drop=True), y_test[unseen]
+
+    # 1) Validation croisée : une tâche par (famille, paramètres, pli)
+    cv = StratifiedGroupKFold(n_splits=folds, shuffle=True, random_state=seed)
+    splits = list(cv.split(X_train, y_train, groups))
+    tasks = [
+        delayed(_cv_task)(family, params, fold, X_train, y_train, train_idx, val_idx, n_threads, seed)
+        for family in families
+        for params in expand_grid(grids[family])
+        for fold, (train_idx, val_idx) in enumerate(splits)
+    ]
+    logger.info("%d entraînements de validation croisée sur %s worker(s)", len(tasks), n_jobs)
+    cv_results = Parallel(n_jobs=n_jobs, verbose=verbose)(tasks)
+    summary = _summarize(cv_results)
+
+    # 2) Ré-entraînement de la meilleure configuration de chaque famille
+    best = {}
+    for s in summary:
+        best.setdefault(s['family'], s)
+    output_dir = output_dir or tempfile.mkdtemp(prefix='model_selection_')
+    refits = Parallel(n_jobs=n_jobs, verbose=verbose)(
+        delayed(_refit_task)(family, s['params'], X_train, y_train, X_test, y_test, output_dir, n_threads, seed)
+        for family, s in best.items()
+    )
+
+    # 3) Classement
+    sample = X_test.iloc[:1024]
+    leaderboard = []
+    for refit in refits:
+        row = {**best[refit['family']], **refit}
+        row.update(measure_inference(refit['model_path'], refit['preprocessor_path'], sample))
+        leaderboard.append(row)
+    leaderboard.sort(key=lambda r: (r['cv_f1_macro'], r['cv_accuracy']), reverse=True)
+    winner = leaderboard[0]
+
+    result = {'leaderboard': leaderboard, 'cv': cv_results, 'winner': winner, 'version': None}
+    with open(os.path.join(output_dir, 'leaderboard.json'), 'w', encoding='utf-8') as f:
+        json.dump({k: v for k, v in result.items() if k != 'version'}, f, indent=2, default=str)
+
+    # 4) Publication du gagnant
+    if publish:
+        from detection.registry import get_registry
+        registry = registry or get_registry()
+        result['version'] = registry.publish(winner['model_path'], winner['preprocessor_path'], activate=activate)
+    return result
+
+
+def format_leaderboard(leaderboard):
+    """Tableau texte du classement."""
+    out = io.StringIO()
+    header = (f"{'famille':<14}{'CV F1':>8}{'±':>6}{'CV acc':>8}{'test F1':>9}{'test acc':>9}"
+              f"{'entr. (s)':>10}{'p50 (ms)':>10}{'1k lignes (ms)':>16}{'taille (ko)':>13}")
+    out.write(header + '\n' + '-' * len(header) + '\n')
+    for r in leaderboard:
+        out.write(
+            f"{r['family']:<14}{r['cv_f1_macro']:>8.4f}{r['cv_f1_std']:>6.3f}{r['cv_accuracy']:>8.4f}"
+            f"{r['test_f1_macro']:>9.4f}{r['test_accuracy']:>9.4f}{r['refit_time']:>10.1f}"
+            f"{r['latency_ms_p50']:>10.3f}{r['batch_ms_per_1k_rows']:>16.2f}{r['size_bytes'] / 1024:>13.0f}\n"
+        )
+        out.write(f"{'':<14}{json.dumps(r['params'], sort_keys=True)}\n")
+    return out.getvalue()
@@ -0,0 +1,251 @@
+# detection/numpy_runtime.py
+"""
+Moteur d'inférence NumPy pour le MLP de ``create_model.build_model``.
+
+Le réseau n'est qu'une pile Dense / BatchNormalization / Dropout : en
+inférence, Dropout est l'identité et BatchNormalization une transformation
+affine par colonne, que l'on replie dans la couche Dense suivante
+(W' = diag(a) · W, b' = b + c · W). Il ne reste que des produits matriciels,
+que NumPy fait très bien sans charger TensorFlow dans le processus web.
+
+Export (nécessite TensorFlow, à faire hors du serveur web) :
+
+    python manage.py export_numpy_model detection/modele_vulnerabilite.h5 --dtype float32
+
+Le fichier .npz produit est non compressé, ce qui permet de mapper les poids
+en mémoire (``load_numpy_model(path, mmap=True)``) : les workers partagent
+alors les mêmes pages au lieu d'en avoir chacun une copie.
+"""
+import json
+import struct
+import zipfile
+
+import numpy as np
+
+FORMAT_VERSION = 1
+SUPPORTED_DTYPES = ('float32', 'float16', 'int8')
+
+
+# ----------------------------------------------------------------------
+# Activations
+# ----------------------------------------------------------------------
+def _relu(x):
+    return np.maximum(x, 0, out=x)
+
+
+def _softmax(x):
+    x = x - x.max(axis=1, keepdims=True)
+    np.exp(x, out=x)
+    x /= x.sum(axis=1, keepdims=True)
+    return x
+
+
+def _sigmoid(x):
+    return 1.0 / (1.0 + np.exp(-x))
+
+
+ACTIVATIONS = {
+    'linear': lambda x: x,
+    'relu': _relu,
+    'softmax': _softmax,
+    'sigmoid': _sigmoid,
+    'tanh': np.tanh,
+}
+
+
+# ----------------------------------------------------------------------
+# Conversion depuis Keras
+# ----------------------------------------------------------------------
+def fold_keras_model(model, keep_input_scale=False):
+    """
+    Convertit un modèle Keras séquentiel en liste de couches denses
+    ``(kernel, bias, activation, input_scale)`` en float32, BatchNormalization
+    repliée. Avec ``keep_input_scale``, le facteur multiplicatif de la
+    normalisation n'est pas multiplié dans le noyau mais rendu à part
+    (utile pour quantifier le noyau d'origine, aux lignes homogènes).
+    """
+    layers = []
+    pending = None  # transformation affine (a, c) en attente d'une couche Dense
+
+    for layer in model.layers:
+        kind = layer.__class__.__name__
+        config = layer.get_config()
+
+        if kind in ('InputLayer', 'Dropout'):
+            continue
+
+        if kind == 'Dense':
+            weights = layer.get_weights()
+            kernel = weights[0].astype(np.float64)
+            bias = weights[1].astype(np.float64) if config.get('use_bias', True) else np.zeros(kernel.shape[1])
+            input_scale = None
+            if pending is not None:
+                a, c = pending
+                bias = bias + c @ kernel
+                if keep_input_scale:
+                    input_scale = a.astype(np.float32)
+                else:
+                    kernel = a[:, None] * kernel
+                pending = None
+            activation = config.get('activation', 'linear')
+            if activation not in ACTIVATIONS:
+                raise ValueError(f"Activation non supportée : {activation}")
+            layers.append((kernel.astype(np.float32), bias.astype(np.float32), activation, input_scale))
+
+        elif kind == 'BatchNormalization':
+            weights = list(layer.get_weights())
+            gamma = weights.pop(0) if config.get('scale', True) else None
+            beta = weights.pop(0) if config.get('center', True) else None
+            mean, var = weights
+            a = 1.0 / np.sqrt(var.astype(np.float64) + config['epsilon'])
+            if gamma is not None:
+                a = a * gamma
+            c = -mean * a
+            if beta is not None:
+                c = c + beta
+            if pending is not None:
+                # Deux normalisations consécutives : on compose les transformations
+                a0, c0 = pending
+                a, c = a0 * a, c0 * a + c
+            pending = (a, c)
+
+        else:
+            raise ValueError(f"Couche non supportée par le moteur NumPy : {kind}")
+
+    if pending is not None:
+        # Normalisation finale sans Dense derrière : couche diagonale linéaire
+        a, c = pending
+        layers.append((np.diag(a).astype(np.float32), c.astype(np.float32), 'linear', None))
+
+    return layers
+
+
+def export_numpy_model(model, path, dtype='float32', metadata=None):
+    """Sauvegarde un modèle Keras au format .npz du moteur NumPy."""
+    if dtype not in SUPPORTED_DTYPES:
+        raise ValueError(f"dtype doit être l'un de {SUPPORTED_DTYPES}")
+
+    arrays = {}
+    activations = []
+    layers = fold_keras_model(model, keep_input_scale=(dtype == 'int8'))
+    for i, (kernel, bias, activation, input_scale) in enumerate(layers):
+        if dtype == 'int8':
+            # Quantification symétrique par colonne de sortie du noyau d'origine
+            scale = np.abs(kernel).max(axis=0) / 127.0
+            scale[scale == 0] = 1.0
+            arrays[f'kernel_{i}'] = np.round(kernel / scale).astype(np.int8)
+            arrays[f'scale_{i}'] = scale.astype(np.float32)
+            if input_scale is not None:
+                arrays[f'input_scale_{i}'] = input_scale
+        else:
+            arrays[f'kernel_{i}'] = kernel.astype(dtype)
+        arrays[f'bias_{i}'] = bias.astype(np.float32)
+        activations.append(activation)
+
+    meta = {
+        'format_version': FORMAT_VERSION,
+        'dtype': dtype,
+        'activations': activations,
+        **(metadata or {}),
+    }
+    arrays['meta'] = np.array(json.dumps(meta))
+    # savez (et non savez_compressed) : les tableaux restent mappables en mémoire
+    with open(path, 'wb') as f:
+        np.savez(f, **arrays)
+    return meta
+
+
+# ----------------------------------------------------------------------
+# Chargement / inférence
+# ----------------------------------------------------------------------
+def _mmap_npz(path):
+    """Mappe en mémoire les tableaux d'un .npz non compressé."""
+    arrays = {}
+    with zipfile.ZipFile(path) as zf, open(path, 'rb') as f:
+        for info in zf.infolist():
+            name = info.filename[:-4] if info.filename.endswith('.npy') else info.filename
+            if info.compress_type != zipfile.ZIP_STORED:
+                arrays[name] = np.load(zf.open(info))
+                continue
+            # En-tête local du zip : 30 octets + nom + champ « extra »
+            f.seek(info.header_offset + 26)
+            name_len, extra_len = struct.unpack('<HH', f.read(4))
+            f.seek(info.header_offset + 30 + name_len + extra_len)
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+            if not shape or dtype.hasobject:
+                f.seek(info.header_offset + 30 + name_len + extra_len)
+                arrays[name] = np.lib.format.read_array(f)
+                continue
+            arrays[name] = np.memmap(
+                path, dtype=dtype, mode='r', offset=f.tell(), shape=shape,
+                order='F' if fortran_order else 'C',
+            )
+    return arrays
+
+
+class NumpyMLP:
+    """Réseau dense exécuté en NumPy ; même interface ``predict`` que Keras."""
+
+    def __init__(self, kernels, biases, scales, activations, input_scales=None, meta=None):
+        self.kernels = kernels
+        self.biases = biases
+        self.scales = scales
+        self.input_scales = input_scales or [None] * len(kernels)
+        self.activations = [ACTIVATIONS[name] for name in activations]
+        self.meta = meta or {}
+
+    @property
+    def input_dim(self):
+        return self.kernels[0].shape[0]
+
+    @property
+    def nbytes(self):
+        """Taille des poids (octets)."""
+        total = sum(k.nbytes for k in self.kernels) + sum(b.nbytes for b in self.biases)
+        extras = [s for s in self.scales + self.input_scales if s is not None]
+        return total + sum(s.nbytes for s in extras)
+
+    def predict(self, X, verbose=0, batch_size=None):
+        x = np.asarray(X, dtype=np.float32)
+        if x.ndim == 1:
+            x = x[None, :]
+        layers = zip(self.kernels, self.biases, self.scales, self.input_scales, self.activations)
+        for kernel, bias, scale, input_scale, activation in layers:
+            if input_scale is not None:
+                x = x * input_scale
+            if scale is not None:
+                x = (x @ kernel.astype(np.float32)) * scale
+            else:
+                x = x @ kernel.astype(np.float32, copy=False)
+            x += bias
+            x = activation(x)
+        return x
+
+    __call__ = predict
+
+
+def load_numpy_model(path, mmap=True):
+    """Charge un .npz produit par ``export_numpy_model``."""
+    if mmap:
+        arrays = _mmap_npz(path)
+    else:
+        with np.load(path) as data:
+            arrays = {name: data[name] for name in data.files}
+
+    meta = json.loads(str(arrays['meta']))
+    if meta.get('format_version') != FORMAT_VERSION:
+        raise ValueError(f"Format de modèle NumPy non supporté : {meta.get('format_version')}")
+
+    n_layers = len(meta['activations'])
+    kernels = [arrays[f'kernel_{i}'] for i in range(n_layers)]
+    biases = [np.asarray(arrays[f'bias_{i}']) for i in range(n_layers)]
+    scales = [np.asarray(arrays[f'scale_{i}']) if f'scale_{i}' in arrays else None for i in range(n_layers)]
+    input_scales = [
+        np.asarray(arrays[f'input_scale_{i}']) if f'input_scale_{i}' in arrays else None
+        for i in range(n_layers)
+    ]
+    return NumpyMLP(kernels, biases, scales, meta['activations'], input_scales=input_scales, meta=meta)
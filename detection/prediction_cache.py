@@ -0,0 +1,185 @@
+# detection/prediction_cache.py
+"""
+Cache des prédictions du modèle de vulnérabilité.
+
+Un même ménage est souvent scoré plusieurs fois (modification d'un recensement,
+nouvelle soumission après une erreur de validation, doublons importés). La clé
+est une empreinte du vecteur de features *normalisé* (sortie du pré-processeur)
+et du modèle (``ModelBundle.fingerprint`` : version + fichier) : deux saisies
+équivalentes (« 30 » et 30, champ absent et médiane…) tombent sur la même
+entrée, et changer de modèle invalide tout le cache sans rien avoir à purger.
+
+Deux niveaux :
+
+- un LRU en mémoire du processus (``DETECTION_PREDICTION_CACHE_SIZE`` entrées),
+  vidé dès que le registre change de version ;
+- le cache Django ``DETECTION_PREDICTION_CACHE_ALIAS`` (``predictions`` : table
+  ``detection_prediction_cache`` en base, partagée entre workers et persistante ;
+  cf. ``CACHES`` dans settings.py), avec une durée de vie
+  ``DETECTION_PREDICTION_CACHE_TTL``.
+
+Les compteurs (``stats()``) sont ceux du processus courant.
+"""
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'detection:proba'
+
+
+class PredictionCache:
+    """LRU local + cache Django partagé, indexés par (version, vecteur normalisé)."""
+
+    def __init__(self, max_size=10000, alias='predictions', ttl=7 * 24 * 3600):
+        self.max_size = max_size
+        self.alias = alias
+        self.ttl = ttl
+
+        self._lru = OrderedDict()
+        self._version = None
+        self._lock = threading.Lock()
+        self.hits_local = self.hits_shared = self.misses = 0
+
+    @staticmethod
+    def key(version, vector):
+        digest = hashlib.blake2b(np.ascontiguousarray(vector, dtype=np.float32).tobytes(), digest_size=16)
+        return f'{KEY_PREFIX}:{version}:{digest.hexdigest()}'
+
+    def _shared(self):
+        return caches[self.alias] if self.alias else None
+
+    def _check_version(self, version):
+        # Appelé sous verrou : nouvelle version du modèle → le LRU ne sert plus
+        if version != self._version:
+            self._lru.clear()
+            self._version = version
+
+    # ------------------------------------------------------------------
+    # Lecture / écriture
+    # ------------------------------------------------------------------
+    def get_many(self, version, X, count=True):
+        """
+        Probabilités en cache pour chaque ligne de ``X``.
+
+        Retourne ``(keys, found)`` où ``found[i]`` est le vecteur de
+        probabilités de la ligne i, ou None si elle doit être calculée.
+        ``count=False`` : consultation déjà comptée par l'appelant.
+        """
+        keys = [self.key(version, row) for row in X]
+        found = [None] * len(keys)
+        missing = {}
+        with self._lock:
+            self._check_version(version)
+            for i, key in enumerate(keys):
+                proba = self._lru.get(key)
+                if proba is not None:
+                    self._lru.move_to_end(key)
+                    found[i] = proba
+                    self.hits_local += count
+                else:
+                    missing.setdefault(key, []).append(i)
+
+        shared = self._shared()
+        if missing and shared is not None:
+            try:
+                values = shared.get_many(list(missing))
+            except Exception:
+                # Le cache partagé est une optimisation : indisponible, on recalcule
+                logger.warning("Cache des prédictions « %s » indisponible", self.alias, exc_info=True)
+                values = {}
+            for key, value in values.items():
+                proba = np.frombuffer(value, dtype=np.float32)
+                indices = missing.pop(key)
+                for i in indices:
+                    found[i] = proba
+                with self._lock:
+                    self.hits_shared += len(indices) * count
+                    self._remember(key, proba)
+
+        if count:
+            with self._lock:
+                self.misses += sum(len(indices) for indices in missing.values())
+        return keys, found
+
+    def set_many(self, version, keys, probas):
+        """Enregistre les probabilités calculées pour ces clés (même version)."""
+        probas = np.asarray(probas, dtype=np.float32)
+        with self._lock:
+            self._check_version(version)
+            for key, proba in zip(keys, probas):
+                self._remember(key, proba)
+        shared = self._shared()
+        if shared is not None:
+            try:
+                shared.set_many({key: proba.tobytes() for key, proba in zip(keys, probas)}, timeout=self.ttl)
+            except Exception:
+                logger.warning("Cache des prédictions « %s » indisponible", self.alias, exc_info=True)
+
+    def _remember(self, key, proba):
+        self._lru[key] = proba
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_size:
+            self._lru.popitem(last=False)
+
+    # ------------------------------------------------------------------
+    # Supervision
+    # ------------------------------------------------------------------
+    def stats(self):
+        lookups = self.hits_local + self.hits_shared + self.misses
+        return {
+            'version': self._version,
+            'size': len(self._lru),
+            'max_size': self.max_size,
+            'hits_local': self.hits_local,
+            'hits_shared': self.hits_shared,
+            'misses': self.misses,
+            'hit_rate': (self.hits_local + self.hits_shared) / lookups if lookups else None,
+        }
+
+    def clear(self):
+        with self._lock:
+            self._lru.clear()
+            self.hits_local = self.hits_shared = self.misses = 0
+
+
+def predict_cached(bundle, X, cache, count=True):
+    """Probabilités pour la matrice ``X`` : cache d'abord, une passe du modèle pour le reste."""
+    if cache is None or not len(X):
+        return bundle.predict_proba(X)
+
+    keys, found = cache.get_many(bundle.fingerprint, X, count=count)
+    todo = [i for i, proba in enumerate(found) if proba is None]
+    if todo:
+        computed = np.asarray(bundle.predict_proba(X[todo]), dtype=np.float32)
+        cache.set_many(bundle.fingerprint, [keys[i] for i in todo], computed)
+        for i, proba in zip(todo, computed):
+            found[i] = proba
+    return np.stack(found)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_prediction_cache():
+    """Cache unique du processus ; None si désactivé (``DETECTION_PREDICTION_CACHE_SIZE = 0``)."""
+    global _cache
+    size = getattr(settings, 'DETECTION_PREDICTION_CACHE_SIZE', 10000)
+    if not size:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = PredictionCache(
+                    max_size=size,
+                    alias=getattr(settings, 'DETECTION_PREDICTION_CACHE_ALIAS', 'predictions'),
+                    ttl=getattr(settings, 'DETECTION_PREDICTION_CACHE_TTL', 7 * 24 * 3600),
+                )
+    return _cache
@@ -1,77 +1,218 @@
 # detection/prepare_data.py
+import hashlib
+import importlib.util
+import json
+import logging
 import os
+from concurrent.futures import ProcessPoolExecutor
+
 import pandas as pd
+import unidecode
 from sklearn.model_selection import train_test_split
 
-def load_and_concatenate():
-    # 1) Construction des chemins vers les deux fichiers
-    base_dir = os.path.dirname(__file__)
-    files = [
-        os.path.join(base_dir, 'data', 'population_vulnerable.xlsx'),
-        os.path.join(base_dir, 'data', 'population_vulnerable_score.xlsx'),
-    ]
+from detection.registry import FEATURES
+
+logger = logging.getLogger(__name__)
+
+# Renommage des colonnes pour matcher vos features « snake_case »
+COLUMN_RENAMES = {
+    'Âge':                          'age',
+    'Nom':                          'first_name',  # si nécessaire
+    'Sexe':                         'sexe',
+    'Statut matrimonial':           'situation_matrimoniale',
+    'Type de logement':             'logement',
+    "Source d'eau":                 'source_eau',
+    'Type de sanitaires':           'type_sanitaires',
+    'Accès à l’électricité':        'acces_electricite',
+    'Situation professionnelle':    'emploi',
+    'Revenu mensuel (FCFA)':        'revenu',
+    'Niveau d’éducation':           'niveau_education',
+    'État de santé':                'etat_sante',
+    'Handicap':                     'handicap',
+    'Région':                       'region',
+    'Auto-évaluation de vulnérabilité':'auto_eval_vulnerabilite',
+    'Enfants non scolarisés':       'enfants_non_scolarises',
+    'Nombre de personnes dans le ménage': 'nombre_personnes_menage',
+    'Montant total reçu (allocations)':  'montant_total_recu',
+    # pour le second fichier :
+    'Score de vulnérabilité':       'vulnerability_score',
+    'Catégorie de vulnérabilité':   'vulnerability_category',
+}
+
+BASE_DIR = os.path.dirname(__file__)
+SOURCE_FILES = [
+    os.path.join(BASE_DIR, 'data', 'population_vulnerable.xlsx'),
+    os.path.join(BASE_DIR, 'data', 'population_vulnerable_score.xlsx'),
+]
+
+# ----------------------------------------------------------------------
+# Cache colonnaire des classeurs Excel
+# ----------------------------------------------------------------------
+# pd.read_excel est de loin l'étape la plus lente d'un entraînement : les deux
+# classeurs sont convertis une fois pour toutes en un fichier Feather (Arrow IPC
+# non compressé, donc mappable en mémoire), colonnes déjà renommées et typées.
+# Le manifeste à côté garde taille, mtime et SHA-256 de chaque source : le cache
+# est reconstruit dès qu'un classeur change (ou que COLUMN_RENAMES change).
+CACHE_DIR = os.path.join(BASE_DIR, 'data', 'cache')
+CACHE_FILE = os.path.join(CACHE_DIR, 'population.feather')
+CACHE_FORMAT_VERSION = 1
+
+
+def _read_workbook(path):
+    return pd.read_excel(path).rename(columns=COLUMN_RENAMES)
+
+
+def _file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _source_state(path, with_digest=True):
+    stat = os.stat(path)
+    state = {'path': os.path.basename(path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+    if with_digest:
+        state['sha256'] = _file_digest(path)
+    return state
+
+
+def _manifest_path(cache_file):
+    return os.path.splitext(cache_file)[0] + '.json'
+
+
+def _expected_header(sources):
+    return {
+        'format_version': CACHE_FORMAT_VERSION,
+        'renames': hashlib.sha256(json.dumps(COLUMN_RENAMES, sort_keys=True).encode()).hexdigest(),
+        'n_sources': len(sources),
+    }
+
 
-    # 2) Lecture et concaténation
-    dfs = [pd.read_excel(p) for p in files]
+def cache_is_valid(sources=None, cache_file=CACHE_FILE):
+    """Vrai si le cache existe et correspond aux classeurs sources actuels."""
+    sources = sources or SOURCE_FILES
+    manifest_path = _manifest_path(cache_file)
+    if not os.path.exists(cache_file) or not os.path.exists(manifest_path):
+        return False
+    with open(manifest_path, encoding='utf-8') as f:
+        manifest = json.load(f)
+    if manifest.get('header') != _expected_header(sources):
+        return False
+
+    touched = False
+    for path, recorded in zip(sources, manifest['sources']):
+        state = _source_state(path, with_digest=False)
+        if state['path'] != recorded['path']:
+            return False
+        if state['size'] == recorded['size'] and state['mtime_ns'] == recorded['mtime_ns']:
+            continue
+        # mtime modifié (copie, checkout git…) : le contenu fait foi
+        if state['size'] != recorded['size'] or _file_digest(path) != recorded['sha256']:
+            return False
+        recorded['mtime_ns'] = state['mtime_ns']
+        touched = True
+
+    if touched:
+        _write_json(manifest_path, manifest)
+    return True
+
+
+def build_cache(sources=None, cache_file=CACHE_FILE):
+    """Lit les classeurs (en parallèle, un processus par fichier) et écrit le cache."""
+    import pyarrow as pa
+    import pyarrow.feather as feather
+
+    sources = sources or SOURCE_FILES
+    with ProcessPoolExecutor(max_workers=len(sources)) as pool:
+        dfs = list(pool.map(_read_workbook, sources))
     df = pd.concat(dfs, ignore_index=True)
 
-    # 3) Renommage des colonnes pour matcher vos features « snake_case »
-    df = df.rename(columns={
-        'Âge':                          'age',
-        'Nom':                          'first_name',  # si nécessaire
-        'Sexe':                         'sexe',
-        'Statut matrimonial':           'situation_matrimoniale',
-        'Type de logement':             'logement',
-        "Source d'eau":                 'source_eau',
-        'Type de sanitaires':           'type_sanitaires',
-        'Accès à l’électricité':        'acces_electricite',
-        'Situation professionnelle':    'emploi',
-        'Revenu mensuel (FCFA)':        'revenu',
-        'Niveau d’éducation':           'niveau_education',
-        'État de santé':                'etat_sante',
-        'Handicap':                     'handicap',
-        'Région':                       'region',
-        'Auto-évaluation de vulnérabilité':'auto_eval_vulnerabilite',
-        'Enfants non scolarisés':       'enfants_non_scolarises',
-        'Nombre de personnes dans le ménage': 'nombre_personnes_menage',
-        'Montant total reçu (allocations)':  'montant_total_recu',
-        # pour le second fichier :
-        'Score de vulnérabilité':       'vulnerability_score',
-        'Catégorie de vulnérabilité':   'vulnerability_category',
+    # Colonnes texte stockées en dictionnaire (catégories) : plus compact, et
+    # relues directement en dtype « category »
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    for i, field in enumerate(table.schema):
+        if pa.types.is_string(field.type) or pa.types.is_large_string(field.type):
+            table = table.set_column(i, field.name, table.column(i).dictionary_encode())
+
+    os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+    tmp_file = f'{cache_file}.tmp'
+    feather.write_feather(table, tmp_file, compression='uncompressed')
+    os.replace(tmp_file, cache_file)
+    _write_json(_manifest_path(cache_file), {
+        'header': _expected_header(sources),
+        'sources': [_source_state(path) for path in sources],
+        'rows': len(df),
+        'dtypes': {name: str(dtype) for name, dtype in df.dtypes.items()},
     })
-
     return df
 
-from sklearn.model_selection import train_test_split
 
-import unidecode
+def read_cache(cache_file=CACHE_FILE, columns=None, memory_map=True):
+    """Relit le cache (colonnes au choix), en mappant le fichier en mémoire."""
+    import pyarrow.feather as feather
+
+    table = feather.read_table(cache_file, columns=columns, memory_map=memory_map)
+    return table.to_pandas()
+
+
+def _write_json(path, data):
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def load_and_concatenate(use_cache=True, refresh=False, columns=None, memory_map=True):
+    """
+    Les deux classeurs concaténés, colonnes renommées.
+
+    Passe par le cache colonnaire (reconstruit si besoin) ; ``use_cache=False``
+    relit directement les fichiers Excel, ``refresh=True`` force la reconstruction.
+    Sans pyarrow, le cache est ignoré (lecture directe des classeurs).
+    """
+    if use_cache and importlib.util.find_spec('pyarrow') is None:
+        logger.warning("pyarrow absent : cache colonnaire ignoré, lecture directe des classeurs Excel")
+        use_cache = False
+    if not use_cache:
+        df = pd.concat([_read_workbook(p) for p in SOURCE_FILES], ignore_index=True)
+        return df[columns] if columns is not None else df
+
+    if refresh or not cache_is_valid():
+        build_cache()
+    # Toujours relu depuis le cache : mêmes dtypes au premier appel et aux suivants
+    return read_cache(columns=columns, memory_map=memory_map)
+
+
+# Colonnes explicatives : FEATURES, défini avec le modèle servi (detection/registry.py)
+TARGET = 'auto_eval_vulnerabilite'
+
+# Adapter ce mapping à vos 4 libellés effectivement présents
+TARGET_MAPPING = {
+    'resilient':      0,
+    'stable':         1,
+    'vulnerable':     2,
+    'tres vulnerable':3
+}
+
+
+def normalize_label(value):
+    """'Très vulnérable ' -> 'tres vulnerable' (clé de TARGET_MAPPING)."""
+    return unidecode.unidecode(str(value).strip().lower())
+
+
+def encode_target(values):
+    """Série de libellés -> série d'entiers (NaN pour les libellés inconnus)."""
+    return pd.Series(values).astype(str).str.strip().str.lower().map(unidecode.unidecode).map(TARGET_MAPPING)
 
-import unidecode
-import pandas as pd
-from sklearn.model_selection import train_test_split
 
 def preprocess(df):
-    features = [
-        'age', 'revenu', 'logement', 'type_sanitaires', 'sexe',
-        'situation_matrimoniale', 'source_eau', 'acces_electricite',
-        'emploi', 'niveau_education', 'etat_sante', 'handicap',
-        'enfants_non_scolarises', 'nombre_personnes_menage',
-        'montant_total_recu',
-    ]            # vos colonnes explicatives
-    raw_target = 'auto_eval_vulnerabilite'
+    features = FEATURES
+    raw_target = TARGET
 
     df = df[features + [raw_target]].copy()
-    df[raw_target] = df[raw_target].astype(str).str.strip()
-    df['target_norm'] = df[raw_target].str.lower().map(unidecode.unidecode)
-
-    # Adapter ce mapping à vos 4 libellés effectivement présents
-    mapping = {
-        'resilient':      0,
-        'stable':         1,
-        'vulnerable':     2,
-        'tres vulnerable':3
-    }
-    df['y'] = df['target_norm'].map(mapping)
+    df['y'] = encode_target(df[raw_target])
 
     print("Après mapping, répartition de y :\n", df['y'].value_counts(dropna=False))
 
@@ -85,7 +226,7 @@ def preprocess(df):
 
 if __name__ == "__main__":
     # Chargement + pré-traitement
-    df = load_and_concatenate()
+    df = load_and_concatenate(columns=FEATURES + [TARGET])
     X_train, X_test, y_train, y_test = preprocess(df)
     print("Données prêtes : ", X_train.shape, X_test.shape, y_train.shape)
 
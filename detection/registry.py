@@ -0,0 +1,292 @@
+# detection/registry.py
+"""
+Registre de modèles du module de détection.
+
+Le modèle de vulnérabilité et son pré-processeur sont chargés une seule fois
+par processus, au premier usage (ou au démarrage du worker via ``warmup``),
+puis partagés par toutes les vues.
+
+Les artefacts sont versionnés dans ``DETECTION_ARTIFACTS_DIR`` :
+
+    artifacts/
+        CURRENT                 # nom de la version active
+        20250728-1200/
+            model.npz           # moteur NumPy (cf. numpy_runtime.py), sinon
+            model.joblib        # estimateur sklearn / XGBoost (predict_proba), sinon
+            model.h5            # model.keras / model.h5 chargés avec TensorFlow
+            preprocessor.pkl
+
+Changer de version (``activate``) réécrit ``CURRENT`` de façon atomique ;
+chaque worker le remarque au plus tard après ``DETECTION_REGISTRY_CHECK_INTERVAL``
+secondes et bascule sur le nouveau modèle sans redémarrage.
+Sans fichier ``CURRENT``, on retombe sur les anciens chemins
+(``modele_vulnerabilite.npz`` ou ``.h5`` et ``data/preprocessor.pkl``),
+version « legacy ». TensorFlow n'est importé que si aucun export NumPy n'existe.
+"""
+import os
+import shutil
+import threading
+import time
+import logging
+from datetime import datetime
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+LEGACY_VERSION = 'legacy'
+CURRENT_FILE = 'CURRENT'
+MODEL_FILENAMES = ('model.npz', 'model.joblib', 'model.keras', 'model.h5')
+PREPROCESSOR_FILENAME = 'preprocessor.pkl'
+
+# Libellés des 4 classes (cf. mapping de prepare_data.preprocess)
+LABELS = ['Résilient', 'Stable', 'Vulnérable', 'Très vulnérable']
+# Classes à partir desquelles une personne est considérée comme vulnérable
+VULNERABLE_FROM_CLASS = 2
+
+# Les 15 colonnes explicatives attendues par le pré-processeur
+FEATURES = [
+    'age', 'revenu', 'logement', 'type_sanitaires', 'sexe',
+    'situation_matrimoniale', 'source_eau', 'acces_electricite',
+    'emploi', 'niveau_education', 'etat_sante', 'handicap',
+    'enfants_non_scolarises', 'nombre_personnes_menage',
+    'montant_total_recu',
+]
+
+
+class ModelBundle:
+    """Un modèle chargé, son pré-processeur et la version d'où ils proviennent."""
+
+    def __init__(self, version, model, preprocessor, model_path=None):
+        self.version = version
+        self.model = model
+        self.preprocessor = preprocessor
+        self.model_path = model_path
+        self.loaded_at = datetime.now()
+        # Identifie le modèle au-delà du nom de version (fichier « legacy » ré-entraîné
+        # sur place) ; sert de clé au cache des prédictions
+        self.fingerprint = version
+        if model_path and os.path.exists(model_path):
+            stat = os.stat(model_path)
+            self.fingerprint = f'{version}-{stat.st_size:x}-{stat.st_mtime_ns:x}'
+
+        from detection.features import CompiledTransformer
+        try:
+            self.transformer = CompiledTransformer.from_preprocessor(preprocessor)
+        except (AttributeError, KeyError, ValueError) as e:
+            logger.warning("Pré-processeur %s non compilable (%s) : transformation sklearn", version, e)
+            self.transformer = None
+
+    def transform(self, rows):
+        """
+        Transforme une liste de lignes (dicts ou PersonneVulnerable) en matrice
+        float32, avec le transformateur compilé quand c'est possible.
+        """
+        if self.transformer is not None:
+            return self.transformer.transform_many(rows)
+        return self.transform_sklearn(rows)
+
+    def transform_sklearn(self, rows):
+        """Chemin de référence : DataFrame pandas + ``preprocessor.transform``."""
+        import numpy as np
+        import pandas as pd
+        from detection.features import _as_features
+
+        rows = [_as_features(row) for row in rows]
+        df = pd.DataFrame([{f: row.get(f) for f in FEATURES} for row in rows], columns=FEATURES)
+        return np.asarray(self.preprocessor.transform(df), dtype=np.float32)
+
+    def predict_proba(self, X):
+        """Probabilités des 4 classes pour une matrice déjà pré-traitée."""
+        import numpy as np
+
+        if hasattr(self.model, 'predict_proba'):
+            # Estimateurs sklearn / XGBoost (cf. model_selection.py)
+            return np.asarray(self.model.predict_proba(X))
+        return np.asarray(self.model.predict(X, verbose=0))
+
+    def __repr__(self):
+        return f"<ModelBundle {self.version}>"
+
+
+class ModelRegistry:
+    """Charge paresseusement le modèle actif et le partage dans le processus."""
+
+    def __init__(self, artifacts_dir, legacy_model_path, legacy_preprocessor_path, check_interval=30):
+        self.artifacts_dir = str(artifacts_dir)
+        self.legacy_model_path = str(legacy_model_path)
+        self.legacy_preprocessor_path = str(legacy_preprocessor_path)
+        self.check_interval = check_interval
+
+        self._bundle = None
+        self._lock = threading.Lock()
+        self._last_check = 0.0
+
+    # ------------------------------------------------------------------
+    # Accès au modèle
+    # ------------------------------------------------------------------
+    def get(self):
+        """Retourne le bundle actif, en le chargeant au premier appel."""
+        bundle = self._bundle
+        if bundle is not None and time.monotonic() - self._last_check < self.check_interval:
+            return bundle
+
+        with self._lock:
+            self._last_check = time.monotonic()
+            wanted = self.active_version()
+            if self._bundle is None or self._bundle.version != wanted:
+                self._swap(self._load(wanted))
+            return self._bundle
+
+    def warmup(self):
+        """Charge le modèle immédiatement et exécute une prédiction à vide."""
+        start = time.perf_counter()
+        bundle = self.get()
+        bundle.predict_proba(bundle.transform([{}]))
+        logger.info("Modèle %s préchargé en %.2fs", bundle.version, time.perf_counter() - start)
+        return bundle
+
+    def current_version(self):
+        """Version actuellement chargée dans ce processus (None si rien n'est chargé)."""
+        return self._bundle.version if self._bundle is not None else None
+
+    # ------------------------------------------------------------------
+    # Gestion des versions
+    # ------------------------------------------------------------------
+    def active_version(self):
+        """Version désignée par le fichier CURRENT, ou 'legacy' à défaut."""
+        try:
+            with open(os.path.join(self.artifacts_dir, CURRENT_FILE), encoding='utf-8') as f:
+                version = f.read().strip()
+        except FileNotFoundError:
+            return LEGACY_VERSION
+        return version or LEGACY_VERSION
+
+    def available_versions(self):
+        """Liste des versions présentes dans le répertoire d'artefacts."""
+        if not os.path.isdir(self.artifacts_dir):
+            return []
+        return sorted(
+            name for name in os.listdir(self.artifacts_dir)
+            if os.path.isdir(os.path.join(self.artifacts_dir, name))
+        )
+
+    def publish(self, model_path, preprocessor_path, version=None, activate=True, extra_files=()):
+        """
+        Copie un modèle et son pré-processeur dans une nouvelle version.
+
+        ``extra_files`` : fichiers joints à la version sans être chargés (par
+        exemple le .keras d'origine d'un export NumPy, pour un ré-entraînement).
+        """
+        version = version or datetime.now().strftime('%Y%m%d-%H%M%S')
+        target = os.path.join(self.artifacts_dir, version)
+        if os.path.exists(target):
+            raise ValueError(f"La version {version} existe déjà.")
+
+        model_ext = os.path.splitext(model_path)[1] or '.h5'
+        if 'model' + model_ext not in MODEL_FILENAMES:
+            raise ValueError(f"Format de modèle non supporté : {model_ext}")
+        os.makedirs(target)
+        shutil.copy2(model_path, os.path.join(target, 'model' + model_ext))
+        shutil.copy2(preprocessor_path, os.path.join(target, PREPROCESSOR_FILENAME))
+        for path in extra_files:
+            shutil.copy2(path, os.path.join(target, os.path.basename(path)))
+
+        if activate:
+            self.activate(version)
+        return version
+
+    def activate(self, version):
+        """
+        Rend une version active pour tous les workers.
+
+        Le bundle est chargé avant l'écriture de CURRENT : une version
+        illisible ne devient jamais active.
+        """
+        bundle = self._load(version)
+        if version != LEGACY_VERSION:
+            os.makedirs(self.artifacts_dir, exist_ok=True)
+            tmp_path = os.path.join(self.artifacts_dir, f'.{CURRENT_FILE}.{os.getpid()}')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(version)
+            os.replace(tmp_path, os.path.join(self.artifacts_dir, CURRENT_FILE))
+        else:
+            try:
+                os.remove(os.path.join(self.artifacts_dir, CURRENT_FILE))
+            except FileNotFoundError:
+                pass
+
+        with self._lock:
+            self._swap(bundle)
+            self._last_check = time.monotonic()
+        return bundle
+
+    # ------------------------------------------------------------------
+    # Chargement
+    # ------------------------------------------------------------------
+    def paths_for(self, version):
+        """Chemins (modèle, pré-processeur) d'une version."""
+        if version == LEGACY_VERSION:
+            npz_path = os.path.splitext(self.legacy_model_path)[0] + '.npz'
+            if os.path.exists(npz_path):
+                return npz_path, self.legacy_preprocessor_path
+            return self.legacy_model_path, self.legacy_preprocessor_path
+
+        version_dir = os.path.join(self.artifacts_dir, version)
+        for filename in MODEL_FILENAMES:
+            model_path = os.path.join(version_dir, filename)
+            if os.path.exists(model_path):
+                return model_path, os.path.join(version_dir, PREPROCESSOR_FILENAME)
+        raise FileNotFoundError(f"Aucun modèle trouvé pour la version {version} dans {version_dir}")
+
+    def _load(self, version):
+        import joblib
+
+        model_path, preprocessor_path = self.paths_for(version)
+        start = time.perf_counter()
+        if model_path.endswith('.npz'):
+            from detection.numpy_runtime import load_numpy_model
+            model = load_numpy_model(model_path)
+        elif model_path.endswith('.joblib'):
+            model = joblib.load(model_path)
+        else:
+            import tensorflow as tf
+            model = tf.keras.models.load_model(model_path, compile=False)
+        preprocessor = joblib.load(preprocessor_path)
+        logger.info("Modèle %s chargé depuis %s en %.2fs", version, model_path, time.perf_counter() - start)
+        return ModelBundle(version, model, preprocessor, model_path=model_path)
+
+    def _swap(self, bundle):
+        # Une simple affectation : les requêtes en cours gardent leur référence
+        # à l'ancien bundle, les suivantes voient le nouveau.
+        self._bundle = bundle
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    """Registre unique du processus."""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                base = os.path.dirname(__file__)
+                _registry = ModelRegistry(
+                    artifacts_dir=getattr(settings, 'DETECTION_ARTIFACTS_DIR', os.path.join(base, 'artifacts')),
+                    legacy_model_path=os.path.join(base, 'modele_vulnerabilite.h5'),
+                    legacy_preprocessor_path=os.path.join(base, 'data', 'preprocessor.pkl'),
+                    check_interval=getattr(settings, 'DETECTION_REGISTRY_CHECK_INTERVAL', 30),
+                )
+    return _registry
+
+
+def get_model():
+    """Raccourci : bundle actif du registre."""
+    return get_registry().get()
+
+
+def warmup():
+    """Hook de préchargement (cf. gunicorn.conf.py)."""
+    return get_registry().warmup()
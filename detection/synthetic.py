@@ -0,0 +1,30 @@
+# detection/synthetic.py
+"""Lignes synthétiques tirées du schéma d'entraînement (contrôles de parité, benchmarks)."""
+import numpy as np
+
+from detection.registry import FEATURES
+
+
+def synthetic_rows(preprocessor, n, seed=0):
+    """
+    Génère ``n`` dicts de features plausibles à partir d'un ColumnTransformer
+    ajusté : numériques autour de la moyenne/écart-type du StandardScaler,
+    catégories tirées parmi celles vues par le OneHotEncoder.
+    """
+    rng = np.random.default_rng(seed)
+    columns = {}
+
+    for name, transformer, cols in preprocessor.transformers_:
+        if name == 'num':
+            scaler = transformer.named_steps['scaler']
+            values = rng.normal(scaler.mean_, scaler.scale_, size=(n, len(cols)))
+            for j, col in enumerate(cols):
+                columns[col] = np.abs(np.round(values[:, j]))
+        elif name == 'cat':
+            for col, categories in zip(cols, transformer.categories_):
+                columns[col] = rng.choice(categories, size=n)
+
+    return [
+        {f: (columns[f][i].item() if hasattr(columns[f][i], 'item') else columns[f][i]) for f in FEATURES if f in columns}
+        for i in range(n)
+    ]
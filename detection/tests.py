@@ -1,3 +1,404 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+import threading
+from importlib import import_module
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+import joblib
+import numpy as np
+import pandas as pd
+from django.apps import apps
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from detection import db_source, prepare_data
+from detection.batching import InferenceService
+from detection.features import PERSONNE_FIELDS, CompiledTransformer
+from detection.numpy_runtime import export_numpy_model, load_numpy_model
+from detection.prediction_cache import PredictionCache, predict_cached
+from detection.registry import FEATURES, ModelBundle
+from detection.synthetic import synthetic_rows
+from detection.utils import est_vulnerable
+from donations import statistiques
+from users.models import PersonneVulnerable, User
+
+BASE_DIR = os.path.dirname(__file__)
+
+
+class NumpyRuntimeParityTests(SimpleTestCase):
+    """Le moteur NumPy doit reproduire model.predict du modèle Keras."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        import tensorflow as tf
+
+        cls.keras_model = tf.keras.models.load_model(
+            os.path.join(BASE_DIR, 'modele_vulnerabilite.h5'), compile=False
+        )
+        preprocessor = joblib.load(os.path.join(BASE_DIR, 'data', 'preprocessor.pkl'))
+        rows = synthetic_rows(preprocessor, 512, seed=0)
+        cls.X = preprocessor.transform(pd.DataFrame(rows, columns=FEATURES)).astype(np.float32)
+        cls.expected = cls.keras_model.predict(cls.X, verbose=0)
+        cls.tmpdir = tempfile.TemporaryDirectory()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmpdir.cleanup()
+        super().tearDownClass()
+
+    def _export(self, dtype):
+        path = os.path.join(self.tmpdir.name, f'model_{dtype}.npz')
+        export_numpy_model(self.keras_model, path, dtype=dtype)
+        return path
+
+    def test_float32_matches_keras(self):
+        runtime = load_numpy_model(self._export('float32'))
+        np.testing.assert_allclose(runtime.predict(self.X), self.expected, atol=1e-4)
+
+    def test_quantized_exports_keep_predicted_class(self):
+        for dtype, tolerance in (('float16', 5e-3), ('int8', 1e-1)):
+            with self.subTest(dtype=dtype):
+                obtained = load_numpy_model(self._export(dtype)).predict(self.X)
+                self.assertLess(np.abs(obtained - self.expected).max(), tolerance)
+                agreement = (obtained.argmax(axis=1) == self.expected.argmax(axis=1)).mean()
+                self.assertGreaterEqual(agreement, 0.97)
+
+    def test_mmap_and_eager_loading_agree(self):
+        path = self._export('float32')
+        mapped = load_numpy_model(path, mmap=True)
+        eager = load_numpy_model(path, mmap=False)
+        self.assertIsInstance(mapped.kernels[0], np.memmap)
+        np.testing.assert_array_equal(mapped.predict(self.X), eager.predict(self.X))
+
+    def test_committed_export_matches_keras(self):
+        runtime = load_numpy_model(os.path.join(BASE_DIR, 'modele_vulnerabilite.npz'))
+        np.testing.assert_allclose(runtime.predict(self.X), self.expected, atol=1e-4)
+
+
+class CompiledTransformerTests(SimpleTestCase):
+    """Le transformateur compilé doit reproduire preprocessor.transform à l'identique."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.preprocessor = joblib.load(os.path.join(BASE_DIR, 'data', 'preprocessor.pkl'))
+        cls.compiled = CompiledTransformer.from_preprocessor(cls.preprocessor)
+
+    def _expected(self, rows):
+        df = pd.DataFrame([{f: row.get(f) for f in FEATURES} for row in rows], columns=FEATURES)
+        return self.preprocessor.transform(df).astype(np.float32)
+
+    def test_synthetic_rows(self):
+        rows = synthetic_rows(self.preprocessor, 1000, seed=1)
+        np.testing.assert_array_equal(self.compiled.transform_many(rows), self._expected(rows))
+
+    def test_missing_and_unknown_values(self):
+        rows = [
+            {},
+            {'age': 34, 'revenu': 25000},
+            {'age': '41', 'revenu': '120000.5', 'sexe': 'Inconnu', 'handicap': True},
+            {'age': None, 'acces_electricite': False, 'logement': 'Rue'},
+        ]
+        expected = self._expected(rows)
+        np.testing.assert_array_equal(self.compiled.transform_many(rows), expected)
+        for row, line in zip(rows, expected):
+            np.testing.assert_array_equal(self.compiled.transform_one(row), line)
+
+    def test_model_instance_and_preallocated_buffer(self):
+        personne = PersonneVulnerable(age=27, revenu=54000, sexe='Femme', montant_recu=15000, entite='handicape')
+        attendu = self._expected([{
+            'age': 27, 'revenu': 54000, 'sexe': 'Féminin', 'montant_total_recu': 15000, 'handicap': True,
+        }])
+        buffer = np.full((4, self.compiled.n_features_out), 9, dtype=np.float32)
+        out = self.compiled.transform_many([personne], out=buffer)
+        np.testing.assert_array_equal(out, attendu)
+        self.assertTrue(np.shares_memory(out, buffer))
+        np.testing.assert_array_equal(self.compiled.transform_one(personne), attendu[0])
+        bundle = ModelBundle('test', None, self.preprocessor)
+        np.testing.assert_array_equal(bundle.transform_sklearn([personne]), attendu)
+
+
+class PredictionCacheTests(SimpleTestCase):
+    """Les entrées déjà scorées ne repassent pas par le modèle, sauf changement de modèle."""
+
+    class CountingModel:
+        def __init__(self):
+            self.rows = 0
+
+        def predict(self, X, verbose=0):
+            self.rows += len(X)
+            return np.tile(np.array([0.1, 0.2, 0.3, 0.4], dtype=np.float32), (len(X), 1))
+
+    def setUp(self):
+        preprocessor = joblib.load(os.path.join(BASE_DIR, 'data', 'preprocessor.pkl'))
+        self.model = self.CountingModel()
+        self.bundle = ModelBundle('test', self.model, preprocessor)
+        self.cache = PredictionCache(max_size=100, alias=None)
+
+    def _predict(self, rows, bundle=None):
+        bundle = bundle or self.bundle
+        return predict_cached(bundle, bundle.transform(rows), self.cache)
+
+    def test_equivalent_inputs_hit_the_cache(self):
+        self._predict([{'age': 30, 'revenu': 25000}])
+        probas = self._predict([{'age': '30', 'revenu': '25000.0'}, {'age': 30.0, 'revenu': 25000}])
+        self.assertEqual(self.model.rows, 1)
+        self.assertEqual(probas.shape, (2, 4))
+        stats = self.cache.stats()
+        self.assertEqual((stats['hits_local'], stats['misses']), (2, 1))
+
+    def test_new_model_version_invalidates(self):
+        self._predict([{'age': 30}])
+        other = ModelBundle('autre', self.model, self.bundle.preprocessor)
+        self._predict([{'age': 30}], bundle=other)
+        self.assertEqual(self.model.rows, 2)
+        self.assertEqual(self.cache.stats()['version'], 'autre')
+
+
+class InferenceServiceTests(SimpleTestCase):
+    """Micro-lots : une transformation par ligne, un passage du modèle par lot."""
+
+    class BatchCountingModel(PredictionCacheTests.CountingModel):
+        def __init__(self):
+            super().__init__()
+            self.batches = []
+
+        def predict(self, X, verbose=0):
+            self.batches.append(len(X))
+            return super().predict(X, verbose)
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.preprocessor = joblib.load(os.path.join(BASE_DIR, 'data', 'preprocessor.pkl'))
+
+    def setUp(self):
+        self.model = self.BatchCountingModel()
+        self.bundle = ModelBundle('test', self.model, self.preprocessor)
+        registry = mock.Mock(get=mock.Mock(return_value=self.bundle))
+        self.service = InferenceService(registry, max_batch_size=4, max_wait=0.5,
+                                        cache=PredictionCache(max_size=100, alias=None))
+
+    def test_each_row_is_transformed_once(self):
+        with mock.patch.object(self.bundle, 'transform', wraps=self.bundle.transform) as transform:
+            proba = self.service.predict({'age': 30, 'revenu': 25000}, timeout=5)
+            self.service.predict({'age': 30, 'revenu': 25000}, timeout=5)  # servie par le cache
+        # Une transformation par appel (avant la file), un seul passage du modèle
+        self.assertEqual(transform.call_count, 2)
+        self.assertEqual((self.model.rows, proba.shape), (1, (4,)))
+
+    def test_concurrent_rows_share_one_batch(self):
+        results = [None] * 4
+
+        def appel(i):
+            results[i] = self.service.predict({'age': 20 + i, 'revenu': 1000 * i}, timeout=5)
+
+        threads = [threading.Thread(target=appel, args=(i,)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(self.model.batches, [4])
+        self.assertTrue(all(result is not None for result in results))
+
+    def test_worker_thread_restarts_in_forked_child(self):
+        if not hasattr(os, 'fork'):
+            self.skipTest("os.fork indisponible")
+        self.service.predict({'age': 30}, timeout=5)
+        parent_thread = self.service._thread
+        lecture, ecriture = os.pipe()
+        pid = os.fork()
+        if pid == 0:  # Processus enfant (worker gunicorn) : le thread du parent n'existe pas ici
+            code = 1
+            try:
+                self.service.max_wait = 0
+                proba = self.service.predict({'age': 45}, timeout=5)
+                nouveau = self.service._thread is not parent_thread and self.service._thread.is_alive()
+                os.write(ecriture, b'ok' if nouveau and len(proba) == 4 else b'ko')
+                code = 0
+            finally:
+                os._exit(code)
+        os.close(ecriture)
+        _, statut = os.waitpid(pid, 0)
+        with os.fdopen(lecture, 'rb') as f:
+            self.assertEqual((f.read(), os.waitstatus_to_exitcode(statut)), (b'ok', 0))
+        self.assertIs(self.service._thread, parent_thread)
+
+
+class SharedPredictionCacheTests(TestCase):
+    """Le cache partagé par défaut est en base : visible des autres processus."""
+
+    def test_other_process_reads_database_cache(self):
+        preprocessor = joblib.load(os.path.join(BASE_DIR, 'data', 'preprocessor.pkl'))
+        model = PredictionCacheTests.CountingModel()
+        bundle = ModelBundle('test', model, preprocessor)
+        X = bundle.transform([{'age': 30, 'revenu': 25000}])
+        predict_cached(bundle, X, PredictionCache(max_size=10))
+        autre_processus = PredictionCache(max_size=10)
+        predict_cached(bundle, X, autre_processus)
+        self.assertEqual(model.rows, 1)
+        self.assertEqual(autre_processus.stats()['hits_shared'], 1)
+
+
+class LabeledQuerysetTests(TestCase):
+    """Seules les catégories saisies par un humain servent d'étiquettes."""
+
+    def setUp(self):
+        for source in (PersonneVulnerable.CATEGORIE_HUMAIN, PersonneVulnerable.CATEGORIE_LLM,
+                       PersonneVulnerable.CATEGORIE_MODELE, None):
+            PersonneVulnerable.objects.create(
+                first_name=str(source), last_name="Test", categorie_predite='Vulnérable',
+                categorie_source=source, validated_by_admin=True,
+            )
+
+    def sources(self, **kwargs):
+        return set(db_source.labeled_queryset(**kwargs).values_list('categorie_source', flat=True))
+
+    def test_model_predictions_are_never_training_labels(self):
+        self.assertEqual(self.sources(), {PersonneVulnerable.CATEGORIE_HUMAIN})
+        self.assertEqual(
+            self.sources(sources=[PersonneVulnerable.CATEGORIE_HUMAIN, PersonneVulnerable.CATEGORIE_LLM,
+                                  PersonneVulnerable.CATEGORIE_MODELE]),
+            {PersonneVulnerable.CATEGORIE_HUMAIN, PersonneVulnerable.CATEGORIE_LLM},
+        )
+
+    def test_validated_only_still_applies(self):
+        PersonneVulnerable.objects.update(validated_by_admin=False)
+        self.assertEqual(self.sources(), set())
+        self.assertEqual(self.sources(validated_only=False), {PersonneVulnerable.CATEGORIE_HUMAIN})
+
+    def test_backfill_marks_validated_rows_as_human_and_llm_rows_as_llm(self):
+        backfill = import_module('users.migrations.0038_backfill_categorie_source')
+        PersonneVulnerable.objects.all().delete()
+        valide = PersonneVulnerable.objects.create(first_name="V", last_name="Test", categorie_predite='Stable',
+                                                   validated_by_admin=True)
+        llm = PersonneVulnerable.objects.create(first_name="L", last_name="Test", categorie_predite='Pauvreté',
+                                                analyse_llm="Catégorie : Pauvreté")
+        brute = PersonneVulnerable.objects.create(first_name="B", last_name="Test", categorie_predite='Stable')
+        backfill.renseigner_provenance(apps, None)
+        self.assertEqual(
+            dict(PersonneVulnerable.objects.values_list('pk', 'categorie_source')),
+            {valide.pk: PersonneVulnerable.CATEGORIE_HUMAIN, llm.pk: PersonneVulnerable.CATEGORIE_LLM,
+             brute.pk: None},
+        )
+
+    def test_training_fails_loudly_without_any_label(self):
+        PersonneVulnerable.objects.filter(categorie_source=PersonneVulnerable.CATEGORIE_HUMAIN).delete()
+        with self.assertRaisesMessage(CommandError, "Aucune fiche étiquetée"):
+            call_command('train_from_db', '--full', stdout=StringIO())
+
+
+class RescorePopulationTests(TestCase):
+    """Re-scoring de la table avec le modèle actif."""
+
+    def setUp(self):
+        self.personnes = [
+            PersonneVulnerable.objects.create(
+                first_name=f"P{i}", last_name="Test", age=18 + 7 * i, nombre_enfants=i % 6,
+                revenu=[0, 15000, 60000, 250000][i % 4], sexe=['Homme', 'Femme'][i % 2],
+                entite=['chomeur', 'handicape', 'veuve'][i % 3], est_vulnerable=bool(i % 2),
+            )
+            for i in range(12)
+        ]
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.checkpoint = os.path.join(tmpdir.name, 'rescore.json')
+
+    def rescore(self, *args):
+        out = StringIO()
+        call_command('rescore_population', '--checkpoint', self.checkpoint, *args, stdout=out)
+        return out.getvalue()
+
+    def test_snapshot_follows_rescored_rows(self):
+        statistiques.reconstruire()
+        avant = PersonneVulnerable.objects.filter(est_vulnerable=True).count()
+        self.rescore('--chunk-size', '5')
+        self.assertNotEqual(PersonneVulnerable.objects.filter(est_vulnerable=True).count(), avant)
+        lues = statistiques.statistiques_population()
+        del lues['statistiques_maj'], lues['statistiques_reconstruites']
+        self.assertEqual(lues, statistiques.calculer_statistiques())
+
+    def test_human_labels_are_left_alone(self):
+        humain = self.personnes[0]
+        PersonneVulnerable.objects.filter(pk=humain.pk).update(
+            categorie_predite='Stable', categorie_source=PersonneVulnerable.CATEGORIE_HUMAIN,
+        )
+        self.rescore()
+        humain.refresh_from_db()
+        self.assertEqual((humain.categorie_predite, humain.categorie_source), ('Stable', 'humain'))
+        self.assertEqual(
+            set(PersonneVulnerable.objects.exclude(pk=humain.pk).values_list('categorie_source', flat=True)),
+            {PersonneVulnerable.CATEGORIE_MODELE},
+        )
+
+    @override_settings(DONS_OBJECTIF_FINANCEMENT=1000)
+    def test_funded_people_keep_their_vulnerability(self):
+        financees = [p.pk for p in self.personnes[::2]]
+        PersonneVulnerable.objects.filter(pk__in=financees).update(montant_recu=1000, est_vulnerable=False)
+        self.rescore()
+        self.assertFalse(PersonneVulnerable.objects.filter(pk__in=financees, est_vulnerable=True).exists())
+        self.assertFalse(PersonneVulnerable.objects.filter(pk__in=financees, categorie_predite=None).exists())
+        self.assertTrue(PersonneVulnerable.objects.exclude(pk__in=financees).filter(est_vulnerable=True).exists())
+
+    def test_dry_run_writes_nothing(self):
+        avant = list(PersonneVulnerable.objects.order_by('pk').values_list('categorie_predite', 'est_vulnerable'))
+        out = self.rescore('--dry-run')
+        self.assertIn("seraient mises à jour", out)
+        self.assertEqual(
+            list(PersonneVulnerable.objects.order_by('pk').values_list('categorie_predite', 'est_vulnerable')), avant,
+        )
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+    def test_resume_starts_after_checkpoint(self):
+        self.rescore('--chunk-size', '5')
+        with open(self.checkpoint, encoding='utf-8') as f:
+            self.assertEqual(json.load(f)['last_id'], self.personnes[-1].pk)
+
+        # Interruption simulée après le 6e : seules les fiches suivantes sont relues
+        PersonneVulnerable.objects.update(categorie_predite=None, categorie_source=None)
+        with open(self.checkpoint, 'w', encoding='utf-8') as f:
+            json.dump({'last_id': self.personnes[5].pk}, f)
+        self.rescore('--resume', '--chunk-size', '5')
+        rescorees = PersonneVulnerable.objects.filter(categorie_source=PersonneVulnerable.CATEGORIE_MODELE)
+        self.assertEqual(set(rescorees.values_list('pk', flat=True)), {p.pk for p in self.personnes[6:]})
+
+    def test_resume_without_checkpoint_fails(self):
+        with self.assertRaises(CommandError):
+            self.rescore('--resume')
+
+    def test_census_prediction_matches_rescore(self):
+        self.rescore()
+        for personne in PersonneVulnerable.objects.order_by('pk'):
+            self.assertEqual(est_vulnerable(personne), personne.est_vulnerable)
+            # Mêmes valeurs reçues en chaînes (formulaire, API)
+            saisie = {name: str(getattr(personne, name)) for name in PERSONNE_FIELDS}
+            self.assertEqual(est_vulnerable(saisie), personne.est_vulnerable)
+
+    def test_census_api_uses_the_rescore_features(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user('recenseur', password='x', is_recenseur=True))
+        for url in (reverse('recenser_personne_api'), reverse('recensement_api')):
+            for i, personne in enumerate(self.personnes[:4]):
+                response = client.post(url, {
+                    'first_name': f"API{i}", 'last_name': "Test", 'age': str(personne.age),
+                    'revenu': str(personne.revenu), 'sexe': personne.sexe, 'entite': personne.entite,
+                }, format='json')
+                self.assertEqual(response.status_code, 201, response.content)
+                creee = PersonneVulnerable.objects.get(pk=response.data['id'])
+                self.assertEqual(creee.est_vulnerable, est_vulnerable(personne))
+
+
+class PrepareDataCacheTests(SimpleTestCase):
+    def test_without_pyarrow_the_workbooks_are_read_directly(self):
+        classeur = pd.DataFrame({'age': [30], 'revenu': [1000]})
+        with mock.patch.object(prepare_data.importlib.util, 'find_spec', return_value=None), \
+                mock.patch.object(prepare_data, '_read_workbook', return_value=classeur), \
+                mock.patch.object(prepare_data, 'build_cache') as build_cache:
+            df = prepare_data.load_and_concatenate(columns=['age'])
+        build_cache.assert_not_called()
+        self.assertEqual(df['age'].tolist(), [30] * len(prepare_data.SOURCE_FILES))
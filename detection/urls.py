@@ -0,0 +1,8 @@
+# detection/urls.py
+from django.urls import path
+
+from detection import views
+
+urlpatterns = [
+    path('stats/', views.detection_stats, name='detection_stats'),
+]
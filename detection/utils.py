@@ -1,16 +1,24 @@
 # detection/utils.py
-import tensorflow as tf
+from detection.batching import get_inference_service
+from detection.features import personne_features
+from detection.registry import VULNERABLE_FROM_CLASS
 
-import numpy as np
 
-# Charger le modèle sauvegardé
-MODELE_PATH = 'detection/modele_vulnerabilite.h5'
-modele = tf.keras.models.load_model(MODELE_PATH)
+def est_vulnerable(personne):
+    """
+    True si le modèle classe ``personne`` « Vulnérable » ou « Très vulnérable ».
 
-def est_vulnerable(age, revenu):
-    # Prépare les données pour le modèle en tant que tableau NumPy avec la bonne forme
-    donnee = np.array([[age, revenu]], dtype=np.float32)
-    prediction = modele.predict(donnee)
-    print(prediction)
-    # Renvoie True si la prédiction est supérieure à 0.5, sinon False
-    return prediction[0][0] > 0.5
+    ``personne`` : PersonneVulnerable, ou données d'un recensement (dict des
+    champs du modèle, valeurs éventuellement en chaînes). Les features sont
+    celles de ``personne_features``, comme pour ``rescore_population`` : une
+    fiche reçoit la même décision à la saisie et au re-scoring.
+    """
+    # La ligne rejoint le micro-lot courant du service d'inférence (cf. batching.py) ;
+    # les colonnes non fournies sont complétées par le pré-processeur (médiane / ignorées).
+    prediction = get_inference_service().predict(personne_features(personne))
+    return bool(prediction.argmax() >= VULNERABLE_FROM_CLASS)
+
+
+def predict_many(rows):
+    """Probabilités des classes pour une liste de dicts de features, en une seule passe."""
+    return get_inference_service().predict_many(rows)
@@ -1,14 +1,25 @@
 # detection/views.py
-import tensorflow as tf
+import os
 
-# Charger le modèle TensorFlow
-model = tf.keras.models.load_model('detection/modele_vulnerabilite.h5')
+from django.contrib.auth.decorators import login_required, user_passes_test
+from django.http import JsonResponse
 
-def est_vulnerable(data):
-    # Traitez les données avec le modèle
-    prediction = model.predict(data)
-    # Retournez True si la personne est vulnérable
-    return prediction[0] > 0.5
+from detection.prediction_cache import get_prediction_cache
+from detection.registry import get_registry
+
+
+@login_required
+@user_passes_test(lambda u: u.is_superuser)
+def detection_stats(request):
+    """Supervision du worker courant : version du modèle et compteurs du cache de prédictions."""
+    registry = get_registry()
+    cache = get_prediction_cache()
+    return JsonResponse({
+        'pid': os.getpid(),
+        'active_version': registry.active_version(),
+        'loaded_version': registry.current_version(),
+        'prediction_cache': cache.stats() if cache is not None else None,
+    })
 from django.shortcuts import render
 #
 # # Create your views here.
@@ -1,124 +1,24 @@
 # donations/admin.py
 from django.contrib import admin
-from django.db import transaction, models
-from django.utils.html import format_html
-from django.utils import timezone
-from decimal import Decimal
 
 # Import des modèles locaux
-from .models import Don
-from users.models import PersonneVulnerable
-from notifications.models import Notification
+from .distribution import RepartitionImpossible, repartir_don
+from .models import AllocationDon, Don
 
 
 def valider_dons(modeladmin, request, queryset):
-    """Action pour valider et répartir les dons sélectionnés."""
+    """Action pour valider et répartir les dons sélectionnés (cf. distribution.py)."""
     updated_count = 0
     errors = []
 
-    for don in queryset:
-        if not don.est_reparti:
-            try:
-                with transaction.atomic():
-                    # Marquer le don comme validé et réparti
-                    don.est_valide = True
-                    don.est_reparti = True
-                    don.save()
-                    updated_count += 1
-
-                    print(f"Validation du don {don.id} de {don.montant}€")
-
-                    # Déterminer les personnes bénéficiaires
-                    if don.personne_vulnerable.exists():
-                        # Don ciblé sur des personnes spécifiques
-                        personnes = don.personne_vulnerable.all()
-                        montant_par_personne = don.montant / personnes.count()
-
-                        print(f"Don ciblé: {personnes.count()} personne(s), {montant_par_personne}€ par personne")
-
-                        for personne in personnes:
-                            # Mettre à jour le montant reçu
-                            if personne.montant_recu is None:
-                                personne.montant_recu = Decimal('0.00')
-
-                            personne.montant_recu += montant_par_personne
-
-                            # Vérifier si la personne dépasse le seuil
-                            if personne.montant_recu >= Decimal('300.00'):
-                                personne.est_vulnerable = False
-                                message = f"Félicitations ! Vous avez atteint votre objectif de financement."
-                            else:
-                                reste = Decimal('200000.00') - personne.montant_recu
-                                message = f"Il vous reste {reste:.2f}€ pour atteindre votre objectif."
-
-                            personne.save()
-
-                            # Créer une notification pour la personne
-                            if personne.user:
-                                Notification.objects.create(
-                                    user=personne.user,
-                                    message=f"Vous avez reçu un don de {montant_par_personne:.2f}F de {don.donateur.username}. {message}"
-                                )
-                    else:
-                        # Don pour toute l'entité
-                        personnes_entite = PersonneVulnerable.objects.filter(
-                            entite=don.entite_vulnerable,
-                            est_vulnerable=True,
-                            validated_by_admin=True
-                        )
-
-                        if personnes_entite.exists():
-                            montant_par_personne = don.montant / personnes_entite.count()
-
-                            print(
-                                f"Don pour l'entité {don.entite_vulnerable}: {personnes_entite.count()} personne(s), {montant_par_personne}€ par personne")
-
-                            # Associer ces personnes au don pour la traçabilité
-                            for personne in personnes_entite:
-                                don.personne_vulnerable.add(personne)
-
-                                # Mettre à jour le montant reçu
-                                if personne.montant_recu is None:
-                                    personne.montant_recu = Decimal('0.00')
-
-                                personne.montant_recu += montant_par_personne
-
-                                # Vérifier si la personne dépasse le seuil
-                                if personne.montant_recu >= Decimal('300.00'):
-                                    personne.est_vulnerable = False
-                                    message = f"Félicitations ! Vous avez atteint votre objectif de financement."
-                                else:
-                                    reste = Decimal('300.00') - personne.montant_recu
-                                    message = f"Il vous reste {reste:.2f}€ pour atteindre votre objectif."
-
-                                personne.save()
-
-                                # Créer une notification pour la personne
-                                if personne.user:
-                                    Notification.objects.create(
-                                        user=personne.user,
-                                        message=f"Vous avez reçu un don de {montant_par_personne:.2f}F de {don.donateur.username}. {message}"
-                                    )
-                        else:
-                            errors.append(
-                                f"Don #{don.id}: Aucune personne vulnérable validée dans l'entité {don.entite_vulnerable}")
-                            # Annuler la validation
-                            don.est_valide = False
-                            don.est_reparti = False
-                            don.save()
-                            updated_count -= 1
-                            continue
-
-                    # Créer une notification pour le donateur
-                    Notification.objects.create(
-                        user=don.donateur,
-                        message=f"Votre don de {don.montant}€ a été validé et réparti avec succès."
-                    )
-
-            except Exception as e:
-                print(f"Erreur lors de la validation du don {don.id}: {str(e)}")
-                errors.append(f"Erreur pour le don #{don.id}: {str(e)}")
-                continue
+    for don in queryset.filter(est_reparti=False).select_related('donateur'):
+        try:
+            repartir_don(don)
+            updated_count += 1
+        except RepartitionImpossible as e:
+            errors.append(f"Don #{don.id}: {e}")
+        except Exception as e:
+            errors.append(f"Erreur pour le don #{don.id}: {str(e)}")
 
     # Messages de retour
     if updated_count > 0:
@@ -223,4 +123,21 @@ class DonAdmin(admin.ModelAdmin):
         """Empêcher la suppression des dons validés."""
         if obj and obj.est_reparti:
             return False
-        return super().has_delete_permission(request, obj)
\ No newline at end of file
+        return super().has_delete_permission(request, obj)
+
+
+@admin.register(AllocationDon)
+class AllocationDonAdmin(admin.ModelAdmin):
+    """Registre des parts (écrit par la répartition, cf. distribution.py) : lecture seule."""
+    list_display = ['id', 'don', 'personne', 'montant', 'est_retire', 'date_allocation', 'date_retrait']
+    list_filter = ['est_retire', 'date_allocation']
+    search_fields = ['personne__first_name', 'personne__last_name', 'don__donateur__username']
+    list_select_related = ['don', 'personne']
+    ordering = ['-date_allocation']
+    list_per_page = 50
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,153 @@
+# donations/agregation.py
+"""
+Agrégation en une passe des statistiques de population.
+
+Les répartitions des tableaux de bord (par région, entité, sexe, âge, plus le
+total), chacune croisée avec ``est_vulnerable``, coûtaient une requête
+``values().annotate()`` par dimension, soit autant de parcours de la table.
+``agreger(personnes)`` les calcule toutes en un seul parcours :
+
+- PostgreSQL : une requête ``GROUP BY GROUPING SETS`` (une ligne par valeur de
+  chaque dimension) ;
+- autres bases (SQLite) : un seul ``SELECT`` des colonnes utiles, lu par lots
+  (``fetchmany``) ; chaque lot est encodé (valeur → indice) et replié dans des
+  accumulateurs NumPy par ``np.bincount``.
+
+Résultat : ``{dimension: {valeur: [vulnerables, non_vulnerables,
+enfants_vulnerables, enfants_non_vulnerables, aidees]}}`` ; ``aidees`` compte
+les vulnérables ayant déjà reçu un montant. Utilisé par statistiques.py
+(instantané, reconstruction, calcul direct).
+"""
+import numpy as np
+from django.core.exceptions import EmptyResultSet
+from django.db import connections
+from django.db.models import Case, IntegerField, Value, When
+
+# Dimension → champ de PersonneVulnerable (None : ligne unique « total »)
+DIMENSIONS = {
+    'total': None,
+    'region': 'region_geographique',
+    'entite': 'entite',
+    'sexe': 'sexe',
+    'age': 'age',
+}
+CHAMPS_DIMENSIONS = tuple(champ for champ in DIMENSIONS.values() if champ)
+NOMBRE_COMPTEURS = 5
+# Lignes lues par lot lors du balayage
+TAILLE_LOT = 50000
+
+
+def agreger(personnes, methode=None):
+    """
+    Compteurs du queryset ``personnes`` pour toutes les dimensions, en un parcours.
+
+    ``methode`` : ``'grouping_sets'`` ou ``'balayage'`` ; par défaut selon la base.
+    """
+    connection = connections[personnes.db]
+    if methode is None:
+        methode = 'grouping_sets' if connection.vendor == 'postgresql' else 'balayage'
+    try:
+        if methode == 'grouping_sets':
+            return _agreger_grouping_sets(personnes, connection)
+        return _agreger_par_balayage(personnes, connection)
+    except EmptyResultSet:  # Queryset vide par construction (.none(), pk__in=[])
+        return _vide()
+
+
+def _colonnes(personnes):
+    """Requête SQL des seules colonnes utiles, ``aidee`` (0/1) calculée par la base."""
+    colonnes = (
+        personnes.order_by()
+        .annotate(aidee=Case(When(montant_recu__gt=0, then=Value(1)), default=Value(0), output_field=IntegerField()))
+        .values_list(*CHAMPS_DIMENSIONS, 'est_vulnerable', 'nombre_enfants', 'aidee')
+    )
+    return colonnes.query.get_compiler(using=personnes.db).as_sql()
+
+
+def _vide():
+    return {dimension: {} for dimension in DIMENSIONS}
+
+
+def _agreger_grouping_sets(personnes, connection):
+    sql, params = _colonnes(personnes)
+    qn = connection.ops.quote_name
+    colonnes = [qn(f'c{i}') for i in range(len(CHAMPS_DIMENSIONS))]
+    vulnerable, enfants, aidee = qn('vulnerable'), qn('enfants'), qn('aidee')
+    ensembles = ', '.join(f'({colonne}, {vulnerable})' for colonne in colonnes) + f', ({vulnerable})'
+    requete = (
+        f"SELECT {', '.join(colonnes)}, {vulnerable}, "
+        f"{', '.join(f'GROUPING({colonne})' for colonne in colonnes)}, "
+        f"COUNT(*), COALESCE(SUM({enfants}), 0), COALESCE(SUM({aidee}), 0) "
+        f"FROM ({sql}) AS p ({', '.join(colonnes)}, {vulnerable}, {enfants}, {aidee}) "
+        f"GROUP BY GROUPING SETS ({ensembles})"
+    )
+    n = len(CHAMPS_DIMENSIONS)
+    dimensions = [dimension for dimension, champ in DIMENSIONS.items() if champ]
+    resultat = _vide()
+    with connection.cursor() as cursor:
+        cursor.execute(requete, params)
+        for ligne in cursor.fetchall():
+            valeurs, est_vulnerable, groupements = ligne[:n], ligne[n], ligne[n + 1:2 * n + 1]
+            nombre, nb_enfants, aidees = (int(x) for x in ligne[2 * n + 1:])
+            # GROUPING(c) = 0 : la colonne c fait partie de l'ensemble de cette ligne
+            groupees = [i for i, g in enumerate(groupements) if not g]
+            dimension, valeur = (dimensions[groupees[0]], valeurs[groupees[0]]) if groupees else ('total', None)
+            compteurs = resultat[dimension].setdefault(valeur, [0] * NOMBRE_COMPTEURS)
+            if est_vulnerable:
+                compteurs[0] += nombre
+                compteurs[2] += nb_enfants
+                compteurs[4] += aidees
+            else:
+                compteurs[1] += nombre
+                compteurs[3] += nb_enfants
+    return resultat
+
+
+def _agreger_par_balayage(personnes, connection, taille_lot=TAILLE_LOT):
+    sql, params = _colonnes(personnes)
+    n = len(CHAMPS_DIMENSIONS)
+    index = [{} for _ in range(n)]  # valeur → indice, par dimension
+    # Accumulateurs par dimension : (indice, compteur) ; le total en dernier
+    accumulateurs = [np.zeros((0, NOMBRE_COMPTEURS)) for _ in range(n)] + [np.zeros((1, NOMBRE_COMPTEURS))]
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        while True:
+            lignes = cursor.fetchmany(taille_lot)
+            if not lignes:
+                break
+            colonnes = list(zip(*lignes))
+            vulnerable = np.asarray(colonnes[n], dtype=bool)
+            enfants = np.asarray(colonnes[n + 1], dtype=np.float64)
+            aidee = np.asarray(colonnes[n + 2], dtype=np.float64) * vulnerable
+
+            codes_par_dimension = []
+            for i in range(n):
+                codes_dimension = index[i]
+                codes = np.fromiter(
+                    (codes_dimension.setdefault(v, len(codes_dimension)) for v in colonnes[i]),
+                    dtype=np.intp, count=len(lignes),
+                )
+                codes_par_dimension.append((i, codes, len(codes_dimension)))
+            codes_par_dimension.append((n, np.zeros(len(lignes), dtype=np.intp), 1))
+
+            for i, codes, taille in codes_par_dimension:
+                cases = codes * 2 + vulnerable  # (valeur, vulnérable) → une case
+                nombre = np.bincount(cases, minlength=2 * taille).reshape(taille, 2)
+                somme_enfants = np.bincount(cases, weights=enfants, minlength=2 * taille).reshape(taille, 2)
+                aidees = np.bincount(codes, weights=aidee, minlength=taille)
+                lot = np.column_stack((nombre[:, 1], nombre[:, 0], somme_enfants[:, 1], somme_enfants[:, 0], aidees))
+                accumulateur = accumulateurs[i]
+                if len(accumulateur) < taille:
+                    accumulateur = np.vstack((accumulateur, np.zeros((taille - len(accumulateur), NOMBRE_COMPTEURS))))
+                accumulateur += lot
+                accumulateurs[i] = accumulateur
+
+    resultat = _vide()
+    dimensions = [dimension for dimension, champ in DIMENSIONS.items() if champ]
+    for i, dimension in enumerate(dimensions):
+        for valeur, code in index[i].items():
+            resultat[dimension][valeur] = [int(x) for x in accumulateurs[i][code]]
+    if len(accumulateurs[n]) and accumulateurs[n][0].any():
+        resultat['total'][None] = [int(x) for x in accumulateurs[n][0]]
+    return resultat
@@ -0,0 +1,316 @@
+# donations/benchmarks.py
+"""
+Bancs du module dons, dans une base de test jetable (cf. llm/benchmarks.py).
+
+Validation des dons : répartition ensembliste (distribution.py) contre
+l'ancienne boucle par bénéficiaire. Pour chaque taille d'entité, un don
+d'entité est validé par chaque méthode sur des bénéficiaires fraîchement créés
+(tous avec un compte, donc une notification chacun) ; on mesure la durée et le
+nombre de requêtes SQL.
+
+    python manage.py benchmark_dons --tailles 100 1000 10000
+
+Statistiques des tableaux de bord (statistiques.py) : la population grandit
+par paliers ; à chaque palier on mesure la latence de ``dashboard_api``
+(instantané), le calcul direct en un parcours (agregation.py), le calcul
+d'origine à une requête par dimension et l'enregistrement d'une personne
+(coût de l'incrément).
+
+    python manage.py benchmark_statistiques --tailles 1000 10000 100000 1000000
+"""
+import json
+import os
+import platform
+import random
+import statistics
+import time
+from datetime import datetime
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import Case, Count, IntegerField, Q, Sum, When
+
+from llm.benchmarks import base_de_test
+
+METHODES = ('ensembliste', 'iteratif')
+TAILLES = (100, 1000, 10000)
+
+METHODES_STATISTIQUES = ('instantane', 'agregation', 'requetes', 'increment')
+TAILLES_POPULATION = (1000, 10000, 100000, 1000000)
+
+
+class CompteurRequetes:
+    """``execute_wrapper`` qui compte les requêtes (sans limite, contrairement à CaptureQueriesContext)."""
+
+    def __init__(self):
+        self.requetes = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.requetes += 1
+        return execute(sql, params, many, context)
+
+
+def repartition_iterative(don):
+    """Ancienne répartition (action ``valider_dons`` d'origine), conservée comme référence."""
+    from notifications.models import Notification
+    from users.models import PersonneVulnerable
+    from .distribution import objectif_financement
+
+    objectif = objectif_financement()
+    with transaction.atomic():
+        don.est_valide = don.est_reparti = True
+        don.save()
+        personnes = PersonneVulnerable.objects.filter(
+            entite=don.entite_vulnerable, est_vulnerable=True, validated_by_admin=True,
+        )
+        montant_par_personne = don.montant / personnes.count()
+        for personne in personnes:
+            don.personne_vulnerable.add(personne)
+            personne.montant_recu += montant_par_personne
+            if personne.montant_recu >= objectif:
+                personne.est_vulnerable = False
+            personne.save()
+            if personne.user:
+                Notification.objects.create(user=personne.user, message=f"Don de {montant_par_personne:.2f}F")
+        Notification.objects.create(user=don.donateur, message=f"Votre don de {don.montant}F a été réparti.")
+
+
+def statistiques_par_requetes():
+    """Calcul d'origine (une requête par dimension), conservé comme référence."""
+    from users.models import PersonneVulnerable
+    from .statistiques import _ajouter_pourcentages
+
+    stats_region = list(
+        PersonneVulnerable.objects
+        .values('region_geographique')
+        .annotate(
+            total_vulnerables=Count(
+                Case(When(est_vulnerable=True, then=1), output_field=IntegerField())
+            ),
+            total_non_vulnerables=Count(
+                Case(When(est_vulnerable=False, then=1), output_field=IntegerField())
+            )
+        )
+    )
+
+    stats_pauvrete = list(
+        PersonneVulnerable.objects
+        .values('est_vulnerable')
+        .annotate(total=Count('id'))
+    )
+
+    stats_entite = list(
+        PersonneVulnerable.objects
+        .values('entite')
+        .annotate(
+            total_vulnerables=Count('id', filter=Q(est_vulnerable=True)),
+            total_non_vulnerables=Count('id', filter=Q(est_vulnerable=False)),
+            total=Count('id')
+        )
+    )
+    _ajouter_pourcentages(stats_entite)
+
+    stats_sexe = list(
+        PersonneVulnerable.objects
+        .values('sexe')
+        .annotate(
+            total_vulnerables=Count('id', filter=Q(est_vulnerable=True)),
+            total_non_vulnerables=Count('id', filter=Q(est_vulnerable=False))
+        )
+    )
+
+    stats_age = list(
+        PersonneVulnerable.objects
+        .values('age')
+        .annotate(
+            total_vulnerables=Count('id', filter=Q(est_vulnerable=True)),
+            total_non_vulnerables=Count('id', filter=Q(est_vulnerable=False))
+        )
+        .order_by('age')
+    )
+
+    stats_enfants = PersonneVulnerable.objects.aggregate(
+        enfants_vulnerables=Sum('nombre_enfants', filter=Q(est_vulnerable=True)),
+        enfants_non_vulnerables=Sum('nombre_enfants', filter=Q(est_vulnerable=False))
+    )
+
+    nombre_personnes_total = PersonneVulnerable.objects.count()
+    nombre_personnes_aidees = PersonneVulnerable.objects.filter(
+        est_vulnerable=True,
+        montant_recu__gt=0
+    ).count()
+    nombre_personnes_vulnerables = PersonneVulnerable.objects.filter(est_vulnerable=True).count()
+
+    return {
+        'stats_region': stats_region,
+        'stats_pauvrete': stats_pauvrete,
+        'stats_entite': stats_entite,
+        'stats_sexe': stats_sexe,
+        'stats_age': stats_age,
+        'stats_enfants': stats_enfants,
+        'nombre_personnes_total': nombre_personnes_total,
+        'nombre_personnes_aidees': nombre_personnes_aidees,
+        'nombre_personnes_vulnerables': nombre_personnes_vulnerables,
+    }
+
+
+def preparer(taille, entite, donateur):
+    """Entité de ``taille`` bénéficiaires, chacun avec un compte, et un don d'entité en attente."""
+    from users.models import PersonneVulnerable, User
+    from .models import Don
+
+    users = User.objects.bulk_create(
+        [User(username=f'{entite}-{i}') for i in range(taille)], batch_size=1000,
+    )
+    PersonneVulnerable.objects.bulk_create([
+        PersonneVulnerable(user=user, first_name=f"Bench{i}", last_name="Don", entite=entite,
+                           est_vulnerable=True, validated_by_admin=True, montant_recu=Decimal('1000'))
+        for i, user in enumerate(users)
+    ], batch_size=1000)
+    don = Don.objects.create(
+        donateur=donateur, entite_vulnerable=entite, montant=Decimal(taille * 500),
+        provenance='benchmark', description='-',
+    )
+    return Don.objects.select_related('donateur').get(pk=don.pk)
+
+
+def _meta():
+    return {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'base': connection.vendor,
+    }
+
+
+def run_benchmark(tailles=TAILLES, methodes=METHODES, log=print):
+    from users.models import User
+    from .distribution import repartir_don
+
+    fonctions = {'ensembliste': repartir_don, 'iteratif': repartition_iterative}
+    results = []
+    with base_de_test():
+        donateur = User.objects.create(username='bench-donateur')
+        for taille in tailles:
+            for methode in methodes:
+                log(f"{methode} : {taille} bénéficiaire(s)…")
+                don = preparer(taille, f'{methode}-{taille}', donateur)
+                compteur = CompteurRequetes()
+                with connection.execute_wrapper(compteur):
+                    debut = time.perf_counter()
+                    fonctions[methode](don)
+                    duree = time.perf_counter() - debut
+                results.append({
+                    'methode': methode,
+                    'beneficiaires': taille,
+                    'duree_s': round(duree, 4),
+                    'requetes': compteur.requetes,
+                    'us_par_beneficiaire': round(duree / taille * 1e6, 1),
+                })
+
+    return {'meta': _meta(), 'results': results}
+
+
+def format_results(report):
+    """Résumé texte d'un rapport."""
+    header = f"{'méthode':<14}{'bénéficiaires':>14}{'durée (s)':>11}{'requêtes':>10}{'µs/bénéf.':>11}"
+    lines = [header, '-' * len(header)]
+    for r in report['results']:
+        lines.append(
+            f"{r['methode']:<14}{r['beneficiaires']:>14}{r['duree_s']:>11.3f}{r['requetes']:>10}"
+            f"{r['us_par_beneficiaire']:>11.1f}"
+        )
+    return '\n'.join(lines)
+
+
+def peupler(nombre, graine=0):
+    """Ajoute ``nombre`` personnes aux attributs aléatoires (``bulk_create`` : hors instantané)."""
+    from users.models import PersonneVulnerable
+
+    rng = random.Random(graine)
+    regions = [code for code, _ in PersonneVulnerable.REGION_CHOICES] + [None]
+    entites = [code for code, _ in PersonneVulnerable.ENTITE_CHOICES]
+    lot = 10000
+    for debut in range(0, nombre, lot):
+        PersonneVulnerable.objects.bulk_create([
+            PersonneVulnerable(
+                first_name="Bench", last_name="Stat",
+                region_geographique=rng.choice(regions), entite=rng.choice(entites),
+                sexe=rng.choice(('Homme', 'Femme')), age=rng.choice((None, rng.randint(0, 95))),
+                nombre_enfants=rng.randint(0, 8), est_vulnerable=rng.random() < 0.6,
+                montant_recu=Decimal(rng.choice((0, 0, 5000))),
+            )
+            for _ in range(min(lot, nombre - debut))
+        ], batch_size=lot)
+
+
+def _mesurer(fonction, repetitions):
+    """Latence médiane (ms) et requêtes SQL d'un appel de ``fonction``."""
+    durees = []
+    for _ in range(repetitions):
+        compteur = CompteurRequetes()
+        with connection.execute_wrapper(compteur):
+            debut = time.perf_counter()
+            fonction()
+            durees.append(time.perf_counter() - debut)
+    return round(statistics.median(durees) * 1000, 2), compteur.requetes
+
+
+def run_benchmark_statistiques(tailles=TAILLES_POPULATION, methodes=METHODES_STATISTIQUES, repetitions=5, log=print):
+    from django.test import RequestFactory
+    from users.models import PersonneVulnerable
+    from . import statistiques
+    from .views import dashboard_api
+
+    requete = RequestFactory().get('/dashboard_api/')
+
+    def enregistrer_personne():
+        personne.nombre_enfants += 1
+        personne.est_vulnerable = not personne.est_vulnerable
+        personne.save()
+
+    fonctions = {
+        'instantane': lambda: dashboard_api(requete),
+        'agregation': statistiques.calculer_statistiques,
+        'requetes': statistiques_par_requetes,
+        'increment': enregistrer_personne,
+    }
+    results = []
+    with base_de_test():
+        personne = PersonneVulnerable.objects.create(first_name="Bench", last_name="Increment", entite='veuve')
+        population = 1
+        for taille in sorted(tailles):
+            log(f"Population : {taille} personne(s)…")
+            peupler(taille - population, graine=taille)
+            population = max(population, taille)
+            debut = time.perf_counter()
+            statistiques.reconstruire()
+            reconstruction = round(time.perf_counter() - debut, 3)
+            for methode in methodes:
+                latence, requetes = _mesurer(fonctions[methode], repetitions)
+                results.append({
+                    'methode': methode,
+                    'personnes': population,
+                    'latence_ms': latence,
+                    'requetes': requetes,
+                    'reconstruction_s': reconstruction,
+                })
+
+    return {'meta': _meta(), 'results': results}
+
+
+def format_results_statistiques(report):
+    header = f"{'méthode':<12}{'personnes':>11}{'latence (ms)':>14}{'requêtes':>10}{'reconstr. (s)':>15}"
+    lines = [header, '-' * len(header)]
+    for r in report['results']:
+        lines.append(
+            f"{r['methode']:<12}{r['personnes']:>11}{r['latence_ms']:>14.2f}{r['requetes']:>10}"
+            f"{r['reconstruction_s']:>15.3f}"
+        )
+    return '\n'.join(lines)
+
+
+def write_report(report, path):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, default=str)
@@ -0,0 +1,187 @@
+# donations/distribution.py
+"""
+Validation et répartition des dons.
+
+Un don validé est partagé à parts égales entre ses bénéficiaires : les personnes
+choisies par le donateur, ou à défaut toutes les personnes vulnérables validées
+de l'entité (associées alors au don pour la traçabilité). Une personne dont le
+montant reçu atteint l'objectif de financement (``DONS_OBJECTIF_FINANCEMENT``)
+n'est plus considérée vulnérable.
+
+``repartir_don`` traite un don en un nombre de requêtes indépendant du nombre
+de bénéficiaires (au lieu de trois requêtes par personne) :
+
+- passage conditionnel du don à « validé, réparti » : un don n'est jamais
+  réparti deux fois, même validé simultanément depuis deux écrans ;
+- pour un don d'entité, un seul ``INSERT … SELECT`` dans la table du M2M ;
+- un seul ``UPDATE`` : ``montant_recu = montant_recu + part``, la bascule de
+  ``est_vulnerable`` étant calculée en SQL (répercuté sur l'instantané des
+  statistiques de population par deux requêtes groupées, cf. statistiques.py) ;
+- un seul ``INSERT … SELECT`` des allocations (``AllocationDon``, une ligne par
+  bénéficiaire avec sa part) ;
+- lecture des nouveaux montants et ``bulk_create`` des notifications.
+
+Les allocations sont le registre des parts : montants reçus et à retirer se
+lisent par une somme indexée (``totaux_personne``), et le retrait est suivi par
+bénéficiaire (``retirer_allocations``).
+
+Utilisé par l'action d'administration ``valider_dons``, la vue
+``repartir_don_admin`` et l'API ``validate_don_api``.
+"""
+from decimal import ROUND_DOWN, Decimal
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Case, F, Q, Sum, Value, When
+from django.db.models.lookups import GreaterThanOrEqual
+from django.utils import timezone
+
+from notifications.models import Notification
+from users.models import PersonneVulnerable
+
+from . import statistiques
+from .models import AllocationDon, Don
+
+CENTIME = Decimal('0.01')
+# Notifications insérées par requête
+BATCH_SIZE = 1000
+
+
+class RepartitionImpossible(Exception):
+    """Le don ne peut pas être réparti (déjà réparti, aucun bénéficiaire)."""
+
+
+def objectif_financement():
+    return Decimal(str(getattr(settings, 'DONS_OBJECTIF_FINANCEMENT', 200000)))
+
+
+def part_par_personne(montant, nombre):
+    """Part de chaque bénéficiaire, arrondie au centime inférieur (jamais plus que le don)."""
+    return (Decimal(montant) / nombre).quantize(CENTIME, rounding=ROUND_DOWN)
+
+
+def _associer_entite(don):
+    """Associe au don les personnes vulnérables validées de son entité ; renvoie leur nombre."""
+    through = Don.personne_vulnerable.through._meta
+    personnes = PersonneVulnerable._meta
+    qn = connection.ops.quote_name
+    colonnes = ', '.join(qn(through.get_field(name).column) for name in ('don', 'personnevulnerable'))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {qn(through.db_table)} ({colonnes}) "
+            f"SELECT %s, {qn(personnes.pk.column)} FROM {qn(personnes.db_table)} "
+            f"WHERE {qn('entite')} = %s AND {qn('est_vulnerable')} = %s AND {qn('validated_by_admin')} = %s",
+            [don.pk, don.entite_vulnerable, True, True],
+        )
+        return cursor.rowcount
+
+
+def _ecrire_allocations(don, part):
+    """Une allocation de ``part`` par bénéficiaire du don, en une requête."""
+    through = Don.personne_vulnerable.through._meta
+    allocations = AllocationDon._meta
+    qn = connection.ops.quote_name
+    colonnes = ', '.join(
+        qn(allocations.get_field(name).column) for name in ('don', 'personne', 'montant', 'est_retire', 'date_allocation')
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {qn(allocations.db_table)} ({colonnes}) "
+            f"SELECT {qn(through.get_field('don').column)}, {qn(through.get_field('personnevulnerable').column)}, "
+            f"%s, %s, %s FROM {qn(through.db_table)} WHERE {qn(through.get_field('don').column)} = %s",
+            [
+                connection.ops.adapt_decimalfield_value(part, 12, 2),
+                False,
+                connection.ops.adapt_datetimefield_value(timezone.now()),
+                don.pk,
+            ],
+        )
+
+
+def repartir_don(don):
+    """
+    Valide et répartit ``don`` ; renvoie le bilan de la répartition.
+
+    Lève ``RepartitionImpossible`` (et rien n'est modifié) si le don est déjà
+    réparti ou n'a aucun bénéficiaire.
+    """
+    objectif = objectif_financement()
+    with transaction.atomic():
+        if not Don.objects.filter(pk=don.pk, est_reparti=False).update(est_valide=True, est_reparti=True):
+            raise RepartitionImpossible("Ce don a déjà été réparti.")
+
+        beneficiaires = PersonneVulnerable.objects.filter(dons=don)
+        nombre = beneficiaires.count()
+        if not nombre:
+            nombre = _associer_entite(don)
+        if not nombre:
+            raise RepartitionImpossible(
+                f"Aucune personne vulnérable validée dans l'entité {don.entite_vulnerable}"
+            )
+
+        part = part_par_personne(don.montant, nombre)
+        nouveau_montant = F('montant_recu') + Value(part)
+        with statistiques.suivre(beneficiaires):
+            beneficiaires.update(
+                montant_recu=nouveau_montant,
+                est_vulnerable=Case(
+                    When(GreaterThanOrEqual(nouveau_montant, Value(objectif)), then=Value(False)),
+                    default=F('est_vulnerable'),
+                ),
+            )
+        _ecrire_allocations(don, part)
+
+        donateur = don.donateur
+        notifications, sorties = [], 0
+        for user_id, montant_recu in beneficiaires.values_list('user_id', 'montant_recu'):
+            if montant_recu >= objectif:
+                if montant_recu - part < objectif:
+                    sorties += 1
+                message = "Félicitations ! Vous avez atteint votre objectif de financement."
+            else:
+                message = f"Il vous reste {objectif - montant_recu:.2f}F pour atteindre votre objectif."
+            if user_id is not None:
+                notifications.append(Notification(
+                    user_id=user_id,
+                    message=f"Vous avez reçu un don de {part:.2f}F de {donateur.username}. {message}",
+                ))
+        notifications.append(Notification(
+            user=donateur,
+            message=f"Votre don de {don.montant}F a été validé et réparti entre {nombre} personne(s).",
+        ))
+        Notification.objects.bulk_create(notifications, batch_size=BATCH_SIZE)
+
+    don.est_valide = don.est_reparti = True
+    return {
+        'don': don.pk,
+        'beneficiaires': nombre,
+        'part': part,
+        'sortis_de_vulnerabilite': sorties,
+        'notifications': len(notifications),
+    }
+
+
+def totaux_personne(personne):
+    """Montants reçus, retirés et à retirer par ``personne`` (une requête sur le registre)."""
+    totaux = AllocationDon.objects.filter(personne=personne).aggregate(
+        recu=Sum('montant'),
+        retire=Sum('montant', filter=Q(est_retire=True)),
+        a_retirer=Sum('montant', filter=Q(est_retire=False)),
+    )
+    return {cle: valeur or Decimal('0.00') for cle, valeur in totaux.items()}
+
+
+def retirer_allocations(personne, dons=None):
+    """
+    Marque comme retirées les parts de ``personne`` (toutes, ou celles des ``dons``
+    donnés) ; un don dont toutes les parts sont retirées passe à ``est_retires``.
+    Renvoie le nombre de parts retirées.
+    """
+    allocations = AllocationDon.objects.filter(personne=personne, est_retire=False)
+    if dons is not None:
+        allocations = allocations.filter(don__in=dons)
+    with transaction.atomic():
+        dons_concernes = list(allocations.values_list('don_id', flat=True))
+        retirees = allocations.update(est_retire=True, date_retrait=timezone.now())
+        Don.objects.filter(pk__in=dons_concernes).exclude(allocations__est_retire=False).update(est_retires=True)
+    return retirees
@@ -0,0 +1,153 @@
+# donations/geo.py
+"""
+Référentiel géographique des régions de Côte d'Ivoire (``json_ci/IvoryCoast.json``).
+
+Le fichier était relu et décodé à chaque affichage du tableau de bord, à chaque
+appel de ``dashboard_api`` et à chaque instanciation de ``RecensementForm``,
+avec un chemin relatif au répertoire courant. ``referentiel()`` le charge et le
+valide une fois par processus, puis le recharge seulement si le fichier change
+(date de modification ou taille) :
+
+- ``regions`` (ordre du fichier), index ``par_nom``, ``choix`` du formulaire ;
+- ``payload`` / ``payload_gzip`` : les régions (nom, coordonnées) déjà
+  sérialisées et compressées, avec leur ``etag``.
+
+``carte(stats_region, cle)`` joint les régions aux statistiques par un dict
+(O(n) au lieu d'un parcours des statistiques par région) et garde la carte
+sérialisée et compressée tant que ``cle`` (fraîcheur de l'instantané, cf.
+statistiques.py) ne change pas.
+
+Un fichier devenu invalide est signalé dans les logs et la version précédente
+reste servie.
+"""
+import gzip
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+CHEMIN = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'json_ci', 'IvoryCoast.json')
+# Cartes sérialisées gardées en mémoire (une par version des statistiques)
+CARTES_EN_CACHE = 8
+
+Region = namedtuple('Region', 'name lat lng')
+Carte = namedtuple('Carte', 'regions json gzip etag')
+
+
+class ReferentielInvalide(ValueError):
+    """Le fichier des régions est illisible ou incohérent."""
+
+
+def _serialiser(donnees):
+    contenu = json.dumps(donnees, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    # mtime=0 : compression reproductible, l'ETag ne dépend que du contenu
+    return contenu, gzip.compress(contenu, mtime=0), '"%s"' % hashlib.sha1(contenu).hexdigest()[:16]
+
+
+class ReferentielGeo:
+    """Régions validées et index précalculés, pour une version du fichier."""
+
+    def __init__(self, contenu, signature=None):
+        self.signature = signature
+        try:
+            donnees = json.loads(contenu)
+            brutes = donnees['regions']
+        except (ValueError, TypeError, KeyError) as e:
+            raise ReferentielInvalide(f"JSON des régions illisible : {e}") from e
+
+        regions = []
+        for i, brute in enumerate(brutes):
+            name = (brute.get('name') or '').strip() if isinstance(brute, dict) else ''
+            if not name:
+                raise ReferentielInvalide(f"Région n°{i} sans nom")
+            try:
+                lat, lng = float(brute.get('lat', 0)), float(brute.get('lng', 0))
+            except (TypeError, ValueError):
+                raise ReferentielInvalide(f"Coordonnées invalides pour la région {name}")
+            if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+                raise ReferentielInvalide(f"Coordonnées hors limites pour la région {name}")
+            regions.append(Region(name, lat, lng))
+
+        self.regions = tuple(regions)
+        self.par_nom = {region.name: region for region in regions}
+        if len(self.par_nom) != len(regions):
+            raise ReferentielInvalide("Nom de région en double")
+        self.choix = tuple(sorted((name, name) for name in self.par_nom))
+        self.payload, self.payload_gzip, self.etag = _serialiser([region._asdict() for region in regions])
+        self._cartes = {}
+        self._verrou = threading.Lock()
+
+    def carte(self, stats_region, cle):
+        """
+        Régions jointes aux statistiques (``stats_region`` de statistiques.py),
+        sérialisées et compressées ; mémorisées sous ``cle``.
+        """
+        carte = self._cartes.get(cle)
+        if carte is None:
+            par_region = {stat['region_geographique']: stat for stat in stats_region}
+            regions = []
+            for region in self.regions:
+                stat = par_region.get(region.name, {})
+                regions.append({
+                    'name': region.name,
+                    'lat': region.lat,
+                    'lng': region.lng,
+                    'total_vulnerables': stat.get('total_vulnerables', 0),
+                    'total_non_vulnerables': stat.get('total_non_vulnerables', 0),
+                })
+            carte = Carte(regions, *_serialiser(regions))
+            if cle is not None:
+                with self._verrou:
+                    while len(self._cartes) >= CARTES_EN_CACHE:
+                        self._cartes.pop(next(iter(self._cartes)))
+                    self._cartes[cle] = carte
+        return carte
+
+
+VIDE = ReferentielGeo('{"regions": []}')
+
+_verrou = threading.Lock()
+_courant = {}
+# Signature du dernier fichier rejeté par chemin : pas de nouvel essai avant sa prochaine modification
+_rejets = {}
+
+
+def _signature(chemin):
+    etat = os.stat(chemin)
+    return etat.st_mtime_ns, etat.st_size
+
+
+def referentiel(chemin=CHEMIN):
+    """Référentiel du fichier ``chemin``, rechargé si le fichier a changé."""
+    actuel = _courant.get(chemin)
+    try:
+        signature = _signature(chemin)
+    except OSError:
+        if actuel is None:
+            logger.error("Fichier des régions introuvable : %s", chemin)
+            return VIDE
+        return actuel
+    if actuel is not None and actuel.signature == signature or _rejets.get(chemin) == signature:
+        return actuel or VIDE
+
+    with _verrou:
+        actuel = _courant.get(chemin)
+        if actuel is not None and actuel.signature == signature or _rejets.get(chemin) == signature:
+            return actuel or VIDE
+        try:
+            with open(chemin, 'rb') as f:
+                nouveau = ReferentielGeo(f.read(), signature)
+        except (OSError, ReferentielInvalide):
+            logger.exception("Fichier des régions %s non chargé", chemin)
+            _rejets[chemin] = signature
+            return actuel or VIDE
+        _courant[chemin] = nouveau
+        return nouveau
+
+
+def carte(stats_region, cle=None):
+    return referentiel().carte(stats_region, cle)
@@ -0,0 +1,29 @@
+# donations/management/commands/benchmark_dons.py
+import os
+from datetime import datetime
+
+from django.core.management.base import BaseCommand
+
+from donations.benchmarks import METHODES, TAILLES, format_results, run_benchmark, write_report
+
+
+class Command(BaseCommand):
+    help = ("Durée et nombre de requêtes de la validation d'un don d'entité (répartition ensembliste "
+            "contre l'ancienne boucle) ; écrit un rapport JSON.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tailles', nargs='+', type=int, default=list(TAILLES),
+                            help="Nombres de bénéficiaires à tester")
+        parser.add_argument('--methodes', nargs='+', choices=METHODES, default=list(METHODES))
+        parser.add_argument('--output', default=None,
+                            help="Fichier JSON (défaut : donations/outputs/benchmark-<date>.json)")
+
+    def handle(self, *args, **options):
+        report = run_benchmark(tailles=options['tailles'], methodes=options['methodes'], log=self.stdout.write)
+        output = options['output'] or os.path.join(
+            os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
+            'outputs', f"benchmark-{datetime.now():%Y%m%d-%H%M%S}.json",
+        )
+        write_report(report, output)
+        self.stdout.write(format_results(report))
+        self.stdout.write(self.style.SUCCESS(f"Rapport écrit dans {output}"))
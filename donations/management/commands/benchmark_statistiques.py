@@ -0,0 +1,35 @@
+# donations/management/commands/benchmark_statistiques.py
+import os
+from datetime import datetime
+
+from django.core.management.base import BaseCommand
+
+from donations.benchmarks import (
+    METHODES_STATISTIQUES, TAILLES_POPULATION, format_results_statistiques, run_benchmark_statistiques, write_report,
+)
+
+
+class Command(BaseCommand):
+    help = ("Latence des statistiques du tableau de bord donateur (instantané contre calcul direct) "
+            "selon la taille de la population ; écrit un rapport JSON.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tailles', nargs='+', type=int, default=list(TAILLES_POPULATION),
+                            help="Paliers de population à tester")
+        parser.add_argument('--methodes', nargs='+', choices=METHODES_STATISTIQUES, default=list(METHODES_STATISTIQUES))
+        parser.add_argument('--repetitions', type=int, default=5, help="Mesures par palier (médiane)")
+        parser.add_argument('--output', default=None,
+                            help="Fichier JSON (défaut : donations/outputs/benchmark-statistiques-<date>.json)")
+
+    def handle(self, *args, **options):
+        report = run_benchmark_statistiques(
+            tailles=options['tailles'], methodes=options['methodes'],
+            repetitions=options['repetitions'], log=self.stdout.write,
+        )
+        output = options['output'] or os.path.join(
+            os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
+            'outputs', f"benchmark-statistiques-{datetime.now():%Y%m%d-%H%M%S}.json",
+        )
+        write_report(report, output)
+        self.stdout.write(format_results_statistiques(report))
+        self.stdout.write(self.style.SUCCESS(f"Rapport écrit dans {output}"))
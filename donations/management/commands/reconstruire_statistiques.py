@@ -0,0 +1,23 @@
+# donations/management/commands/reconstruire_statistiques.py
+"""
+Reconstruit l'instantané des statistiques de population (cf. donations/statistiques.py).
+
+    python manage.py reconstruire_statistiques      # à lancer via cron (nuit)
+
+L'instantané est tenu à jour par incréments ; la reconstruction rattrape les
+écritures qui y échappent (SQL brut, ``bulk_create``, ``loaddata``).
+"""
+from django.core.management.base import BaseCommand
+
+from donations import statistiques
+
+
+class Command(BaseCommand):
+    help = "Recalcule depuis la table l'instantané des statistiques des tableaux de bord donateur."
+
+    def handle(self, *args, **options):
+        lignes = statistiques.reconstruire()
+        stats = statistiques.statistiques_population()
+        self.stdout.write(self.style.SUCCESS(
+            f"Instantané reconstruit : {lignes} ligne(s), {stats['nombre_personnes_total']} personne(s)."
+        ))
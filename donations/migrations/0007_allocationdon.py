@@ -0,0 +1,52 @@
+# Generated by Django 5.2.4 on 2026-10-18 13:45
+
+from decimal import ROUND_DOWN, Decimal
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def remplir_allocations(apps, schema_editor):
+    """Allocations des dons déjà répartis : part égale entre les bénéficiaires associés."""
+    Don = apps.get_model('donations', 'Don')
+    AllocationDon = apps.get_model('donations', 'AllocationDon')
+    Through = Don.personne_vulnerable.through
+
+    dons = Don.objects.filter(est_reparti=True).annotate(nombre=Count('personne_vulnerable')).filter(nombre__gt=0)
+    for don in dons.iterator():
+        part = (don.montant / don.nombre).quantize(Decimal('0.01'), rounding=ROUND_DOWN)
+        AllocationDon.objects.bulk_create([
+            AllocationDon(don_id=don.pk, personne_id=personne_id, montant=part, est_retire=don.est_retires)
+            for personne_id in Through.objects.filter(don_id=don.pk).values_list('personnevulnerable_id', flat=True)
+        ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('donations', '0006_remove_don_nombre_personnes'),
+        ('users', '0036_personnevulnerable_analyse_statut'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AllocationDon',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('montant', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('est_retire', models.BooleanField(default=False)),
+                ('date_allocation', models.DateTimeField(auto_now_add=True)),
+                ('date_retrait', models.DateTimeField(blank=True, null=True)),
+                ('don', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='allocations', to='donations.don')),
+                ('personne', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='allocations_dons', to='users.personnevulnerable')),
+            ],
+            options={
+                'verbose_name': 'Allocation de don',
+                'verbose_name_plural': 'Allocations de dons',
+                'indexes': [models.Index(fields=['personne', 'est_retire'], name='donations_a_personn_5b27a9_idx')],
+                'unique_together': {('don', 'personne')},
+            },
+        ),
+        migrations.RunPython(remplir_allocations, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,79 @@
+# Generated by Django 5.2.4 on 2026-10-18 13:49
+
+import json
+
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+# Figés ici : la migration ne dépend pas du code courant de donations/statistiques.py
+DIMENSIONS = {
+    'total': None,
+    'region': 'region_geographique',
+    'entite': 'entite',
+    'sexe': 'sexe',
+    'age': 'age',
+}
+
+
+def construire_instantane(apps, schema_editor):
+    """Instantané initial des statistiques de population, agrégé par la base (une requête par dimension)."""
+    PersonneVulnerable = apps.get_model('users', 'PersonneVulnerable')
+    StatistiquePopulation = apps.get_model('donations', 'StatistiquePopulation')
+    maintenant = timezone.now()
+    lignes = {}
+    for dimension, champ in DIMENSIONS.items():
+        groupes = PersonneVulnerable.objects.order_by().values(*filter(None, (champ, 'est_vulnerable'))).annotate(
+            nombre=Count('pk'),
+            enfants=Sum('nombre_enfants'),
+            aidees=Count('pk', filter=Q(montant_recu__gt=0)),
+        )
+        for groupe in groupes:
+            cle = json.dumps(groupe[champ] if champ else None, ensure_ascii=False)
+            ligne = lignes.setdefault((dimension, cle), StatistiquePopulation(
+                dimension=dimension, cle=cle, date_maj=maintenant, date_reconstruction=maintenant,
+            ))
+            if groupe['est_vulnerable']:
+                ligne.vulnerables += groupe['nombre']
+                ligne.enfants_vulnerables += groupe['enfants'] or 0
+                ligne.aidees += groupe['aidees']
+            else:
+                ligne.non_vulnerables += groupe['nombre']
+                ligne.enfants_non_vulnerables += groupe['enfants'] or 0
+    # La ligne « total » existe même sans personne
+    lignes.setdefault(('total', json.dumps(None)), StatistiquePopulation(
+        dimension='total', cle=json.dumps(None), date_maj=maintenant, date_reconstruction=maintenant,
+    ))
+    StatistiquePopulation.objects.bulk_create(lignes.values())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('donations', '0007_allocationdon'),
+        ('users', '0036_personnevulnerable_analyse_statut'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatistiquePopulation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dimension', models.CharField(choices=[('total', 'Total'), ('region', 'Région'), ('entite', 'Entité'), ('sexe', 'Sexe'), ('age', 'Âge')], max_length=10)),
+                ('cle', models.CharField(max_length=150)),
+                ('vulnerables', models.IntegerField(default=0)),
+                ('non_vulnerables', models.IntegerField(default=0)),
+                ('enfants_vulnerables', models.BigIntegerField(default=0)),
+                ('enfants_non_vulnerables', models.BigIntegerField(default=0)),
+                ('aidees', models.IntegerField(default=0)),
+                ('date_maj', models.DateTimeField()),
+                ('date_reconstruction', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name': 'Statistique de population',
+                'verbose_name_plural': 'Statistiques de population',
+                'unique_together': {('dimension', 'cle')},
+            },
+        ),
+        migrations.RunPython(construire_instantane, migrations.RunPython.noop),
+    ]
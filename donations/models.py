@@ -20,3 +20,62 @@ class Don(models.Model):
 
     def __str__(self):
         return f"Don de {self.donateur.username} - {self.montant} €"
+
+
+class AllocationDon(models.Model):
+    """
+    Part d'un don attribuée à un bénéficiaire, écrite une fois à la répartition
+    (cf. distribution.py) : les montants reçus et à retirer sont des sommes sur
+    cette table, sans recompter les bénéficiaires de chaque don.
+    """
+    don = models.ForeignKey(Don, on_delete=models.CASCADE, related_name='allocations')
+    personne = models.ForeignKey(PersonneVulnerable, on_delete=models.CASCADE, related_name='allocations_dons')
+    montant = models.DecimalField(max_digits=12, decimal_places=2)
+    est_retire = models.BooleanField(default=False)  # Part retirée par le bénéficiaire
+    date_allocation = models.DateTimeField(auto_now_add=True)
+    date_retrait = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Allocation de don"
+        verbose_name_plural = "Allocations de dons"
+        unique_together = ('don', 'personne')
+        indexes = [
+            models.Index(fields=['personne', 'est_retire']),
+        ]
+
+    def __str__(self):
+        return f"Don {self.don_id} → {self.personne_id} : {self.montant}"
+
+
+class StatistiquePopulation(models.Model):
+    """
+    Instantané des statistiques de population des tableaux de bord donateur :
+    une ligne de compteurs par valeur de chaque dimension (région, entité,
+    sexe, âge, plus une ligne « total »). Tenu à jour par incréments
+    (cf. statistiques.py) et reconstruit périodiquement.
+    """
+    DIMENSION_CHOICES = [
+        ('total', 'Total'),
+        ('region', 'Région'),
+        ('entite', 'Entité'),
+        ('sexe', 'Sexe'),
+        ('age', 'Âge'),
+    ]
+
+    dimension = models.CharField(max_length=10, choices=DIMENSION_CHOICES)
+    cle = models.CharField(max_length=150)  # Valeur de la dimension, encodée en JSON (None → "null")
+    vulnerables = models.IntegerField(default=0)
+    non_vulnerables = models.IntegerField(default=0)
+    enfants_vulnerables = models.BigIntegerField(default=0)
+    enfants_non_vulnerables = models.BigIntegerField(default=0)
+    aidees = models.IntegerField(default=0)  # Vulnérables ayant déjà reçu un montant
+    date_maj = models.DateTimeField()
+    date_reconstruction = models.DateTimeField()
+
+    class Meta:
+        verbose_name = "Statistique de population"
+        verbose_name_plural = "Statistiques de population"
+        unique_together = ('dimension', 'cle')
+
+    def __str__(self):
+        return f"{self.dimension} {self.cle} : {self.vulnerables}/{self.non_vulnerables}"
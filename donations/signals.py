@@ -0,0 +1,36 @@
+# donations/signals.py
+"""Mise à jour de l'instantané des statistiques de population (cf. statistiques.py)."""
+from django.db.models.signals import post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from users.models import PersonneVulnerable
+
+from . import statistiques
+
+
+@receiver(pre_save, sender=PersonneVulnerable)
+def memoriser_statistiques(sender, instance, update_fields=None, **kwargs):
+    """Relit l'état enregistré de la personne, retiré de l'instantané après le save()."""
+    if update_fields is not None and not set(update_fields) & set(statistiques.CHAMPS):
+        # Enregistrement partiel sans effet sur les statistiques (ex. statut d'analyse)
+        instance._statistiques_suivies = False
+        return
+    instance._statistiques_suivies = True
+    instance._statistiques_avant = statistiques.valeurs_personne(instance.pk) if instance.pk else None
+
+
+@receiver(post_save, sender=PersonneVulnerable)
+def mettre_a_jour_statistiques(sender, instance, **kwargs):
+    if not getattr(instance, '_statistiques_suivies', False):
+        return
+    statistiques.appliquer(statistiques.difference(
+        statistiques.contribution(statistiques.valeurs_personne(instance.pk)),
+        statistiques.contribution(instance._statistiques_avant),
+    ))
+    instance._statistiques_suivies = False
+
+
+@receiver(pre_delete, sender=PersonneVulnerable)
+def retirer_des_statistiques(sender, instance, **kwargs):
+    # Dans la transaction de la suppression : annulé avec elle en cas d'échec
+    statistiques.appliquer(statistiques.contribution(statistiques.valeurs_personne(instance.pk), signe=-1))
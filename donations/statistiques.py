@@ -0,0 +1,275 @@
+# donations/statistiques.py
+"""
+Statistiques de population des tableaux de bord donateur (``dashboard_donateur``,
+``dashboard_api``).
+
+Les calculer à chaque affichage (``calculer_statistiques``) coûte un parcours
+de toute la table ``PersonneVulnerable`` (cf. agregation.py) ; ``dashboard_api``
+est en accès libre. Les vues lisent à la place un instantané (``StatistiquePopulation``) :
+une ligne de compteurs par valeur de chaque dimension, lue en une requête dont
+le coût ne dépend pas du nombre de personnes (``statistiques_population``).
+
+L'instantané est tenu à jour par incréments (``F() + n``, sûrs en concurrence,
+dans la transaction de la modification) :
+
+- ``save()`` / ``delete()`` d'une personne (recensement, validation, édition) :
+  signaux branchés dans ``signals.py`` ;
+- ``update()`` en masse : bloc ``suivre(queryset)``, qui compare les
+  contributions agrégées avant et après. Écrivains concernés : la répartition
+  d'un don (distribution.py) et le re-scoring de la population
+  (``detection/management/commands/rescore_population.py``).
+
+Une écriture qui échappe aux deux (SQL brut, ``bulk_create``, ``loaddata``)
+n'est rattrapée qu'à la reconstruction complète, à lancer périodiquement :
+
+    python manage.py reconstruire_statistiques     # via cron (nuit)
+
+La fraîcheur est exposée (``statistiques_maj``, ``statistiques_reconstruites``).
+
+Les âges sont regroupés en tranches (``DONS_TRANCHES_AGE`` : bornes inférieures,
+ex. « 0,18,25,35,50,65 » ; vide : une ligne par âge).
+"""
+import json
+from bisect import bisect_right
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from users.models import PersonneVulnerable
+
+from .agregation import CHAMPS_DIMENSIONS, DIMENSIONS, agreger
+from .models import StatistiquePopulation
+
+COMPTEURS = ('vulnerables', 'non_vulnerables', 'enfants_vulnerables', 'enfants_non_vulnerables', 'aidees')
+# Champs dont dépendent les statistiques : un save(update_fields=...) qui n'en touche aucun est ignoré
+CHAMPS = CHAMPS_DIMENSIONS + ('est_vulnerable', 'nombre_enfants', 'montant_recu')
+CLE_TOTAL = json.dumps(None)
+
+
+def tranches_age():
+    """Bornes inférieures des tranches d'âge (``DONS_TRANCHES_AGE``), croissantes ; () : pas de tranches."""
+    bornes = str(getattr(settings, 'DONS_TRANCHES_AGE', '') or '')
+    return tuple(sorted({int(borne) for borne in bornes.split(',') if borne.strip()}))
+
+
+def calculer_statistiques(personnes=None, tranches=None):
+    """Statistiques calculées directement sur la table, en un parcours."""
+    compteurs = agreger(PersonneVulnerable.objects.all() if personnes is None else personnes)
+    return mettre_en_forme(compteurs, tranches)
+
+
+# ---------------------------------------------------------------------------
+# Contributions aux compteurs
+# ---------------------------------------------------------------------------
+
+def _ajouter(totaux, valeurs, nombre, enfants, aidees, signe=1):
+    """Ajoute à ``totaux`` la contribution d'un groupe de personnes partageant ``valeurs``."""
+    if valeurs['est_vulnerable']:
+        compteurs = (nombre, 0, enfants, 0, aidees)
+    else:
+        compteurs = (0, nombre, 0, enfants, 0)
+    for dimension, champ in DIMENSIONS.items():
+        cle = CLE_TOTAL if champ is None else json.dumps(valeurs[champ], ensure_ascii=False)
+        ligne = totaux[(dimension, cle)]
+        for i, n in enumerate(compteurs):
+            ligne[i] += signe * n
+
+
+def contributions(personnes):
+    """Compteurs apportés par le queryset ``personnes``, en un parcours (cf. agregation.py)."""
+    totaux = defaultdict(lambda: [0] * len(COMPTEURS))
+    for dimension, par_valeur in agreger(personnes).items():
+        for valeur, compteurs in par_valeur.items():
+            cle = CLE_TOTAL if dimension == 'total' else json.dumps(valeur, ensure_ascii=False)
+            totaux[(dimension, cle)] = compteurs
+    return totaux
+
+
+def contribution(valeurs, signe=1):
+    """Compteurs apportés par une personne (dictionnaire des ``CHAMPS``)."""
+    totaux = defaultdict(lambda: [0] * len(COMPTEURS))
+    if valeurs is not None:
+        aidee = bool(valeurs['est_vulnerable'] and valeurs['montant_recu'] and valeurs['montant_recu'] > 0)
+        _ajouter(totaux, valeurs, 1, valeurs['nombre_enfants'] or 0, int(aidee), signe)
+    return totaux
+
+
+def difference(apres, avant):
+    delta = defaultdict(lambda: [0] * len(COMPTEURS))
+    for totaux, signe in ((apres, 1), (avant, -1)):
+        for cle, compteurs in totaux.items():
+            for i, n in enumerate(compteurs):
+                delta[cle][i] += signe * n
+    return delta
+
+
+def valeurs_personne(pk):
+    return PersonneVulnerable.objects.filter(pk=pk).values(*CHAMPS).first()
+
+
+# ---------------------------------------------------------------------------
+# Mise à jour et reconstruction de l'instantané
+# ---------------------------------------------------------------------------
+
+def appliquer(delta):
+    """Ajoute ``delta`` aux compteurs de l'instantané ; renvoie le nombre de lignes touchées."""
+    delta = {cle: compteurs for cle, compteurs in delta.items() if any(compteurs)}
+    if not delta:
+        return 0
+    maintenant = timezone.now()
+    with transaction.atomic():
+        # Lignes des valeurs encore jamais vues (nouvelle région, nouvel âge…)
+        StatistiquePopulation.objects.bulk_create([
+            StatistiquePopulation(dimension=dimension, cle=cle, date_maj=maintenant, date_reconstruction=maintenant)
+            for dimension, cle in delta
+        ], ignore_conflicts=True)
+        for (dimension, cle), compteurs in delta.items():
+            StatistiquePopulation.objects.filter(dimension=dimension, cle=cle).update(
+                date_maj=maintenant,
+                **{champ: F(champ) + n for champ, n in zip(COMPTEURS, compteurs) if n},
+            )
+    return len(delta)
+
+
+@contextmanager
+def suivre(personnes):
+    """
+    Répercute sur l'instantané les modifications faites dans le bloc sur le
+    queryset ``personnes`` (``update()`` n'émet pas de signal). Deux parcours
+    des personnes concernées, quel que soit leur nombre.
+    """
+    avant = contributions(personnes)
+    yield
+    appliquer(difference(contributions(personnes), avant))
+
+
+def reconstruire(personnes=None):
+    """Recalcule tout l'instantané depuis la table ; renvoie le nombre de lignes écrites."""
+    maintenant = timezone.now()
+    totaux = contributions(PersonneVulnerable.objects.all() if personnes is None else personnes)
+    totaux[('total', CLE_TOTAL)]  # La ligne « total » existe même sans personne
+    with transaction.atomic():
+        StatistiquePopulation.objects.all().delete()
+        StatistiquePopulation.objects.bulk_create([
+            StatistiquePopulation(
+                dimension=dimension, cle=cle, date_maj=maintenant, date_reconstruction=maintenant,
+                **dict(zip(COMPTEURS, compteurs)),
+            )
+            for (dimension, cle), compteurs in totaux.items()
+        ])
+    return len(totaux)
+
+
+# ---------------------------------------------------------------------------
+# Lecture
+# ---------------------------------------------------------------------------
+
+def statistiques_population(tranches=None):
+    """
+    Statistiques lues dans l'instantané (une requête), mêmes structures que
+    ``calculer_statistiques``, plus ``statistiques_maj`` (dernier incrément) et
+    ``statistiques_reconstruites`` (dernière reconstruction complète).
+    """
+    lignes = list(StatistiquePopulation.objects.all())
+    if not any(ligne.dimension == 'total' for ligne in lignes):
+        # Instantané absent (base neuve ou vidée) : construit au premier affichage
+        reconstruire()
+        lignes = list(StatistiquePopulation.objects.all())
+
+    compteurs = {dimension: {} for dimension in DIMENSIONS}
+    for ligne in lignes:
+        valeur = json.loads(ligne.cle)
+        compteurs[ligne.dimension][valeur] = [getattr(ligne, champ) for champ in COMPTEURS]
+        if ligne.dimension == 'total':
+            reconstruction = ligne.date_reconstruction
+
+    stats = mettre_en_forme(compteurs, tranches)
+    stats['statistiques_maj'] = max(ligne.date_maj for ligne in lignes)
+    stats['statistiques_reconstruites'] = reconstruction
+    return stats
+
+
+def _ajouter_pourcentages(stats_entite):
+    """Pourcentages de vulnérables / non vulnérables de chaque entité."""
+    for stat in stats_entite:
+        total = stat['total']
+        if total:
+            stat['pourcentage_vulnerables'] = round((stat['total_vulnerables'] * 100) / total, 2)
+            stat['pourcentage_non_vulnerables'] = round((stat['total_non_vulnerables'] * 100) / total, 2)
+        else:
+            stat['pourcentage_vulnerables'] = 0
+            stat['pourcentage_non_vulnerables'] = 0
+
+
+def _regrouper_ages(par_age, bornes):
+    """Compteurs par âge → compteurs par tranche (toutes les tranches, âge inconnu à part)."""
+    tranches = [[0] * len(COMPTEURS) for _ in bornes]
+    inconnu = par_age.pop(None, None)
+    for age, compteurs in par_age.items():
+        tranche = tranches[max(bisect_right(bornes, age) - 1, 0)]
+        for i, n in enumerate(compteurs):
+            tranche[i] += n
+    lignes = [] if inconnu is None else [({'age': None, 'age_min': None, 'age_max': None}, inconnu)]
+    for i, (borne, compteurs) in enumerate(zip(bornes, tranches)):
+        fin = bornes[i + 1] - 1 if i + 1 < len(bornes) else None
+        libelle = f"{borne}-{fin}" if fin is not None else f"{borne}+"
+        lignes.append(({'age': libelle, 'age_min': borne, 'age_max': fin}, compteurs))
+    return lignes
+
+
+def mettre_en_forme(compteurs, tranches=None):
+    """
+    Structures consommées par les tableaux de bord, à partir des compteurs par
+    dimension (``{dimension: {valeur: [COMPTEURS]}}``, cf. agregation.py).
+    """
+    tranches = tranches_age() if tranches is None else tuple(tranches)
+    non_vides = {
+        dimension: {valeur: c for valeur, c in par_valeur.items() if c[0] or c[1]}
+        for dimension, par_valeur in compteurs.items()
+    }
+    total = compteurs['total'].get(None) or [0] * len(COMPTEURS)
+
+    def repartition(dimension, champ):
+        return [
+            {champ: valeur, 'total_vulnerables': c[0], 'total_non_vulnerables': c[1]}
+            for valeur, c in sorted(non_vides[dimension].items(), key=lambda item: str(item[0]))
+        ]
+
+    stats_entite = repartition('entite', 'entite')
+    for stat in stats_entite:
+        stat['total'] = stat['total_vulnerables'] + stat['total_non_vulnerables']
+    _ajouter_pourcentages(stats_entite)
+
+    if tranches:
+        stats_age = [
+            {**tranche, 'total_vulnerables': c[0], 'total_non_vulnerables': c[1]}
+            for tranche, c in _regrouper_ages(dict(non_vides['age']), tranches)
+        ]
+    else:
+        # Âges croissants, âge inconnu en tête (comme ORDER BY age sous SQLite)
+        stats_age = [
+            {'age': age, 'total_vulnerables': c[0], 'total_non_vulnerables': c[1]}
+            for age, c in sorted(non_vides['age'].items(), key=lambda item: (item[0] is not None, item[0] or 0))
+        ]
+
+    return {
+        'stats_region': repartition('region', 'region_geographique'),
+        'stats_pauvrete': [
+            {'est_vulnerable': est_vulnerable, 'total': nombre}
+            for est_vulnerable, nombre in ((False, total[1]), (True, total[0])) if nombre
+        ],
+        'stats_entite': stats_entite,
+        'stats_sexe': repartition('sexe', 'sexe'),
+        'stats_age': stats_age,
+        'stats_enfants': {
+            'enfants_vulnerables': total[2] if total[0] else None,
+            'enfants_non_vulnerables': total[3] if total[1] else None,
+        },
+        'nombre_personnes_total': total[0] + total[1],
+        'nombre_personnes_aidees': total[4],
+        'nombre_personnes_vulnerables': total[0],
+    }
@@ -1,3 +1,301 @@
-from django.test import TestCase
+import gzip
+import json
+import os
+import tempfile
+from decimal import Decimal
+from importlib import import_module
 
-# Create your tests here.
+from django.apps import apps
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from notifications.models import Notification
+from users.models import PersonneVulnerable, User
+from . import agregation, geo, statistiques
+from .benchmarks import statistiques_par_requetes
+from .distribution import RepartitionImpossible, repartir_don, retirer_allocations, totaux_personne
+from .models import AllocationDon, Don, StatistiquePopulation
+
+
+@override_settings(DONS_OBJECTIF_FINANCEMENT=1000)
+class RepartitionTests(TestCase):
+    def setUp(self):
+        self.donateur = User.objects.create(username='donateur')
+
+    def personnes(self, n, entite='veuve', avec_compte=True, **kwargs):
+        champs = {'est_vulnerable': True, 'validated_by_admin': True, **kwargs}
+        personnes = []
+        for i in range(n):
+            user = User.objects.create(username=f'u{User.objects.count()}') if avec_compte else None
+            personnes.append(PersonneVulnerable.objects.create(
+                user=user, first_name=f"P{i}", last_name="Test", entite=entite, **champs,
+            ))
+        return personnes
+
+    def don(self, montant, entite='veuve', personnes=()):
+        don = Don.objects.create(
+            donateur=self.donateur, entite_vulnerable=entite, montant=montant, provenance='-', description='-',
+        )
+        don.personne_vulnerable.set(personnes)
+        return don
+
+    def test_entity_gift_is_split_and_linked(self):
+        personnes = self.personnes(3)
+        self.personnes(1, est_vulnerable=False)
+        PersonneVulnerable.objects.filter(pk=personnes[0].pk).update(montant_recu=Decimal('900'))
+
+        result = repartir_don(self.don(Decimal('300.00')))
+
+        self.assertEqual((result['beneficiaires'], result['part'], result['sortis_de_vulnerabilite']),
+                         (3, Decimal('100.00'), 1))
+        recus = dict(PersonneVulnerable.objects.filter(dons=result['don']).values_list('pk', 'montant_recu'))
+        self.assertEqual(recus, {personnes[0].pk: Decimal('1000.00'), personnes[1].pk: Decimal('100.00'),
+                                 personnes[2].pk: Decimal('100.00')})
+        personnes[0].refresh_from_db()
+        self.assertFalse(personnes[0].est_vulnerable)
+        self.assertTrue(Don.objects.filter(pk=result['don'], est_valide=True, est_reparti=True).exists())
+        # Une notification par bénéficiaire, plus celle du donateur
+        self.assertEqual(Notification.objects.count(), 4)
+        self.assertIn("Félicitations", Notification.objects.get(user=personnes[0].user).message)
+
+    def test_targeted_gift_only_reaches_selected_people(self):
+        personnes = self.personnes(4, avec_compte=False)
+        result = repartir_don(self.don(Decimal('100.00'), personnes=personnes[:3]))
+        self.assertEqual((result['beneficiaires'], result['part']), (3, Decimal('33.33')))
+        personnes[3].refresh_from_db()
+        self.assertEqual(personnes[3].montant_recu, Decimal('0'))
+        self.assertEqual(Notification.objects.get().user, self.donateur)
+
+    def test_gift_is_never_distributed_twice(self):
+        self.personnes(2)
+        don = self.don(Decimal('100.00'))
+        repartir_don(don)
+        with self.assertRaises(RepartitionImpossible):
+            repartir_don(don)
+        self.assertEqual(sum(PersonneVulnerable.objects.values_list('montant_recu', flat=True)), Decimal('100.00'))
+
+    def test_entity_without_beneficiary_rolls_back(self):
+        don = self.don(Decimal('100.00'), entite='senior')
+        with self.assertRaises(RepartitionImpossible):
+            repartir_don(don)
+        don.refresh_from_db()
+        self.assertFalse(don.est_reparti or don.est_valide)
+        self.assertFalse(Notification.objects.exists())
+
+    def test_query_count_does_not_grow_with_beneficiaries(self):
+        def queries(n, entite):
+            self.personnes(n, entite=entite)
+            don = Don.objects.select_related('donateur').get(pk=self.don(Decimal('1000'), entite=entite).pk)
+            with CaptureQueriesContext(connection) as ctx:
+                repartir_don(don)
+            return len(ctx.captured_queries)
+
+        self.assertEqual(queries(2, 'orphelin'), queries(40, 'veuve'))
+
+    def test_distribution_writes_one_allocation_per_beneficiary(self):
+        personnes = self.personnes(3, avec_compte=False)
+        don = self.don(Decimal('100.00'))
+        repartir_don(don)
+        self.assertEqual(
+            sorted(AllocationDon.objects.filter(don=don).values_list('personne_id', 'montant', 'est_retire')),
+            [(p.pk, Decimal('33.33'), False) for p in personnes],
+        )
+        repartir_don(self.don(Decimal('50.00'), personnes=personnes[:1]))
+        self.assertEqual(totaux_personne(personnes[0]),
+                         {'recu': Decimal('83.33'), 'retire': Decimal('0.00'), 'a_retirer': Decimal('83.33')})
+
+    def test_withdrawal_is_tracked_per_beneficiary(self):
+        personnes = self.personnes(2, avec_compte=False)
+        don = self.don(Decimal('100.00'))
+        repartir_don(don)
+
+        self.assertEqual(retirer_allocations(personnes[0]), 1)
+        self.assertEqual(retirer_allocations(personnes[0]), 0)
+        don.refresh_from_db()
+        # L'autre bénéficiaire n'a pas encore retiré sa part
+        self.assertFalse(don.est_retires)
+        self.assertEqual(totaux_personne(personnes[1])['a_retirer'], Decimal('50.00'))
+
+        retirer_allocations(personnes[1], dons=[don])
+        don.refresh_from_db()
+        self.assertTrue(don.est_retires)
+        self.assertEqual(totaux_personne(personnes[0])['retire'], Decimal('50.00'))
+
+    def test_withdrawal_api_reads_the_allocation_ledger(self):
+        beneficiaire, autre = self.personnes(2)
+        don = self.don(Decimal('100.00'))
+        repartir_don(don)
+        # Lien M2M retiré : le registre des parts suffit à autoriser le retrait
+        don.personne_vulnerable.clear()
+        client = APIClient()
+        url = reverse('withdraw_donation_api')
+
+        client.force_authenticate(self.donateur)
+        self.assertEqual(client.post(url, {'donation_id': don.pk}, format='json').status_code, 404)
+        client.force_authenticate(beneficiaire.user)
+        self.assertEqual(client.post(url, {'donation_id': don.pk}, format='json').status_code, 200)
+        self.assertEqual(totaux_personne(beneficiaire)['retire'], Decimal('50.00'))
+        self.assertEqual(totaux_personne(autre)['retire'], Decimal('0.00'))
+
+
+@override_settings(DONS_OBJECTIF_FINANCEMENT=1000)
+class StatistiquesPopulationTests(TestCase):
+    LISTES = {
+        'stats_region': 'region_geographique', 'stats_pauvrete': 'est_vulnerable', 'stats_entite': 'entite',
+        'stats_sexe': 'sexe', 'stats_age': 'age',
+    }
+
+    def normaliser(self, stats):
+        stats = {cle: stats[cle] for cle in statistiques.calculer_statistiques()}
+        for cle, champ in self.LISTES.items():
+            stats[cle] = sorted(stats[cle], key=lambda ligne: str(ligne[champ]))
+        return stats
+
+    def assertInstantaneExact(self):
+        self.assertEqual(self.normaliser(statistiques.statistiques_population()),
+                         self.normaliser(statistiques.calculer_statistiques()))
+
+    def personne(self, **champs):
+        return PersonneVulnerable.objects.create(first_name="P", last_name="Test", **champs)
+
+    def test_snapshot_follows_saves_deletes_and_distributions(self):
+        self.personne(entite='veuve', sexe='Femme', age=34, nombre_enfants=3, est_vulnerable=True,
+                      region_geographique='Lagunes', validated_by_admin=True)
+        autre = self.personne(entite='veuve', age=34, nombre_enfants=1, est_vulnerable=True, validated_by_admin=True)
+        sortante = self.personne(entite='chomeur', region_geographique='Savanes', est_vulnerable=False)
+        self.assertInstantaneExact()
+
+        autre.region_geographique, autre.age = 'Zanzan', 61
+        autre.save()
+        sortante.delete()
+        self.assertInstantaneExact()
+
+        # update() en masse de la répartition : une personne aidée, l'autre sort de la vulnérabilité
+        PersonneVulnerable.objects.filter(pk=autre.pk).update(montant_recu=Decimal('900'))
+        statistiques.reconstruire()
+        don = Don.objects.create(donateur=User.objects.create(username='donateur'), entite_vulnerable='veuve',
+                                 montant=Decimal('200'), provenance='-', description='-')
+        repartir_don(don)
+        self.assertInstantaneExact()
+        stats = statistiques.statistiques_population()
+        self.assertEqual((stats['nombre_personnes_vulnerables'], stats['nombre_personnes_aidees']), (1, 1))
+
+    def test_unrelated_partial_save_is_ignored(self):
+        personne = self.personne(entite='senior', est_vulnerable=True)
+        avant = statistiques.statistiques_population()['statistiques_maj']
+        personne.analyse_statut = PersonneVulnerable.ANALYSE_EN_ATTENTE
+        with self.assertNumQueries(1):
+            personne.save(update_fields=['analyse_statut'])
+        self.assertEqual(statistiques.statistiques_population()['statistiques_maj'], avant)
+
+    def test_snapshot_is_read_in_one_query_and_rebuilt_when_missing(self):
+        self.personne(entite='orphelin', age=9, est_vulnerable=True)
+        StatistiquePopulation.objects.all().delete()
+        self.assertEqual(statistiques.statistiques_population()['nombre_personnes_total'], 1)
+        with self.assertNumQueries(1):
+            stats = statistiques.statistiques_population()
+        self.assertEqual(stats['stats_age'][0],
+                         {'age': '0-17', 'age_min': 0, 'age_max': 17, 'total_vulnerables': 1, 'total_non_vulnerables': 0})
+        self.assertIsNotNone(stats['statistiques_reconstruites'])
+
+    def population(self):
+        for i, (entite, region, sexe, age) in enumerate([
+            ('veuve', 'Lagunes', 'Femme', 34), ('veuve', None, 'Femme', 34), ('chomeur', 'Lagunes', 'Homme', None),
+            ('orphelin', 'Zanzan', 'Homme', 9), ('senior', 'Savanes', 'Femme', 71), ('chomeur', 'Zanzan', 'Homme', 40),
+        ]):
+            self.personne(entite=entite, region_geographique=region, sexe=sexe, age=age, nombre_enfants=i,
+                          est_vulnerable=i % 3 != 2, montant_recu=Decimal(500 * (i % 2)))
+
+    def test_single_pass_aggregation_matches_per_dimension_queries(self):
+        self.population()
+        self.assertEqual(self.normaliser(statistiques.calculer_statistiques(tranches=())),
+                         self.normaliser(statistiques_par_requetes()))
+
+        # Lecture par petits lots : les index de valeurs grandissent d'un lot à l'autre
+        personnes = PersonneVulnerable.objects.all()
+        self.assertEqual(agregation._agreger_par_balayage(personnes, connection, taille_lot=2),
+                         agregation.agreger(personnes))
+        self.assertEqual(agregation.agreger(PersonneVulnerable.objects.none())['total'], {})
+
+    def test_initial_migration_snapshot_matches_rebuild(self):
+        self.population()
+        migration = import_module('donations.migrations.0008_statistiquepopulation')
+        StatistiquePopulation.objects.all().delete()
+        migration.construire_instantane(apps, None)
+        compteurs = ('dimension', 'cle') + statistiques.COMPTEURS
+        instantane = set(StatistiquePopulation.objects.values_list(*compteurs))
+        statistiques.reconstruire()
+        self.assertEqual(instantane, set(StatistiquePopulation.objects.values_list(*compteurs)))
+
+    @override_settings(DONS_TRANCHES_AGE='60, 18')
+    def test_ages_are_binned(self):
+        self.population()
+        stats_age = statistiques.calculer_statistiques()['stats_age']
+        self.assertEqual([(s['age'], s['total_vulnerables'], s['total_non_vulnerables']) for s in stats_age],
+                         [(None, 0, 1), ('18-59', 3, 1), ('60+', 1, 0)])
+        self.assertEqual(statistiques.statistiques_population()['stats_age'], stats_age)
+
+    def test_map_api_serves_compressed_payload_with_etag(self):
+        self.personne(entite='veuve', region_geographique='Lagunes', est_vulnerable=True)
+        reponse = self.client.get(reverse('carte_api'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(reponse['Content-Encoding'], 'gzip')
+        regions = {r['name']: r for r in json.loads(gzip.decompress(reponse.content))}
+        self.assertEqual(regions['Lagunes']['total_vulnerables'], 1)
+        self.assertEqual(self.client.get(reverse('carte_api'), HTTP_IF_NONE_MATCH=reponse['ETag']).status_code, 304)
+
+
+class ReferentielGeoTests(SimpleTestCase):
+    def fichier(self, regions):
+        fd, chemin = tempfile.mkstemp(suffix='.json')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump({'regions': regions}, f)
+        self.addCleanup(os.remove, chemin)
+        return chemin
+
+    def reecrire(self, chemin, contenu):
+        with open(chemin, 'w', encoding='utf-8') as f:
+            f.write(contenu)
+        os.utime(chemin, ns=(os.stat(chemin).st_atime_ns, os.stat(chemin).st_mtime_ns + 10**9))
+
+    def test_shipped_file_is_indexed_once(self):
+        ref = geo.referentiel()
+        self.assertIs(geo.referentiel(), ref)
+        self.assertEqual(len(ref.regions), 19)
+        self.assertEqual(ref.par_nom['Lagunes'].lat, 5.86667)
+        self.assertEqual(ref.choix, tuple(sorted(ref.choix)))
+        self.assertEqual(json.loads(gzip.decompress(ref.payload_gzip)), json.loads(ref.payload))
+
+    def test_map_join_and_payload_cache(self):
+        ref = geo.ReferentielGeo(json.dumps({'regions': [{'name': 'Lacs', 'lat': '7', 'lng': '-5'},
+                                                         {'name': 'Zanzan', 'lat': '8', 'lng': '-3'}]}))
+        stats = [{'region_geographique': 'Zanzan', 'total_vulnerables': 4, 'total_non_vulnerables': 1},
+                 {'region_geographique': None, 'total_vulnerables': 2, 'total_non_vulnerables': 0}]
+        carte = ref.carte(stats, cle='v1')
+        self.assertEqual([(r['name'], r['total_vulnerables'], r['total_non_vulnerables']) for r in carte.regions],
+                         [('Lacs', 0, 0), ('Zanzan', 4, 1)])
+        self.assertEqual(json.loads(gzip.decompress(carte.gzip)), carte.regions)
+        self.assertIs(ref.carte([], cle='v1'), carte)
+        self.assertIsNot(ref.carte(stats, cle='v2'), carte)
+
+    def test_reloads_on_change_and_keeps_last_valid_version(self):
+        chemin = self.fichier([{'name': 'Lacs', 'lat': 7, 'lng': -5}])
+        premier = geo.referentiel(chemin)
+        self.assertEqual(list(premier.par_nom), ['Lacs'])
+
+        self.reecrire(chemin, json.dumps({'regions': [{'name': 'Lacs'}, {'name': 'Savanes', 'lat': 9, 'lng': -6}]}))
+        second = geo.referentiel(chemin)
+        self.assertEqual(list(second.par_nom), ['Lacs', 'Savanes'])
+
+        self.reecrire(chemin, json.dumps({'regions': [{'name': 'Lacs'}, {'name': 'Lacs'}]}))
+        with self.assertLogs('donations.geo', 'ERROR'):
+            self.assertIs(geo.referentiel(chemin), second)
+        self.assertIs(geo.referentiel(chemin), second)
+
+    def test_invalid_coordinates_are_rejected(self):
+        with self.assertRaises(geo.ReferentielInvalide):
+            geo.ReferentielGeo(json.dumps({'regions': [{'name': 'Lacs', 'lat': 'nord', 'lng': 0}]}))
+        with self.assertRaises(geo.ReferentielInvalide):
+            geo.ReferentielGeo(json.dumps({'regions': [{'name': 'Lacs', 'lat': 95, 'lng': 0}]}))
@@ -18,6 +18,7 @@ urlpatterns = [
     path('mes-dons-en-attente/', views.mes_dons_en_attente, name='mes_dons_en_attente'),
     path('dashboard/', views.dashboard_donateur, name='dashboard_donateur'),
     path('dashboard_api/', dashboard_api, name='dashboard_api'),
+    path('carte_api/', views.carte_api, name='carte_api'),
     path('api/dons-en-attente/', dons_en_attente_api, name='dons_en_attente_api'),
     path('api/mes-dons/', views.mes_dons_api, name='mes_dons_api'),
     path('api/create-don/', views.create_don_api, name='create_don_api'),
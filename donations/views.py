@@ -15,8 +15,8 @@ from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.contrib.admin.views.decorators import staff_member_required
 from django.db import models, transaction
-from django.db.models import Count, Case, When, IntegerField, Sum, Q
-from django.http import JsonResponse
+from django.db.models import Sum
+from django.http import HttpResponse, JsonResponse
 from django.shortcuts import render, redirect, get_object_or_404
 from django.utils import timezone
 from django.views.decorators.csrf import csrf_exempt
@@ -28,8 +28,11 @@ from rest_framework.permissions import AllowAny, IsAuthenticated, IsAdminUser
 from rest_framework.response import Response
 
 # Local imports
+from . import geo
+from .distribution import RepartitionImpossible, repartir_don, retirer_allocations, totaux_personne
+from .statistiques import statistiques_population
 from .forms import DonationForm
-from .models import Don, PersonneVulnerable
+from .models import AllocationDon, Don, PersonneVulnerable
 from .serializers import DonSerializer
 from notifications.models import Notification
 from users.models import PersonneVulnerable
@@ -153,34 +156,6 @@ def _associate_vulnerable_people(don, form):
     print(f"Don sauvegardé avec {don.personne_vulnerable.count()} personne(s) associée(s)")
 
 
-def _distribute_donation_amount(don, form):
-    """Distribute donation amount among vulnerable people."""
-    personne_vulnerable = form.cleaned_data['personne_vulnerable']
-
-    if personne_vulnerable:
-        # Donor selected specific people
-        montant_par_personne = don.montant / len(personne_vulnerable)
-        for personne in personne_vulnerable:
-            don.personne_vulnerable.add(personne)
-            personne.montant_recu += montant_par_personne
-            personne.save()
-    else:
-        # Distribute among all vulnerable people in the entity
-        personnes = PersonneVulnerable.objects.filter(
-            entite=don.entite_vulnerable,
-            est_vulnerable=True,
-            validated_by_admin=True
-        )
-        if personnes.exists():
-            montant_par_personne = don.montant / personnes.count()
-            for personne in personnes:
-                don.personne_vulnerable.add(personne)
-                personne.montant_recu += montant_par_personne
-                personne.save()
-
-    don.save()
-
-
 @staff_member_required
 def liste_dons_attente(request):
     """Display pending donations for admin validation."""
@@ -191,41 +166,17 @@ def liste_dons_attente(request):
 @staff_member_required
 def repartir_don_admin(request, don_id):
     """Admin action to validate and distribute a donation."""
-    don = get_object_or_404(Don, pk=don_id)
-
-    if not don.est_valide:
-        with transaction.atomic():
-            don.est_valide = True
-            don.est_reparti = True
-            don.save()
-
-            # Process each vulnerable person
-            for personne in don.personne_vulnerable.all():
-                personne.montant_recu = (personne.montant_recu or Decimal('0.00')) + don.montant
-
-                if personne.montant_recu >= Decimal('200000.00'):
-                    personne.est_vulnerable = False
-                    message = f"{personne.user.username} n'est plus considéré comme vulnérable."
-                else:
-                    message = f"Le don de {don.montant} € a été réparti à {personne.user.username}."
-
-                personne.save()
-
-                # Notify vulnerable person
-                Notification.objects.create(
-                    user=personne.user,
-                    message=f"Vous avez reçu un don de {don.montant} € de {don.donateur.username}. {message}"
-                )
-
-            # Notify donor
-            Notification.objects.create(
-                user=don.donateur,
-                message=f"Votre don de {don.montant} € a été validé et réparti avec succès."
-            )
-
-            messages.success(request, f"Le don de {don.montant} € a été validé et réparti.")
+    don = get_object_or_404(Don.objects.select_related('donateur'), pk=don_id)
+
+    try:
+        repartition = repartir_don(don)
+    except RepartitionImpossible as e:
+        messages.warning(request, str(e))
     else:
-        messages.warning(request, "Ce don a déjà été validé.")
+        messages.success(
+            request,
+            f"Le don de {don.montant} € a été validé et réparti entre {repartition['beneficiaires']} personne(s)."
+        )
 
     return redirect('liste_dons_attente')
 
@@ -278,50 +229,26 @@ def voir_retirer_dons(request):
     except PersonneVulnerable.DoesNotExist:
         return redirect('home')
 
-    dons_a_retirer = Don.objects.filter(
-        personne_vulnerable=personne,
-        est_reparti=True,
-        est_retires=False
-    )
-
-    dons_recus = []
-    total_retirer = Decimal('0.00')
-
-    for don in dons_a_retirer:
-        montant_par_personne = _calculate_amount_per_person(don, personne)
-        total_retirer += montant_par_personne
-
-        dons_recus.append({
-            'don': don,
-            'montant_recu': montant_par_personne,
-        })
+    # Parts non retirées, lues dans le registre des allocations (cf. distribution.py)
+    allocations = AllocationDon.objects.filter(
+        personne=personne,
+        est_retire=False
+    ).select_related('don__donateur').order_by('-don__date_don')
 
-    dons_retires = Don.objects.filter(personne_vulnerable=personne, est_retires=True)
-    total_retires = dons_retires.aggregate(total=Sum('montant'))['total'] or Decimal('0.00')
+    dons_recus = [
+        {'don': allocation.don, 'montant_recu': allocation.montant}
+        for allocation in allocations
+    ]
+    totaux = totaux_personne(personne)
 
     context = {
         'dons': dons_recus,
-        'total_retirer': total_retirer,
-        'total_retires': total_retires,
+        'total_retirer': totaux['a_retirer'],
+        'total_retires': totaux['retire'],
     }
     return render(request, 'donations/voir_retirer_dons.html', context)
 
 
-def _calculate_amount_per_person(don, personne):
-    """Calculate the amount a specific person receives from a donation."""
-    if don.personne_vulnerable.exists():
-        nombre_personnes = don.personne_vulnerable.count()
-        if nombre_personnes > 0:
-            return don.montant / nombre_personnes
-    else:
-        personnes_entite = don.entite_vulnerable.personnevulnerable_set.filter(est_vulnerable=True)
-        nombre_personnes = personnes_entite.count()
-        if nombre_personnes > 0:
-            return don.montant / nombre_personnes
-
-    return Decimal('0.00')
-
-
 @login_required
 def retirer_don(request, don_id):
     """Mark a donation as withdrawn by vulnerable person."""
@@ -333,12 +260,11 @@ def retirer_don(request, don_id):
     don = get_object_or_404(
         Don,
         pk=don_id,
-        personne_vulnerable=personne,
+        allocations__personne=personne,
         est_reparti=True
     )
 
-    don.est_retires = True
-    don.save()
+    retirer_allocations(personne, dons=[don])
 
     messages.success(request, "Le don a été retiré avec succès.")
     return redirect('voir_retirer_dons')
@@ -352,13 +278,7 @@ def retirer_tous_les_dons(request):
     except PersonneVulnerable.DoesNotExist:
         return redirect('home')
 
-    dons_a_retirer = Don.objects.filter(
-        personne_vulnerable=personne,
-        est_reparti=True,
-        est_retires=False
-    )
-
-    dons_a_retirer.update(est_retires=True)
+    retirer_allocations(personne)
 
     messages.success(request, "Tous vos dons ont été retirés avec succès.")
     return redirect('voir_retirer_dons')
@@ -424,13 +344,8 @@ def get_personnes_vulnerables(request, entite):
 @login_required
 def dashboard_donateur(request):
     """Display donor dashboard with statistics and visualizations."""
-    # Load regions data
-    with open('donations/json_ci/IvoryCoast.json', encoding='utf-8') as f:
-        data_json = json.load(f)
-    regions_data_raw = data_json.get("regions", [])
-
     # Get statistics
-    stats = _get_dashboard_statistics()
+    stats = statistiques_population()
 
     # Get last three vulnerable people
     last_three_vulnerables = PersonneVulnerable.objects.filter(
@@ -448,8 +363,8 @@ def dashboard_donateur(request):
             'pourcentage_vulnerabilite': vulnerability_percentage
         })
 
-    # Process regions data
-    regions_data = _process_regions_data(regions_data_raw, stats['stats_region'])
+    # Regions joined with statistics, serialized once per snapshot version (cf. geo.py)
+    carte = _carte(stats)
 
     # Calculate vulnerability rate
     globalVuln = next((stat['total'] for stat in stats['stats_pauvrete'] if stat['est_vulnerable'] is True), 0)
@@ -458,7 +373,7 @@ def dashboard_donateur(request):
     taux_vulnerabilite = (globalVuln / totalPersons * 100) if totalPersons > 0 else 0
 
     context = {
-        'regions_data': json.dumps(regions_data),
+        'regions_data': carte.json.decode('utf-8'),
         'stats_pauvrete': json.dumps(stats['stats_pauvrete']),
         'stats_region': json.dumps(stats['stats_region']),
         'stats_entite': json.dumps(stats['stats_entite']),
@@ -469,134 +384,22 @@ def dashboard_donateur(request):
         'nombre_personnes_aidees': stats['nombre_personnes_aidees'],
         'nombre_personnes_vulnerables': stats['nombre_personnes_vulnerables'],
         'taux_vulnerabilite': round(taux_vulnerabilite, 2),
-        'last_three_list': json.dumps(last_three_list)
+        'last_three_list': json.dumps(last_three_list),
+        'statistiques_maj': stats['statistiques_maj'],
     }
 
     return render(request, 'donations/dashboard_donateur.html', context)
 
 
-def _get_dashboard_statistics():
-    """Get all statistics for dashboard."""
-    stats_region = list(
-        PersonneVulnerable.objects
-        .values('region_geographique')
-        .annotate(
-            total_vulnerables=Count(
-                Case(When(est_vulnerable=True, then=1), output_field=IntegerField())
-            ),
-            total_non_vulnerables=Count(
-                Case(When(est_vulnerable=False, then=1), output_field=IntegerField())
-            )
-        )
-    )
-
-    stats_pauvrete = list(
-        PersonneVulnerable.objects
-        .values('est_vulnerable')
-        .annotate(total=Count('id'))
-    )
-
-    stats_entite = list(
-        PersonneVulnerable.objects
-        .values('entite')
-        .annotate(
-            total_vulnerables=Count('id', filter=Q(est_vulnerable=True)),
-            total_non_vulnerables=Count('id', filter=Q(est_vulnerable=False)),
-            total=Count('id')
-        )
-    )
-
-    # Calculate percentages for each entity
-    for stat in stats_entite:
-        total = stat['total']
-        if total:
-            stat['pourcentage_vulnerables'] = round((stat['total_vulnerables'] * 100) / total, 2)
-            stat['pourcentage_non_vulnerables'] = round((stat['total_non_vulnerables'] * 100) / total, 2)
-        else:
-            stat['pourcentage_vulnerables'] = 0
-            stat['pourcentage_non_vulnerables'] = 0
-
-    stats_sexe = list(
-        PersonneVulnerable.objects
-        .values('sexe')
-        .annotate(
-            total_vulnerables=Count('id', filter=Q(est_vulnerable=True)),
-            total_non_vulnerables=Count('id', filter=Q(est_vulnerable=False))
-        )
-    )
-
-    stats_age = list(
-        PersonneVulnerable.objects
-        .values('age')
-        .annotate(
-            total_vulnerables=Count('id', filter=Q(est_vulnerable=True)),
-            total_non_vulnerables=Count('id', filter=Q(est_vulnerable=False))
-        )
-        .order_by('age')
-    )
-
-    stats_enfants = PersonneVulnerable.objects.aggregate(
-        enfants_vulnerables=Sum('nombre_enfants', filter=Q(est_vulnerable=True)),
-        enfants_non_vulnerables=Sum('nombre_enfants', filter=Q(est_vulnerable=False))
-    )
-
-    nombre_personnes_total = PersonneVulnerable.objects.count()
-    nombre_personnes_aidees = PersonneVulnerable.objects.filter(
-        est_vulnerable=True,
-        montant_recu__gt=0
-    ).count()
-    nombre_personnes_vulnerables = PersonneVulnerable.objects.filter(est_vulnerable=True).count()
-
-    return {
-        'stats_region': stats_region,
-        'stats_pauvrete': stats_pauvrete,
-        'stats_entite': stats_entite,
-        'stats_sexe': stats_sexe,
-        'stats_age': stats_age,
-        'stats_enfants': stats_enfants,
-        'nombre_personnes_total': nombre_personnes_total,
-        'nombre_personnes_aidees': nombre_personnes_aidees,
-        'nombre_personnes_vulnerables': nombre_personnes_vulnerables,
-    }
-
-
-def _process_regions_data(regions_data_raw, stats_region):
-    """Process regions data with statistics."""
-    regions_data = []
-    for region_raw in regions_data_raw:
-        region_name = region_raw.get("name")
-        if not region_name:
-            continue
-
-        found_stats = next(
-            (s for s in stats_region if s["region_geographique"] == region_name),
-            None
-        )
-
-        total_vuln = found_stats["total_vulnerables"] if found_stats else 0
-        total_nonvuln = found_stats["total_non_vulnerables"] if found_stats else 0
-
-        regions_data.append({
-            "name": region_name,
-            "lat": float(region_raw.get("lat", 0)),
-            "lng": float(region_raw.get("lng", 0)),
-            "total_vulnerables": total_vuln,
-            "total_non_vulnerables": total_nonvuln
-        })
-
-    return regions_data
+def _carte(stats):
+    """Map payload for the statistics snapshot ``stats``."""
+    return geo.carte(stats['stats_region'], (stats['statistiques_maj'], stats['statistiques_reconstruites']))
 
 
 def dashboard_api(request):
     """API endpoint for dashboard data."""
-    stats = _get_dashboard_statistics()
-
-    # Load regions data
-    with open('donations/json_ci/IvoryCoast.json', encoding='utf-8') as f:
-        data_json = json.load(f)
-    regions_data_raw = data_json.get("regions", [])
-
-    regions_data = _process_regions_data(regions_data_raw, stats['stats_region'])
+    stats = statistiques_population()
+    regions_data = _carte(stats).regions
 
     # Calculate vulnerability rate
     globalVuln = next((stat['total'] for stat in stats['stats_pauvrete'] if stat['est_vulnerable'] is True), 0)
@@ -618,11 +421,31 @@ def dashboard_api(request):
         'taux_vulnerabilite': round(taux_vulnerabilite, 2),
         'stats_pauvrete_vulnerables': globalVuln,
         'stats_pauvrete_non_vulnerables': globalNonVuln,
+        'statistiques_maj': stats['statistiques_maj'],
+        'statistiques_reconstruites': stats['statistiques_reconstruites'],
     }
 
     return JsonResponse(data)
 
 
+def carte_api(request):
+    """
+    Map payload (regions with their statistics), served pre-serialized and,
+    when the client accepts it, pre-compressed; ETag / 304 support.
+    """
+    carte = _carte(statistiques_population())
+    if carte.etag in request.headers.get('If-None-Match', ''):
+        response = HttpResponse(status=304)
+    elif 'gzip' in request.headers.get('Accept-Encoding', ''):
+        response = HttpResponse(carte.gzip, content_type='application/json')
+        response['Content-Encoding'] = 'gzip'
+    else:
+        response = HttpResponse(carte.json, content_type='application/json')
+    response['ETag'] = carte.etag
+    response['Vary'] = 'Accept-Encoding'
+    return response
+
+
 def donation_stats_api(request):
     """API endpoint for donation statistics."""
     total_personnes = PersonneVulnerable.objects.filter(
@@ -702,20 +525,24 @@ def validate_don_api(request, donation_id):
             status=status.HTTP_400_BAD_REQUEST
         )
 
-    with transaction.atomic():
-        don.est_reparti = True
-        don.est_valide = True
-        don.save()
-
-        # Create notification for donor
-        Notification.objects.create(
-            user=don.donateur,
-            message=f"Votre don de {don.montant} € a été validé."
+    # Validation et répartition entre les bénéficiaires (cf. distribution.py)
+    try:
+        repartition = repartir_don(don)
+    except RepartitionImpossible as e:
+        return Response(
+            {"success": False, "message": str(e)},
+            status=status.HTTP_400_BAD_REQUEST
         )
 
     serializer = DonSerializer(don)
     return Response(
-        {"success": True, "message": "Don validé avec succès", "don": serializer.data},
+        {
+            "success": True,
+            "message": "Don validé avec succès",
+            "don": serializer.data,
+            "beneficiaires": repartition['beneficiaires'],
+            "montant_par_personne": str(repartition['part']),
+        },
         status=status.HTTP_200_OK
     )
 
@@ -745,25 +572,24 @@ def withdraw_donation_api(request):
             status=status.HTTP_400_BAD_REQUEST
         )
 
-    try:
-        donation = Don.objects.get(
-            id=donation_id,
-            personne_vulnerable__user=request.user
-        )
-    except Don.DoesNotExist:
+    # Le registre des parts (AllocationDon) fait foi : seul un bénéficiaire du don peut le retirer
+    allocation = AllocationDon.objects.select_related('don', 'personne').filter(
+        don_id=donation_id,
+        personne__user=request.user
+    ).first()
+    if allocation is None:
         return Response(
             {"detail": "Don introuvable ou non autorisé."},
             status=status.HTTP_404_NOT_FOUND
         )
 
-    if not donation.est_reparti:
+    if not allocation.don.est_reparti:
         return Response(
             {"detail": "Ce don ne peut pas être retiré car il n'est pas encore réparti."},
             status=status.HTTP_400_BAD_REQUEST
         )
 
-    donation.est_retires = True
-    donation.save()
+    retirer_allocations(allocation.personne, dons=[allocation.don])
 
     return Response(
         {"detail": "Don retiré avec succès."},
@@ -0,0 +1,235 @@
+# formation/batch.py
+"""
+Moteur d'analyses IA en lot des demandes de formation.
+
+Les vues d'administration ne font plus tourner les analyses dans la requête
+HTTP (coupée à 120 s par gunicorn) : elles créent un ``LotAnalyse`` avec un
+``LotAnalyseElement`` par demande, puis le confient à une tâche de fond.
+
+L'exécuteur :
+
+- lance au plus ``lot.concurrence`` analyses simultanées contre Ollama ;
+- retente chaque demande en échec jusqu'à ``lot.max_tentatives`` fois, avec un
+  délai croissant ; les nouvelles tentatives ignorent le cache des réponses
+  (une réponse mal formée mise en cache reviendrait à l'identique) ;
+- enregistre l'issue de chaque demande dès qu'elle est connue : après un arrêt
+  brutal, ``reprendre_lots_interrompus`` relance le lot et seules les demandes
+  non terminées sont analysées ;
+- met à jour ``dernier_signe_de_vie`` et s'arrête proprement si le lot est annulé ;
+- compte à part (``inchangee``) les demandes dont les données n'ont pas changé
+  depuis leur dernière analyse : le LLM n'est pas rappelé pour elles ;
+- appelle le LLM dans la classe de priorité du lot (``masse`` ou ``planifie``,
+  cf. llm/priorites.py) : une demande soumise par un utilisateur passe avant.
+
+``progression(lot)`` fournit les compteurs affichés en direct dans l'admin.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Count, F, Q
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from llm import priorites
+
+from .models import LotAnalyse, LotAnalyseElement
+
+logger = logging.getLogger(__name__)
+
+# Intervalle (s) de mise à jour du signe de vie et de vérification d'annulation
+HEARTBEAT_INTERVAL = 5
+# Fenêtre (s) sur laquelle le débit est mesuré
+THROUGHPUT_WINDOW = 300
+# Délai (s) avant la 2e tentative, doublé à chaque échec (plafonné à 30 s)
+RETRY_BASE_DELAY = 2
+
+
+def creer_lot(demande_ids, user=None, concurrence=None, max_tentatives=None, force=False, priorite='masse'):
+    """Crée un lot (et ses éléments) pour ces demandes ; les doublons sont ignorés."""
+    demande_ids = list(dict.fromkeys(str(pk) for pk in demande_ids))
+    with transaction.atomic():
+        lot = LotAnalyse.objects.create(
+            cree_par=user,
+            concurrence=concurrence or getattr(settings, 'FORMATION_LOT_CONCURRENCE', 2),
+            max_tentatives=max_tentatives or getattr(settings, 'FORMATION_LOT_MAX_TENTATIVES', 3),
+            force=force,
+            priorite=priorite,
+            total=len(demande_ids),
+        )
+        LotAnalyseElement.objects.bulk_create(
+            [LotAnalyseElement(lot=lot, demande_id=pk) for pk in demande_ids],
+            batch_size=500,
+        )
+    return lot
+
+
+def lancer_lot(lot, bloquant=False):
+    """
+    Confie le lot à une tâche de fond, après le commit de la transaction en cours.
+
+    ``bloquant=True`` (commandes de gestion) : sans worker Celery, le lot est
+    exécuté avant le retour (cf. llm/jobs.py).
+    """
+    from llm.jobs import submit_on_commit
+    from .tasks import executer_lot_analyse
+
+    submit_on_commit(executer_lot_analyse, lot.pk, name=f'lot-analyse-{lot.pk}', bloquant=bloquant)
+
+
+def executer_lot(lot_id):
+    """Analyse les demandes non terminées du lot ; renvoie la progression finale."""
+    now = timezone.now()
+    # Un lot « en cours » n'est repris que si son exécuteur ne donne plus signe de
+    # vie : un message livré deux fois ne lance pas deux exécuteurs en parallèle
+    started = LotAnalyse.objects.filter(
+        Q(statut='en_attente') | Q(statut='en_cours', dernier_signe_de_vie__lt=now - _delai_interruption()),
+        pk=lot_id,
+    ).update(statut='en_cours', date_debut=Coalesce(F('date_debut'), now), dernier_signe_de_vie=now)
+    if not started:
+        return None
+    lot = LotAnalyse.objects.get(pk=lot_id)
+
+    # Reprise : les demandes « en cours » au moment de l'arrêt sont rejouées
+    lot.elements.filter(statut='en_cours').update(statut='en_attente')
+    todo = list(lot.elements.filter(statut='en_attente').values_list('pk', 'demande_id', 'tentatives'))
+
+    annule = threading.Event()
+    with ThreadPoolExecutor(max_workers=max(1, lot.concurrence), thread_name_prefix=f'lot-{lot_id}') as pool:
+        pending = {pool.submit(_traiter_element, lot, *item, annule) for item in todo}
+        while pending:
+            _, pending = wait(pending, timeout=HEARTBEAT_INTERVAL)
+            LotAnalyse.objects.filter(pk=lot_id).update(dernier_signe_de_vie=timezone.now())
+            if LotAnalyse.objects.filter(pk=lot_id, statut='annule').exists():
+                annule.set()
+
+    if not annule.is_set():
+        LotAnalyse.objects.filter(pk=lot_id, statut='en_cours').update(statut='termine', date_fin=timezone.now())
+    return progression(LotAnalyse.objects.get(pk=lot_id))
+
+
+def _traiter_element(lot, element_id, demande_id, tentatives, annule):
+    """Analyse une demande du lot, avec nouvelles tentatives ; exécuté dans un thread du pool."""
+    from .views import analyser_demande_formation_sync
+
+    try:
+        if annule.is_set():
+            return
+        LotAnalyseElement.objects.filter(pk=element_id).update(statut='en_cours')
+        start = time.perf_counter()
+        erreur = ''
+        while tentatives < lot.max_tentatives and not annule.is_set():
+            tentatives += 1
+            try:
+                # Les threads du pool n'héritent pas du contexte : la priorité est posée ici
+                with priorites.priorite(lot.priorite):
+                    result = analyser_demande_formation_sync(demande_id, force=lot.force or tentatives > 1)
+            except Exception as e:
+                result = {'success': False, 'error': str(e)}
+            if result.get('success'):
+                _terminer(element_id, 'inchangee' if result.get('inchangee') else 'reussie', tentatives, '', start)
+                return
+            erreur = result.get('error') or 'Erreur inconnue'
+            logger.warning("Lot %s : demande %s en échec (tentative %s/%s) : %s",
+                           lot.pk, demande_id, tentatives, lot.max_tentatives, erreur)
+            if tentatives < lot.max_tentatives:
+                annule.wait(min(RETRY_BASE_DELAY * 2 ** (tentatives - 1), 30))
+
+        if annule.is_set() and tentatives < lot.max_tentatives:
+            # Lot annulé en cours de route : la demande reste à faire
+            LotAnalyseElement.objects.filter(pk=element_id).update(statut='en_attente', tentatives=tentatives)
+        else:
+            _terminer(element_id, 'echouee', tentatives, erreur, start)
+    finally:
+        close_old_connections()
+
+
+def _terminer(element_id, statut, tentatives, erreur, start):
+    LotAnalyseElement.objects.filter(pk=element_id).update(
+        statut=statut, tentatives=tentatives, erreur=erreur,
+        duree=time.perf_counter() - start, date_fin=timezone.now(),
+    )
+
+
+def progression(lot):
+    """Compteurs du lot : terminées, échouées, restantes, débit (demandes/min) et temps restant estimé."""
+    counts = lot.elements.aggregate(
+        reussies=Count('pk', filter=Q(statut='reussie')),
+        inchangees=Count('pk', filter=Q(statut='inchangee')),
+        echouees=Count('pk', filter=Q(statut='echouee')),
+        en_cours=Count('pk', filter=Q(statut='en_cours')),
+    )
+    now = timezone.now()
+    lot.refresh_from_db(fields=['statut', 'date_debut', 'date_fin'])
+    restantes = lot.total - counts['reussies'] - counts['inchangees'] - counts['echouees']
+
+    debit = None
+    if lot.date_debut:
+        fin = lot.date_fin or now
+        window_start = max(lot.date_debut, fin - timedelta(seconds=THROUGHPUT_WINDOW))
+        elapsed = (fin - window_start).total_seconds()
+        recentes = lot.elements.filter(date_fin__gte=window_start).count()
+        if elapsed > 0 and recentes:
+            debit = recentes / elapsed * 60
+    eta = restantes / debit * 60 if debit and lot.statut == 'en_cours' else None
+
+    return {
+        'id': lot.pk,
+        'statut': lot.statut,
+        'statut_display': lot.get_statut_display(),
+        'total': lot.total,
+        'reussies': counts['reussies'],
+        'inchangees': counts['inchangees'],
+        'echouees': counts['echouees'],
+        'en_cours': counts['en_cours'],
+        'restantes': restantes,
+        'pourcentage': round(100 * (lot.total - restantes) / lot.total) if lot.total else 100,
+        'debit_par_minute': round(debit, 2) if debit else None,
+        'eta_secondes': round(eta) if eta is not None else None,
+        'date_debut': lot.date_debut.isoformat() if lot.date_debut else None,
+        'date_fin': lot.date_fin.isoformat() if lot.date_fin else None,
+    }
+
+
+def annuler_lot(lot):
+    """Demande l'arrêt du lot : les analyses en cours se terminent, les suivantes ne démarrent pas."""
+    return LotAnalyse.objects.filter(pk=lot.pk, statut__in=['en_attente', 'en_cours']).update(
+        statut='annule', date_fin=timezone.now(),
+    )
+
+
+def reprendre_lot(lot):
+    """
+    Relance un lot annulé ou interrompu ; seules les demandes non terminées seront analysées.
+
+    Un lot dont l'exécuteur est toujours actif n'est pas relancé (renvoie False).
+    """
+    relance = LotAnalyse.objects.filter(
+        Q(statut='annule') | Q(pk__in=lots_interrompus().values('pk')), pk=lot.pk,
+    ).update(statut='en_attente', date_fin=None)
+    if relance:
+        lancer_lot(lot)
+    return bool(relance)
+
+
+def _delai_interruption(delai=None):
+    return timedelta(seconds=delai or HEARTBEAT_INTERVAL * 12)
+
+
+def lots_interrompus(delai=None):
+    """Lots « en cours » dont l'exécuteur ne donne plus signe de vie (arrêt brutal du worker)."""
+    limite = timezone.now() - _delai_interruption(delai)
+    # Un lot « en attente » n'a pas encore d'exécuteur : son ancienneté ne signale pas une interruption
+    return LotAnalyse.objects.filter(statut='en_cours', dernier_signe_de_vie__lt=limite)
+
+
+def reprendre_lots_interrompus(delai=None, bloquant=False):
+    lots = list(lots_interrompus(delai))
+    for lot in lots:
+        LotAnalyse.objects.filter(pk=lot.pk).update(statut='en_attente')
+        lancer_lot(lot, bloquant=bloquant)
+    return lots
@@ -0,0 +1,39 @@
+# formation/management/commands/planifier_reanalyses.py
+"""
+Planifie la réanalyse IA des demandes dont l'analyse est ancienne.
+
+    python manage.py planifier_reanalyses               # à lancer via cron (nuit)
+    python manage.py planifier_reanalyses --jours 60
+    python manage.py planifier_reanalyses --dry-run
+
+Seules les demandes dont les données ont changé depuis leur dernière analyse
+sont retenues. Le lot tourne avec la priorité ``planifie`` (cf. llm/priorites.py) :
+ses appels au LLM passent après les appels interactifs et les lots lancés depuis
+l'administration, sans jamais être bloqués indéfiniment.
+
+Sans worker Celery (``CELERY_TASK_ALWAYS_EAGER``, broker injoignable), le lot est
+exécuté par la commande elle-même, qui ne rend la main qu'à sa fin.
+"""
+from django.core.management.base import BaseCommand
+
+from formation import batch
+from formation.views import demandes_a_reanalyser
+
+
+class Command(BaseCommand):
+    help = "Crée un lot de réanalyses IA (priorité basse) pour les analyses anciennes dont les données ont changé."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--jours', type=int, default=30, help="Ancienneté minimale de l'analyse (défaut : 30)")
+        parser.add_argument('--concurrence', type=int, default=None, help="Analyses simultanées du lot")
+        parser.add_argument('--dry-run', action='store_true', help="Compter les demandes sans créer de lot")
+
+    def handle(self, *args, **options):
+        demandes, inchangees = demandes_a_reanalyser(options['jours'])
+        self.stdout.write(f"{len(demandes)} demande(s) à réanalyser, {inchangees} analyse(s) ancienne(s) à jour.")
+        if options['dry_run'] or not demandes:
+            return
+
+        lot = batch.creer_lot([d.pk for d in demandes], concurrence=options['concurrence'], priorite='planifie')
+        batch.lancer_lot(lot, bloquant=True)
+        self.stdout.write(self.style.SUCCESS(f"Lot {lot.pk} de {lot.total} réanalyse(s) planifié."))
@@ -0,0 +1,38 @@
+# formation/management/commands/reprendre_lots_analyse.py
+"""
+Relance les lots d'analyses IA interrompus (worker arrêté, redémarrage du serveur).
+
+    python manage.py reprendre_lots_analyse            # à lancer au démarrage ou via cron
+    python manage.py reprendre_lots_analyse --dry-run
+    python manage.py reprendre_lots_analyse --delai 300
+
+Un lot est interrompu quand il est « en cours » sans signe de vie depuis
+``--delai`` secondes. Seules ses demandes non terminées sont analysées à la reprise.
+
+Sans worker Celery (``CELERY_TASK_ALWAYS_EAGER``, broker injoignable), les lots
+sont exécutés par la commande elle-même, qui ne rend la main qu'à leur fin.
+"""
+from django.core.management.base import BaseCommand
+
+from formation import batch
+
+
+class Command(BaseCommand):
+    help = "Relance les lots d'analyses IA interrompus."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--delai', type=int, default=None,
+                            help="Secondes sans signe de vie avant de considérer un lot interrompu (défaut : 60)")
+        parser.add_argument('--dry-run', action='store_true', help="Lister les lots sans les relancer")
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            lots = list(batch.lots_interrompus(options['delai']))
+        else:
+            lots = batch.reprendre_lots_interrompus(options['delai'], bloquant=True)
+
+        for lot in lots:
+            p = batch.progression(lot)
+            self.stdout.write(f"Lot {lot.pk} : {p['restantes']}/{p['total']} demande(s) restante(s)")
+        verb = "à relancer" if options['dry_run'] else "relancé(s)"
+        self.stdout.write(self.style.SUCCESS(f"{len(lots)} lot(s) {verb}."))
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.4 on 2026-10-18 13:17
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('formation', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LotAnalyse',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('statut', models.CharField(choices=[('en_attente', 'En attente'), ('en_cours', 'En cours'), ('termine', 'Terminé'), ('annule', 'Annulé')], default='en_attente', max_length=20, verbose_name='Statut du lot')),
+                ('concurrence', models.PositiveSmallIntegerField(default=2, verbose_name='Analyses simultanées')),
+                ('max_tentatives', models.PositiveSmallIntegerField(default=3, verbose_name='Tentatives par demande')),
+                ('force', models.BooleanField(default=False, verbose_name='Ignorer le cache des réponses IA')),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('date_creation', models.DateTimeField(auto_now_add=True)),
+                ('date_debut', models.DateTimeField(blank=True, null=True)),
+                ('date_fin', models.DateTimeField(blank=True, null=True)),
+                ('dernier_signe_de_vie', models.DateTimeField(blank=True, null=True)),
+                ('cree_par', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL, verbose_name='Lancé par')),
+            ],
+            options={
+                'verbose_name': "Lot d'analyses IA",
+                'verbose_name_plural': "Lots d'analyses IA",
+                'ordering': ['-date_creation'],
+            },
+        ),
+        migrations.CreateModel(
+            name='LotAnalyseElement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('statut', models.CharField(choices=[('en_attente', 'En attente'), ('en_cours', 'En cours'), ('reussie', 'Réussie'), ('echouee', 'Échouée')], default='en_attente', max_length=20)),
+                ('tentatives', models.PositiveSmallIntegerField(default=0)),
+                ('erreur', models.TextField(blank=True)),
+                ('duree', models.FloatField(blank=True, null=True, verbose_name='Durée (s)')),
+                ('date_fin', models.DateTimeField(blank=True, null=True)),
+                ('demande', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='elements_lot', to='formation.demandeformation')),
+                ('lot', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='elements', to='formation.lotanalyse')),
+            ],
+            options={
+                'verbose_name': "Élément de lot d'analyses",
+                'verbose_name_plural': "Éléments de lot d'analyses",
+                'indexes': [models.Index(fields=['lot', 'statut'], name='formation_l_lot_id_4158fd_idx')],
+                'unique_together': {('lot', 'demande')},
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.4 on 2026-10-18 13:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('formation', '0002_lots_analyse'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='demandeformation',
+            name='analyses_evitees',
+            field=models.PositiveIntegerField(default=0, verbose_name='Réanalyses évitées (données inchangées)'),
+        ),
+        migrations.AddField(
+            model_name='demandeformation',
+            name='empreinte_analyse',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AlterField(
+            model_name='lotanalyseelement',
+            name='statut',
+            field=models.CharField(choices=[('en_attente', 'En attente'), ('en_cours', 'En cours'), ('reussie', 'Réussie'), ('inchangee', 'Inchangée (analyse à jour)'), ('echouee', 'Échouée')], default='en_attente', max_length=20),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-18 13:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('formation', '0003_empreinte_analyse'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lotanalyse',
+            name='priorite',
+            field=models.CharField(choices=[('masse', "Lot lancé depuis l'administration"), ('planifie', 'Réanalyse planifiée')], default='masse', max_length=20, verbose_name='Priorité'),
+        ),
+    ]
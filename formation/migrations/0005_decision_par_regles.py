@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-18 13:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('formation', '0004_lot_priorite'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='demandeformation',
+            name='decision_par_regles',
+            field=models.BooleanField(default=False, verbose_name='Décision par règles (sans IA)'),
+        ),
+    ]
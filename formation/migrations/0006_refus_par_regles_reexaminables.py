@@ -0,0 +1,29 @@
+# Generated by Django 5.2.4 on 2026-10-18 17:20
+
+from django.db import migrations
+
+
+def lever_refus_capacite(apps, schema_editor):
+    """
+    Refus par règles déjà enregistrés : plus de score fictif ni d'empreinte (cf.
+    prescoring.py). Les refus dus seulement à une formation complète ou fermée
+    ne sont plus des refus : ces demandes redeviennent « en attente ».
+    """
+    DemandeFormation = apps.get_model('formation', 'DemandeFormation')
+    refus = DemandeFormation.objects.filter(decision_par_regles=True, statut='refusee')
+    refus.update(score_formabilite=None, empreinte_analyse='')
+    refus.exclude(commentaire_decision__contains="Âge").update(
+        statut='en_attente', decision_par_regles=False, date_analyse=None, date_decision=None,
+        commentaire_decision='', analyse_llm='',
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('formation', '0005_decision_par_regles'),
+    ]
+
+    operations = [
+        migrations.RunPython(lever_refus_capacite, migrations.RunPython.noop),
+    ]
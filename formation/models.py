@@ -294,6 +294,22 @@ class DemandeFormation(models.Model):
         default=dict,
         verbose_name="Critères d'évaluation détaillés"
     )
+    # Empreinte des données envoyées au LLM lors de la dernière analyse réussie
+    # (cf. views.empreinte_analyse) : inchangée, la réanalyse est évitée
+    empreinte_analyse = models.CharField(
+        max_length=64,
+        blank=True,
+        default=''
+    )
+    analyses_evitees = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Réanalyses évitées (données inchangées)"
+    )
+    # Refus décidé par les règles, sans appel au LLM (cf. prescoring.py)
+    decision_par_regles = models.BooleanField(
+        default=False,
+        verbose_name="Décision par règles (sans IA)"
+    )
 
     # Feedback et suivi
     commentaire_decision = models.TextField(
@@ -493,4 +509,111 @@ class SuiviProgression(models.Model):
         ordering = ['-date_suivi']
 
     def __str__(self):
-        return f"{self.titre} - {self.parcours.demande_formation.personne.get_full_name()}"
\ No newline at end of file
+        return f"{self.titre} - {self.parcours.demande_formation.personne.get_full_name()}"
+
+class LotAnalyse(models.Model):
+    """Lot d'analyses IA de demandes, exécuté en tâche de fond (cf. formation/batch.py)"""
+
+    STATUT_CHOICES = [
+        ('en_attente', 'En attente'),
+        ('en_cours', 'En cours'),
+        ('termine', 'Terminé'),
+        ('annule', 'Annulé'),
+    ]
+
+    cree_par = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        verbose_name="Lancé par"
+    )
+    statut = models.CharField(
+        max_length=20,
+        choices=STATUT_CHOICES,
+        default='en_attente',
+        verbose_name="Statut du lot"
+    )
+    concurrence = models.PositiveSmallIntegerField(
+        default=2,
+        verbose_name="Analyses simultanées"
+    )
+    max_tentatives = models.PositiveSmallIntegerField(
+        default=3,
+        verbose_name="Tentatives par demande"
+    )
+    force = models.BooleanField(
+        default=False,
+        verbose_name="Ignorer le cache des réponses IA"
+    )
+    # Classe de priorité des appels au LLM (cf. llm/priorites.py) : les appels
+    # interactifs passent avant les lots
+    PRIORITE_CHOICES = [
+        ('masse', 'Lot lancé depuis l\'administration'),
+        ('planifie', 'Réanalyse planifiée'),
+    ]
+    priorite = models.CharField(
+        max_length=20,
+        choices=PRIORITE_CHOICES,
+        default='masse',
+        verbose_name="Priorité"
+    )
+    total = models.PositiveIntegerField(default=0)
+
+    date_creation = models.DateTimeField(auto_now_add=True)
+    date_debut = models.DateTimeField(null=True, blank=True)
+    date_fin = models.DateTimeField(null=True, blank=True)
+    # Mis à jour régulièrement par l'exécuteur : un lot « en cours » sans signe
+    # de vie récent a été interrompu et peut être repris
+    dernier_signe_de_vie = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Lot d'analyses IA"
+        verbose_name_plural = "Lots d'analyses IA"
+        ordering = ['-date_creation']
+
+    def __str__(self):
+        return f"Lot {self.pk} - {self.total} demande(s) ({self.get_statut_display()})"
+
+
+class LotAnalyseElement(models.Model):
+    """Une demande d'un lot d'analyses : l'avancement est persisté demande par demande"""
+
+    STATUT_CHOICES = [
+        ('en_attente', 'En attente'),
+        ('en_cours', 'En cours'),
+        ('reussie', 'Réussie'),
+        ('inchangee', 'Inchangée (analyse à jour)'),
+        ('echouee', 'Échouée'),
+    ]
+
+    lot = models.ForeignKey(
+        LotAnalyse,
+        on_delete=models.CASCADE,
+        related_name='elements'
+    )
+    demande = models.ForeignKey(
+        DemandeFormation,
+        on_delete=models.CASCADE,
+        related_name='elements_lot'
+    )
+    statut = models.CharField(
+        max_length=20,
+        choices=STATUT_CHOICES,
+        default='en_attente'
+    )
+    tentatives = models.PositiveSmallIntegerField(default=0)
+    erreur = models.TextField(blank=True)
+    duree = models.FloatField(null=True, blank=True, verbose_name="Durée (s)")
+    date_fin = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Élément de lot d'analyses"
+        verbose_name_plural = "Éléments de lot d'analyses"
+        unique_together = ('lot', 'demande')
+        indexes = [
+            models.Index(fields=['lot', 'statut']),
+        ]
+
+    def __str__(self):
+        return f"Lot {self.lot_id} - {self.demande_id} ({self.get_statut_display()})"
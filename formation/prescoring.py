@@ -0,0 +1,91 @@
+# formation/prescoring.py
+"""
+Pré-évaluation par règles des demandes de formation, avant tout appel au LLM.
+
+Une partie de la grille de formabilité est mécanique : la tranche d'âge de la
+formation (``age_min``/``age_max``), ses prérequis (``niveau_requis``), les
+places restantes, la formation encore active. Ces vérifications prennent
+quelques microsecondes (une requête pour les places) :
+
+- une demande dont le demandeur est hors de la tranche d'âge est refusée
+  directement, sans appel au LLM. Le refus n'est pas définitif : tant que la
+  demande n'a pas été décidée autrement, chaque nouvelle analyse réapplique les
+  règles, et une fiche corrigée repart vers le LLM ;
+- une formation complète ou fermée n'est qu'un état passager de la formation,
+  pas un critère du demandeur : elle est signalée (``alertes``) et empêche
+  l'acceptation automatique, la décision revenant à l'administrateur ;
+- sinon le critère « compatibilité âge et prérequis » (0-20 points) est calculé
+  quand toutes ses données sont connues, et transmis au LLM qui n'évalue plus
+  que les critères qualitatifs (prompt plus court).
+
+Le niveau d'études n'est pas recensé (``PersonneVulnerable``) : une formation
+avec prérequis laisse le critère au LLM. Une demande n'est jamais acceptée sans
+le LLM : 80 points sur 100 portent sur la motivation et le projet.
+"""
+
+# Barème du critère « compatibilité » du prompt (cf. views.build_formation_analysis_prompt)
+POINTS_AGE = 10
+POINTS_PREREQUIS = 10
+
+# Seules les demandes sans décision peuvent être refusées par les règles : une
+# demande acceptée occupe déjà sa place
+STATUTS_DECIDABLES = ('en_attente', 'analysee')
+
+
+def decidable(demande):
+    """Demande sans décision, ou refusée par les règles (refus réexaminé à chaque analyse)."""
+    return demande.statut in STATUTS_DECIDABLES or (demande.statut == 'refusee' and demande.decision_par_regles)
+
+
+class PreEvaluation:
+    """Résultat des règles pour une demande : critères calculés, motifs de refus et alertes."""
+
+    def __init__(self, age_compatible=None, prerequis_verifies=None, motifs_refus=(), alertes=()):
+        self.age_compatible = age_compatible
+        self.prerequis_verifies = prerequis_verifies
+        self.motifs_refus = list(motifs_refus)
+        # Formation complète ou fermée : pas d'acceptation automatique
+        self.alertes = list(alertes)
+
+    @property
+    def compatibilite(self):
+        """Points du critère « compatibilité » (0-20), ou None si une donnée manque."""
+        if self.age_compatible is None or self.prerequis_verifies is None:
+            return None
+        return (POINTS_AGE if self.age_compatible else 0) + (POINTS_PREREQUIS if self.prerequis_verifies else 0)
+
+    @property
+    def refus(self):
+        return bool(self.motifs_refus)
+
+
+def pre_evaluer(demande, places_restantes=None):
+    """
+    Applique les règles à la demande.
+
+    ``places_restantes`` : places libres de la formation ; None pour ne pas les
+    vérifier (construction du prompt, qui ne doit pas en dépendre).
+    """
+    personne, formation = demande.personne, demande.formation_souhaitee
+    motifs, alertes = [], []
+
+    age_compatible = None
+    if personne.age is not None:
+        age_compatible = formation.age_min <= personne.age <= formation.age_max
+        if not age_compatible:
+            motifs.append(
+                f"Âge ({personne.age} ans) hors de la tranche de la formation "
+                f"({formation.age_min}-{formation.age_max} ans)"
+            )
+    # Sans niveau d'études recensé, seuls les prérequis « aucun » sont vérifiables
+    prerequis_verifies = True if formation.niveau_requis == 'aucun' else None
+
+    if not decidable(demande):
+        motifs = []
+    else:
+        if not formation.est_active:
+            alertes.append("Formation fermée aux inscriptions")
+        if places_restantes is not None and places_restantes <= 0:
+            alertes.append("Plus aucune place disponible dans cette formation")
+
+    return PreEvaluation(age_compatible, prerequis_verifies, motifs, alertes)
@@ -0,0 +1,130 @@
+# formation/streaming.py
+"""
+Analyse IA d'une demande de formation diffusée en direct (Server-Sent Events).
+
+Au lieu d'attendre la fin de la génération de Mistral derrière un spinner,
+le navigateur reçoit les tokens au fur et à mesure qu'Ollama les produit :
+
+    event: debut     {"demande": "<uuid>", "cache": false}
+    event: token     {"t": "..."}            (répété)
+    event: resultat  {"success": true, "score": 74.0, "statut": "acceptee"}
+    event: erreur    {"error": "..."}
+
+La vue est asynchrone : servie par ``lanfiasave/asgi.py`` (gunicorn avec
+``uvicorn.workers.UvicornWorker``, le worker par défaut de gunicorn.conf.py),
+elle n'occupe aucun worker synchrone pendant la génération. La réponse JSON finale est enregistrée
+sur la demande (``appliquer_resultat_analyse``) et dans le cache des réponses ;
+une réponse déjà en cache est renvoyée d'un bloc, une demande inéligible selon
+les règles est refusée sans génération (cf. prescoring.py), et une demande dont
+les données n'ont pas changé depuis la dernière analyse n'est pas réanalysée.
+L'appel est journalisé comme une analyse synchrone (cf. llm/journal.py).
+"""
+import json
+import logging
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.decorators import login_required, user_passes_test
+from django.http import StreamingHttpResponse
+from django.views.decorators.http import require_POST
+
+from llm.cache import get_llm_cache
+from llm.journal import ajournaliser_appel
+from .models import DemandeFormation
+from .views import (
+    analyse_a_jour, appliquer_refus_par_regles, appliquer_resultat_analyse, build_formation_analysis_messages,
+    empreinte_analyse, eviter_analyse, is_admin_or_mentor, pre_evaluation_demande,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def sse_event(event, data):
+    """Formate un évènement SSE."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def _preparer(demande_id):
+    demande = DemandeFormation.objects.select_related('personne', 'formation_souhaitee').get(id=demande_id)
+    pre_evaluation = pre_evaluation_demande(demande)
+    messages_llm = build_formation_analysis_messages(demande, pre_evaluation)
+    return demande, pre_evaluation, messages_llm, empreinte_analyse(messages_llm)
+
+
+def _enregistrer(demande, llm_response, empreinte, pre_evaluation, cache, key, model):
+    result = appliquer_resultat_analyse(demande, llm_response, empreinte, pre_evaluation)
+    if cache is not None and result['success']:
+        cache.set(key, model, llm_response)
+    return result
+
+
+async def stream_analyse(demande_id, force=False):
+    """Générateur asynchrone des évènements SSE d'une analyse."""
+    from .views import llm
+
+    # Premier octet immédiat : le navigateur sait que l'analyse a démarré
+    yield ": analyse\n\n"
+    try:
+        demande, pre_evaluation, messages_llm, empreinte = await sync_to_async(_preparer)(demande_id)
+    except DemandeFormation.DoesNotExist:
+        yield sse_event('erreur', {'error': 'Demande introuvable'})
+        return
+
+    if pre_evaluation.refus:
+        # Demande inéligible : décision par règles, rien à générer
+        yield sse_event('debut', {'demande': str(demande_id), 'cache': False})
+        yield sse_event('resultat', await sync_to_async(appliquer_refus_par_regles)(demande, pre_evaluation))
+        return
+
+    if analyse_a_jour(demande, empreinte):
+        # Données inchangées depuis la dernière analyse : rien à générer
+        yield sse_event('debut', {'demande': str(demande_id), 'cache': True})
+        yield sse_event('resultat', await sync_to_async(eviter_analyse)(demande))
+        return
+
+    cache = get_llm_cache()
+    key = model = cached = None
+    if cache is not None:
+        key, model = cache.key_for(llm, messages_llm)
+        if not force:
+            cached = await sync_to_async(cache.get)(key)
+    yield sse_event('debut', {'demande': str(demande_id), 'cache': cached is not None})
+
+    try:
+        async with ajournaliser_appel('formabilite', demande_id) as appel:
+            if cached is not None:
+                llm_response = cached
+                appel.noter_requete(model, messages_llm)
+                appel.noter_reponse(cached, depuis_cache=True)
+                yield sse_event('token', {'t': cached})
+            else:
+                parts = []
+                async for chunk in llm.astream(messages_llm):
+                    if chunk.content:
+                        parts.append(chunk.content)
+                        yield sse_event('token', {'t': chunk.content})
+                llm_response = ''.join(parts)
+
+            result = await sync_to_async(_enregistrer)(
+                demande, llm_response, empreinte, pre_evaluation, cache if cached is None else None, key, model,
+            )
+            appel.json_valide = result['success']
+            appel.erreur = result.get('error', '')[:255]
+    except Exception as e:
+        logger.warning("Analyse en flux de la demande %s en échec", demande_id, exc_info=True)
+        yield sse_event('erreur', {'error': str(e)})
+        return
+
+    yield sse_event('resultat', result)
+
+
+@login_required
+@user_passes_test(is_admin_or_mentor)
+@require_POST
+async def api_analyse_stream(request, demande_id):
+    """Lance l'analyse IA d'une demande et en diffuse la génération (POST, ``force=true`` : sans cache)"""
+    force = request.POST.get('force') in ('1', 'true', 'on')
+    response = StreamingHttpResponse(stream_analyse(demande_id, force=force), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Pas de mise en tampon par un éventuel proxy nginx
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,16 @@
+# formation/tasks.py
+"""Tâches de fond du module formation (cf. formation/batch.py)."""
+from .batch import executer_lot
+
+try:
+    from celery import shared_task
+
+
+    # acks_late : si le worker meurt en plein lot, le message est relivré et le lot reprend
+    @shared_task(acks_late=True)
+    def executer_lot_analyse(lot_id):
+        return executer_lot(lot_id)
+
+except ImportError:
+    def executer_lot_analyse(lot_id):
+        return executer_lot(lot_id)
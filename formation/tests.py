@@ -1,3 +1,288 @@
-from django.test import TestCase
+import asyncio
+import json
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from users.models import PersonneVulnerable, User
+from llm.cache import LLMResponseCache
+from . import batch, streaming, views
+from .models import DemandeFormation, Formation, LotAnalyse
+from .prescoring import pre_evaluer
+
+
+def creer_demandes(n):
+    formation = Formation.objects.create(
+        nom="Couture", type_formation='artisanat', description="-", duree_semaines=8, competences_acquises="-",
+    )
+    return [
+        DemandeFormation.objects.create(
+            personne=PersonneVulnerable.objects.create(first_name=f"P{i}", last_name="Test"),
+            formation_souhaitee=formation,
+            motivation_principale='emploi',
+            disponibilite_horaire='matin',
+        )
+        for i in range(n)
+    ]
+
+
+class LotAnalyseTests(TransactionTestCase):
+    """Moteur d'analyses en lot ; l'appel au LLM est simulé."""
+
+    def setUp(self):
+        self.demandes = creer_demandes(4)
+        for name, value in (('HEARTBEAT_INTERVAL', 0.05), ('RETRY_BASE_DELAY', 0)):
+            patcher = mock.patch.object(batch, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def executer(self, lot, side_effect):
+        with mock.patch('formation.views.analyser_demande_formation_sync', side_effect=side_effect) as analyse:
+            progression = batch.executer_lot(lot.pk)
+        return progression, analyse
+
+    def test_all_items_processed_with_retries(self):
+        lot = batch.creer_lot([d.id for d in self.demandes], concurrence=2, max_tentatives=2)
+        fails_once = {str(self.demandes[0].id)}
+
+        def analyse(demande_id, force=False):
+            if str(demande_id) in fails_once:
+                fails_once.discard(str(demande_id))
+                return {'success': False, 'error': 'JSON invalide'}
+            return {'success': True}
+
+        progression, mocked = self.executer(lot, analyse)
+        self.assertEqual((progression['statut'], progression['reussies'], progression['restantes']), ('termine', 4, 0))
+        self.assertEqual(mocked.call_count, 5)
+        # La nouvelle tentative contourne le cache des réponses
+        self.assertTrue(any(call.kwargs['force'] for call in mocked.call_args_list))
+
+    def test_failures_are_recorded(self):
+        lot = batch.creer_lot([d.id for d in self.demandes[:2]], max_tentatives=3)
+        progression, mocked = self.executer(lot, lambda demande_id, force=False: {'success': False, 'error': 'down'})
+        self.assertEqual(progression['echouees'], 2)
+        self.assertEqual(mocked.call_count, 6)
+        self.assertEqual(set(lot.elements.values_list('erreur', flat=True)), {'down'})
+
+    def test_resume_only_runs_unfinished_items(self):
+        lot = batch.creer_lot([d.id for d in self.demandes])
+        # Arrêt brutal simulé : une demande terminée, une en cours, signe de vie ancien
+        elements = list(lot.elements.order_by('pk'))
+        elements[0].statut, elements[1].statut = 'reussie', 'en_cours'
+        for element in elements[:2]:
+            element.save()
+        LotAnalyse.objects.filter(pk=lot.pk).update(
+            statut='en_cours', date_debut=timezone.now() - timedelta(hours=1),
+            dernier_signe_de_vie=timezone.now() - timedelta(hours=1),
+        )
+        self.assertEqual(list(batch.lots_interrompus()), [lot])
+
+        progression, mocked = self.executer(lot, lambda demande_id, force=False: {'success': True})
+        self.assertEqual(mocked.call_count, 3)
+        self.assertEqual(progression['reussies'], 4)
+
+    def test_unchanged_demandes_are_counted_apart(self):
+        lot = batch.creer_lot([d.id for d in self.demandes[:2]])
+        inchangee = str(self.demandes[0].id)
+        progression, _ = self.executer(
+            lot, lambda demande_id, force=False: {'success': True, 'inchangee': str(demande_id) == inchangee},
+        )
+        self.assertEqual((progression['reussies'], progression['inchangees'], progression['restantes']), (1, 1, 0))
+
+    def test_requeued_old_lot_is_not_reported_interrupted(self):
+        lot = batch.creer_lot([d.id for d in self.demandes])
+        LotAnalyse.objects.filter(pk=lot.pk).update(date_creation=timezone.now() - timedelta(days=2))
+        self.assertEqual(list(batch.lots_interrompus()), [])
+
+    def test_running_lot_is_not_started_twice(self):
+        lot = batch.creer_lot([d.id for d in self.demandes])
+        LotAnalyse.objects.filter(pk=lot.pk).update(statut='en_cours', dernier_signe_de_vie=timezone.now())
+        progression, mocked = self.executer(lot, lambda demande_id, force=False: {'success': True})
+        self.assertIsNone(progression)
+        self.assertFalse(mocked.called)
+        self.assertFalse(batch.reprendre_lot(lot))
+
+    @override_settings(CELERY_TASK_ALWAYS_EAGER=True)
+    def test_resume_command_runs_lot_before_exiting_without_worker(self):
+        lot = batch.creer_lot([d.id for d in self.demandes])
+        LotAnalyse.objects.filter(pk=lot.pk).update(
+            statut='en_cours', dernier_signe_de_vie=timezone.now() - timedelta(hours=1),
+        )
+        # Un thread démon mourrait avec la commande : le lot doit être fini à son retour
+        with mock.patch('llm.jobs.run_in_thread', side_effect=AssertionError("thread démon")), \
+                mock.patch('formation.views.analyser_demande_formation_sync', return_value={'success': True}):
+            call_command('reprendre_lots_analyse', stdout=mock.Mock())
+        self.assertEqual(batch.progression(LotAnalyse.objects.get(pk=lot.pk))['statut'], 'termine')
+
+    @override_settings(CELERY_TASK_ALWAYS_EAGER=True)
+    def test_planned_reanalysis_runs_before_exiting_without_worker(self):
+        with mock.patch('formation.management.commands.planifier_reanalyses.demandes_a_reanalyser',
+                        return_value=(self.demandes, 0)), \
+                mock.patch('llm.jobs.run_in_thread', side_effect=AssertionError("thread démon")), \
+                mock.patch('formation.views.analyser_demande_formation_sync', return_value={'success': True}):
+            call_command('planifier_reanalyses', stdout=mock.Mock())
+        lot = LotAnalyse.objects.get()
+        self.assertEqual((lot.priorite, batch.progression(lot)['statut']), ('planifie', 'termine'))
+
+    def test_admin_page_lists_old_analyses_without_rebuilding_prompts(self):
+        DemandeFormation.objects.update(score_formabilite=60, date_analyse=timezone.now() - timedelta(days=40))
+        admin = User.objects.create_user('admin', password='x', is_staff=True)
+        self.client.force_login(admin)
+        with mock.patch('formation.views.build_formation_analysis_messages', side_effect=AssertionError):
+            response = self.client.get(reverse('formation:admin_lancer_analyses_lot'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['demandes_analyse_ancienne']), 4)
+
+
+class FakeStreamingLLM:
+    """Client simulé : renvoie la réponse JSON en plusieurs morceaux."""
+    model = 'mistral'
+
+    def __init__(self, response):
+        self.response = response
+        self.calls = 0
+
+    async def astream(self, messages):
+        self.calls += 1
+        for i in range(0, len(self.response), 10):
+            yield SimpleNamespace(content=self.response[i:i + 10])
+
+
+class AnalyseStreamTests(TransactionTestCase):
+    def setUp(self):
+        self.demande = creer_demandes(1)[0]
+        self.llm = FakeStreamingLLM(json.dumps({
+            'score_formabilite': 55, 'analyse_detaillee': 'ok', 'recommandations': '-', 'criteres_scores': {},
+        }))
+        self.cache = LLMResponseCache()
+        for target, value in (('formation.views.llm', self.llm), ('formation.streaming.get_llm_cache', lambda: self.cache)):
+            patcher = mock.patch(target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def collect(self, force=False):
+        async def run():
+            return [chunk async for chunk in streaming.stream_analyse(self.demande.id, force=force)]
+        chunks = asyncio.run(run())
+        events = []
+        for chunk in chunks[1:]:
+            event, data = chunk.strip().split('\n')
+            events.append((event[len('event: '):], json.loads(data[len('data: '):])))
+        return chunks[0], events
+
+    def test_tokens_are_streamed_and_result_persisted(self):
+        first, events = self.collect()
+        self.assertTrue(first.startswith(':'))
+        names = [name for name, _ in events]
+        self.assertEqual(names[0], 'debut')
+        self.assertGreater(names.count('token'), 1)
+        self.assertEqual(events[-1], ('resultat', {'success': True, 'score': 55, 'statut': 'analysee'}))
+        self.assertEqual(''.join(data['t'] for name, data in events if name == 'token'), self.llm.response)
+        self.demande.refresh_from_db()
+        self.assertEqual(self.demande.score_formabilite, 55)
+
+    def test_cached_response_is_sent_at_once(self):
+        self.collect()
+        # Empreinte effacée (p. ex. nouvelle version du traitement) : même prompt, servi par le cache
+        DemandeFormation.objects.filter(pk=self.demande.pk).update(empreinte_analyse='')
+        _, events = self.collect()
+        self.assertEqual(self.llm.calls, 1)
+        self.assertTrue(events[0][1]['cache'])
+        DemandeFormation.objects.filter(pk=self.demande.pk).update(empreinte_analyse='')
+        _, events = self.collect(force=True)
+        self.assertEqual(self.llm.calls, 2)
+
+    def test_unchanged_inputs_are_not_reanalysed(self):
+        self.collect()
+        _, events = self.collect(force=True)
+        self.assertEqual(self.llm.calls, 1)
+        self.assertTrue(events[-1][1]['inchangee'])
+        self.demande.refresh_from_db()
+        self.assertEqual(self.demande.analyses_evitees, 1)
+
+        # Une donnée du prompt change : nouvelle analyse
+        self.demande.experience_anterieure = "Deux ans en atelier"
+        self.demande.save()
+        _, events = self.collect()
+        self.assertEqual(self.llm.calls, 2)
+        self.assertNotIn('inchangee', events[-1][1])
+
+
+class PreEvaluationTests(TestCase):
+    """Règles appliquées avant l'appel au LLM."""
+
+    def setUp(self):
+        self.demande = creer_demandes(1)[0]
+        self.reponse = json.dumps({
+            'score_formabilite': 60, 'analyse_detaillee': 'ok', 'recommandations': '-',
+            'criteres_scores': {'compatibilite': 5, 'motivation': 20},
+        })
+
+    def analyser(self, force=False):
+        with mock.patch('formation.views.invoke_cached', return_value=self.reponse) as invoke:
+            result = views.analyser_demande_formation_sync(self.demande.id, force=force)
+        self.demande.refresh_from_db()
+        return result, invoke
+
+    def test_age_out_of_range_is_refused_without_llm(self):
+        PersonneVulnerable.objects.filter(pk=self.demande.personne_id).update(age=60)
+        result, invoke = self.analyser()
+        invoke.assert_not_called()
+        self.assertEqual((result['statut'], result['par_regles']), ('refusee', True))
+        self.assertTrue(self.demande.decision_par_regles)
+        self.assertIn("60 ans", self.demande.commentaire_decision)
+        # Pas de score fictif ni d'empreinte
+        self.assertEqual((self.demande.score_formabilite, self.demande.empreinte_analyse), (None, ''))
+        # Données inchangées : même refus, sans LLM ni nouvelle décision
+        result, invoke = self.analyser()
+        invoke.assert_not_called()
+        self.assertTrue(result['inchangee'])
+
+    def test_rule_refusal_is_lifted_when_data_is_corrected(self):
+        PersonneVulnerable.objects.filter(pk=self.demande.personne_id).update(age=60)
+        self.analyser()
+        PersonneVulnerable.objects.filter(pk=self.demande.personne_id).update(age=30)
+        result, invoke = self.analyser(force=True)
+        invoke.assert_called_once()
+        self.assertEqual((result['statut'], result['score']), ('analysee', 60))
+        self.assertFalse(self.demande.decision_par_regles)
+        self.assertEqual(self.demande.commentaire_decision, '')
+
+    def test_full_formation_is_left_to_the_admin(self):
+        Formation.objects.filter(pk=self.demande.formation_souhaitee_id).update(places_disponibles=0)
+        self.reponse = json.dumps({'score_formabilite': 85, 'analyse_detaillee': 'ok', 'criteres_scores': {}})
+        result, invoke = self.analyser()
+        invoke.assert_called_once()
+        # Bon score mais plus de place : ni refus ni acceptation automatique
+        self.assertEqual((result['statut'], result['score']), ('analysee', 85))
+        self.assertFalse(self.demande.decision_par_regles)
+        self.assertIn("place", self.demande.commentaire_decision)
+
+    def test_mechanical_score_replaces_llm_criterion(self):
+        PersonneVulnerable.objects.filter(pk=self.demande.personne_id).update(age=30)
+        self.demande.personne.age = 30
+        prompt = views.build_formation_analysis_prompt(self.demande, pre_evaluer(self.demande))
+        self.assertIn("20/20", prompt)
+        self.assertNotIn("Âge requis", prompt)
+        self.assertNotIn('"compatibilite"', prompt)
+
+        result, invoke = self.analyser()
+        invoke.assert_called_once()
+        self.assertEqual(self.demande.criteres_evaluacion['compatibilite'], 20)
+        self.assertFalse(self.demande.decision_par_regles)
+
+    def test_unknown_data_is_left_to_llm(self):
+        Formation.objects.filter(pk=self.demande.formation_souhaitee_id).update(niveau_requis='secondaire')
+        self.demande.refresh_from_db()
+        self.demande.personne.age = 30
+        pre_evaluation = pre_evaluer(self.demande, places_restantes=5)
+        self.assertFalse(pre_evaluation.refus)
+        self.assertIsNone(pre_evaluation.compatibilite)
+        prompt = views.build_formation_analysis_prompt(self.demande, pre_evaluation)
+        self.assertIn("Âge requis", prompt)
+        self.assertIn('"compatibilite"', prompt)
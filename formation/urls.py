@@ -1,7 +1,7 @@
 # formation/urls.py - URLs corrigées avec le bon type selon le modèle
 
 from django.urls import path
-from . import views
+from . import streaming, views
 
 app_name = 'formation'
 
@@ -53,8 +53,11 @@ urlpatterns = [
     path('admin/analyses-ia/', views.analyses_ia_dashboard, name='analyses_ia_dashboard'),
     path('admin/analyses-lot/', views.admin_lancer_analyses_lot, name='admin_lancer_analyses_lot'),
     path('admin/analyser-toutes/', views.admin_analyser_toutes_demandes, name='admin_analyser_toutes_demandes'),
+    path('admin/lots-analyse/<int:lot_id>/', views.admin_lot_analyse_detail, name='admin_lot_analyse_detail'),
+    path('api/lots-analyse/<int:lot_id>/', views.api_lot_analyse_progression, name='api_lot_analyse_progression'),
     path('admin/configuration-ia/', views.admin_configuration_ia, name='admin_configuration_ia'),
     path('admin/historique-analyses/', views.admin_historique_analyses, name='admin_historique_analyses'),
+    path('admin/statistiques-ia/', views.admin_statistiques_ia, name='admin_statistiques_ia'),
     path('admin/test-ia-connection/', views.admin_test_ia_connection, name='admin_test_ia_connection'),
 
     # Mentoring
@@ -80,6 +83,8 @@ urlpatterns = [
     # DemandeFormation = UUID
     path('api/analyser-projet/<uuid:projet_id>/', views.api_analyser_projet, name='api_analyser_projet'),
     # ProjetVie = UUID
+    path('api/analyse-stream/<uuid:demande_id>/', streaming.api_analyse_stream, name='api_analyse_stream'),
+    # DemandeFormation = UUID, réponse en Server-Sent Events
     path('api/stats/', views.api_stats_formation, name='api_stats_formation'),
     path('api/dashboard-stats/', views.api_dashboard_stats, name='api_dashboard_stats'),
     path('api/formations-populaires/', views.api_formations_populaires, name='api_formations_populaires'),
@@ -1,4 +1,5 @@
 # formation/views.py
+import hashlib
 import json
 
 import csv
@@ -9,7 +10,7 @@ from django.contrib import messages
 from django.http import JsonResponse, HttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.core.paginator import Paginator
-from django.db.models import Q, Count, Avg, Sum, Max
+from django.db.models import F, Q, Count, Avg, Sum, Max
 from django.utils import timezone
 from django.db.models.functions import TruncMonth
 
@@ -18,21 +19,25 @@ from .forms import (
     FiltreDemandesForm, DecisionDemandeForm
 )
 
-from langchain_ollama import ChatOllama
 from langchain.schema import HumanMessage, SystemMessage
+from llm.cache import get_llm_cache, invoke_cached
+from llm.client import get_llm_client
+from llm.journal import journaliser_appel, statistiques_appels
 
 from .models import (
     Formation, DemandeFormation, ParcoursFormation,
-    ProjetVie, SuiviProgression
+    ProjetVie, SuiviProgression, LotAnalyse
 )
+from . import batch
+from .prescoring import decidable, pre_evaluer
 from .forms import (
     DemandeFormationForm, ProjetVieForm,
     FormationForm, EvaluationSuiviForm
 )
 from users.models import PersonneVulnerable, User
 
-# Initialisation du LLM
-llm = ChatOllama(base_url="http://localhost:11434", model="mistral")
+# Client LLM partagé (pool de connexions, délais, disjoncteur : cf. llm/client.py)
+llm = get_llm_client()
 
 
 def is_vulnerable_or_admin(user):
@@ -173,10 +178,30 @@ def demande_formation(request, formation_id):
     return render(request, 'formation/demande_formation.html', context)
 
 
-def build_formation_analysis_prompt(demande):
-    """Construit le prompt pour l'analyse de formabilité - VERSION CORRIGÉE"""
+def build_formation_analysis_prompt(demande, pre_evaluation=None):
+    """
+    Construit le prompt pour l'analyse de formabilité - VERSION CORRIGÉE
+
+    Si la pré-évaluation par règles a calculé le critère de compatibilité, il est
+    donné au LLM au lieu des données d'âge et de prérequis (cf. prescoring.py).
+    """
     personne = demande.personne
     formation = demande.formation_souhaitee
+    compatibilite = pre_evaluation.compatibilite if pre_evaluation is not None else None
+
+    if compatibilite is None:
+        exigences = f"""
+- Niveau requis : {formation.get_niveau_requis_display()}
+- Âge requis : {formation.age_min}-{formation.age_max} ans"""
+        criteres = """1. Compatibilité âge et prérequis (0-20 points)
+2. Motivation et engagement (0-25 points)"""
+        cle_compatibilite = """
+        "compatibilite": <score 0-20>,"""
+    else:
+        exigences = ""
+        criteres = f"""1. Compatibilité âge et prérequis : {compatibilite}/20 (déjà évaluée, à inclure telle quelle dans le score)
+2. Motivation et engagement (0-25 points)"""
+        cle_compatibilite = ""
 
     return f"""
 Vous êtes un expert en évaluation de formabilité pour des programmes d'insertion socio-économique.
@@ -197,9 +222,7 @@ PROFIL DU CANDIDAT :
 FORMATION DEMANDÉE :
 - Nom : {formation.nom}
 - Type : {formation.get_type_formation_display()}
-- Durée : {formation.duree_semaines} semaines
-- Niveau requis : {formation.get_niveau_requis_display()}
-- Âge requis : {formation.age_min}-{formation.age_max} ans
+- Durée : {formation.duree_semaines} semaines{exigences}
 
 MOTIVATION ET PROJET :
 - Motivation principale : {demande.get_motivation_principale_display()}
@@ -214,8 +237,7 @@ MOTIVATION ET PROJET :
 - Accepte mentoring : {"Oui" if demande.accepte_mentoring else "Non"}
 
 CRITÈRES D'ÉVALUATION :
-1. Compatibilité âge et prérequis (0-20 points)
-2. Motivation et engagement (0-25 points)
+{criteres}
 3. Capacité d'apprentissage et niveau éducatif (0-20 points)
 4. Faisabilité du projet post-formation (0-20 points)
 5. Contexte socio-économique favorable (0-15 points)
@@ -225,8 +247,7 @@ Répondez en JSON strict avec les clés suivantes :
     "score_formabilite": <score de 0 à 100>,
     "analyse_detaillee": "<analyse complète des points forts et faiblesses>",
     "recommandations": "<recommandations spécifiques>",
-    "criteres_scores": {{
-        "compatibilite": <score 0-20>,
+    "criteres_scores": {{{cle_compatibilite}
         "motivation": <score 0-25>,
         "capacite_apprentissage": <score 0-20>,
         "faisabilite_projet": <score 0-20>,
@@ -238,68 +259,208 @@ Répondez en JSON strict avec les clés suivantes :
 """
 
 
-def analyser_demande_formation_sync(demande_id):
-    """Analyse synchrone d'une demande de formation par le LLM"""
-    try:
-        demande = DemandeFormation.objects.get(id=demande_id)
+FORMATION_SYSTEM_MESSAGE = "Tu es un expert en évaluation de formabilité et insertion socio-économique."
 
-        prompt = build_formation_analysis_prompt(demande)
 
-        messages_llm = [
-            SystemMessage(content="Tu es un expert en évaluation de formabilité et insertion socio-économique."),
-            HumanMessage(content=prompt)
-        ]
+def build_formation_analysis_messages(demande, pre_evaluation=None):
+    """Messages envoyés au LLM pour l'analyse d'une demande (appel direct ou en flux)"""
+    if pre_evaluation is None:
+        pre_evaluation = pre_evaluer(demande)
+    return [
+        SystemMessage(content=FORMATION_SYSTEM_MESSAGE),
+        HumanMessage(content=build_formation_analysis_prompt(demande, pre_evaluation))
+    ]
 
-        response = llm(messages_llm)
-        llm_response = response.content
 
-        try:
-            result = json.loads(llm_response)
-
-            # Mettre à jour la demande avec les résultats
-            demande.score_formabilite = result.get('score_formabilite')
-            demande.analyse_llm = result.get('analyse_detaillee', '')
-            demande.recommandations_llm = result.get('recommandations', '')
-            demande.criteres_evaluacion = result.get('criteres_scores', {})
-            demande.statut = 'analysee'
-            demande.date_analyse = timezone.now()
-
-            # Décision automatique basée sur le score
-            if demande.score_formabilite >= 70:
-                demande.statut = 'acceptee'
-                demande.date_decision = timezone.now()
-
-                # Créer automatiquement le parcours de formation
-                parcours = ParcoursFormation.objects.create(
-                    demande_formation=demande
+# À incrémenter quand l'interprétation de la réponse change (appliquer_resultat_analyse) :
+# les analyses existantes ne sont alors plus considérées à jour
+FORMATION_ANALYSE_VERSION = 2
+
+
+def empreinte_analyse(messages_llm):
+    """
+    Empreinte des données d'une analyse : messages envoyés au LLM (donc champs de
+    la personne, de la demande et de la formation tels que le prompt les présente),
+    version du traitement et modèle.
+    """
+    payload = json.dumps(
+        [FORMATION_ANALYSE_VERSION, llm.model, [(m.type, m.content) for m in messages_llm]],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def analyse_a_jour(demande, empreinte):
+    """La dernière analyse réussie a-t-elle été faite sur exactement les mêmes données ?"""
+    return demande.score_formabilite is not None and demande.empreinte_analyse == empreinte
+
+
+def analyses_anciennes(jours=30):
+    """Demandes dont la dernière analyse réussie date de plus de ``jours`` jours (filtre SQL seul)."""
+    return DemandeFormation.objects.filter(
+        score_formabilite__isnull=False,
+        date_analyse__lt=timezone.now() - timedelta(days=jours)
+    ).select_related('personne', 'formation_souhaitee')
+
+
+def demandes_a_reanalyser(jours=30):
+    """
+    Analyses anciennes dont les données ont changé depuis ; renvoie
+    ``(demandes, nombre d'analyses anciennes encore à jour)``.
+
+    Reconstruit le prompt de chaque analyse ancienne pour en comparer l'empreinte :
+    réservé à la commande ``planifier_reanalyses`` (cron), pas aux pages.
+    """
+    demandes, inchangees = [], 0
+    for demande in analyses_anciennes(jours):
+        if analyse_a_jour(demande, empreinte_analyse(build_formation_analysis_messages(demande))):
+            inchangees += 1
+        else:
+            demandes.append(demande)
+    return demandes, inchangees
+
+
+def eviter_analyse(demande):
+    """Compte une réanalyse évitée et renvoie le résultat de l'analyse existante"""
+    DemandeFormation.objects.filter(pk=demande.pk).update(analyses_evitees=F('analyses_evitees') + 1)
+    return {
+        'success': True,
+        'score': demande.score_formabilite,
+        'statut': demande.statut,
+        'inchangee': True,
+    }
+
+
+def pre_evaluation_demande(demande):
+    """Pré-évaluation par règles avant analyse, places restantes de la formation comprises"""
+    places = None
+    if decidable(demande):
+        places = demande.formation_souhaitee.places_restantes()
+    return pre_evaluer(demande, places)
+
+
+def appliquer_refus_par_regles(demande, pre_evaluation):
+    """
+    Refuse une demande inéligible sans appel au LLM (cf. prescoring.py).
+
+    Ni score (pas de 0 fictif dans les statistiques de formabilité) ni empreinte :
+    la prochaine analyse réapplique les règles et, si la fiche a été corrigée,
+    interroge le LLM. Un refus identique déjà enregistré n'est pas réécrit.
+    """
+    motifs = " ; ".join(pre_evaluation.motifs_refus)
+    if demande.statut == 'refusee' and demande.decision_par_regles and demande.commentaire_decision == motifs:
+        return {'success': True, 'score': None, 'statut': demande.statut, 'par_regles': True, 'inchangee': True}
+    demande.score_formabilite = None
+    demande.analyse_llm = f"Demande non éligible (décision par règles, sans analyse IA) : {motifs}"
+    demande.recommandations_llm = ''
+    demande.criteres_evaluacion = (
+        {'compatibilite': pre_evaluation.compatibilite} if pre_evaluation.compatibilite is not None else {}
+    )
+    demande.decision_par_regles = True
+    demande.empreinte_analyse = ''
+    demande.statut = 'refusee'
+    demande.date_analyse = demande.date_decision = timezone.now()
+    demande.commentaire_decision = motifs
+    demande.save()
+    return {
+        'success': True,
+        'score': demande.score_formabilite,
+        'statut': demande.statut,
+        'par_regles': True,
+    }
+
+
+def appliquer_resultat_analyse(demande, llm_response, empreinte='', pre_evaluation=None):
+    """Enregistre la réponse JSON du LLM sur la demande (score, analyse, décision automatique)"""
+    try:
+        result = json.loads(llm_response)
+
+        # Mettre à jour la demande avec les résultats
+        demande.score_formabilite = result.get('score_formabilite')
+        demande.analyse_llm = result.get('analyse_detaillee', '')
+        demande.recommandations_llm = result.get('recommandations', '')
+        demande.criteres_evaluacion = result.get('criteres_scores', {})
+        if pre_evaluation is not None and pre_evaluation.compatibilite is not None:
+            # Critère calculé par les règles, pas par le LLM
+            demande.criteres_evaluacion['compatibilite'] = pre_evaluation.compatibilite
+        if demande.decision_par_regles:
+            # Ancien refus par règles levé (fiche corrigée) : la décision est à reprendre
+            demande.decision_par_regles = False
+            demande.date_decision = None
+            demande.commentaire_decision = ''
+        demande.empreinte_analyse = empreinte
+        demande.statut = 'analysee'
+        demande.date_analyse = timezone.now()
+
+        alertes = pre_evaluation.alertes if pre_evaluation is not None else []
+        if alertes:
+            # Formation complète ou fermée : acceptation laissée à l'administrateur
+            demande.commentaire_decision = " ; ".join(alertes)
+
+        # Décision automatique basée sur le score
+        if demande.score_formabilite >= 70 and not alertes:
+            demande.statut = 'acceptee'
+            demande.date_decision = timezone.now()
+
+            # Créer automatiquement le parcours de formation
+            parcours = ParcoursFormation.objects.create(
+                demande_formation=demande
+            )
+
+            # Si la personne a un projet, le créer
+            if demande.a_idee_projet and demande.description_projet:
+                projet = ProjetVie.objects.create(
+                    personne=demande.personne,
+                    titre_projet=f"Projet post-formation {demande.formation_souhaitee.nom}",
+                    description=demande.description_projet,
+                    secteur_activite=demande.formation_souhaitee.get_type_formation_display(),
+                    budget_estime=demande.montant_financement or 0,
+                    type_financement='microcredit' if demande.souhaite_financement else 'autofinancement'
                 )
+                parcours.projet_vie = projet
+                parcours.save()
 
-                # Si la personne a un projet, le créer
-                if demande.a_idee_projet and demande.description_projet:
-                    projet = ProjetVie.objects.create(
-                        personne=demande.personne,
-                        titre_projet=f"Projet post-formation {demande.formation_souhaitee.nom}",
-                        description=demande.description_projet,
-                        secteur_activite=demande.formation_souhaitee.get_type_formation_display(),
-                        budget_estime=demande.montant_financement or 0,
-                        type_financement='microcredit' if demande.souhaite_financement else 'autofinancement'
-                    )
-                    parcours.projet_vie = projet
-                    parcours.save()
+        demande.save()
 
-            demande.save()
+        return {
+            'success': True,
+            'score': demande.score_formabilite,
+            'statut': demande.statut
+        }
 
-            return {
-                'success': True,
-                'score': demande.score_formabilite,
-                'statut': demande.statut
-            }
+    except json.JSONDecodeError as e:
+        demande.analyse_llm = f"Erreur d'analyse : {str(e)}"
+        demande.empreinte_analyse = ''
+        demande.statut = 'analysee'
+        demande.save()
+        return {'success': False, 'error': str(e)}
 
-        except json.JSONDecodeError as e:
-            demande.analyse_llm = f"Erreur d'analyse : {str(e)}"
-            demande.statut = 'analysee'
-            demande.save()
-            return {'success': False, 'error': str(e)}
+
+def analyser_demande_formation_sync(demande_id, force=False):
+    """
+    Analyse synchrone d'une demande de formation par le LLM (force : ignorer le cache des réponses).
+
+    Une demande inéligible selon les règles est refusée sans appel au LLM
+    (résultat marqué ``par_regles``, cf. prescoring.py). Si les données n'ont pas
+    changé depuis la dernière analyse réussie, le LLM n'est pas rappelé, même
+    avec ``force`` (résultat marqué ``inchangee``).
+    """
+    try:
+        demande = DemandeFormation.objects.select_related('personne', 'formation_souhaitee').get(id=demande_id)
+        pre_evaluation = pre_evaluation_demande(demande)
+        messages_llm = build_formation_analysis_messages(demande, pre_evaluation)
+        empreinte = empreinte_analyse(messages_llm)
+        if pre_evaluation.refus:
+            return appliquer_refus_par_regles(demande, pre_evaluation)
+        if analyse_a_jour(demande, empreinte):
+            return eviter_analyse(demande)
+
+        with journaliser_appel('formabilite', demande.id) as appel:
+            llm_response = invoke_cached(llm, messages_llm, bypass_cache=force, valider=json.loads)
+            result = appliquer_resultat_analyse(demande, llm_response, empreinte, pre_evaluation)
+            appel.json_valide = result['success']
+            appel.erreur = result.get('error', '')[:255]
+        return result
 
     except DemandeFormation.DoesNotExist:
         return {'success': False, 'error': 'Demande introuvable'}
@@ -337,8 +498,8 @@ PROFIL PORTEUR :
 """
 
 
-def analyser_projet_vie_sync(projet_id):
-    """Analyse synchrone d'un projet de vie par le LLM"""
+def analyser_projet_vie_sync(projet_id, force=False):
+    """Analyse synchrone d'un projet de vie par le LLM (force : ignorer le cache des réponses)"""
     try:
         projet = ProjetVie.objects.get(id=projet_id)
         prompt = build_projet_analysis_prompt(projet)
@@ -348,22 +509,26 @@ def analyser_projet_vie_sync(projet_id):
             HumanMessage(content=prompt)
         ]
 
-        response = llm(messages_llm)
+        with journaliser_appel('projet', projet.id) as appel:
+            llm_response = invoke_cached(llm, messages_llm, bypass_cache=force, valider=json.loads)
 
-        try:
-            result = json.loads(response.content)
+            try:
+                result = json.loads(llm_response)
+                appel.json_valide = True
 
-            projet.faisabilite_score = result.get('faisabilite_score')
-            projet.analyse_ia = result.get('analyse', '')
-            projet.recommandations = result.get('recommandations', '')
-            projet.save()
+                projet.faisabilite_score = result.get('faisabilite_score')
+                projet.analyse_ia = result.get('analyse', '')
+                projet.recommandations = result.get('recommandations', '')
+                projet.save()
 
-            return {'success': True}
+                return {'success': True}
 
-        except json.JSONDecodeError as e:
-            projet.analyse_ia = f"Erreur d'analyse : {str(e)}"
-            projet.save()
-            return {'success': False, 'error': str(e)}
+            except json.JSONDecodeError as e:
+                appel.json_valide = False
+                appel.erreur = str(e)[:255]
+                projet.analyse_ia = f"Erreur d'analyse : {str(e)}"
+                projet.save()
+                return {'success': False, 'error': str(e)}
 
     except ProjetVie.DoesNotExist:
         return {'success': False, 'error': 'Projet introuvable'}
@@ -377,22 +542,22 @@ try:
 
 
     @shared_task
-    def analyser_demande_formation(demande_id):
-        return analyser_demande_formation_sync(demande_id)
+    def analyser_demande_formation(demande_id, force=False):
+        return analyser_demande_formation_sync(demande_id, force=force)
 
 
     @shared_task
-    def analyser_projet_vie(projet_id):
-        return analyser_projet_vie_sync(projet_id)
+    def analyser_projet_vie(projet_id, force=False):
+        return analyser_projet_vie_sync(projet_id, force=force)
 
 except ImportError:
     # Si Celery n'est pas installé, utiliser la version synchrone
-    def analyser_demande_formation(demande_id):
-        return analyser_demande_formation_sync(demande_id)
+    def analyser_demande_formation(demande_id, force=False):
+        return analyser_demande_formation_sync(demande_id, force=force)
 
 
-    def analyser_projet_vie(projet_id):
-        return analyser_projet_vie_sync(projet_id)
+    def analyser_projet_vie(projet_id, force=False):
+        return analyser_projet_vie_sync(projet_id, force=force)
 
 
 @login_required
@@ -1812,10 +1977,15 @@ def reanalyser_demande(request, demande_id):
 
     if request.method == 'POST':
         try:
-            # Relancer l'analyse
-            result = analyser_demande_formation_sync(demande_id)
+            # Relancer l'analyse : nouvelle génération sans cache, sauf si les données n'ont pas changé
+            result = analyser_demande_formation_sync(demande_id, force=True)
 
-            if result['success']:
+            if result.get('inchangee'):
+                messages.info(
+                    request,
+                    f"Données inchangées depuis la dernière analyse : score conservé ({result['score']}/100)"
+                )
+            elif result['success']:
                 messages.success(
                     request,
                     f"Analyse IA relancée avec succès. Nouveau score: {result['score']}/100"
@@ -1946,36 +2116,16 @@ def admin_lancer_analyses_lot(request):
             messages.error(request, "Aucune demande sélectionnée.")
             return redirect('formation:admin_lancer_analyses_lot')
 
-        # Statistiques de traitement
-        total_demandes = len(demandes_ids)
-        analyses_reussies = 0
-        analyses_echouees = 0
-
-        # Traiter chaque demande
-        for demande_id in demandes_ids:
-            try:
-                result = analyser_demande_formation_sync(demande_id)
-                if result['success']:
-                    analyses_reussies += 1
-                else:
-                    analyses_echouees += 1
-            except Exception as e:
-                analyses_echouees += 1
-
-        # Messages de résultat
-        if analyses_reussies > 0:
-            messages.success(
-                request,
-                f"✅ {analyses_reussies}/{total_demandes} analyses réussies"
-            )
-
-        if analyses_echouees > 0:
-            messages.warning(
-                request,
-                f"⚠️ {analyses_echouees}/{total_demandes} analyses échouées"
-            )
+        # Les analyses tournent en tâche de fond (cf. formation/batch.py)
+        lot = batch.creer_lot(
+            demandes_ids,
+            user=request.user,
+            concurrence=_entier_positif(request.POST.get('concurrence')),
+        )
+        batch.lancer_lot(lot)
 
-        return redirect('formation:admin_demandes_list')
+        messages.success(request, f"🧠 Lot de {lot.total} analyse(s) lancé en arrière-plan.")
+        return redirect('formation:admin_lot_analyse_detail', lot_id=lot.pk)
 
     # GET: Afficher les demandes disponibles pour analyse
     # Demandes sans analyse ou avec analyse ancienne
@@ -1984,17 +2134,16 @@ def admin_lancer_analyses_lot(request):
         statut='en_attente'
     ).select_related('personne', 'formation_souhaitee')
 
-    # Demandes avec analyse ancienne (+ de 30 jours)
-    from datetime import timedelta
-    ancienne_date = timezone.now() - timedelta(days=30)
-    demandes_analyse_ancienne = DemandeFormation.objects.filter(
-        score_formabilite__isnull=False,
-        date_analyse__lt=ancienne_date
-    ).select_related('personne', 'formation_souhaitee')
+    # Demandes avec analyse ancienne (+ de 30 jours). Le tri des données inchangées
+    # (empreinte) est fait par planifier_reanalyses et, à l'exécution, par l'analyse
+    # elle-même : une demande inchangée n'est pas renvoyée au LLM.
+    demandes_analyse_ancienne = analyses_anciennes(30)
 
     context = {
         'demandes_sans_analyse': demandes_sans_analyse,
         'demandes_analyse_ancienne': demandes_analyse_ancienne,
+        'analyses_evitees': DemandeFormation.objects.aggregate(total=Sum('analyses_evitees'))['total'] or 0,
+        'lots_recents': LotAnalyse.objects.all()[:5],
     }
 
     return render(request, 'formation/admin/lancer_analyses_lot.html', context)
@@ -2018,31 +2167,21 @@ def admin_analyser_toutes_demandes(request):
             statut='en_attente'
         )
 
-        total = demandes_a_analyser.count()
-        if total == 0:
+        demandes_ids = list(demandes_a_analyser.values_list('id', flat=True))
+        if not demandes_ids:
             messages.info(request, "Aucune demande en attente d'analyse.")
             return redirect('formation:admin_dashboard')
 
-        # Traitement en lot
-        reussies = 0
-        echouees = 0
-
-        for demande in demandes_a_analyser:
-            try:
-                result = analyser_demande_formation_sync(demande.id)
-                if result['success']:
-                    reussies += 1
-                else:
-                    echouees += 1
-            except Exception:
-                echouees += 1
+        # Traitement en lot, en tâche de fond
+        lot = batch.creer_lot(demandes_ids, user=request.user)
+        batch.lancer_lot(lot)
 
         messages.success(
             request,
-            f"🧠 Analyse en lot terminée : {reussies}/{total} réussies, {echouees} échouées"
+            f"🧠 Analyse en lot lancée : {lot.total} demande(s) en arrière-plan"
         )
 
-        return redirect('formation:admin_dashboard')
+        return redirect('formation:admin_lot_analyse_detail', lot_id=lot.pk)
 
     # GET: Page de confirmation
     demandes_count = DemandeFormation.objects.filter(
@@ -2057,6 +2196,49 @@ def admin_analyser_toutes_demandes(request):
     return render(request, 'formation/admin/confirmer_analyse_lot.html', context)
 
 
+def _entier_positif(valeur):
+    try:
+        valeur = int(valeur)
+    except (TypeError, ValueError):
+        return None
+    return valeur if valeur > 0 else None
+
+
+@login_required
+@user_passes_test(is_admin_or_mentor)
+def admin_lot_analyse_detail(request, lot_id):
+    """Suivi en direct d'un lot d'analyses IA (annulation et reprise)"""
+    lot = get_object_or_404(LotAnalyse, id=lot_id)
+
+    if request.method == 'POST':
+        action = request.POST.get('action')
+        if action == 'annuler' and batch.annuler_lot(lot):
+            messages.warning(request, "Lot annulé : les analyses en cours se terminent, les suivantes ne démarrent pas.")
+        elif action == 'reprendre':
+            if batch.reprendre_lot(lot):
+                messages.success(request, "Lot relancé : seules les demandes non terminées seront analysées.")
+            else:
+                messages.info(request, "Ce lot est terminé ou toujours en cours d'exécution.")
+        return redirect('formation:admin_lot_analyse_detail', lot_id=lot.pk)
+
+    context = {
+        'lot': lot,
+        'progression': batch.progression(lot),
+        'echecs': lot.elements.filter(statut='echouee').select_related(
+            'demande__personne', 'demande__formation_souhaitee'
+        )[:50],
+    }
+    return render(request, 'formation/admin/lot_analyse_detail.html', context)
+
+
+@login_required
+@user_passes_test(is_admin_or_mentor)
+def api_lot_analyse_progression(request, lot_id):
+    """Compteurs d'un lot d'analyses IA, interrogés régulièrement par la page de suivi"""
+    lot = get_object_or_404(LotAnalyse, id=lot_id)
+    return JsonResponse(batch.progression(lot))
+
+
 @login_required
 @user_passes_test(is_admin_or_mentor)
 def admin_configuration_ia(request):
@@ -2083,13 +2265,36 @@ def admin_configuration_ia(request):
         'seuil_acceptation': 70,
     })
 
+    llm_cache = get_llm_cache()
     context = {
         'config': config,
+        'llm_cache_stats': llm_cache.stats() if llm_cache else None,
     }
 
     return render(request, 'formation/admin/configuration_ia.html', context)
 
 
+@login_required
+@user_passes_test(is_admin_or_mentor)
+def admin_statistiques_ia(request):
+    """Latences (percentiles) et taux d'échec des appels au LLM, par usage et par jour ; files par priorité"""
+    jours = min(_entier_positif(request.GET.get('jours')) or 14, 365)
+    stats = statistiques_appels(jours)
+    context = {
+        'stats': stats,
+        # Files d'attente du processus web (chaque worker Celery a les siennes)
+        'priorites': llm.stats()['priorites'],
+        'analyses_evitees': DemandeFormation.objects.aggregate(total=Sum('analyses_evitees'))['total'] or 0,
+        'decisions_par_regles': DemandeFormation.objects.filter(decision_par_regles=True).count(),
+        'sections': [
+            ('Par usage', 'fa-tags', stats['par_usage']),
+            ('Par jour', 'fa-calendar-day', stats['par_jour']),
+        ],
+        'periodes': [1, 7, 14, 30, 90],
+    }
+    return render(request, 'formation/admin/statistiques_ia.html', context)
+
+
 @login_required
 @user_passes_test(is_admin_or_mentor)
 def admin_historique_analyses(request):
@@ -2160,8 +2365,8 @@ def api_lancer_analyse_ajax(request, demande_id):
             demande = DemandeFormation.objects.get(id=demande_id)
 
             # Vérifier si une analyse existe déjà
+            force_reanalyse = bool(request.POST.get('force', False))
             if demande.score_formabilite:
-                force_reanalyse = request.POST.get('force', False)
                 if not force_reanalyse:
                     return JsonResponse({
                         'success': False,
@@ -2169,8 +2374,8 @@ def api_lancer_analyse_ajax(request, demande_id):
                         'existing_score': demande.score_formabilite
                     })
 
-            # Lancer l'analyse
-            result = analyser_demande_formation_sync(demande_id)
+            # Lancer l'analyse (force : nouvelle génération, sans passer par le cache)
+            result = analyser_demande_formation_sync(demande_id, force=force_reanalyse)
 
             if result['success']:
                 # Recharger la demande pour récupérer les nouvelles données
@@ -2209,25 +2414,31 @@ def api_lancer_analyse_ajax(request, demande_id):
 def admin_test_ia_connection(request):
     """Tester la connexion avec l'IA (Ollama)"""
 
-    try:
-        # Test simple avec un prompt basique
-        test_messages = [
-            SystemMessage(content="Tu es un assistant de test."),
-            HumanMessage(content="Réponds simplement 'OK' si tu reçois ce message.")
-        ]
-
-        response = llm(test_messages)
+    # Sonde légère (/api/tags) : pas de génération, réponse en quelques millisecondes
+    with journaliser_appel('test') as appel:
+        health = llm.health()
+        appel.modele = health['model']
+        appel.succes = health['ok']
+        appel.erreur = health.get('error', '')[:255]
 
+    if health['ok']:
         return JsonResponse({
             'success': True,
             'message': 'Connexion IA fonctionnelle',
-            'response': response.content[:100] + '...' if len(response.content) > 100 else response.content,
-            'model': 'mistral (Ollama)'
+            'response': f"Modèle disponible ({health['latency_ms']} ms)",
+            'model': f"{health['model']} (Ollama)",
+            'health': health,
         })
 
-    except Exception as e:
-        return JsonResponse({
-            'success': False,
-            'error': f'Erreur de connexion IA: {str(e)}',
-            'solution': 'Vérifiez que Ollama est démarré avec le modèle Mistral'
-        }, status=500)
\ No newline at end of file
+    if 'error' in health:
+        error = f"Erreur de connexion IA: {health['error']}"
+        solution = f"Vérifiez que Ollama est démarré ({health['base_url']})"
+    else:
+        error = f"Modèle {health['model']} introuvable sur Ollama"
+        solution = f"Installez le modèle : ollama pull {health['model']}"
+    return JsonResponse({
+        'success': False,
+        'error': error,
+        'solution': solution,
+        'health': health,
+    }, status=500)
\ No newline at end of file
@@ -5,8 +5,18 @@ import os
 
 # Configuration des workers
 workers = 1  # Un seul worker pour économiser la mémoire
-worker_class = "sync"
+# Worker ASGI : les vues asynchrones (diffusion SSE des analyses IA, cf.
+# formation/streaming.py) n'y bloquent pas le worker pendant la génération.
+# Un worker « sync » sert le flux en bloquant tout le processus jusqu'à la fin
+# de l'analyse : à réserver au dépannage (GUNICORN_WORKER_CLASS=sync).
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'uvicorn.workers.UvicornWorker')
 worker_connections = 1000
+# Application assortie au worker (ASGI pour uvicorn, WSGI sinon) ; ne pas passer
+# d'application en ligne de commande, elle remplacerait celle-ci
+wsgi_app = os.environ.get(
+    'GUNICORN_APP',
+    'lanfiasave.asgi:application' if 'uvicorn' in worker_class.lower() else 'lanfiasave.wsgi:application',
+)
 
 # Timeouts augmentés
 timeout = 120  # 2 minutes au lieu de 30 secondes
@@ -28,4 +38,25 @@ loglevel = "info"
 access_log_format = '%(h)s %(l)s %(u)s %(t)s "%(r)s" %(s)s %(b)s "%(f)s" "%(a)s" %(D)s'
 
 # Limites mémoire
-worker_memory_limit = 300 * 1024 * 1024  # 300MB par worker
\ No newline at end of file
+worker_memory_limit = 300 * 1024 * 1024  # 300MB par worker
+
+
+def when_ready(server):
+    if 'uvicorn' not in worker_class.lower():
+        server.log.warning(
+            f"Worker « {worker_class} » : chaque analyse IA diffusée en direct bloque le worker "
+            f"jusqu'à la fin de la génération (préférer uvicorn.workers.UvicornWorker)."
+        )
+
+
+def post_worker_init(worker):
+    """Précharge le modèle de détection une fois par worker (voir detection/registry.py)."""
+    from django.conf import settings
+
+    if getattr(settings, 'DETECTION_PRELOAD', False):
+        try:
+            from detection.registry import warmup
+            warmup()
+        except Exception as e:
+            # Le modèle sera chargé au premier appel
+            worker.log.warning(f"Préchargement du modèle impossible : {e}")
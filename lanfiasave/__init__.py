@@ -0,0 +1,7 @@
+# Charge l'application Celery au démarrage de Django, pour que les @shared_task l'utilisent
+try:
+    from .celery import app as celery_app
+except ImportError:
+    celery_app = None
+
+__all__ = ('celery_app',)
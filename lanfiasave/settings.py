@@ -290,6 +290,7 @@ INSTALLED_APPS = [
     'rest_framework',
     'rest_framework.authtoken',
     'formation',
+    'llm',
 ]
 
 MIDDLEWARE = [
@@ -357,6 +358,87 @@ else:
     CELERY_BROKER_URL = 'redis://localhost:6379/0'
     CELERY_RESULT_BACKEND = 'redis://localhost:6379/0'
 
+# Configuration du module de détection (cf. detection/registry.py)
+DETECTION_ARTIFACTS_DIR = os.environ.get('DETECTION_ARTIFACTS_DIR', str(BASE_DIR / 'detection' / 'artifacts'))
+# Délai (secondes) entre deux vérifications de la version active du modèle
+DETECTION_REGISTRY_CHECK_INTERVAL = int(os.environ.get('DETECTION_REGISTRY_CHECK_INTERVAL', '30'))
+# Précharger le modèle au démarrage de chaque worker gunicorn
+DETECTION_PRELOAD = os.environ.get('DETECTION_PRELOAD', 'True').lower() == 'true'
+# Micro-lots d'inférence (cf. detection/batching.py)
+DETECTION_BATCH_MAX_SIZE = int(os.environ.get('DETECTION_BATCH_MAX_SIZE', '32'))
+DETECTION_BATCH_MAX_WAIT_MS = float(os.environ.get('DETECTION_BATCH_MAX_WAIT_MS', '5'))
+# Cache des prédictions (cf. detection/prediction_cache.py) : entrées du LRU local
+# (0 pour désactiver), alias du cache Django partagé et durée de vie (secondes)
+DETECTION_PREDICTION_CACHE_SIZE = int(os.environ.get('DETECTION_PREDICTION_CACHE_SIZE', '10000'))
+DETECTION_PREDICTION_CACHE_ALIAS = os.environ.get('DETECTION_PREDICTION_CACHE_ALIAS', 'predictions')
+DETECTION_PREDICTION_CACHE_TTL = int(os.environ.get('DETECTION_PREDICTION_CACHE_TTL', str(7 * 24 * 3600)))
+# Entrées maximales du cache partagé (au-delà, Django en supprime un tiers)
+DETECTION_PREDICTION_CACHE_MAX_ENTRIES = int(os.environ.get('DETECTION_PREDICTION_CACHE_MAX_ENTRIES', '200000'))
+
+# Caches Django. « predictions » est en base : partagé entre les workers gunicorn
+# et conservé au redémarrage (un LocMemCache serait propre à chaque processus).
+# Sa table est créée par la migration detection 0001 (ou « python manage.py
+# createcachetable »).
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'predictions': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'detection_prediction_cache',
+        'TIMEOUT': DETECTION_PREDICTION_CACHE_TTL,
+        'OPTIONS': {'MAX_ENTRIES': DETECTION_PREDICTION_CACHE_MAX_ENTRIES},
+    },
+}
+
+# Client LLM partagé (cf. llm/client.py) : serveur Ollama, modèle et durée de
+# maintien en mémoire du modèle entre deux appels
+LLM_BASE_URL = os.environ.get('OLLAMA_BASE_URL', 'http://localhost:11434')
+LLM_MODEL = os.environ.get('LLM_MODEL', 'mistral')
+LLM_KEEP_ALIVE = os.environ.get('LLM_KEEP_ALIVE', '10m')
+# Délais (secondes) de connexion et de lecture d'une génération
+LLM_CONNECT_TIMEOUT = float(os.environ.get('LLM_CONNECT_TIMEOUT', '5'))
+LLM_READ_TIMEOUT = float(os.environ.get('LLM_READ_TIMEOUT', '120'))
+# Générations simultanées par processus, et attente maximale d'une place libre
+LLM_MAX_CONCURRENCY = int(os.environ.get('LLM_MAX_CONCURRENCY', '4'))
+LLM_QUEUE_TIMEOUT = float(os.environ.get('LLM_QUEUE_TIMEOUT', '120'))
+# Nouvelles tentatives sur erreur transitoire (délai exponentiel à partir de LLM_RETRY_BACKOFF)
+LLM_MAX_RETRIES = int(os.environ.get('LLM_MAX_RETRIES', '2'))
+LLM_RETRY_BACKOFF = float(os.environ.get('LLM_RETRY_BACKOFF', '1'))
+# Disjoncteur : échecs consécutifs avant ouverture, et durée (secondes) d'ouverture
+LLM_CIRCUIT_FAILURES = int(os.environ.get('LLM_CIRCUIT_FAILURES', '5'))
+LLM_CIRCUIT_RESET = float(os.environ.get('LLM_CIRCUIT_RESET', '30'))
+# Priorités (cf. llm/priorites.py) : places utilisables par les lots d'analyses et
+# par les réanalyses planifiées (par défaut, une place reste aux appels interactifs),
+# et attente (secondes) après laquelle un appel gagne un rang de priorité
+LLM_BULK_CONCURRENCY = int(os.environ.get('LLM_BULK_CONCURRENCY', str(max(1, LLM_MAX_CONCURRENCY - 1))))
+LLM_SCHEDULED_CONCURRENCY = int(os.environ.get('LLM_SCHEDULED_CONCURRENCY', str(max(1, LLM_MAX_CONCURRENCY // 2))))
+LLM_PRIORITY_AGING = float(os.environ.get('LLM_PRIORITY_AGING', '30'))
+
+# Cache des réponses du LLM (cf. llm/cache.py) : LRU local, durée de vie (secondes)
+# et nombre maximal d'entrées de la table ReponseLLMEnCache
+LLM_CACHE_ENABLED = os.environ.get('LLM_CACHE_ENABLED', 'True').lower() == 'true'
+LLM_CACHE_LOCAL_SIZE = int(os.environ.get('LLM_CACHE_LOCAL_SIZE', '256'))
+LLM_CACHE_TTL = int(os.environ.get('LLM_CACHE_TTL', str(30 * 24 * 3600)))
+LLM_CACHE_MAX_ENTRIES = int(os.environ.get('LLM_CACHE_MAX_ENTRIES', '20000'))
+
+# Journal des appels au LLM (cf. llm/journal.py) et durée de conservation (jours)
+LLM_JOURNAL_ENABLED = os.environ.get('LLM_JOURNAL_ENABLED', 'True').lower() == 'true'
+LLM_JOURNAL_RETENTION_JOURS = int(os.environ.get('LLM_JOURNAL_RETENTION_JOURS', '90'))
+
+# Lots d'analyses IA des demandes de formation (cf. formation/batch.py) :
+# analyses simultanées envoyées à Ollama et tentatives par demande
+FORMATION_LOT_CONCURRENCE = int(os.environ.get('FORMATION_LOT_CONCURRENCE', '2'))
+FORMATION_LOT_MAX_TENTATIVES = int(os.environ.get('FORMATION_LOT_MAX_TENTATIVES', '3'))
+
+# Répartition des dons (cf. donations/distribution.py) : montant reçu (FCFA) à
+# partir duquel une personne n'est plus considérée vulnérable
+DONS_OBJECTIF_FINANCEMENT = int(os.environ.get('DONS_OBJECTIF_FINANCEMENT', '200000'))
+
+# Tranches d'âge des statistiques du tableau de bord donateur (cf. donations/statistiques.py) :
+# bornes inférieures séparées par des virgules ; vide : une ligne par âge
+DONS_TRANCHES_AGE = os.environ.get('DONS_TRANCHES_AGE', '0,18,25,35,50,65')
+
 # Configuration d'authentification REST
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
@@ -36,4 +36,5 @@ urlpatterns = [
          name='password_change_done'),
     # Autres routes si nécessaire
     path('formation/', include('formation.urls')),  # Nouvelle ligne
+    path('detection/', include('detection.urls')),  # Supervision du modèle de vulnérabilité
 ]+ static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
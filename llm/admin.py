@@ -0,0 +1,25 @@
+from django.contrib import admin
+
+from .models import AppelLLM, ReponseLLMEnCache
+
+
+@admin.register(ReponseLLMEnCache)
+class ReponseLLMEnCacheAdmin(admin.ModelAdmin):
+    list_display = ('cle', 'modele', 'nb_utilisations', 'cree_le', 'dernier_acces', 'expire_le')
+    list_filter = ('modele',)
+    search_fields = ('cle', 'reponse')
+    readonly_fields = ('cle', 'modele', 'reponse', 'cree_le', 'dernier_acces', 'nb_utilisations')
+
+
+@admin.register(AppelLLM)
+class AppelLLMAdmin(admin.ModelAdmin):
+    list_display = ('date', 'usage', 'modele', 'duree_ms', 'tokens_reponse', 'depuis_cache', 'succes', 'json_valide')
+    list_filter = ('usage', 'succes', 'json_valide', 'depuis_cache', 'modele')
+    search_fields = ('objet_id', 'erreur')
+    date_hierarchy = 'date'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
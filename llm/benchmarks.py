@@ -0,0 +1,313 @@
+# llm/benchmarks.py
+"""
+Banc de charge des analyses IA, contre le serveur Ollama simulé (fake_ollama.py).
+
+Pour chaque flux et chaque nombre de workers, ``workers`` threads (comme
+autant de workers gunicorn ou Celery) enchaînent les requêtes :
+
+- ``recensement`` : enregistrement d'une personne puis analyse de pauvreté
+  (``users.tasks.analyser_pauvrete_sync``, le corps de la tâche de fond) ;
+- ``formation`` : analyse de formabilité d'une demande
+  (``formation.views.analyser_demande_formation_sync``, sans cache).
+
+On mesure le débit de bout en bout, les latences p50 / p95 / p99, les échecs,
+et, échantillonnés toutes les 100 ms, les appels en vol dans ``LLMClient``
+(bornés par ``concurrence_client``), la file d'attente et l'occupation des
+places de génération du serveur simulé : la saturation se lit directement.
+
+Tout se passe dans une base de test créée pour l'occasion (fichier temporaire
+sous SQLite), avec le cache des réponses désactivé ; les vues utilisent un
+``LLMClient`` dédié pointé vers le serveur simulé (ou ``--url``).
+
+    python manage.py benchmark_llm --workers 1 4 16 --requetes 200 --paralleles 2
+"""
+import json
+import os
+import platform
+import random
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+from unittest import mock
+
+from django.db import connection
+from django.test.utils import override_settings
+
+from .fake_ollama import FakeOllamaConfig, FakeOllamaServer
+from .journal import percentile
+
+FLUX = ('recensement', 'formation')
+
+# Période d'échantillonnage des files d'attente (secondes)
+SAMPLE_INTERVAL = 0.1
+
+
+@contextmanager
+def base_de_test():
+    """Base de données jetable (fichier partagé entre threads sous SQLite)."""
+    settings_dict = connection.settings_dict
+    fichier = None
+    if connection.vendor == 'sqlite':
+        fd, fichier = tempfile.mkstemp(prefix='llm_bench_', suffix='.sqlite3')
+        os.close(fd)
+        settings_dict.setdefault('TEST', {})['NAME'] = fichier
+    ancien_nom = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(ancien_nom, verbosity=0)
+        if fichier and os.path.exists(fichier):
+            os.unlink(fichier)
+
+
+# ----------------------------------------------------------------------
+# Données et opérations
+# ----------------------------------------------------------------------
+def donnees_recensement(rng):
+    """Fiche de recensement plausible (clés de ``build_poverty_prompt``)."""
+    return {
+        'age': rng.randint(18, 80),
+        'revenu': rng.choice([0, 15000, 30000, 60000, 120000]),
+        'logement': rng.choice(['Précaire', 'Location', 'Propriétaire', 'Hébergé']),
+        'situation_matrimoniale': rng.choice(['Célibataire', 'Marié(e)', 'Veuf(ve)', 'Divorcé(e)']),
+        'source_eau': rng.choice(['Robinet', 'Puits', 'Rivière']),
+        'type_sanitaires': rng.choice(['Latrines', 'WC', 'Aucun']),
+        'acces_electricite': rng.choice(['Oui', 'Non']),
+        'emploi': rng.choice(['Sans emploi', 'Informel', 'Salarié']),
+        'niveau_education': rng.choice(['Aucun', 'Primaire', 'Secondaire', 'Supérieur']),
+        'etat_sante': rng.choice(['Bon', 'Moyen', 'Mauvais']),
+        'handicap': rng.choice(['Oui', 'Non']),
+        'enfants_non_scolarises': rng.randint(0, 4),
+        'nombre_personnes_menage': rng.randint(1, 12),
+        'montant_total_recu': rng.choice([0, 10000, 50000]),
+    }
+
+
+def preparer(flux, n, rng):
+    """Éléments à traiter : fiches de recensement, ou identifiants de demandes créées en base."""
+    if flux == 'recensement':
+        return [donnees_recensement(rng) for _ in range(n)]
+
+    from formation.models import DemandeFormation, Formation
+    from users.models import PersonneVulnerable
+
+    # Candidats éligibles et places suffisantes : aucune demande n'est refusée par
+    # les règles sans appel au LLM (cf. formation/prescoring.py)
+    formation = Formation.objects.create(
+        nom="Couture", type_formation='artisanat', description="-", duree_semaines=8, competences_acquises="-",
+        places_disponibles=n,
+    )
+    personnes = PersonneVulnerable.objects.bulk_create([
+        PersonneVulnerable(first_name=f"Bench{i}", last_name="Formation", age=rng.randint(18, 45)) for i in range(n)
+    ])
+    demandes = DemandeFormation.objects.bulk_create([
+        DemandeFormation(
+            personne=personne, formation_souhaitee=formation,
+            motivation_principale='emploi', disponibilite_horaire='matin',
+        )
+        for personne in personnes
+    ])
+    return [demande.id for demande in demandes]
+
+
+def operation(flux):
+    """Fonction traitant un élément ; renvoie True si l'analyse a abouti."""
+    if flux == 'recensement':
+        from users.models import PersonneVulnerable
+        from users.tasks import analyser_pauvrete_sync
+        from users.views import build_poverty_prompt
+
+        def recenser(data):
+            personne = PersonneVulnerable.objects.create(
+                first_name="Bench", last_name="Recensement", age=data['age'],
+                analyse_statut=PersonneVulnerable.ANALYSE_EN_ATTENTE,
+            )
+            return analyser_pauvrete_sync(personne.pk, build_poverty_prompt(data)) == PersonneVulnerable.ANALYSE_TERMINEE
+        return recenser
+
+    from formation.views import analyser_demande_formation_sync
+
+    def analyser(demande_id):
+        return analyser_demande_formation_sync(demande_id, force=True)['success']
+    return analyser
+
+
+# ----------------------------------------------------------------------
+# Mesure
+# ----------------------------------------------------------------------
+class Echantillonneur(threading.Thread):
+    """Relève périodiquement les appels en vol du client et la file du serveur simulé."""
+
+    def __init__(self, client, serveur=None):
+        super().__init__(name='llm-bench-sampler', daemon=True)
+        self.client, self.serveur = client, serveur
+        self.arret = threading.Event()
+        self.en_vol, self.en_attente, self.en_cours = [], [], []
+
+    def run(self):
+        while not self.arret.wait(SAMPLE_INTERVAL):
+            self.en_vol.append(self.client.stats()['in_flight'])
+            if self.serveur is not None:
+                stats = self.serveur.stats()
+                self.en_attente.append(stats['en_attente'])
+                self.en_cours.append(stats['en_cours'])
+
+    def resume(self, concurrence_client, paralleles):
+        def moyenne(valeurs):
+            return round(sum(valeurs) / len(valeurs), 2) if valeurs else None
+
+        resume = {
+            'client_en_vol_moyen': moyenne(self.en_vol),
+            'client_en_vol_max': max(self.en_vol, default=None),
+            'client_occupation': round(moyenne(self.en_vol) / concurrence_client, 3) if self.en_vol else None,
+        }
+        if self.serveur is not None:
+            resume.update(
+                serveur_file_moyenne=moyenne(self.en_attente),
+                serveur_file_max=max(self.en_attente, default=None),
+                serveur_occupation=round(moyenne(self.en_cours) / paralleles, 3) if self.en_cours else None,
+            )
+        return resume
+
+
+def _executer(flux, elements, workers):
+    """Traite ``elements`` avec ``workers`` threads ; renvoie (latences réussies en ms, échecs, durée)."""
+    from django.db import connections
+
+    traiter = operation(flux)
+    latences, echecs = [], []
+    verrou = threading.Lock()
+
+    def un(element):
+        debut = time.perf_counter()
+        try:
+            ok = traiter(element)
+            erreur = None if ok else 'analyse en échec'
+        except Exception as e:
+            ok, erreur = False, str(e) or type(e).__name__
+        finally:
+            connections.close_all()
+        with verrou:
+            if ok:
+                latences.append((time.perf_counter() - debut) * 1000)
+            else:
+                echecs.append(erreur)
+
+    debut = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f'bench-{flux}') as pool:
+        list(pool.map(un, elements))
+    return sorted(latences), echecs, time.perf_counter() - debut
+
+
+def run_benchmark(flux=FLUX, workers=(1, 4, 16), requetes=100, concurrence_client=4, max_retries=2,
+                  read_timeout=120.0, url=None, config=None, seed=0, log=print):
+    """
+    Exécute le banc et renvoie un rapport (dict sérialisable en JSON).
+
+    ``url`` : serveur Ollama (réel ou simulé) déjà lancé ; sinon un
+    ``FakeOllamaServer`` est démarré dans le processus avec ``config``.
+    """
+    from .client import LLMClient
+    from .models import AppelLLM
+    from .journal import statistiques_appels
+
+    rng = random.Random(seed)
+    config = config or FakeOllamaConfig(seed=seed)
+    serveur = None if url else FakeOllamaServer(config).start()
+    client = LLMClient(
+        base_url=url or serveur.url, max_concurrency=concurrence_client, max_retries=max_retries,
+        read_timeout=read_timeout, retry_backoff=0.2,
+    )
+    if not client.health()['ok']:
+        raise RuntimeError(f"Ollama injoignable ou modèle absent : {client.base_url}")
+
+    results = []
+    try:
+        with base_de_test(), override_settings(LLM_CACHE_ENABLED=False), \
+                mock.patch('users.views.llm', client), mock.patch('formation.views.llm', client):
+            for nom in flux:
+                for n_workers in workers:
+                    log(f"Flux {nom}, {n_workers} worker(s), {requetes} requête(s)…")
+                    elements = preparer(nom, requetes, rng)
+                    AppelLLM.objects.all().delete()
+                    if serveur is not None:
+                        serveur.reset_stats()
+                    client.breaker.record_success()
+
+                    echantillonneur = Echantillonneur(client, serveur)
+                    echantillonneur.start()
+                    latences, echecs, duree = _executer(nom, elements, n_workers)
+                    echantillonneur.arret.set()
+                    echantillonneur.join()
+
+                    llm = statistiques_appels(1)['total']
+                    result = {
+                        'flux': nom,
+                        'workers': n_workers,
+                        'requetes': len(elements),
+                        'reussies': len(latences),
+                        'echecs': len(echecs),
+                        'exemples_erreurs': sorted(set(echecs))[:5],
+                        'duree_s': round(duree, 3),
+                        'debit_par_s': round(len(latences) / duree, 3) if duree else None,
+                        'p50_ms': percentile(latences, 50),
+                        'p95_ms': percentile(latences, 95),
+                        'p99_ms': percentile(latences, 99),
+                        'llm_p50_ms': llm['p50_ms'],
+                        'llm_p95_ms': llm['p95_ms'],
+                        'json_invalides': llm['json_invalides'],
+                        **echantillonneur.resume(concurrence_client, config.paralleles),
+                    }
+                    if serveur is not None:
+                        result['serveur'] = serveur.stats()
+                    results.append(result)
+    finally:
+        if serveur is not None:
+            serveur.stop()
+
+    return {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'base': connection.vendor,
+            'url': url or 'fake_ollama',
+            'requetes': requetes,
+            'concurrence_client': concurrence_client,
+            'serveur': None if url else {
+                'latence_ms': config.latence_ms, 'distribution': config.distribution,
+                'tokens_par_s': config.tokens_par_s, 'paralleles': config.paralleles,
+                'taux_erreur': config.taux_erreur, 'taux_json_invalide': config.taux_json_invalide,
+                'taux_blocage': config.taux_blocage,
+            },
+        },
+        'results': results,
+    }
+
+
+def format_results(report):
+    """Résumé texte d'un rapport."""
+    def fmt(valeur, largeur, decimales=0):
+        return f"{'–':>{largeur}}" if valeur is None else f"{valeur:>{largeur}.{decimales}f}"
+
+    header = (f"{'flux':<13}{'workers':>8}{'req/s':>9}{'p50 (ms)':>10}{'p95 (ms)':>10}{'p99 (ms)':>10}"
+              f"{'échecs':>8}{'client':>8}{'file srv':>10}{'occ. srv':>10}")
+    lines = [header, '-' * len(header)]
+    for r in report['results']:
+        lines.append(
+            f"{r['flux']:<13}{r['workers']:>8}{fmt(r['debit_par_s'], 9, 2)}{fmt(r['p50_ms'], 10)}"
+            f"{fmt(r['p95_ms'], 10)}{fmt(r['p99_ms'], 10)}{r['echecs']:>8}"
+            f"{fmt(r['client_occupation'], 8, 2)}{fmt(r.get('serveur_file_moyenne'), 10, 1)}"
+            f"{fmt(r.get('serveur_occupation'), 10, 2)}"
+        )
+    return '\n'.join(lines)
+
+
+def write_report(report, path):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, default=str)
@@ -0,0 +1,261 @@
+# llm/cache.py
+"""
+Cache des réponses du LLM.
+
+Les prompts (``build_poverty_prompt``, ``build_formation_analysis_prompt``,
+``build_projet_analysis_prompt``) sont des fonctions déterministes de la fiche :
+tant que la fiche ne change pas, relancer l'analyse reproduit exactement le
+même appel, qui coûte plusieurs secondes de génération à Mistral en local.
+
+La clé est une empreinte de (modèle, message système, empreinte du prompt,
+paramètres de génération) : changer de modèle, de température ou de consigne
+système crée d'autres entrées, sans rien avoir à purger.
+
+Deux niveaux :
+
+- un LRU en mémoire du processus (``LLM_CACHE_LOCAL_SIZE`` entrées) ;
+- la table ``ReponseLLMEnCache``, partagée entre workers, avec une durée de vie
+  (``LLM_CACHE_TTL``) et un nombre maximal d'entrées (``LLM_CACHE_MAX_ENTRIES``) :
+  au-delà, les entrées les moins récemment utilisées sont supprimées.
+
+``bypass_cache=True`` (réanalyse forcée) appelle toujours le LLM et remplace
+l'entrée existante. Seules les réponses que l'appelant sait interpréter
+(``valider``) sont mises en cache. Les compteurs (``stats()``) sont ceux du processus courant.
+"""
+import hashlib
+import json
+import logging
+import threading
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .journal import appel_courant
+
+logger = logging.getLogger(__name__)
+
+# Attributs de ChatOllama qui changent la génération
+GENERATION_PARAMS = (
+    'temperature', 'top_k', 'top_p', 'num_predict', 'num_ctx', 'seed',
+    'repeat_penalty', 'mirostat', 'stop', 'format',
+)
+
+# Nettoyage (expirées + surplus) toutes les N écritures
+EVICTION_EVERY = 50
+
+
+def generation_params(llm):
+    """Paramètres de génération d'un client ChatOllama (None = valeur par défaut d'Ollama)."""
+    llm = getattr(llm, 'chat', llm)  # LLMClient (llm/client.py) : paramètres du ChatOllama sous-jacent
+    return {name: getattr(llm, name, None) for name in GENERATION_PARAMS}
+
+
+def split_messages(messages):
+    """Sépare le(s) message(s) système du reste de la conversation."""
+    system = '\n'.join(m.content for m in messages if getattr(m, 'type', None) == 'system')
+    prompt = '\n'.join(f"{m.type}: {m.content}" for m in messages if getattr(m, 'type', None) != 'system')
+    return system, prompt
+
+
+class LLMResponseCache:
+    """LRU local + table ``ReponseLLMEnCache``, indexés par l'empreinte de l'appel."""
+
+    def __init__(self, local_size=256, ttl=30 * 24 * 3600, max_entries=20000, use_db=True):
+        self.local_size = local_size
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.use_db = use_db
+
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.hits_local = self.hits_db = self.misses = self.bypassed = 0
+
+    @staticmethod
+    def key(model, system, prompt, params):
+        prompt_hash = hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+        payload = json.dumps([model, system, prompt_hash, params], sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def key_for(self, llm, messages):
+        """``(clé, nom du modèle)`` de l'appel ``llm`` avec ``messages``."""
+        model = getattr(llm, 'model', type(llm).__name__)
+        system, prompt = split_messages(messages)
+        return self.key(model, system, prompt, generation_params(llm)), model
+
+    # ------------------------------------------------------------------
+    # Lecture / écriture
+    # ------------------------------------------------------------------
+    def get(self, key):
+        """Réponse en cache, ou None."""
+        now = timezone.now()
+        with self._lock:
+            entry = self._lru.get(key)
+            if entry is not None and entry[1] > now:
+                self._lru.move_to_end(key)
+                self.hits_local += 1
+                return entry[0]
+
+        if self.use_db:
+            from .models import ReponseLLMEnCache
+
+            try:
+                row = ReponseLLMEnCache.objects.filter(cle=key, expire_le__gt=now).values_list(
+                    'reponse', 'expire_le').first()
+                if row is not None:
+                    ReponseLLMEnCache.objects.filter(cle=key).update(
+                        dernier_acces=now, nb_utilisations=F('nb_utilisations') + 1,
+                    )
+                    with self._lock:
+                        self.hits_db += 1
+                        self._remember(key, row[0], row[1])
+                    return row[0]
+            except Exception:
+                # Le cache est une optimisation : table absente ou base indisponible, on génère
+                logger.warning("Cache des réponses LLM indisponible", exc_info=True)
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key, model, response):
+        now = timezone.now()
+        expires = now + timedelta(seconds=self.ttl)
+        with self._lock:
+            self._remember(key, response, expires)
+            self._writes += 1
+            evict = self._writes % EVICTION_EVERY == 0
+
+        if not self.use_db:
+            return
+        from .models import ReponseLLMEnCache
+
+        try:
+            ReponseLLMEnCache.objects.update_or_create(
+                cle=key,
+                defaults={'modele': model, 'reponse': response, 'expire_le': expires, 'dernier_acces': now},
+            )
+            if evict:
+                self.evict()
+        except Exception:
+            logger.warning("Cache des réponses LLM indisponible", exc_info=True)
+
+    def _remember(self, key, response, expires):
+        self._lru[key] = (response, expires)
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.local_size:
+            self._lru.popitem(last=False)
+
+    def evict(self):
+        """Supprime les entrées expirées puis les moins récemment utilisées au-delà de ``max_entries``."""
+        from .models import ReponseLLMEnCache
+
+        deleted, _ = ReponseLLMEnCache.objects.filter(expire_le__lte=timezone.now()).delete()
+        cutoff = (ReponseLLMEnCache.objects.order_by('-dernier_acces')
+                  .values_list('dernier_acces', flat=True)[self.max_entries:self.max_entries + 1].first())
+        if cutoff is not None:
+            deleted += ReponseLLMEnCache.objects.filter(dernier_acces__lte=cutoff).delete()[0]
+        return deleted
+
+    # ------------------------------------------------------------------
+    # Supervision
+    # ------------------------------------------------------------------
+    def stats(self):
+        lookups = self.hits_local + self.hits_db + self.misses
+        stats = {
+            'local_size': len(self._lru),
+            'hits_local': self.hits_local,
+            'hits_db': self.hits_db,
+            'misses': self.misses,
+            'bypassed': self.bypassed,
+            'hit_rate': (self.hits_local + self.hits_db) / lookups if lookups else None,
+        }
+        if self.use_db:
+            from .models import ReponseLLMEnCache
+
+            try:
+                totals = ReponseLLMEnCache.objects.aggregate(total=Sum('nb_utilisations'))
+                stats['db_entries'] = ReponseLLMEnCache.objects.count()
+                stats['db_hits_total'] = totals['total'] or 0
+            except Exception:
+                logger.warning("Cache des réponses LLM indisponible", exc_info=True)
+        return stats
+
+    def clear(self, db=False):
+        with self._lock:
+            self._lru.clear()
+            self.hits_local = self.hits_db = self.misses = self.bypassed = 0
+        if db and self.use_db:
+            from .models import ReponseLLMEnCache
+            ReponseLLMEnCache.objects.all().delete()
+
+
+def _valide(response, valider):
+    if valider is None:
+        return True
+    try:
+        valider(response)
+    except Exception:
+        return False
+    return True
+
+
+def invoke_cached(llm, messages, bypass_cache=False, cache=None, valider=None):
+    """
+    Texte de la réponse de ``llm`` à ``messages``, depuis le cache si possible.
+
+    ``bypass_cache=True`` : appel systématique au LLM, la nouvelle réponse
+    remplace l'ancienne. Les erreurs du LLM ne sont jamais mises en cache.
+
+    ``valider`` : fonction appelée sur la réponse (en général le parseur de
+    l'appelant), qui lève une exception si elle est inexploitable. Une réponse
+    refusée est renvoyée à l'appelant mais pas mise en cache : la prochaine
+    analyse rappelle le LLM au lieu de resservir le même JSON invalide. Une
+    entrée déjà en cache et refusée est régénérée.
+    """
+    cache = cache if cache is not None else get_llm_cache()
+    if cache is None:
+        return llm.invoke(messages).content
+
+    key, model = cache.key_for(llm, messages)
+    if bypass_cache:
+        with cache._lock:
+            cache.bypassed += 1
+    else:
+        response = cache.get(key)
+        if response is not None and _valide(response, valider):
+            appel = appel_courant()
+            if appel is not None:
+                appel.noter_requete(model, messages)
+                appel.noter_reponse(response, depuis_cache=True)
+            return response
+
+    response = llm.invoke(messages).content
+    if _valide(response, valider):
+        cache.set(key, model, response)
+    else:
+        logger.warning("Réponse du LLM (%s) inexploitable : non mise en cache", model)
+    return response
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_llm_cache():
+    """Cache unique du processus ; None si désactivé (``LLM_CACHE_ENABLED = False``)."""
+    global _cache
+    if not getattr(settings, 'LLM_CACHE_ENABLED', True):
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = LLMResponseCache(
+                    local_size=getattr(settings, 'LLM_CACHE_LOCAL_SIZE', 256),
+                    ttl=getattr(settings, 'LLM_CACHE_TTL', 30 * 24 * 3600),
+                    max_entries=getattr(settings, 'LLM_CACHE_MAX_ENTRIES', 20000),
+                )
+    return _cache
@@ -0,0 +1,342 @@
+# llm/client.py
+"""
+Client LLM partagé (Ollama).
+
+Un seul client par processus, configuré depuis les settings (``LLM_BASE_URL``,
+``LLM_MODEL``, ``LLM_KEEP_ALIVE``, délais…), remplace les instances de
+``ChatOllama`` créées à l'import dans chaque module de vues :
+
+- connexions HTTP réutilisées (pool httpx du client ``ollama``) ;
+- au plus ``LLM_MAX_CONCURRENCY`` générations simultanées par processus ;
+  au-delà on attend une place, au plus ``LLM_QUEUE_TIMEOUT`` secondes ; les
+  places sont servies par classe de priorité (interactif, lots, réanalyses
+  planifiées, cf. llm/priorites.py) ;
+- délais de connexion et de lecture explicites ;
+- nouvelles tentatives avec délai exponentiel sur les erreurs transitoires
+  (connexion refusée, délai dépassé, erreur 5xx / 429) ;
+- disjoncteur : après ``LLM_CIRCUIT_FAILURES`` échecs consécutifs, les appels
+  échouent immédiatement (``LLMUnavailable``) pendant ``LLM_CIRCUIT_RESET``
+  secondes, puis un appel d'essai décide de la réouverture.
+
+``health()`` interroge ``/api/tags`` (quelques millisecondes) au lieu de lancer
+une génération complète.
+
+Chaque appel complète l'entrée courante du journal (cf. llm/journal.py) :
+modèle, tailles, tokens, tentatives.
+"""
+import asyncio
+import logging
+import random
+import threading
+import time
+
+import httpx
+from django.conf import settings
+
+from .journal import appel_courant, journaliser_appel
+from .priorites import PriorityLimiter, priorite_courante
+
+logger = logging.getLogger(__name__)
+
+
+class LLMUnavailable(Exception):
+    """Le backend LLM est considéré indisponible (disjoncteur ouvert, file d'attente saturée)."""
+
+
+class CircuitBreaker:
+    """Disjoncteur fermé → ouvert après N échecs consécutifs → semi-ouvert après le délai."""
+
+    CLOSED, OPEN, HALF_OPEN = 'ferme', 'ouvert', 'semi_ouvert'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial_running = False
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state()
+
+    def _state(self):
+        if self._opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def allow(self):
+        """
+        Vrai si un appel peut partir ; en semi-ouvert, un seul appel d'essai à la
+        fois. Renvoie l'état dans lequel l'appel est accordé (``CLOSED`` ou
+        ``HALF_OPEN`` : l'appelant doit alors conclure l'essai), ou False.
+        """
+        with self._lock:
+            state = self._state()
+            if state == self.CLOSED:
+                return self.CLOSED
+            if state == self.HALF_OPEN and not self._trial_running:
+                self._trial_running = True
+                return self.HALF_OPEN
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def abandon_trial(self):
+        """Essai terminé sans verdict (file d'attente, annulation) : un autre appel pourra le tenter."""
+        with self._lock:
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_running = False
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                if self._opened_at is None:
+                    logger.warning("Disjoncteur LLM ouvert après %s échecs consécutifs", self._failures)
+                self._opened_at = time.monotonic()
+
+    def stats(self):
+        with self._lock:
+            state = self._state()
+            retry_in = None
+            if state == self.OPEN:
+                retry_in = round(self.reset_timeout - (time.monotonic() - self._opened_at), 1)
+            return {'state': state, 'consecutive_failures': self._failures, 'retry_in_s': retry_in}
+
+
+def _is_transient(exc):
+    """Erreur qui vaut une nouvelle tentative (et compte pour le disjoncteur)."""
+    import ollama
+
+    if isinstance(exc, (httpx.TransportError, ConnectionError, TimeoutError)):
+        return True
+    if isinstance(exc, ollama.ResponseError):
+        return exc.status_code >= 500 or exc.status_code == 429
+    return False
+
+
+class LLMClient:
+    """Accès partagé à Ollama : pool HTTP, concurrence bornée, nouvelles tentatives, disjoncteur."""
+
+    def __init__(self, base_url='http://localhost:11434', model='mistral', keep_alive='10m',
+                 connect_timeout=5.0, read_timeout=120.0, max_concurrency=4, queue_timeout=None,
+                 max_retries=2, retry_backoff=1.0, circuit_failures=5, circuit_reset=30.0,
+                 class_limits=None, priority_aging=30.0, **generation):
+        from langchain_ollama import ChatOllama
+
+        self.base_url = base_url.rstrip('/')
+        self.model = model
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.queue_timeout = read_timeout if queue_timeout is None else queue_timeout
+        self.breaker = CircuitBreaker(circuit_failures, circuit_reset)
+        self._slots = PriorityLimiter(max_concurrency, class_limits, priority_aging)
+        self.max_concurrency = max_concurrency
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+        self.chat = ChatOllama(
+            base_url=self.base_url,
+            model=model,
+            keep_alive=keep_alive,
+            client_kwargs={
+                'timeout': httpx.Timeout(read_timeout, connect=connect_timeout),
+                'limits': httpx.Limits(max_connections=max_concurrency, max_keepalive_connections=max_concurrency),
+            },
+            **generation,
+        )
+
+    # ------------------------------------------------------------------
+    # Appels
+    # ------------------------------------------------------------------
+    def _check_breaker(self):
+        """Lève ``LLMUnavailable`` si le disjoncteur refuse l'appel ; True si l'appel est l'essai du semi-ouvert."""
+        accorde = self.breaker.allow()
+        if not accorde:
+            raise LLMUnavailable(
+                f"Service IA indisponible (Ollama {self.base_url}) : nouvel essai dans "
+                f"{self.breaker.stats()['retry_in_s']} s"
+            )
+        return accorde == CircuitBreaker.HALF_OPEN
+
+    def _start(self, classe):
+        """
+        Prend une place puis consulte le disjoncteur (dans cet ordre : un essai
+        accordé ne peut plus rester bloqué dans la file d'attente).
+        """
+        self._acquire(classe)
+        try:
+            return self._check_breaker()
+        except BaseException:
+            self._release(classe)
+            raise
+
+    def _finish(self, classe, essai):
+        if essai:
+            # Sans effet si record_success/record_failure a déjà conclu l'essai
+            self.breaker.abandon_trial()
+        self._release(classe)
+
+    def _acquire(self, classe):
+        if not self._slots.acquire(classe, timeout=self.queue_timeout):
+            raise LLMUnavailable(f"Service IA saturé : aucune place libre après {self.queue_timeout} s")
+        with self._lock:
+            self._in_flight += 1
+
+    def _release(self, classe):
+        with self._lock:
+            self._in_flight -= 1
+        self._slots.release(classe)
+
+    def _delay(self, attempt):
+        # Délai exponentiel avec gigue, pour ne pas relancer tous les workers en même temps
+        return self.retry_backoff * 2 ** attempt * (0.5 + random.random() / 2)
+
+    def invoke(self, messages):
+        """Génération complète (``AIMessage``), avec nouvelles tentatives sur erreur transitoire."""
+        appel = appel_courant()
+        if appel is None:
+            with journaliser_appel('autre') as appel:
+                return self._invoke(messages, appel)
+        return self._invoke(messages, appel)
+
+    def _invoke(self, messages, appel):
+        appel.noter_requete(self.model, messages)
+        classe = priorite_courante()
+        attempt = 0
+        while True:
+            essai = self._start(classe)
+            appel.tentatives += 1
+            try:
+                response = self.chat.invoke(messages)
+            except Exception as e:
+                if not _is_transient(e):
+                    self.breaker.record_success()  # le backend a répondu : il est joignable
+                    raise
+                self.breaker.record_failure()
+                if attempt >= self.max_retries:
+                    raise
+                logger.warning("Appel LLM en échec (%s), nouvelle tentative %s/%s",
+                               e, attempt + 1, self.max_retries)
+            else:
+                self.breaker.record_success()
+                appel.noter_reponse(response.content, getattr(response, 'usage_metadata', None))
+                return response
+            finally:
+                self._finish(classe, essai)
+            time.sleep(self._delay(attempt))
+            attempt += 1
+
+    async def astream(self, messages):
+        """Génération en flux ; une nouvelle tentative n'est possible qu'avant le premier token."""
+        appel = appel_courant()
+        if appel is not None:
+            appel.noter_requete(self.model, messages)
+        classe = priorite_courante()
+        attempt = 0
+        while True:
+            essai = await asyncio.to_thread(self._start, classe)
+            if appel is not None:
+                appel.tentatives += 1
+            started = False
+            caracteres, usage_metadata = 0, None
+            try:
+                async for chunk in self.chat.astream(messages):
+                    started = True
+                    caracteres += len(chunk.content or '')
+                    usage_metadata = getattr(chunk, 'usage_metadata', None) or usage_metadata
+                    yield chunk
+            except Exception as e:
+                if not _is_transient(e):
+                    self.breaker.record_success()
+                    raise
+                self.breaker.record_failure()
+                if started or attempt >= self.max_retries:
+                    raise
+                logger.warning("Appel LLM en flux en échec (%s), nouvelle tentative %s/%s",
+                               e, attempt + 1, self.max_retries)
+            else:
+                self.breaker.record_success()
+                if appel is not None:
+                    appel.noter_reponse('', usage_metadata)
+                    appel.caracteres_reponse = caracteres
+                return
+            finally:
+                # Aussi sur GeneratorExit / CancelledError (client parti en plein flux)
+                self._finish(classe, essai)
+            await asyncio.sleep(self._delay(attempt))
+            attempt += 1
+
+    # ------------------------------------------------------------------
+    # Supervision
+    # ------------------------------------------------------------------
+    def health(self, timeout=2.0):
+        """Sonde légère : Ollama répond-il, et le modèle est-il installé ?"""
+        start = time.perf_counter()
+        try:
+            response = httpx.get(f'{self.base_url}/api/tags', timeout=timeout)
+            response.raise_for_status()
+            models = [m.get('name', '') for m in response.json().get('models', [])]
+        except Exception as e:
+            return {
+                'ok': False,
+                'error': str(e) or type(e).__name__,
+                'latency_ms': round((time.perf_counter() - start) * 1000, 1),
+                **self.stats(),
+            }
+        available = any(name == self.model or name.split(':')[0] == self.model for name in models)
+        return {
+            'ok': available,
+            'model_available': available,
+            'latency_ms': round((time.perf_counter() - start) * 1000, 1),
+            **self.stats(),
+        }
+
+    def stats(self):
+        return {
+            'base_url': self.base_url,
+            'model': self.model,
+            'in_flight': self._in_flight,
+            'max_concurrency': self.max_concurrency,
+            'circuit': self.breaker.stats(),
+            'priorites': self._slots.stats(),
+        }
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_llm_client():
+    """Client unique du processus, configuré par les settings ``LLM_*``."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = LLMClient(
+                    base_url=getattr(settings, 'LLM_BASE_URL', 'http://localhost:11434'),
+                    model=getattr(settings, 'LLM_MODEL', 'mistral'),
+                    keep_alive=getattr(settings, 'LLM_KEEP_ALIVE', '10m'),
+                    connect_timeout=getattr(settings, 'LLM_CONNECT_TIMEOUT', 5.0),
+                    read_timeout=getattr(settings, 'LLM_READ_TIMEOUT', 120.0),
+                    max_concurrency=getattr(settings, 'LLM_MAX_CONCURRENCY', 4),
+                    queue_timeout=getattr(settings, 'LLM_QUEUE_TIMEOUT', None),
+                    max_retries=getattr(settings, 'LLM_MAX_RETRIES', 2),
+                    retry_backoff=getattr(settings, 'LLM_RETRY_BACKOFF', 1.0),
+                    circuit_failures=getattr(settings, 'LLM_CIRCUIT_FAILURES', 5),
+                    circuit_reset=getattr(settings, 'LLM_CIRCUIT_RESET', 30.0),
+                    class_limits={
+                        'masse': getattr(settings, 'LLM_BULK_CONCURRENCY', None),
+                        'planifie': getattr(settings, 'LLM_SCHEDULED_CONCURRENCY', None),
+                    },
+                    priority_aging=getattr(settings, 'LLM_PRIORITY_AGING', 30.0),
+                )
+    return _client
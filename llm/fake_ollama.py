@@ -0,0 +1,323 @@
+# llm/fake_ollama.py
+"""
+Serveur Ollama simulé, pour les tests de charge sans GPU.
+
+Il parle le sous-ensemble de l'API HTTP d'Ollama utilisé par ``ChatOllama``
+et ``LLMClient.health()`` :
+
+- ``GET /api/tags``, ``GET /api/version``, ``GET /api/ps`` ;
+- ``POST /api/chat`` et ``POST /api/generate``, en flux (NDJSON) ou non.
+
+Les réponses sont des JSON factices au schéma attendu par chaque analyse
+(pauvreté, formabilité, faisabilité de projet), choisi d'après le prompt.
+Le comportement se règle par ``FakeOllamaConfig`` :
+
+- latence avant le premier token (fixe, uniforme ou log-normale) ;
+- débit de génération (tokens/s) ;
+- nombre de générations simultanées (``paralleles``, comme
+  ``OLLAMA_NUM_PARALLEL``) : les requêtes suivantes attendent une place ;
+- injection d'erreurs 500, de réponses non JSON et de blocages.
+
+    python manage.py fake_ollama --port 11435 --latence-ms 800 --tokens-par-s 25
+
+puis ``OLLAMA_BASE_URL=http://127.0.0.1:11435``. ``stats()`` expose la file
+d'attente et la saturation côté serveur (cf. llm/benchmarks.py).
+"""
+import json
+import logging
+import math
+import random
+import threading
+import time
+from datetime import datetime, timezone as dt_timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+LATENCY_DISTRIBUTIONS = ('fixe', 'uniforme', 'lognormale')
+
+# Caractères par "token" simulé
+CHARS_PER_TOKEN = 4
+
+
+class FakeOllamaConfig:
+    """Réglages du serveur simulé (durées en millisecondes, taux entre 0 et 1)."""
+
+    def __init__(self, latence_ms=500.0, distribution='lognormale', dispersion=0.5, tokens_par_s=30.0,
+                 paralleles=1, taux_erreur=0.0, taux_json_invalide=0.0, taux_blocage=0.0, blocage_s=300.0,
+                 modeles=('mistral',), seed=None):
+        if distribution not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"distribution inconnue : {distribution}")
+        self.latence_ms = latence_ms
+        self.distribution = distribution
+        self.dispersion = dispersion
+        self.tokens_par_s = tokens_par_s
+        self.paralleles = paralleles
+        self.taux_erreur = taux_erreur
+        self.taux_json_invalide = taux_json_invalide
+        self.taux_blocage = taux_blocage
+        self.blocage_s = blocage_s
+        self.modeles = tuple(modeles)
+        self.rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+
+    def tirer(self, methode, *args):
+        with self._rng_lock:
+            return getattr(self.rng, methode)(*args)
+
+    def latence_s(self):
+        """Délai avant le premier token."""
+        if self.distribution == 'fixe':
+            valeur = self.latence_ms
+        elif self.distribution == 'uniforme':
+            valeur = self.tirer('uniform', self.latence_ms * (1 - self.dispersion), self.latence_ms * (1 + self.dispersion))
+        else:
+            # Log-normale de moyenne latence_ms : queue de distribution longue, comme un vrai GPU partagé
+            if self.latence_ms <= 0:
+                return 0
+            sigma = self.dispersion
+            valeur = self.tirer('lognormvariate', math.log(self.latence_ms) - sigma ** 2 / 2, sigma)
+        return max(valeur, 0) / 1000
+
+
+# ----------------------------------------------------------------------
+# Réponses factices
+# ----------------------------------------------------------------------
+TYPES_PAUVRETE = ('pauvreté financière', 'pauvreté matérielle', 'besoin spécifique')
+
+
+def _schema(texte):
+    # Clés JSON demandées par chaque prompt d'abord, mots du domaine ensuite
+    for schema, cle in (('formation', 'score_formabilite'), ('projet', 'faisabilite_score'),
+                        ('pauvrete', 'niveau_pauvrete')):
+        if cle in texte:
+            return schema
+    for schema, mot in (('pauvrete', 'pauvreté'), ('projet', 'faisabilité'), ('formation', 'formation')):
+        if mot in texte:
+            return schema
+    return None
+
+
+def reponse_factice(prompt, tirer):
+    """JSON au schéma attendu par l'analyse reconnue dans le prompt."""
+    schema = _schema(prompt.lower())
+    if schema == 'pauvrete':
+        return {
+            'niveau_pauvrete': tirer('randint', 0, 100),
+            'analyse': "Analyse simulée : revenus faibles et accès limité aux services de base.",
+            'type_pauvrete': tirer('choice', TYPES_PAUVRETE),
+        }
+    if schema == 'projet':
+        return {
+            'faisabilite_score': tirer('randint', 0, 100),
+            'analyse': "Analyse simulée du projet.",
+            'recommandations': "Recommandations simulées.",
+            'risques': "Risques simulés.",
+            'points_forts': "Points forts simulés.",
+        }
+    if schema == 'formation':
+        return {
+            'score_formabilite': tirer('randint', 0, 100),
+            'analyse_detaillee': "Analyse simulée de la demande de formation.",
+            'recommandations': "Recommandations simulées.",
+            'criteres_scores': {
+                'motivation': tirer('randint', 0, 25),
+                'adequation': tirer('randint', 0, 25),
+                'disponibilite': tirer('randint', 0, 25),
+                'potentiel': tirer('randint', 0, 25),
+            },
+        }
+    return {'reponse': 'OK'}
+
+
+def decouper_tokens(texte):
+    return [texte[i:i + CHARS_PER_TOKEN] for i in range(0, len(texte), CHARS_PER_TOKEN)] or ['']
+
+
+# ----------------------------------------------------------------------
+# Serveur
+# ----------------------------------------------------------------------
+class _Handler(BaseHTTPRequestHandler):
+    server_version = 'FakeOllama/0.1'
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        logger.debug("fake_ollama: " + format, *args)
+
+    # -- utilitaires --------------------------------------------------------
+    def _json(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(length) or b'{}')
+
+    # -- routes -------------------------------------------------------------
+    def do_GET(self):
+        config = self.server.config
+        if self.path == '/api/tags':
+            self._json(200, {'models': [
+                {'name': f'{m}:latest', 'model': f'{m}:latest', 'size': 0, 'digest': '0' * 64} for m in config.modeles
+            ]})
+        elif self.path == '/api/version':
+            self._json(200, {'version': '0.0.0-fake'})
+        elif self.path == '/api/ps':
+            self._json(200, {'models': []})
+        else:
+            self._json(404, {'error': 'not found'})
+
+    def do_POST(self):
+        if self.path not in ('/api/chat', '/api/generate'):
+            self._json(404, {'error': 'not found'})
+            return
+        request = self._body()
+        chat = self.path == '/api/chat'
+        if chat:
+            prompt = '\n'.join(m.get('content', '') for m in request.get('messages', []))
+        else:
+            prompt = (request.get('system') or '') + '\n' + request.get('prompt', '')
+        self.server.generer(self, request, prompt, chat)
+
+
+class FakeOllamaServer(ThreadingHTTPServer):
+    """Serveur HTTP simulé ; ``start()`` le lance dans un thread."""
+
+    daemon_threads = True
+
+    def __init__(self, config=None, host='127.0.0.1', port=0):
+        super().__init__((host, port), _Handler)
+        self.config = config or FakeOllamaConfig()
+        self._slots = threading.Semaphore(self.config.paralleles)
+        self._lock = threading.Lock()
+        self._thread = None
+        self.reset_stats()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, name='fake-ollama', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    # -- statistiques -------------------------------------------------------
+    def reset_stats(self):
+        with self._lock:
+            self.requetes = self.erreurs = self.json_invalides = self.blocages = 0
+            self.en_cours = self.en_attente = self.max_en_attente = 0
+            self.attente_totale = self.generation_totale = 0.0
+            self.tokens_generes = 0
+
+    def stats(self):
+        with self._lock:
+            servies = max(self.requetes - self.erreurs, 1)
+            return {
+                'requetes': self.requetes,
+                'erreurs': self.erreurs,
+                'json_invalides': self.json_invalides,
+                'blocages': self.blocages,
+                'en_cours': self.en_cours,
+                'en_attente': self.en_attente,
+                'max_en_attente': self.max_en_attente,
+                'attente_moyenne_ms': round(self.attente_totale / servies * 1000, 1),
+                'generation_moyenne_ms': round(self.generation_totale / servies * 1000, 1),
+                'tokens_generes': self.tokens_generes,
+                'paralleles': self.config.paralleles,
+            }
+
+    # -- génération ---------------------------------------------------------
+    def generer(self, handler, request, prompt, chat):
+        with self._lock:
+            self.requetes += 1
+            self.en_attente += 1
+            self.max_en_attente = max(self.max_en_attente, self.en_attente)
+
+        debut_attente = time.perf_counter()
+        # Une place de "GPU" par génération simultanée
+        with self._slots:
+            attente = time.perf_counter() - debut_attente
+            with self._lock:
+                self.en_attente -= 1
+                self.en_cours += 1
+                self.attente_totale += attente
+            try:
+                self._generer(handler, request, prompt, chat, attente)
+            finally:
+                with self._lock:
+                    self.en_cours -= 1
+
+    def _generer(self, handler, request, prompt, chat, attente):
+        config = self.config
+        debut = time.perf_counter()
+
+        if config.tirer('random') < config.taux_erreur:
+            with self._lock:
+                self.erreurs += 1
+            time.sleep(config.latence_s() / 2)
+            handler._json(500, {'error': 'fake_ollama: erreur simulée'})
+            return
+        if config.tirer('random') < config.taux_blocage:
+            with self._lock:
+                self.blocages += 1
+            time.sleep(config.blocage_s)
+
+        if config.tirer('random') < config.taux_json_invalide:
+            with self._lock:
+                self.json_invalides += 1
+            texte = "Voici mon analyse : la personne semble vulnérable."
+        else:
+            texte = json.dumps(reponse_factice(prompt, config.tirer), ensure_ascii=False)
+        tokens = decouper_tokens(texte)
+        delai_token = 1 / config.tokens_par_s if config.tokens_par_s > 0 else 0
+
+        model = request.get('model', config.modeles[0])
+        time.sleep(config.latence_s())
+        prompt_tokens = max(1, len(prompt) // CHARS_PER_TOKEN)
+
+        def morceau(contenu, done, duree=None):
+            part = {'model': model, 'created_at': datetime.now(dt_timezone.utc).isoformat(), 'done': done}
+            if chat:
+                part['message'] = {'role': 'assistant', 'content': contenu}
+            else:
+                part['response'] = contenu
+            if done:
+                ns = int(duree * 1e9)
+                part.update(done_reason='stop', total_duration=int((duree + attente) * 1e9), load_duration=0,
+                            prompt_eval_count=prompt_tokens, prompt_eval_duration=0,
+                            eval_count=len(tokens), eval_duration=ns)
+            return part
+
+        if request.get('stream', True):
+            handler.send_response(200)
+            handler.send_header('Content-Type', 'application/x-ndjson')
+            handler.send_header('Transfer-Encoding', 'chunked')
+            handler.end_headers()
+
+            def ecrire(part):
+                line = (json.dumps(part, ensure_ascii=False) + '\n').encode('utf-8')
+                handler.wfile.write(f'{len(line):X}\r\n'.encode() + line + b'\r\n')
+                handler.wfile.flush()
+
+            for token in tokens:
+                time.sleep(delai_token)
+                ecrire(morceau(token, False))
+            ecrire(morceau('', True, time.perf_counter() - debut))
+            handler.wfile.write(b'0\r\n\r\n')
+        else:
+            time.sleep(delai_token * len(tokens))
+            handler._json(200, morceau(texte, True, time.perf_counter() - debut))
+
+        with self._lock:
+            self.generation_totale += time.perf_counter() - debut
+            self.tokens_generes += len(tokens)
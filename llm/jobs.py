@@ -0,0 +1,65 @@
+# llm/jobs.py
+"""
+Exécution des tâches LLM en arrière-plan.
+
+En production, les tâches partent au worker Celery (broker ``REDIS_URL``). En
+local (``CELERY_TASK_ALWAYS_EAGER``), il n'y a pas de worker : la tâche est
+exécutée dans un thread du processus web, pour que la réponse HTTP parte sans
+attendre le LLM. Même repli si Celery n'est pas installé ou si le broker est
+injoignable : la tâche n'est jamais perdue. Les commandes de gestion passent
+``bloquant=True`` : sans worker, la tâche s'exécute alors avant la fin de la
+commande au lieu de mourir avec son thread démon.
+
+Le thread reprend le contexte de l'appelant (classe de priorité LLM, cf.
+llm/priorites.py).
+"""
+import contextvars
+import logging
+import threading
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+logger = logging.getLogger(__name__)
+
+
+def _executer(func, *args, name=None):
+    try:
+        return func(*args)
+    except Exception:
+        logger.exception("Tâche %s en échec", name or getattr(func, '__name__', func))
+    finally:
+        close_old_connections()
+
+
+def run_in_thread(func, *args, name=None):
+    """Exécute ``func(*args)`` dans un thread démon qui rend sa connexion à la base en sortant."""
+    thread = threading.Thread(
+        target=contextvars.copy_context().run, args=(_executer, func, *args), kwargs={'name': name},
+        name=name, daemon=True,
+    )
+    thread.start()
+    return thread
+
+
+def submit(task, *args, name=None, bloquant=False):
+    """
+    Envoie ``task`` (``@shared_task`` ou simple fonction) au worker, ou à défaut dans un thread.
+
+    ``bloquant=True`` : sans worker, la tâche est exécutée dans l'appelant au lieu
+    d'un thread démon. À utiliser depuis les commandes de gestion : le processus
+    se termine juste après, et le thread démon serait tué avec lui.
+    """
+    local = _executer if bloquant else run_in_thread
+    if not hasattr(task, 'delay') or getattr(settings, 'CELERY_TASK_ALWAYS_EAGER', False):
+        return local(task, *args, name=name)
+    try:
+        return task.delay(*args)
+    except Exception:
+        logger.warning("Broker Celery injoignable, tâche %s exécutée localement", name or task.name, exc_info=True)
+        return local(task, *args, name=name)
+
+
+def submit_on_commit(task, *args, name=None, bloquant=False):
+    """Comme ``submit``, une fois la transaction en cours validée (la tâche voit les lignes créées)."""
+    transaction.on_commit(lambda: submit(task, *args, name=name, bloquant=bloquant))
@@ -0,0 +1,222 @@
+# llm/journal.py
+"""
+Journal des appels au LLM.
+
+Chaque invocation (prédiction de pauvreté, formabilité, faisabilité de projet,
+test de connexion) laisse une ligne ``AppelLLM`` : usage, modèle, tailles du
+prompt et de la réponse, tokens quand Ollama les renvoie, durée, nombre de
+tentatives, réponse servie par le cache ou non, succès de l'appel et validité
+du JSON, identifiant de l'objet analysé.
+
+Le code appelant délimite l'appel ::
+
+    with journaliser_appel('formabilite', demande.id) as appel:
+        reponse = invoke_cached(llm, messages)
+        appel.json_valide = appliquer(reponse)['success']
+
+``invoke_cached`` et ``LLMClient`` complètent l'appel courant (variable de
+contexte) ; une exception levée après réception de la réponse compte comme un
+JSON invalide, avant comme un échec de l'appel. Un appel au client hors de tout
+bloc est journalisé avec l'usage ``autre``.
+
+L'écriture du journal n'interrompt jamais une analyse. Les lignes de plus de
+``LLM_JOURNAL_RETENTION_JOURS`` jours sont supprimées au fil des écritures.
+``statistiques_appels()`` alimente la page d'administration (percentiles de
+latence et taux d'échec, par usage et par jour).
+"""
+import contextvars
+import logging
+import math
+import threading
+import time
+from collections import defaultdict
+from contextlib import asynccontextmanager, contextmanager
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Purge des lignes anciennes toutes les N écritures
+PURGE_EVERY = 500
+
+_appel_courant = contextvars.ContextVar('appel_llm', default=None)
+_writes = 0
+_writes_lock = threading.Lock()
+
+
+class Appel:
+    """Mesures d'un appel en cours, enregistrées à la fin du bloc."""
+
+    def __init__(self, usage, objet_id=None):
+        self.usage = usage
+        self.objet_id = '' if objet_id is None else str(objet_id)
+        self.date = timezone.now()
+        self.modele = ''
+        self.caracteres_prompt = self.caracteres_reponse = 0
+        self.tokens_prompt = self.tokens_reponse = None
+        self.duree_ms = None
+        self.tentatives = 0
+        self.depuis_cache = False
+        self.reponse_recue = False
+        self.succes = True
+        self.json_valide = None
+        self.erreur = ''
+        self._debut = time.perf_counter()
+
+    def noter_requete(self, modele, messages):
+        self.modele = modele or ''
+        self.caracteres_prompt = sum(len(getattr(m, 'content', '') or '') for m in messages)
+
+    def noter_reponse(self, texte, usage_metadata=None, depuis_cache=False):
+        self.reponse_recue = True
+        self.depuis_cache = depuis_cache
+        self.caracteres_reponse = len(texte or '')
+        if usage_metadata:
+            self.tokens_prompt = usage_metadata.get('input_tokens')
+            self.tokens_reponse = usage_metadata.get('output_tokens')
+
+    def noter_echec(self, exc):
+        if self.reponse_recue:
+            # Réponse reçue mais inexploitable
+            if self.json_valide is None:
+                self.json_valide = False
+        else:
+            self.succes = False
+        self.erreur = (str(exc) or type(exc).__name__)[:255]
+
+    def terminer(self):
+        if self.duree_ms is None:
+            self.duree_ms = int((time.perf_counter() - self._debut) * 1000)
+
+    def enregistrer(self):
+        """Écrit la ligne du journal (sans jamais lever d'exception)."""
+        global _writes
+        if not getattr(settings, 'LLM_JOURNAL_ENABLED', True):
+            return
+        self.terminer()
+        from .models import AppelLLM
+
+        try:
+            AppelLLM.objects.create(
+                date=self.date, usage=self.usage, modele=self.modele[:100], objet_id=self.objet_id[:64],
+                caracteres_prompt=self.caracteres_prompt, caracteres_reponse=self.caracteres_reponse,
+                tokens_prompt=self.tokens_prompt, tokens_reponse=self.tokens_reponse,
+                duree_ms=self.duree_ms, tentatives=self.tentatives, depuis_cache=self.depuis_cache,
+                succes=self.succes, json_valide=self.json_valide, erreur=self.erreur,
+            )
+            with _writes_lock:
+                _writes += 1
+                purge = _writes % PURGE_EVERY == 0
+            if purge:
+                purger_journal()
+        except Exception:
+            logger.warning("Journal des appels LLM indisponible", exc_info=True)
+
+
+def appel_courant():
+    """Appel en cours dans ce contexte (thread ou tâche asyncio), ou None."""
+    return _appel_courant.get()
+
+
+@contextmanager
+def journaliser_appel(usage, objet_id=None):
+    """Délimite un appel au LLM ; la ligne est écrite à la sortie du bloc."""
+    appel = Appel(usage, objet_id)
+    jeton = _appel_courant.set(appel)
+    try:
+        yield appel
+    except Exception as e:
+        appel.noter_echec(e)
+        raise
+    finally:
+        _appel_courant.reset(jeton)
+        appel.enregistrer()
+
+
+@asynccontextmanager
+async def ajournaliser_appel(usage, objet_id=None):
+    """Variante asynchrone de ``journaliser_appel`` (vues en flux)."""
+    appel = Appel(usage, objet_id)
+    jeton = _appel_courant.set(appel)
+    try:
+        yield appel
+    except Exception as e:
+        appel.noter_echec(e)
+        raise
+    finally:
+        _appel_courant.reset(jeton)
+        appel.terminer()
+        await sync_to_async(appel.enregistrer)()
+
+
+def purger_journal(jours=None):
+    """Supprime les lignes plus anciennes que la durée de rétention."""
+    from .models import AppelLLM
+
+    jours = jours if jours is not None else getattr(settings, 'LLM_JOURNAL_RETENTION_JOURS', 90)
+    return AppelLLM.objects.filter(date__lt=timezone.now() - timedelta(days=jours)).delete()[0]
+
+
+# ----------------------------------------------------------------------
+# Statistiques
+# ----------------------------------------------------------------------
+def percentile(valeurs_triees, p):
+    """Percentile (rang le plus proche) d'une liste triée ; None si vide."""
+    if not valeurs_triees:
+        return None
+    rang = max(1, math.ceil(p / 100 * len(valeurs_triees)))
+    return valeurs_triees[rang - 1]
+
+
+def _resumer(lignes):
+    """Agrège des lignes ``(duree_ms, succes, json_valide, depuis_cache, tokens_reponse)``."""
+    appels = len(lignes)
+    echecs = sum(1 for _, succes, _, _, _ in lignes if not succes)
+    json_invalides = sum(1 for _, _, json_valide, _, _ in lignes if json_valide is False)
+    cache = sum(1 for _, _, _, depuis_cache, _ in lignes if depuis_cache)
+    # Latences des générations réelles uniquement : les réponses en cache fausseraient les percentiles
+    durees = sorted(duree for duree, succes, _, depuis_cache, _ in lignes if succes and not depuis_cache)
+    return {
+        'appels': appels,
+        'echecs': echecs,
+        'taux_echec': echecs / appels if appels else None,
+        'json_invalides': json_invalides,
+        'taux_json_invalide': json_invalides / (appels - echecs) if appels - echecs else None,
+        'depuis_cache': cache,
+        'p50_ms': percentile(durees, 50),
+        'p95_ms': percentile(durees, 95),
+        'p99_ms': percentile(durees, 99),
+        'temps_llm_s': round(sum(duree for duree, _, _, depuis_cache, _ in lignes if not depuis_cache) / 1000, 1),
+        'tokens_reponse': sum(tokens or 0 for *_, tokens in lignes),
+    }
+
+
+def statistiques_appels(jours=14):
+    """Statistiques des ``jours`` derniers jours : total, par usage et par jour (du plus récent)."""
+    from .models import AppelLLM
+
+    depuis = timezone.now() - timedelta(days=jours)
+    par_usage, par_jour, toutes = defaultdict(list), defaultdict(list), []
+    for date, usage, *mesures in AppelLLM.objects.filter(date__gte=depuis).values_list(
+            'date', 'usage', 'duree_ms', 'succes', 'json_valide', 'depuis_cache', 'tokens_reponse').iterator():
+        mesures = tuple(mesures)
+        toutes.append(mesures)
+        par_usage[usage].append(mesures)
+        par_jour[timezone.localtime(date).date()].append(mesures)
+
+    libelles = dict(AppelLLM.USAGE_CHOICES)
+    return {
+        'jours': jours,
+        'total': _resumer(toutes),
+        'par_usage': [
+            {'usage': usage, 'libelle': libelles.get(usage, usage), **_resumer(lignes)}
+            for usage, lignes in sorted(par_usage.items(), key=lambda item: -len(item[1]))
+        ],
+        'par_jour': [
+            {'jour': jour, **_resumer(lignes)}
+            for jour, lignes in sorted(par_jour.items(), reverse=True)
+        ],
+    }
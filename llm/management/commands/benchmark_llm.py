@@ -0,0 +1,48 @@
+# llm/management/commands/benchmark_llm.py
+import os
+from datetime import datetime
+
+from django.core.management.base import BaseCommand
+
+from llm.benchmarks import FLUX, format_results, run_benchmark, write_report
+from .fake_ollama import add_server_arguments, config_from_options
+
+
+class Command(BaseCommand):
+    help = ("Débit, latences p50/p95/p99, files d'attente et saturation des flux recensement et "
+            "analyse de formation contre un Ollama simulé ; écrit un rapport JSON.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--flux', nargs='+', choices=FLUX, default=list(FLUX))
+        parser.add_argument('--workers', nargs='+', type=int, default=[1, 4, 16],
+                            help="Nombres de workers simultanés à tester")
+        parser.add_argument('--requetes', type=int, default=100, help="Requêtes par flux et par nombre de workers")
+        parser.add_argument('--concurrence-client', type=int, default=4,
+                            help="Appels simultanés autorisés par LLMClient (LLM_MAX_CONCURRENCY)")
+        parser.add_argument('--max-retries', type=int, default=2)
+        parser.add_argument('--read-timeout', type=float, default=120.0)
+        parser.add_argument('--url', default=None, help="Serveur Ollama existant (sinon simulé dans le processus)")
+        add_server_arguments(parser)
+        parser.add_argument('--output', default=None,
+                            help="Fichier JSON (défaut : llm/outputs/benchmark-<date>.json)")
+
+    def handle(self, *args, **options):
+        report = run_benchmark(
+            flux=options['flux'],
+            workers=options['workers'],
+            requetes=options['requetes'],
+            concurrence_client=options['concurrence_client'],
+            max_retries=options['max_retries'],
+            read_timeout=options['read_timeout'],
+            url=options['url'],
+            config=config_from_options(options),
+            seed=options['seed'] or 0,
+            log=self.stdout.write,
+        )
+        output = options['output'] or os.path.join(
+            os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
+            'outputs', f"benchmark-{datetime.now():%Y%m%d-%H%M%S}.json",
+        )
+        write_report(report, output)
+        self.stdout.write(format_results(report))
+        self.stdout.write(self.style.SUCCESS(f"Rapport écrit dans {output}"))
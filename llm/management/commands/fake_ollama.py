@@ -0,0 +1,65 @@
+# llm/management/commands/fake_ollama.py
+"""
+Lance le serveur Ollama simulé (cf. llm/fake_ollama.py).
+
+    python manage.py fake_ollama --port 11435 --latence-ms 800 --tokens-par-s 25 --paralleles 2
+    OLLAMA_BASE_URL=http://127.0.0.1:11435 python manage.py runserver
+
+Utile pour exercer l'application (ou gunicorn) sans GPU ; ``benchmark_llm``
+démarre son propre serveur quand ``--url`` n'est pas donné.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from llm.fake_ollama import LATENCY_DISTRIBUTIONS, FakeOllamaConfig, FakeOllamaServer
+
+
+def add_server_arguments(parser):
+    """Options de simulation communes à fake_ollama et benchmark_llm."""
+    parser.add_argument('--latence-ms', type=float, default=500.0, help="Latence moyenne avant le premier token")
+    parser.add_argument('--distribution', choices=LATENCY_DISTRIBUTIONS, default='lognormale')
+    parser.add_argument('--dispersion', type=float, default=0.5,
+                        help="Sigma (log-normale) ou demi-largeur relative (uniforme)")
+    parser.add_argument('--tokens-par-s', type=float, default=30.0, help="Débit de génération")
+    parser.add_argument('--paralleles', type=int, default=1, help="Générations simultanées (OLLAMA_NUM_PARALLEL)")
+    parser.add_argument('--taux-erreur', type=float, default=0.0, help="Part de réponses HTTP 500")
+    parser.add_argument('--taux-json-invalide', type=float, default=0.0, help="Part de réponses non JSON")
+    parser.add_argument('--taux-blocage', type=float, default=0.0, help="Part de requêtes bloquées --blocage-s")
+    parser.add_argument('--blocage-s', type=float, default=300.0)
+    parser.add_argument('--seed', type=int, default=None)
+
+
+def config_from_options(options):
+    return FakeOllamaConfig(
+        latence_ms=options['latence_ms'], distribution=options['distribution'], dispersion=options['dispersion'],
+        tokens_par_s=options['tokens_par_s'], paralleles=options['paralleles'],
+        taux_erreur=options['taux_erreur'], taux_json_invalide=options['taux_json_invalide'],
+        taux_blocage=options['taux_blocage'], blocage_s=options['blocage_s'], seed=options['seed'],
+    )
+
+
+class Command(BaseCommand):
+    help = "Serveur Ollama simulé (latence, débit, erreurs configurables) pour les tests de charge."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=11435)
+        add_server_arguments(parser)
+
+    def handle(self, *args, **options):
+        serveur = FakeOllamaServer(config_from_options(options), host=options['host'], port=options['port'])
+        self.stdout.write(self.style.SUCCESS(f"Ollama simulé sur {serveur.url} (Ctrl+C pour arrêter)"))
+        serveur.start()
+        try:
+            while True:
+                time.sleep(10)
+                stats = serveur.stats()
+                self.stdout.write(
+                    f"{stats['requetes']} requête(s), {stats['erreurs']} erreur(s), "
+                    f"{stats['en_cours']} en cours, {stats['en_attente']} en attente"
+                )
+        except KeyboardInterrupt:
+            pass
+        finally:
+            serveur.stop()
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.4 on 2026-10-18 13:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReponseLLMEnCache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cle', models.CharField(max_length=64, unique=True)),
+                ('modele', models.CharField(max_length=100)),
+                ('reponse', models.TextField()),
+                ('cree_le', models.DateTimeField(auto_now_add=True)),
+                ('expire_le', models.DateTimeField(db_index=True)),
+                ('dernier_acces', models.DateTimeField(db_index=True)),
+                ('nb_utilisations', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Réponse LLM en cache',
+                'verbose_name_plural': 'Réponses LLM en cache',
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.4 on 2026-10-18 13:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('llm', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AppelLLM',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateTimeField(db_index=True)),
+                ('usage', models.CharField(choices=[('pauvrete', 'Prédiction de pauvreté'), ('formabilite', 'Formabilité'), ('projet', 'Faisabilité de projet'), ('test', 'Test de connexion'), ('autre', 'Autre')], max_length=20)),
+                ('modele', models.CharField(blank=True, max_length=100)),
+                ('objet_id', models.CharField(blank=True, max_length=64)),
+                ('caracteres_prompt', models.PositiveIntegerField(default=0)),
+                ('caracteres_reponse', models.PositiveIntegerField(default=0)),
+                ('tokens_prompt', models.PositiveIntegerField(blank=True, null=True)),
+                ('tokens_reponse', models.PositiveIntegerField(blank=True, null=True)),
+                ('duree_ms', models.PositiveIntegerField(default=0)),
+                ('tentatives', models.PositiveSmallIntegerField(default=0)),
+                ('depuis_cache', models.BooleanField(default=False)),
+                ('succes', models.BooleanField(default=True)),
+                ('json_valide', models.BooleanField(blank=True, null=True)),
+                ('erreur', models.CharField(blank=True, max_length=255)),
+            ],
+            options={
+                'verbose_name': 'Appel LLM',
+                'verbose_name_plural': 'Appels LLM',
+                'indexes': [models.Index(fields=['usage', 'date'], name='llm_appelll_usage_012898_idx')],
+            },
+        ),
+    ]
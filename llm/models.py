@@ -0,0 +1,58 @@
+from django.db import models
+
+
+class ReponseLLMEnCache(models.Model):
+    """Réponse d'Ollama mémorisée pour un appel identique (cf. llm/cache.py)."""
+    cle = models.CharField(max_length=64, unique=True)
+    modele = models.CharField(max_length=100)
+    reponse = models.TextField()
+    cree_le = models.DateTimeField(auto_now_add=True)
+    expire_le = models.DateTimeField(db_index=True)
+    dernier_acces = models.DateTimeField(db_index=True)
+    nb_utilisations = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Réponse LLM en cache"
+        verbose_name_plural = "Réponses LLM en cache"
+
+    def __str__(self):
+        return f"{self.modele} – {self.cle[:12]} ({self.nb_utilisations} utilisation(s))"
+
+
+class AppelLLM(models.Model):
+    """
+    Une invocation du LLM (cf. llm/journal.py) : tailles, durée, issue.
+
+    Table volontairement compacte (aucun texte de prompt ni de réponse) : elle
+    reçoit une ligne par analyse et sert aux statistiques de latence et d'échecs.
+    """
+    USAGE_CHOICES = [
+        ('pauvrete', 'Prédiction de pauvreté'),
+        ('formabilite', 'Formabilité'),
+        ('projet', 'Faisabilité de projet'),
+        ('test', 'Test de connexion'),
+        ('autre', 'Autre'),
+    ]
+
+    date = models.DateTimeField(db_index=True)
+    usage = models.CharField(max_length=20, choices=USAGE_CHOICES)
+    modele = models.CharField(max_length=100, blank=True)
+    objet_id = models.CharField(max_length=64, blank=True)
+    caracteres_prompt = models.PositiveIntegerField(default=0)
+    caracteres_reponse = models.PositiveIntegerField(default=0)
+    tokens_prompt = models.PositiveIntegerField(null=True, blank=True)
+    tokens_reponse = models.PositiveIntegerField(null=True, blank=True)
+    duree_ms = models.PositiveIntegerField(default=0)
+    tentatives = models.PositiveSmallIntegerField(default=0)
+    depuis_cache = models.BooleanField(default=False)
+    succes = models.BooleanField(default=True)
+    json_valide = models.BooleanField(null=True, blank=True)
+    erreur = models.CharField(max_length=255, blank=True)
+
+    class Meta:
+        verbose_name = "Appel LLM"
+        verbose_name_plural = "Appels LLM"
+        indexes = [models.Index(fields=['usage', 'date'])]
+
+    def __str__(self):
+        return f"{self.get_usage_display()} – {self.date:%d/%m/%Y %H:%M} ({self.duree_ms} ms)"
@@ -0,0 +1,166 @@
+# llm/priorites.py
+"""
+Classes de priorité des appels au LLM.
+
+Ollama génère peu de réponses à la fois : les places de ``LLMClient``
+(``LLM_MAX_CONCURRENCY``) sont la ressource disputée. Sans priorité, une
+personne qui soumet une demande de formation ou une fiche de recensement
+attend derrière les 500 analyses d'un « analyser toutes les demandes ».
+
+Trois classes, dans l'ordre :
+
+- ``interactif`` (défaut) : un utilisateur attend la réponse ;
+- ``masse`` : lots lancés depuis l'administration (cf. formation/batch.py) ;
+- ``planifie`` : réanalyses programmées (``planifier_reanalyses``).
+
+Chaque classe a une limite d'appels simultanés (``LLM_BULK_CONCURRENCY``,
+``LLM_SCHEDULED_CONCURRENCY``) : les lots ne peuvent pas occuper toutes les
+places. Quand une place se libère, elle revient à l'appel en attente de meilleur
+rang ; le rang d'un appel s'améliore d'un niveau toutes les
+``LLM_PRIORITY_AGING`` secondes d'attente, pour qu'un lot ne soit jamais
+affamé par un flux continu d'appels interactifs.
+
+La classe courante est une variable de contexte (``with priorite('masse'):``),
+propagée aux threads lancés par ``llm.jobs.submit``. L'ordonnancement est
+propre au processus ; ``stats()`` expose, par classe, la file d'attente, les
+appels en cours et les temps d'attente.
+"""
+import contextvars
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from .journal import percentile
+
+INTERACTIF, MASSE, PLANIFIE = 'interactif', 'masse', 'planifie'
+# Ordre de priorité (rang 0 = servi en premier)
+CLASSES = (INTERACTIF, MASSE, PLANIFIE)
+LIBELLES = {INTERACTIF: 'Interactif', MASSE: 'Lots (masse)', PLANIFIE: 'Réanalyses planifiées'}
+
+# Temps d'attente conservés par classe pour les statistiques
+WAIT_SAMPLES = 500
+# Réévaluation périodique des rangs pendant l'attente (vieillissement)
+AGING_TICK = 0.5
+
+_priorite = contextvars.ContextVar('priorite_llm', default=INTERACTIF)
+
+
+def priorite_courante():
+    return _priorite.get()
+
+
+@contextmanager
+def priorite(classe):
+    """Exécute le bloc avec la classe de priorité ``classe``."""
+    if classe not in CLASSES:
+        raise ValueError(f"classe de priorité inconnue : {classe}")
+    jeton = _priorite.set(classe)
+    try:
+        yield
+    finally:
+        _priorite.reset(jeton)
+
+
+class _Attente:
+    __slots__ = ('seq', 'classe', 'debut')
+
+    def __init__(self, seq, classe):
+        self.seq, self.classe, self.debut = seq, classe, time.monotonic()
+
+
+class PriorityLimiter:
+    """
+    Sémaphore à ``capacity`` places, servies par classe de priorité.
+
+    ``limits`` : appels simultanés maximum par classe (absente ou None : ``capacity``) ;
+    ``aging`` : secondes d'attente pour gagner un rang (0 : pas de vieillissement).
+    """
+
+    def __init__(self, capacity, limits=None, aging=30.0):
+        self.capacity = capacity
+        self.limits = {classe: capacity for classe in CLASSES}
+        self.limits.update({k: max(1, min(v, capacity)) for k, v in (limits or {}).items() if v is not None})
+        self.aging = aging
+        self._cond = threading.Condition()
+        self._seq = 0
+        self._waiting = []
+        self._running = {classe: 0 for classe in CLASSES}
+        self._served = {classe: 0 for classe in CLASSES}
+        self._waits = {classe: deque(maxlen=WAIT_SAMPLES) for classe in CLASSES}
+
+    def _rang(self, attente, now):
+        rang = CLASSES.index(attente.classe)
+        if self.aging:
+            rang -= (now - attente.debut) / self.aging
+        return rang, attente.seq
+
+    def _suivant(self, now):
+        """Attente à servir maintenant, ou None (plus de place, ou classes à leur limite)."""
+        if sum(self._running.values()) >= self.capacity:
+            return None
+        eligibles = [a for a in self._waiting if self._running[a.classe] < self.limits[a.classe]]
+        return min(eligibles, key=lambda a: self._rang(a, now)) if eligibles else None
+
+    def acquire(self, classe=None, timeout=None):
+        """Prend une place pour ``classe`` (défaut : classe courante) ; False si ``timeout`` expire."""
+        classe = classe or priorite_courante()
+        with self._cond:
+            self._seq += 1
+            attente = _Attente(self._seq, classe)
+            self._waiting.append(attente)
+            limite = None if timeout is None else attente.debut + timeout
+            try:
+                while True:
+                    now = time.monotonic()
+                    if self._suivant(now) is attente:
+                        break
+                    if limite is not None and now >= limite:
+                        return False
+                    delai = AGING_TICK if limite is None else min(AGING_TICK, limite - now)
+                    self._cond.wait(delai)
+                self._running[classe] += 1
+                self._served[classe] += 1
+                self._waits[classe].append(now - attente.debut)
+                return True
+            finally:
+                self._waiting.remove(attente)
+                # Une autre attente peut être devenue servable (place restante, départ de celle-ci)
+                self._cond.notify_all()
+
+    def release(self, classe):
+        with self._cond:
+            self._running[classe] -= 1
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, classe=None, timeout=None):
+        classe = classe or priorite_courante()
+        if not self.acquire(classe, timeout):
+            raise TimeoutError(f"aucune place libre après {timeout} s")
+        try:
+            yield
+        finally:
+            self.release(classe)
+
+    def stats(self):
+        """Par classe : file d'attente, appels en cours, limite, attentes (moyenne, p95, max) en ms."""
+        now = time.monotonic()
+        with self._cond:
+            stats = []
+            for classe in CLASSES:
+                en_attente = [a for a in self._waiting if a.classe == classe]
+                waits = sorted(self._waits[classe])
+                stats.append({
+                    'classe': classe,
+                    'libelle': LIBELLES[classe],
+                    'en_attente': len(en_attente),
+                    'attente_en_cours_max_ms': round(max((now - a.debut for a in en_attente), default=0) * 1000),
+                    'en_cours': self._running[classe],
+                    'limite': self.limits[classe],
+                    'servis': self._served[classe],
+                    'attente_moyenne_ms': round(sum(waits) / len(waits) * 1000) if waits else None,
+                    'attente_p95_ms': round(percentile(waits, 95) * 1000) if waits else None,
+                    'attente_max_ms': round(waits[-1] * 1000) if waits else None,
+                })
+            return stats
@@ -0,0 +1,326 @@
+import json
+import threading
+import time
+from types import SimpleNamespace
+
+import httpx
+
+from django.test import TestCase
+from langchain.schema import HumanMessage, SystemMessage
+
+from .cache import LLMResponseCache, invoke_cached
+from .client import CircuitBreaker, LLMClient, LLMUnavailable
+from .fake_ollama import FakeOllamaConfig, FakeOllamaServer
+from .jobs import run_in_thread
+from .journal import journaliser_appel, percentile, statistiques_appels
+from .models import AppelLLM, ReponseLLMEnCache
+from .priorites import INTERACTIF, MASSE, PLANIFIE, PriorityLimiter, priorite, priorite_courante
+
+
+class FakeLLM:
+    """Client minimal : compte les appels et renvoie une réponse numérotée."""
+
+    def __init__(self, model='mistral', temperature=None):
+        self.model = model
+        self.temperature = temperature
+        self.calls = 0
+
+    def invoke(self, messages):
+        self.calls += 1
+        return SimpleNamespace(content=f'{{"reponse": {self.calls}}}')
+
+
+def messages(prompt, system="Tu es un expert."):
+    return [SystemMessage(content=system), HumanMessage(content=prompt)]
+
+
+class LLMResponseCacheTests(TestCase):
+    def test_identical_call_hits_cache(self):
+        llm, cache = FakeLLM(), LLMResponseCache()
+        first = invoke_cached(llm, messages("fiche 1"), cache=cache)
+        second = invoke_cached(llm, messages("fiche 1"), cache=cache)
+        self.assertEqual(first, second)
+        self.assertEqual(llm.calls, 1)
+        self.assertEqual(cache.stats()['hits_local'], 1)
+
+    def test_key_depends_on_model_system_and_params(self):
+        cache = LLMResponseCache()
+        invoke_cached(FakeLLM(), messages("fiche 1"), cache=cache)
+        other_system = FakeLLM()
+        invoke_cached(other_system, messages("fiche 1", system="Autre consigne."), cache=cache)
+        other_temperature = FakeLLM(temperature=0.2)
+        invoke_cached(other_temperature, messages("fiche 1"), cache=cache)
+        other_model = FakeLLM(model='llama3')
+        invoke_cached(other_model, messages("fiche 1"), cache=cache)
+        self.assertEqual((other_system.calls, other_temperature.calls, other_model.calls), (1, 1, 1))
+        self.assertEqual(ReponseLLMEnCache.objects.count(), 4)
+
+    def test_db_store_is_shared_between_processes(self):
+        llm = FakeLLM()
+        invoke_cached(llm, messages("fiche 1"), cache=LLMResponseCache())
+        other_process = LLMResponseCache()
+        invoke_cached(llm, messages("fiche 1"), cache=other_process)
+        self.assertEqual(llm.calls, 1)
+        self.assertEqual(other_process.stats()['hits_db'], 1)
+        self.assertEqual(ReponseLLMEnCache.objects.get().nb_utilisations, 1)
+
+    def test_bypass_regenerates_and_replaces(self):
+        llm, cache = FakeLLM(), LLMResponseCache()
+        invoke_cached(llm, messages("fiche 1"), cache=cache)
+        forced = invoke_cached(llm, messages("fiche 1"), bypass_cache=True, cache=cache)
+        self.assertEqual(llm.calls, 2)
+        self.assertEqual(invoke_cached(llm, messages("fiche 1"), cache=cache), forced)
+        self.assertEqual(ReponseLLMEnCache.objects.get().reponse, forced)
+
+    def test_expired_entries_are_ignored_and_evicted(self):
+        llm, cache = FakeLLM(), LLMResponseCache(ttl=-1)
+        invoke_cached(llm, messages("fiche 1"), cache=cache)
+        invoke_cached(llm, messages("fiche 1"), cache=cache)
+        self.assertEqual(llm.calls, 2)
+        self.assertEqual(cache.evict(), 1)
+
+    def test_size_eviction_keeps_most_recent(self):
+        llm, cache = FakeLLM(), LLMResponseCache(max_entries=3)
+        for i in range(5):
+            invoke_cached(llm, messages(f"fiche {i}"), cache=cache)
+        cache.evict()
+        self.assertEqual(ReponseLLMEnCache.objects.count(), 3)
+        cache.clear()
+        invoke_cached(llm, messages("fiche 4"), cache=cache)
+        self.assertEqual(llm.calls, 5)
+
+    def test_rejected_reply_is_returned_but_not_cached(self):
+        llm, cache = FakeLLM(), LLMResponseCache()
+
+        def refuser(reponse):
+            raise ValueError("JSON inattendu")
+
+        first = invoke_cached(llm, messages("fiche 1"), cache=cache, valider=refuser)
+        self.assertEqual(first, '{"reponse": 1}')
+        self.assertFalse(ReponseLLMEnCache.objects.exists())
+        invoke_cached(llm, messages("fiche 1"), cache=cache, valider=json.loads)
+        self.assertEqual(llm.calls, 2)
+        self.assertEqual(ReponseLLMEnCache.objects.get().reponse, '{"reponse": 2}')
+
+    def test_cached_reply_rejected_by_validator_is_regenerated(self):
+        llm, cache = FakeLLM(), LLMResponseCache()
+        invoke_cached(llm, messages("fiche 1"), cache=cache)
+        reponse = invoke_cached(
+            llm, messages("fiche 1"), cache=cache,
+            valider=lambda texte: json.loads(texte)['reponse'] > 1 or 1 / 0,
+        )
+        self.assertEqual((reponse, llm.calls), ('{"reponse": 2}', 2))
+
+
+class FlakyChat:
+    """ChatOllama simulé : échoue ``failures`` fois (erreur de connexion) puis répond."""
+
+    def __init__(self, failures):
+        self.failures = failures
+        self.calls = 0
+
+    def invoke(self, messages):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise httpx.ConnectError("Connection refused")
+        return SimpleNamespace(content="OK", usage_metadata={'input_tokens': 12, 'output_tokens': 3})
+
+
+class LLMClientTests(TestCase):
+    def make_client(self, failures, **kwargs):
+        client = LLMClient(retry_backoff=0, **kwargs)
+        client.chat = FlakyChat(failures)
+        return client
+
+    def test_transient_errors_are_retried(self):
+        client = self.make_client(failures=2, max_retries=2)
+        self.assertEqual(client.invoke(messages("fiche 1")).content, "OK")
+        self.assertEqual(client.chat.calls, 3)
+        self.assertEqual(client.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_open_circuit_fails_fast(self):
+        client = self.make_client(failures=10, max_retries=1, circuit_failures=2, circuit_reset=60)
+        with self.assertRaises(httpx.ConnectError):
+            client.invoke(messages("fiche 1"))
+        self.assertEqual(client.breaker.state, CircuitBreaker.OPEN)
+        with self.assertRaises(LLMUnavailable):
+            client.invoke(messages("fiche 1"))
+        # Aucun appel réseau pendant l'ouverture
+        self.assertEqual(client.chat.calls, 2)
+
+    def test_half_open_trial_closes_circuit(self):
+        client = self.make_client(failures=1, max_retries=0, circuit_failures=1, circuit_reset=0)
+        with self.assertRaises(httpx.ConnectError):
+            client.invoke(messages("fiche 1"))
+        self.assertEqual(client.breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertEqual(client.invoke(messages("fiche 1")).content, "OK")
+        self.assertEqual(client.breaker.state, CircuitBreaker.CLOSED)
+
+    def open_breaker(self, client):
+        client.breaker.record_failure()
+        self.assertEqual(client.breaker.state, CircuitBreaker.HALF_OPEN)
+
+    def test_trial_lost_in_queue_does_not_wedge_breaker(self):
+        client = self.make_client(failures=0, circuit_failures=1, circuit_reset=0, max_concurrency=1,
+                                  queue_timeout=0.05)
+        self.open_breaker(client)
+        client._slots.acquire(INTERACTIF)  # Seule place occupée : l'essai expire dans la file
+        with self.assertRaises(LLMUnavailable):
+            client.invoke(messages("fiche 1"))
+        client._slots.release(INTERACTIF)
+        self.assertEqual(client.invoke(messages("fiche 1")).content, "OK")
+        self.assertEqual(client.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_cancelled_stream_trial_does_not_wedge_breaker(self):
+        import asyncio
+
+        class StreamingChat(FlakyChat):
+            async def astream(self, messages):
+                for mot in ("Bon", "jour"):
+                    yield SimpleNamespace(content=mot)
+
+        client = self.make_client(failures=0, circuit_failures=1, circuit_reset=0)
+        client.chat = StreamingChat(0)
+        self.open_breaker(client)
+
+        async def premier_token():
+            flux = client.astream(messages("fiche 1"))
+            await flux.__anext__()
+            await flux.aclose()  # Client parti en plein flux : GeneratorExit
+
+        asyncio.run(premier_token())
+        self.assertEqual(client.stats()['in_flight'], 0)
+        self.assertEqual(client.invoke(messages("fiche 1")).content, "OK")
+        self.assertEqual(client.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_health_probe_does_not_generate(self):
+        client = self.make_client(failures=0, base_url='http://127.0.0.1:9')
+        health = client.health(timeout=0.5)
+        self.assertFalse(health['ok'])
+        self.assertIn('error', health)
+        self.assertEqual(client.chat.calls, 0)
+
+
+class PriorityLimiterTests(TestCase):
+    def waiter(self, limiter, classe, served):
+        def run():
+            limiter.acquire(classe)
+            served.append(classe)
+            limiter.release(classe)
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        return thread
+
+    def wait_queued(self, limiter, count):
+        deadline = time.monotonic() + 2
+        while sum(c['en_attente'] for c in limiter.stats()) < count and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def test_interactive_calls_go_first(self):
+        limiter, served = PriorityLimiter(1, aging=0), []
+        limiter.acquire(INTERACTIF)
+        threads = [self.waiter(limiter, PLANIFIE, served)]
+        self.wait_queued(limiter, 1)
+        threads.append(self.waiter(limiter, MASSE, served))
+        self.wait_queued(limiter, 2)
+        threads.append(self.waiter(limiter, INTERACTIF, served))
+        self.wait_queued(limiter, 3)
+        limiter.release(INTERACTIF)
+        for thread in threads:
+            thread.join(2)
+        self.assertEqual(served, [INTERACTIF, MASSE, PLANIFIE])
+
+    def test_bulk_work_cannot_take_every_slot(self):
+        limiter = PriorityLimiter(2, limits={MASSE: 1})
+        self.assertTrue(limiter.acquire(MASSE))
+        self.assertFalse(limiter.acquire(MASSE, timeout=0.1))
+        self.assertTrue(limiter.acquire(INTERACTIF, timeout=0.1))
+        stats = {c['classe']: c for c in limiter.stats()}
+        self.assertEqual((stats[MASSE]['en_cours'], stats[MASSE]['limite'], stats[MASSE]['servis']), (1, 1, 1))
+
+    def test_waiting_bulk_work_ages_past_new_interactive_calls(self):
+        limiter, served = PriorityLimiter(1, aging=0.1), []
+        limiter.acquire(INTERACTIF)
+        threads = [self.waiter(limiter, MASSE, served)]
+        self.wait_queued(limiter, 1)
+        time.sleep(0.3)
+        threads.append(self.waiter(limiter, INTERACTIF, served))
+        self.wait_queued(limiter, 2)
+        limiter.release(INTERACTIF)
+        for thread in threads:
+            thread.join(2)
+        self.assertEqual(served, [MASSE, INTERACTIF])
+
+    def test_priority_follows_background_threads(self):
+        seen = []
+        with priorite(PLANIFIE):
+            run_in_thread(lambda: seen.append(priorite_courante())).join(2)
+        self.assertEqual((seen, priorite_courante()), ([PLANIFIE], INTERACTIF))
+
+
+class JournalTests(TestCase):
+    def make_client(self, failures):
+        client = LLMClient(retry_backoff=0, max_retries=1)
+        client.chat = FlakyChat(failures)
+        return client
+
+    def test_call_is_logged_with_sizes_tokens_and_attempts(self):
+        client = self.make_client(failures=1)
+        with journaliser_appel('formabilite', 'demande-1') as appel:
+            client.invoke(messages("fiche 1"))
+            appel.json_valide = True
+        row = AppelLLM.objects.get()
+        self.assertEqual((row.usage, row.objet_id, row.modele), ('formabilite', 'demande-1', 'mistral'))
+        self.assertEqual((row.tentatives, row.tokens_prompt, row.tokens_reponse), (2, 12, 3))
+        self.assertEqual((row.caracteres_reponse, row.succes, row.json_valide), (2, True, True))
+
+    def test_call_failure_and_parse_failure_are_distinguished(self):
+        with self.assertRaises(httpx.ConnectError):
+            with journaliser_appel('pauvrete', 1):
+                self.make_client(failures=5).invoke(messages("fiche 1"))
+        with self.assertRaises(ValueError):
+            with journaliser_appel('pauvrete', 2):
+                self.make_client(failures=0).invoke(messages("fiche 2"))
+                raise ValueError("réponse du LLM sans JSON")
+        rows = {row.objet_id: row for row in AppelLLM.objects.all()}
+        self.assertEqual((rows['1'].succes, rows['1'].json_valide), (False, None))
+        self.assertEqual((rows['2'].succes, rows['2'].json_valide), (True, False))
+
+    def test_calls_outside_a_block_are_logged(self):
+        self.make_client(failures=0).invoke(messages("fiche 1"))
+        self.assertEqual(AppelLLM.objects.get().usage, 'autre')
+
+    def test_cache_hits_are_logged_but_excluded_from_latency(self):
+        llm, cache = FakeLLM(), LLMResponseCache()
+        for _ in range(2):
+            with journaliser_appel('projet'):
+                invoke_cached(llm, messages("fiche 1"), cache=cache)
+        self.assertEqual(AppelLLM.objects.filter(depuis_cache=True).count(), 1)
+        AppelLLM.objects.filter(depuis_cache=False).update(duree_ms=800)
+        AppelLLM.objects.filter(depuis_cache=True).update(duree_ms=1)
+        stats = statistiques_appels(1)['par_usage'][0]
+        self.assertEqual((stats['appels'], stats['depuis_cache'], stats['p50_ms']), (2, 1, 800))
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual((percentile(values, 50), percentile(values, 95), percentile(values, 99)), (50, 95, 99))
+        self.assertIsNone(percentile([], 50))
+
+
+class FakeOllamaTests(TestCase):
+    def setUp(self):
+        self.server = FakeOllamaServer(FakeOllamaConfig(latence_ms=0, tokens_par_s=0, seed=0)).start()
+        self.addCleanup(self.server.stop)
+        self.client = LLMClient(base_url=self.server.url, retry_backoff=0, max_retries=1)
+
+    def test_speaks_the_ollama_api(self):
+        self.assertTrue(self.client.health()['ok'])
+        response = self.client.invoke(messages('Répondez en JSON : {"score_formabilite": <score>}'))
+        self.assertIn('score_formabilite', json.loads(response.content))
+        self.assertGreater(response.usage_metadata['output_tokens'], 0)
+
+    def test_injected_errors_are_retried(self):
+        self.server.config.taux_erreur = 1.0
+        with self.assertRaises(Exception):
+            self.client.invoke(messages("niveau_pauvrete"))
+        self.assertEqual(self.server.stats()['erreurs'], 2)
@@ -97,8 +97,9 @@ class PersonneVulnerableAdmin(admin.ModelAdmin):
         'est_vulnerable', 'validated_by_admin', 'montant_recu',
         'get_recenseur', 'get_username'
     )
-    list_filter = ('est_vulnerable', 'validated_by_admin', 'entite')
+    list_filter = ('est_vulnerable', 'validated_by_admin', 'entite', 'categorie_source')
     search_fields = ['first_name', 'last_name', 'entite']
+    readonly_fields = ('categorie_source',)
     actions = ['valider_personnes_vulnerables']
 
     def get_recenseur(self, obj):
@@ -127,6 +128,9 @@ class PersonneVulnerableAdmin(admin.ModelAdmin):
     def save_model(self, request, obj, form, change):
         if not obj.recenseur:
             obj.recenseur = request.user
+        if 'categorie_predite' in form.changed_data:
+            # Catégorie corrigée à la main : étiquette d'entraînement (cf. detection/db_source.py)
+            obj.categorie_source = PersonneVulnerable.CATEGORIE_HUMAIN if obj.categorie_predite else None
         super().save_model(request, obj, form, change)
         if obj.est_vulnerable and obj.user:
             obj.user.is_vulnerable = True
@@ -1,6 +1,7 @@
 #users/forms.py
-import json
 from django import forms
+
+from donations.geo import referentiel
 from .models import PersonneVulnerable
 
 class RecensementForm(forms.ModelForm):
@@ -213,15 +214,8 @@ class RecensementForm(forms.ModelForm):
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        # Charger le JSON pour régions dynamiques
-        try:
-            with open('donations/json_ci/IvoryCoast.json', encoding='utf-8') as f:
-                data = json.load(f)
-                regions = data.get('regions', [])
-                choices = [(r['name'], r['name']) for r in regions if 'name' in r]
-                self.fields['region_geographique'].choices = sorted(set(choices), key=lambda x: x[0])
-        except FileNotFoundError:
-            self.fields['region_geographique'].choices = []
+        # Régions dynamiques, chargées une fois par processus (cf. donations/geo.py)
+        self.fields['region_geographique'].choices = list(referentiel().choix)
 
 
 # import json
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.4 on 2026-10-18 13:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0035_alter_personnevulnerable_entite'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='personnevulnerable',
+            name='analyse_demandee_le',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='personnevulnerable',
+            name='analyse_statut',
+            field=models.CharField(blank=True, choices=[('en_attente', 'En attente'), ('en_cours', 'En cours'), ('terminee', 'Terminée'), ('echec', 'Échec')], max_length=20, null=True, verbose_name="Statut de l'analyse IA"),
+        ),
+        migrations.AddField(
+            model_name='personnevulnerable',
+            name='analyse_terminee_le',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-18 14:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0036_personnevulnerable_analyse_statut'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='personnevulnerable',
+            name='categorie_source',
+            field=models.CharField(blank=True, choices=[('humain', 'Saisie humaine'), ('llm', 'Analyse LLM'), ('modele', 'Modèle de vulnérabilité')], max_length=10, null=True, verbose_name='Provenance de la catégorie'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.4 on 2026-10-18 17:40
+
+from django.db import migrations
+
+
+def renseigner_provenance(apps, schema_editor):
+    """
+    Provenance des catégories enregistrées avant le champ ``categorie_source`` :
+    analyse LLM terminée → ``llm`` ; fiche validée par un administrateur (qui a
+    vu et accepté la catégorie) → ``humain``, prioritaire. Les autres restent
+    inconnues (NULL) et ne servent pas d'étiquettes.
+    """
+    PersonneVulnerable = apps.get_model('users', 'PersonneVulnerable')
+    a_renseigner = PersonneVulnerable.objects.filter(categorie_source__isnull=True, categorie_predite__isnull=False)
+    a_renseigner.filter(analyse_llm__isnull=False).exclude(analyse_llm='').update(categorie_source='llm')
+    PersonneVulnerable.objects.filter(
+        validated_by_admin=True, categorie_predite__isnull=False,
+    ).exclude(categorie_source__in=['humain', 'modele']).update(categorie_source='humain')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0037_personnevulnerable_categorie_source'),
+    ]
+
+    operations = [
+        migrations.RunPython(renseigner_provenance, migrations.RunPython.noop),
+    ]
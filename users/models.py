@@ -164,8 +164,47 @@ class PersonneVulnerable(models.Model):
 
     niveau_pauvrete = models.FloatField(null=True, blank=True)
     categorie_predite = models.CharField(max_length=50, null=True, blank=True)
+
+    # Provenance de categorie_predite : seules les catégories saisies par un
+    # humain servent d'étiquettes d'entraînement (cf. detection/db_source.py)
+    CATEGORIE_HUMAIN = 'humain'
+    CATEGORIE_LLM = 'llm'
+    CATEGORIE_MODELE = 'modele'
+    CATEGORIE_SOURCE_CHOICES = [
+        (CATEGORIE_HUMAIN, 'Saisie humaine'),
+        (CATEGORIE_LLM, 'Analyse LLM'),
+        (CATEGORIE_MODELE, 'Modèle de vulnérabilité'),
+    ]
+    categorie_source = models.CharField(
+        max_length=10,
+        choices=CATEGORIE_SOURCE_CHOICES,
+        null=True,
+        blank=True,
+        verbose_name="Provenance de la catégorie"
+    )
     analyse_llm = models.TextField(null=True, blank=True)
 
+    # Suivi de l'analyse LLM, exécutée en tâche de fond (cf. users/tasks.py)
+    ANALYSE_EN_ATTENTE = 'en_attente'
+    ANALYSE_EN_COURS = 'en_cours'
+    ANALYSE_TERMINEE = 'terminee'
+    ANALYSE_ECHEC = 'echec'
+    ANALYSE_STATUT_CHOICES = [
+        (ANALYSE_EN_ATTENTE, 'En attente'),
+        (ANALYSE_EN_COURS, 'En cours'),
+        (ANALYSE_TERMINEE, 'Terminée'),
+        (ANALYSE_ECHEC, 'Échec'),
+    ]
+    analyse_statut = models.CharField(
+        max_length=20,
+        choices=ANALYSE_STATUT_CHOICES,
+        null=True,
+        blank=True,
+        verbose_name="Statut de l'analyse IA"
+    )
+    analyse_demandee_le = models.DateTimeField(null=True, blank=True)
+    analyse_terminee_le = models.DateTimeField(null=True, blank=True)
+
     def __str__(self):
         return f"{self.first_name} {self.last_name} - {self.entite}"
 
@@ -0,0 +1,110 @@
+# users/tasks.py
+"""
+Analyse de pauvreté par le LLM, en tâche de fond.
+
+La fiche est enregistrée tout de suite avec ``analyse_statut = 'en_attente'`` ;
+l'appel à Ollama (plusieurs secondes) est fait ensuite par un worker Celery,
+qui remplit ``niveau_pauvrete``, ``categorie_predite`` et ``analyse_llm``.
+L'interface suit l'avancement via ``recenseur/person/<id>/analyse/``.
+
+En local (``CELERY_TASK_ALWAYS_EAGER``) la tâche tourne dans un thread du
+processus web (cf. llm/jobs.py).
+"""
+import json
+import logging
+import re
+
+from django.utils import timezone
+
+from llm.jobs import submit_on_commit
+from llm.journal import journaliser_appel
+from .models import PersonneVulnerable
+
+logger = logging.getLogger(__name__)
+
+
+def parse_poverty_response(text):
+    """
+    Interprète la réponse JSON du LLM.
+
+    Retourne ``(niveau, analyse, type_pauvrete)`` ; ``niveau`` est un float ou None.
+    Lève ``ValueError`` si la réponse n'est pas du JSON exploitable.
+    """
+    try:
+        result = json.loads(text)
+    except (TypeError, json.JSONDecodeError):
+        # Le modèle entoure parfois le JSON de texte ou de balises ```json
+        match = re.search(r'\{.*\}', text or '', re.DOTALL)
+        if not match:
+            raise ValueError("réponse du LLM sans JSON")
+        result = json.loads(match.group(0))
+    if not isinstance(result, dict):
+        raise ValueError("réponse du LLM inattendue")
+
+    niveau = result.get('niveau_pauvrete')
+    try:
+        niveau = float(str(niveau).replace('%', '').strip()) if niveau is not None else None
+    except ValueError:
+        niveau = None
+
+    type_pauvrete = result.get('type_pauvrete')
+    type_pauvrete = str(type_pauvrete).strip().capitalize() if type_pauvrete else 'Inconnu'
+    return niveau, result.get('analyse'), type_pauvrete
+
+
+def analyser_pauvrete_sync(personne_id, prompt):
+    """Appelle le LLM pour une personne et enregistre le résultat (ou l'échec)."""
+    from .views import predict_poverty_with_llm
+
+    updated = PersonneVulnerable.objects.filter(pk=personne_id).update(
+        analyse_statut=PersonneVulnerable.ANALYSE_EN_COURS
+    )
+    if not updated:
+        return None
+
+    fields = {}
+    try:
+        with journaliser_appel('pauvrete', personne_id) as appel:
+            niveau, analyse, type_pauvrete = parse_poverty_response(predict_poverty_with_llm(prompt))
+            appel.json_valide = True
+        fields.update(
+            niveau_pauvrete=niveau,
+            categorie_predite=type_pauvrete,
+            categorie_source=PersonneVulnerable.CATEGORIE_LLM,
+            analyse_llm=analyse or 'Pas d\'analyse disponible.',
+            analyse_statut=PersonneVulnerable.ANALYSE_TERMINEE,
+        )
+    except Exception as e:
+        logger.warning("Analyse LLM de la personne %s en échec", personne_id, exc_info=True)
+        fields.update(
+            niveau_pauvrete=None,
+            categorie_predite='Inconnu',
+            categorie_source=None,
+            analyse_llm=f"Erreur : {e}",
+            analyse_statut=PersonneVulnerable.ANALYSE_ECHEC,
+        )
+    fields['analyse_terminee_le'] = timezone.now()
+    PersonneVulnerable.objects.filter(pk=personne_id).update(**fields)
+    return fields['analyse_statut']
+
+
+try:
+    from celery import shared_task
+
+
+    @shared_task
+    def analyser_pauvrete(personne_id, prompt):
+        return analyser_pauvrete_sync(personne_id, prompt)
+
+except ImportError:
+    def analyser_pauvrete(personne_id, prompt):
+        return analyser_pauvrete_sync(personne_id, prompt)
+
+
+def lancer_analyse_pauvrete(personne, prompt):
+    """Marque la fiche « en attente » et planifie l'analyse après le commit de la transaction."""
+    personne.analyse_statut = PersonneVulnerable.ANALYSE_EN_ATTENTE
+    personne.analyse_demandee_le = timezone.now()
+    personne.analyse_terminee_le = None
+    personne.save(update_fields=['analyse_statut', 'analyse_demandee_le', 'analyse_terminee_le'])
+    submit_on_commit(analyser_pauvrete, personne.pk, prompt, name=f'analyse-pauvrete-{personne.pk}')
@@ -38,6 +38,7 @@ urlpatterns = [
     path('recenseur/profile/', views.recenseur_profile_api, name='recenseur_profile_api'),
     path('recenseur/last-five/', views.last_five_persons_api, name='last_five_persons_api'),
     path('recenseur/person/<int:person_id>/', views.recensed_person_detail_api, name='recensed_person_detail_api'),
+    path('recenseur/person/<int:person_id>/analyse/', views.analyse_pauvrete_status_api, name='analyse_pauvrete_status_api'),
     path('logout_api1/', views.logout_api, name='logout_api1'),
     path('api/change-password/', views.change_password_api, name='change_password_api'),
     path('personnes-carousel/', views.admin_personnes_carousel, name='admin_personnes_carousel'),
@@ -56,6 +56,8 @@ from users.models import PersonneVulnerable  # ajuste le chemin si besoin
 from decimal import Decimal, ROUND_HALF_UP
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import render
+from donations.distribution import totaux_personne
+from donations.models import AllocationDon
 
 @login_required
 def profile(request):
@@ -77,29 +79,12 @@ def profile(request):
         total_amount = sum([don.montant for don in dons_donnes])
 
     if personne:
-        dons_valides = personne.dons.filter(est_reparti=True)
-        dons_recus = []
-        montant_total = Decimal('0.00')
-
-        for don in dons_valides:
-            try:
-                montant = Decimal(don.montant)
-            except Exception as e:
-                print(f"Erreur conversion montant pour le don {don.id}: {e}")
-                montant = Decimal('0.00')
-
-            if don.personne_vulnerable.exists():
-                nb_personnes = don.personne_vulnerable.count()
-            else:
-                nb_personnes = don.entite_vulnerable.personnevulnerable_set.filter(est_vulnerable=True).count()
-
-            montant_par_personne = montant / nb_personnes if nb_personnes > 0 else Decimal('0.00')
-            montant_total += montant_par_personne
-
-            dons_recus.append({
-                'don': don,
-                'montant_recu': montant_par_personne,
-            })
+        # Parts reçues, lues dans le registre des allocations (cf. donations/distribution.py)
+        dons_recus = [
+            {'don': allocation.don, 'montant_recu': allocation.montant}
+            for allocation in personne.allocations_dons.select_related('don').order_by('-don__date_don')
+        ]
+        montant_total = totaux_personne(personne)['recu']
 
         objectif = Decimal('200000.00')
         progression = (montant_total / objectif * 100).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP) if objectif > 0 else Decimal('0.00')
@@ -181,28 +166,18 @@ def profile_api(request):
 
     if user.is_vulnerable:
         try:
-            personne = user.personne_vulnerable
-            dons_query = personne.dons.filter(est_reparti=True)
-
-            if personne.entite:
-                dons_query |= personne.entite.dons.filter(est_reparti=True)
-
-            for don in dons_query.distinct():
-                beneficiaires = (
-                                    don.entite.personnevulnerable_set.count()
-                                    if don.entite
-                                    else 1
-                                ) or 1  # Éviter la division par zéro
-
-                montant_par_personne = don.montant / beneficiaires
-                montant_total += montant_par_personne
+            personne = user.personnevulnerable
+            allocations = personne.allocations_dons.select_related('don').order_by('-don__date_don')
 
+            for allocation in allocations:
+                don = allocation.don
                 dons_recus.append({
                     'don_id': don.id,
-                    'montant_recu': float(montant_par_personne),
+                    'montant_recu': float(allocation.montant),
                     'description': don.description,
                     'date_don': don.date_don.strftime('%d/%m/%Y') if don.date_don else ''
                 })
+            montant_total = totaux_personne(personne)['recu']
 
         except (PersonneVulnerable.DoesNotExist, AttributeError) as e:
             print(f'Erreur de récupération: {e}')
@@ -412,22 +387,18 @@ import os
 import joblib
 import numpy as np
 import pandas as pd
-import tensorflow as tf
 from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.shortcuts import render, redirect
 from .forms import RecensementForm
 from .models import PersonneVulnerable
-from langchain_ollama import ChatOllama
 import json
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.shortcuts import render, redirect
 from django.contrib import messages
 from .forms import RecensementForm
 
-llm = ChatOllama(base_url="http://localhost:11434", model="mistral")
-
 from langchain_ollama import ChatOllama
 import json
 from django.contrib.auth.decorators import login_required, user_passes_test
@@ -435,16 +406,16 @@ from django.shortcuts import render, redirect
 from django.contrib import messages
 from .forms import RecensementForm
 
-# Initialise l’instance du LLM (ajuste l’URL et le modèle si besoin)
-from langchain_ollama import ChatOllama
+# Client LLM partagé du processus (URL, modèle, délais : settings LLM_*, cf. llm/client.py)
 from langchain.schema import HumanMessage, SystemMessage
 import json
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.shortcuts import render, redirect
 from django.contrib import messages
 from .forms import RecensementForm
+from llm.client import get_llm_client
 
-llm = ChatOllama(base_url="http://localhost:11434", model="mistral")
+llm = get_llm_client()
 
 def build_poverty_prompt(data):
     return (
@@ -471,14 +442,17 @@ def build_poverty_prompt(data):
     )
 
 from langchain.schema import HumanMessage, SystemMessage
+from django.urls import reverse
+from llm.cache import invoke_cached
+from .tasks import lancer_analyse_pauvrete, parse_poverty_response
 
-def predict_poverty_with_llm(prompt):
+def predict_poverty_with_llm(prompt, bypass_cache=False):
     messages = [
         SystemMessage(content="Tu es un expert en prédiction de pauvreté."),
         HumanMessage(content=prompt)
     ]
-    response = llm(messages)  # Retourne un AIMessage
-    return response.content  # Texte simple
+    # Texte simple ; réponse mémorisée pour un prompt identique si elle est interprétable (cf. llm/cache.py)
+    return invoke_cached(llm, messages, bypass_cache=bypass_cache, valider=parse_poverty_response)
 
 @login_required
 @user_passes_test(lambda u: u.is_recenseur or u.is_superuser)
@@ -488,48 +462,24 @@ def recenser_personne(request):
         if form.is_valid():
             data_user = form.cleaned_data
             prompt = build_poverty_prompt(data_user)
-            llm_response = predict_poverty_with_llm(prompt)
-
-            try:
-                result = json.loads(llm_response)
-                niveau = result.get('niveau_pauvrete')
-                analyse = result.get('analyse')
-                type_pauvrete = result.get('type_pauvrete')
-            except Exception as e:
-                niveau = None
-                analyse = f"Erreur : {str(e)}"
-                type_pauvrete = None
-
-            niveau_float = None
-            if niveau is not None:
-                try:
-                    niveau_float = float(niveau.replace('%', '').strip())
-                except Exception:
-                    niveau_float = None
-
-            if type_pauvrete:
-                type_pauvrete = type_pauvrete.strip().capitalize()
-            else:
-                type_pauvrete = 'Inconnu'
 
+            # Enregistrement immédiat ; l'analyse LLM est faite en tâche de fond (users/tasks.py)
             personne = form.save(commit=False)
             personne.recenseur = request.user
-            personne.niveau_pauvrete = niveau_float
-            personne.categorie_predite = type_pauvrete
-            personne.analyse_llm = analyse or 'Pas d\'analyse disponible.'
             personne.save()
+            lancer_analyse_pauvrete(personne, prompt)
 
-            # messages.success(request,
-            #     f"Niveau de pauvreté prédit : {niveau_float if niveau_float is not None else 'N/A'}%\n"
-            #     f"Type de pauvreté : {type_pauvrete}\n"
-            #     f"Analyse : {analyse}"
-            # )
-            return redirect('recenser_personne')
+            messages.info(request, "Personne enregistrée. L'analyse de pauvreté est en cours.")
+            return redirect(f"{reverse('recenser_personne')}?analyse={personne.pk}")
 
     else:
         form = RecensementForm()
 
-    return render(request, 'users/recensement.html', {'form': form})
+    analyse_id = request.GET.get('analyse')
+    return render(request, 'users/recensement.html', {
+        'form': form,
+        'analyse_id': int(analyse_id) if analyse_id and analyse_id.isdigit() else None,
+    })
 
 
 # @login_required
@@ -856,7 +806,6 @@ from rest_framework.response import Response
 from rest_framework import status
 from .models import PersonneVulnerable
 from .serializers import PersonneVulnerableSerializer
-from detection.views import est_vulnerable  # Adaptez le chemin si nécessaire
 
 
 from rest_framework.decorators import api_view, permission_classes
@@ -865,7 +814,6 @@ from rest_framework.response import Response
 from rest_framework import status
 from .models import PersonneVulnerable
 from .serializers import PersonneVulnerableSerializer
-from detection.views import est_vulnerable  # Adaptez le chemin selon votre structure
 
 # users/api_views.py (ou dans le fichier approprié)
 
@@ -895,14 +843,12 @@ def recenser_personne_api(request):
     # On force le recenseur à l’utilisateur connecté
     data['recenseur'] = request.user.id
 
-    # Prédiction (par exemple avec votre fonction "est_vulnerable")
-    age = data.get('age')
-    revenu = data.get('revenu')
-    data['est_vulnerable'] = est_vulnerable(age, revenu)
-
     serializer = PersonneVulnerableSerializer(data=data)
     if serializer.is_valid():
-        serializer.save()  # Le champ "user" restera None
+        # Prédiction sur la fiche telle qu'elle sera enregistrée (valeurs par défaut
+        # comprises) : mêmes features que rescore_population
+        personne = PersonneVulnerable(**serializer.validated_data)
+        serializer.save(est_vulnerable=est_vulnerable(personne))  # Le champ "user" restera None
         return Response(serializer.data, status=status.HTTP_201_CREATED)
     else:
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -977,14 +923,12 @@ def recensement_api(request):
     # On force le recenseur à l’utilisateur connecté
     data['recenseur'] = request.user.id
 
-    # Calcul de la vulnérabilité via votre fonction (exemple)
-    age = data.get('age')
-    revenu = data.get('revenu')
-    data['est_vulnerable'] = est_vulnerable(age, revenu)
-
     serializer = PersonneVulnerableSerializer(data=data)
     if serializer.is_valid():
-        serializer.save()  # Ici, le champ "user" reste None, et "recenseur" est défini
+        # Calcul de la vulnérabilité sur la fiche telle qu'elle sera enregistrée
+        # (valeurs par défaut comprises) : mêmes features que rescore_population
+        personne = PersonneVulnerable(**serializer.validated_data)
+        serializer.save(est_vulnerable=est_vulnerable(personne))  # Ici, le champ "user" reste None, et "recenseur" est défini
         return Response(serializer.data, status=status.HTTP_201_CREATED)
     else:
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -1204,6 +1148,42 @@ def last_five_persons_api(request):
     serializer = PersonneVulnerableSerializer(persons, many=True)
     return Response(serializer.data, status=status.HTTP_200_OK)
 
+# ---------------------------------------------------------------------------
+# Recenseur – Suivi de l'analyse LLM d'une personne recensée
+# ---------------------------------------------------------------------------
+@api_view(['GET'])
+@authentication_classes([SessionAuthentication, TokenAuthentication])
+@permission_classes([IsAuthenticated])
+def analyse_pauvrete_status_api(request, person_id):
+    """
+    Statut de l'analyse de pauvreté (en_attente, en_cours, terminee, echec)
+    et son résultat une fois terminée. Requête légère, faite pour être interrogée
+    régulièrement par l'interface ou l'application mobile.
+    """
+    personnes = PersonneVulnerable.objects.all()
+    if not request.user.is_superuser:
+        personnes = personnes.filter(recenseur=request.user)
+    person = personnes.filter(id=person_id).values(
+        'id', 'analyse_statut', 'analyse_demandee_le', 'analyse_terminee_le',
+        'niveau_pauvrete', 'categorie_predite', 'analyse_llm',
+    ).first()
+    if person is None:
+        return Response({"detail": "Personne recensée non trouvée."},
+                        status=status.HTTP_404_NOT_FOUND)
+
+    termine = person['analyse_statut'] in (PersonneVulnerable.ANALYSE_TERMINEE, PersonneVulnerable.ANALYSE_ECHEC)
+    return Response({
+        "id": person['id'],
+        "statut": person['analyse_statut'],
+        "termine": termine,
+        "demandee_le": person['analyse_demandee_le'],
+        "terminee_le": person['analyse_terminee_le'],
+        "niveau_pauvrete": person['niveau_pauvrete'] if termine else None,
+        "categorie_predite": person['categorie_predite'] if termine else None,
+        "analyse_llm": person['analyse_llm'] if termine else None,
+    }, status=status.HTTP_200_OK)
+
+
 # ---------------------------------------------------------------------------
 # Recenseur – Détail d'une personne recensée
 # ---------------------------------------------------------------------------
@@ -1636,10 +1616,7 @@ def dashboard_formation_complete(request):
                 total_amount = sum([float(don.montant) for don in dons_donnes]) if dons_donnes else 0
 
                 # Bénéficiaires uniques
-                beneficiaires = set()
-                for don in dons_donnes.filter(est_reparti=True):
-                    if hasattr(don, 'personne_vulnerable') and don.personne_vulnerable.exists():
-                        beneficiaires.update(don.personne_vulnerable.values_list('id', flat=True))
+                beneficiaires = AllocationDon.objects.filter(don__donateur=user).values('personne').distinct().count()
 
                 # Dons récents (30 derniers jours)
                 date_recente = timezone.now() - timedelta(days=30)
@@ -1653,7 +1630,7 @@ def dashboard_formation_complete(request):
                 context.update({
                     'total_donations': total_donations,
                     'total_amount': int(total_amount),
-                    'beneficiaires': len(beneficiaires),
+                    'beneficiaires': beneficiaires,
                     'recent_amount': int(recent_amount),
                     'new_donations': new_donations,
                     'dons_en_attente': dons_en_attente,
@@ -1742,32 +1719,9 @@ def dashboard_formation_complete(request):
                     'projets_lances_pct': 0,
                 })
 
-            # Calcul des dons reçus (existant)
-            montant_total = Decimal('0.00')
-            nombre_donateurs = set()
-
-            dons_recus = []
-            if hasattr(personne, 'dons'):
-                dons_recus.extend(personne.dons.filter(est_reparti=True))
-
-            for don in dons_recus:
-                try:
-                    if hasattr(don, 'personne_vulnerable') and don.personne_vulnerable.exists():
-                        nb_beneficiaires = don.personne_vulnerable.count()
-                    elif hasattr(don, 'entite_vulnerable') and don.entite_vulnerable:
-                        nb_beneficiaires = don.entite_vulnerable.personnevulnerable_set.filter(
-                            est_vulnerable=True
-                        ).count()
-                    else:
-                        nb_beneficiaires = 1
-
-                    montant_par_personne = don.montant / nb_beneficiaires if nb_beneficiaires > 0 else don.montant
-                    montant_total += montant_par_personne
-                    nombre_donateurs.add(don.donateur.id if hasattr(don, 'donateur') else 0)
-
-                except Exception as e:
-                    print(f"Erreur calcul don {don.id}: {e}")
-                    continue
+            # Dons reçus : sommes sur le registre des allocations
+            montant_total = totaux_personne(personne)['recu']
+            nombre_donateurs = personne.allocations_dons.values('don__donateur').distinct().count()
 
             # Progression vers objectif
             objectif = Decimal('200000.00')
@@ -1778,7 +1732,7 @@ def dashboard_formation_complete(request):
                 'personne': personne,
                 'montant_total': float(montant_total),
                 'progression': float(progression),
-                'nombre_donateurs': len(nombre_donateurs),
+                'nombre_donateurs': nombre_donateurs,
                 'objectif': float(objectif),
             })
 
@@ -1935,13 +1889,7 @@ def api_dashboard_formation_stats(request):
                 personne = user.personnevulnerable
 
                 # Stats dons
-                montant_total = Decimal('0.00')
-                if hasattr(personne, 'dons'):
-                    for don in personne.dons.filter(est_reparti=True):
-                        nb_beneficiaires = 1
-                        if hasattr(don, 'personne_vulnerable') and don.personne_vulnerable.exists():
-                            nb_beneficiaires = don.personne_vulnerable.count()
-                        montant_total += don.montant / nb_beneficiaires
+                montant_total = totaux_personne(personne)['recu']
 
                 progression = (montant_total / Decimal('200000.00') * 100) if montant_total > 0 else 0
 